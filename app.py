@@ -7,15 +7,12 @@ import logging
 # Add tools directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'tools'))
 
-# Import all tools
-from tools.ssh_utils import *
-from tools.grocery_manager import run_grocery_manager
-from tools.whatsapp_bot import run_whatsapp_bot
-from tools.email_scheduler import run_email_scheduler
-from tools.linkedin_automation import run_linkedin_automation
-from tools.instagram_bot import run_instagram_bot
-from tools.sms_sender import run_sms_sender
-from tools.llm_tools import run_llm_tools
+# Tools are imported lazily, the first time their section is opened
+from tools.fragments import fragment
+from tools.registry import load_module, run_tool
+
+# Characters of live output pushed to the browser while a command streams
+LIVE_OUTPUT_TAIL_CHARS = 20000
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -223,23 +220,16 @@ def show_utility_tools():
     )
     
     # Run selected tool
-    if tools[selected_tool] == "grocery_manager":
-        run_grocery_manager()
-    elif tools[selected_tool] == "whatsapp_bot":
-        run_whatsapp_bot()
-    elif tools[selected_tool] == "email_scheduler":
-        run_email_scheduler()
-    elif tools[selected_tool] == "linkedin_automation":
-        run_linkedin_automation()
-    elif tools[selected_tool] == "instagram_bot":
-        run_instagram_bot()
-    elif tools[selected_tool] == "sms_sender":
-        run_sms_sender()
+    run_tool(tools[selected_tool])
 
 def show_linux_docker_commands():
     """Show Linux and Docker commands section"""
     st.markdown('<h2 class="section-header">💻 Linux & Docker Commands</h2>', unsafe_allow_html=True)
     
+    ssh_utils = load_module("ssh_utils")
+    if not ssh_utils.PARAMIKO_AVAILABLE:
+        st.warning("⚠️ Paramiko not installed. SSH functionality will be limited. Install with: `pip install paramiko`")
+    
     # SSH Configuration
     with st.expander("🔐 SSH Configuration", expanded=True):
         col1, col2 = st.columns(2)
@@ -251,6 +241,43 @@ def show_linux_docker_commands():
         with col2:
             password = st.text_input("Password", type="password")
             port = st.number_input("SSH Port", value=22, min_value=1, max_value=65535)
+            output_cap_kb = st.number_input("Output memory cap (KB)", min_value=16, max_value=65536, value=256, step=16,
+                                            help="Larger outputs keep only head and tail in memory; the rest spills to disk")
+        
+        # Multi-host mode runs the same command across a host list at once
+        multi_host = st.checkbox("🖧 Multi-host mode", help="Run each command on every host in a list or inventory file")
+        hosts = []
+        if multi_host:
+            col1, col2 = st.columns(2)
+            with col1:
+                host_text = st.text_area("Hosts (one per line: host, host:port or user@host:port)", height=120)
+                inventory_file = st.file_uploader("...or an inventory file", type=["txt", "ini", "cfg", "hosts"])
+            with col2:
+                max_workers = st.slider("Parallel connections", 1, 64, 16)
+                host_timeout = st.number_input("Per-host timeout (seconds)", min_value=1, max_value=3600, value=30)
+            
+            if inventory_file is not None:
+                host_text = host_text + "\n" + inventory_file.getvalue().decode("utf-8", errors="replace")
+            hosts = ssh_utils.parse_host_list(host_text, default_username=username, default_port=port)
+            st.caption(f"🎯 {len(hosts)} target host(s)")
+        
+        # Connections are pooled process-wide and reused across reruns
+        pool_status = ssh_utils.get_ssh_pool().snapshot()
+        if pool_status:
+            st.caption("🔗 Pooled connections: " + ", ".join(
+                f"{target} ({counts['idle']} idle, {counts['in_use']} busy)" for target, counts in pool_status.items()
+            ))
+    
+    ssh_config = {
+        "hostname": hostname,
+        "username": username,
+        "password": password,
+        "port": port,
+        "hosts": hosts if multi_host else None,
+        "max_workers": max_workers if multi_host else 1,
+        "timeout": host_timeout if multi_host else None,
+        "max_output_bytes": int(output_cap_kb) * 1024,
+    }
     
     # Command categories
     tab1, tab2 = st.tabs(["🐧 Linux Commands", "🐳 Docker Commands"])
@@ -306,17 +333,7 @@ def show_linux_docker_commands():
             col1.code(cmd)
             
             if col2.button(f"Run {i+1}", key=f"linux_{i}"):
-                if hostname and username and password:
-                    with st.spinner(f"Executing: {cmd}"):
-                        success, output = run_remote_command(hostname, username, password, cmd)
-                        
-                        if success:
-                            st.success("✅ Command executed successfully!")
-                            st.code(output)
-                        else:
-                            st.error(f"❌ Command failed: {output}")
-                else:
-                    st.warning("Please configure SSH connection first")
+                execute_command(cmd, ssh_config)
     
     with tab2:
         st.subheader("Docker Commands")
@@ -369,17 +386,128 @@ def show_linux_docker_commands():
             col1.code(cmd)
             
             if col2.button(f"Run {i+1}", key=f"docker_{i}"):
-                if hostname and username and password:
-                    with st.spinner(f"Executing: {cmd}"):
-                        success, output = run_remote_command(hostname, username, password, cmd)
-                        
-                        if success:
-                            st.success("✅ Command executed successfully!")
-                            st.code(output)
-                        else:
-                            st.error(f"❌ Command failed: {output}")
-                else:
-                    st.warning("Please configure SSH connection first")
+                execute_command(cmd, ssh_config)
+    
+    # A running command is polled by its own fragment until it finishes
+    if "ssh_command" in st.session_state:
+        show_running_command()
+    
+    # Output of the last single-host command survives reruns for paging and search
+    last_output = st.session_state.get("ssh_last_output")
+    if last_output:
+        output_buffer = load_module("output_buffer")
+        st.markdown(f"### 📄 Last Output: `{last_output['command']}`")
+        kind, message = last_output["status"]
+        getattr(st, kind)(message)
+        output_buffer.show_output_viewer(last_output["stdout"], key="ssh_stdout")
+        if last_output["stderr"].total_bytes:
+            st.markdown("#### ⚠️ stderr")
+            output_buffer.show_output_viewer(last_output["stderr"], key="ssh_stderr")
+
+def execute_command(cmd, ssh_config):
+    """Run a command on the configured host, or on every host in multi-host mode"""
+    if ssh_config["hosts"] is not None:
+        if ssh_config["hosts"] and ssh_config["password"]:
+            show_fanout_results(cmd, ssh_config)
+        else:
+            st.warning("Please add at least one host and a password first")
+        return
+    
+    if ssh_config["hostname"] and ssh_config["username"] and ssh_config["password"]:
+        start_streaming_command(cmd, ssh_config)
+    else:
+        st.warning("Please configure SSH connection first")
+
+def start_streaming_command(cmd, ssh_config):
+    """Start a command in the background; ``show_running_command`` streams it into the page"""
+    ssh_utils = load_module("ssh_utils")
+    
+    running = st.session_state.pop("ssh_command", None)
+    if running is not None:
+        running.cancel()
+    # Replace (and delete the spill files of) the previous command's output
+    previous = st.session_state.pop("ssh_last_output", None)
+    if previous:
+        previous["stdout"].cleanup()
+        previous["stderr"].cleanup()
+    
+    st.session_state.ssh_command = ssh_utils.CommandRun(
+        ssh_config["hostname"], ssh_config["username"], ssh_config["password"], cmd,
+        port=ssh_config["port"], max_output_bytes=ssh_config["max_output_bytes"]
+    )
+
+@fragment(run_every=0.5)
+def show_running_command():
+    """Live stdout/stderr tail of the running command, with a cancel button"""
+    run = st.session_state.get("ssh_command")
+    if run is None:
+        return
+    
+    if run.running:
+        col1, col2 = st.columns([4, 1])
+        if run.cancel_event.is_set():
+            col1.info(f"⏳ Cancelling `{run.command}`...")
+        else:
+            col1.info(f"⏳ Running `{run.command}` ({run.elapsed:.0f}s, {run.stdout.total_bytes:,} bytes)")
+        # The run lives in session state, so the click reaches the thread streaming it
+        col2.button("⏹️ Cancel", key="cancel_ssh_command", on_click=run.cancel,
+                    disabled=run.cancel_event.is_set())
+        # Only the in-memory tail is pushed while the command runs
+        st.code(run.tail_text("stdout", LIVE_OUTPUT_TAIL_CHARS) or " ")
+        if run.stderr.total_bytes:
+            st.code(run.tail_text("stderr", LIVE_OUTPUT_TAIL_CHARS), language="log")
+        return
+    
+    if run.status == "cancelled":
+        status = ("warning", f"⏹️ Command cancelled after {run.elapsed:.1f}s")
+    elif run.status == "error":
+        status = ("error", f"❌ Command failed: {run.error}")
+    elif run.exit_status == 0:
+        status = ("success", f"✅ Command executed successfully! ({run.elapsed:.1f}s)")
+    else:
+        status = ("error", f"❌ Command failed with exit status {run.exit_status}")
+    del st.session_state["ssh_command"]
+    st.session_state.ssh_last_output = {"command": run.command, "stdout": run.stdout, "stderr": run.stderr,
+                                        "status": status}
+    # The full result is shown by the output viewer, outside this fragment
+    st.rerun()
+
+def show_fanout_results(cmd, ssh_config):
+    """Run a command on many hosts in parallel and fill a results grid as hosts finish"""
+    hosts = ssh_config["hosts"]
+    st.markdown(f"**Running on {len(hosts)} hosts:** `{cmd}`")
+    
+    progress = st.progress(0.0)
+    grid = st.empty()
+    rows = []
+    outputs = []
+    started = datetime.now()
+    
+    for result in load_module("ssh_utils").run_command_on_hosts(hosts, ssh_config["password"], cmd,
+                                                        max_workers=ssh_config["max_workers"],
+                                                        timeout=ssh_config["timeout"]):
+        first_line = result["output"].strip().splitlines()[0] if result["output"].strip() else ""
+        rows.append({
+            "Host": result["target"],
+            "Status": "✅ OK" if result["success"] else "❌ Failed",
+            "Time (s)": round(result["elapsed"], 2),
+            "Output": first_line[:120],
+        })
+        outputs.append(result)
+        progress.progress(len(rows) / len(hosts), text=f"{len(rows)}/{len(hosts)} hosts finished")
+        grid.dataframe(rows, use_container_width=True, hide_index=True)
+    
+    failed = sum(1 for result in outputs if not result["success"])
+    elapsed = (datetime.now() - started).total_seconds()
+    slowest = max(result["elapsed"] for result in outputs)
+    if failed:
+        st.warning(f"⚠️ {failed} of {len(hosts)} hosts failed ({elapsed:.1f}s total, slowest host {slowest:.1f}s)")
+    else:
+        st.success(f"✅ Finished on all {len(hosts)} hosts in {elapsed:.1f}s (slowest host {slowest:.1f}s)")
+    
+    for result in outputs:
+        with st.expander(f"{'✅' if result['success'] else '❌'} {result['target']}"):
+            st.code(result["output"])
 
 def show_apache_launcher():
     """Show Apache launcher section"""
@@ -387,6 +515,10 @@ def show_apache_launcher():
     
     st.info("🚀 Launch Apache web server on your remote machine with one click!")
     
+    ssh_utils = load_module("ssh_utils")
+    if not ssh_utils.PARAMIKO_AVAILABLE:
+        st.warning("⚠️ Paramiko not installed. SSH functionality will be limited. Install with: `pip install paramiko`")
+    
     # SSH Configuration
     with st.expander("🔐 SSH Configuration", expanded=True):
         col1, col2 = st.columns(2)
@@ -408,7 +540,7 @@ def show_apache_launcher():
         if st.button("🚀 Start Apache", type="primary", use_container_width=True):
             if hostname and username and password:
                 with st.spinner("Starting Apache server..."):
-                    success, message = start_apache_server(hostname, username, password)
+                    success, message = ssh_utils.start_apache_server(hostname, username, password, port=port)
                     
                     if success:
                         st.success("✅ Apache started successfully!")
@@ -422,7 +554,7 @@ def show_apache_launcher():
         if st.button("📊 Check Status", use_container_width=True):
             if hostname and username and password:
                 with st.spinner("Checking Apache status..."):
-                    success, output = run_remote_command(hostname, username, password, "systemctl status apache2")
+                    success, output = ssh_utils.run_remote_command(hostname, username, password, "systemctl status apache2", port=port)
                     
                     if success:
                         st.success("✅ Status retrieved!")
@@ -436,7 +568,7 @@ def show_apache_launcher():
         if st.button("🛑 Stop Apache", use_container_width=True):
             if hostname and username and password:
                 with st.spinner("Stopping Apache server..."):
-                    success, output = run_remote_command(hostname, username, password, "sudo systemctl stop apache2")
+                    success, output = ssh_utils.run_remote_command(hostname, username, password, "sudo systemctl stop apache2", port=port)
                     
                     if success:
                         st.success("✅ Apache stopped successfully!")
@@ -479,32 +611,32 @@ def show_llm_panel():
     st.markdown('<h2 class="section-header">🤖 LLMs Panel</h2>', unsafe_allow_html=True)
     
     # Run LLM tools
-    run_llm_tools()
+    run_tool("llm_tools")
 
 # Check for tool-specific sessions
 if st.session_state.get("show_grocery_manager", False):
     st.session_state.show_grocery_manager = False
-    run_grocery_manager()
+    run_tool("grocery_manager")
 
 elif st.session_state.get("show_whatsapp_bot", False):
     st.session_state.show_whatsapp_bot = False
-    run_whatsapp_bot()
+    run_tool("whatsapp_bot")
 
 elif st.session_state.get("show_email_scheduler", False):
     st.session_state.show_email_scheduler = False
-    run_email_scheduler()
+    run_tool("email_scheduler")
 
 elif st.session_state.get("show_linkedin_automation", False):
     st.session_state.show_linkedin_automation = False
-    run_linkedin_automation()
+    run_tool("linkedin_automation")
 
 elif st.session_state.get("show_instagram_bot", False):
     st.session_state.show_instagram_bot = False
-    run_instagram_bot()
+    run_tool("instagram_bot")
 
 elif st.session_state.get("show_llm_tools", False):
     st.session_state.show_llm_tools = False
-    run_llm_tools()
+    run_tool("llm_tools")
 
 else:
     # Run main dashboard
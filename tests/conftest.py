@@ -0,0 +1,4 @@
+import os
+
+# Process-wide stores created during tests never touch data/
+os.environ.setdefault("DASHBOARD_STORAGE", "memory")
@@ -0,0 +1,45 @@
+import os
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+SECTIONS = ["🏠 Dashboard", "💻 Linux & Docker Commands", "🌐 Apache Launcher", "🤖 LLMs Panel"]
+TOOLS = ["🛒 Grocery Manager", "📱 WhatsApp Bot", "📧 Email Scheduler", "💼 LinkedIn Automation",
+         "📸 Instagram Bot", "📱 SMS Sender"]
+
+@pytest.fixture
+def sqlite_dashboard(tmp_path, monkeypatch):
+    """Point every store at a fresh temporary SQLite database and data directory"""
+    monkeypatch.setenv("DASHBOARD_STORAGE", "sqlite")
+    monkeypatch.setenv("DASHBOARD_DB", str(tmp_path / "dashboard.db"))
+    monkeypatch.setenv("DASHBOARD_ARCHIVE", str(tmp_path / "archive"))
+    monkeypatch.setenv("DASHBOARD_ATTACHMENTS", str(tmp_path / "attachments"))
+    monkeypatch.setenv("DASHBOARD_BATCHES", str(tmp_path / "batches"))
+    monkeypatch.setenv("DASHBOARD_LLM_CACHE", str(tmp_path / "llm_cache.db"))
+    monkeypatch.setenv("DASHBOARD_LLM_USAGE", str(tmp_path / "llm_usage.db"))
+    # Shared resources are process-wide; rebuild them against the temporary files
+    st.cache_resource.clear()
+    yield
+    st.cache_resource.clear()
+
+def render(section, tool=None):
+    at = AppTest.from_file(APP, default_timeout=30).run()
+    at.sidebar.selectbox[0].set_value(section).run()
+    if tool is not None:
+        next(box for box in at.selectbox if box.label == "Choose a tool to run:").set_value(tool).run()
+    return at
+
+@pytest.mark.parametrize("section", SECTIONS)
+def test_section_renders(sqlite_dashboard, section):
+    at = render(section)
+    assert not at.exception, [e.message for e in at.exception]
+
+@pytest.mark.parametrize("tool", TOOLS)
+def test_utility_tool_renders(sqlite_dashboard, tool):
+    at = render("🧰 Utility Tools", tool)
+    assert not at.exception, [e.message for e in at.exception]
+    # Render again so anything read back from the database goes through the same paths
+    at.run()
+    assert not at.exception, [e.message for e in at.exception]
@@ -0,0 +1,77 @@
+import io
+import os
+import re
+import time
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+import pytest
+from tools.attachment_store import AttachmentStore
+from tools.email_dispatch import StreamedMessage
+
+READ_SIZE = StreamedMessage.READ_SIZE
+
+@pytest.fixture
+def store(tmp_path):
+    return AttachmentStore(str(tmp_path / "attachments"))
+
+def blobs(store):
+    return sorted(name for _, _, files in os.walk(store.root) for name in files)
+
+def age(store, digest, seconds):
+    then = time.time() - seconds
+    os.utime(store.path(digest), (then, then))
+
+def test_identical_content_is_stored_once(store):
+    first = store.put(io.BytesIO(b"report"), "a.txt", "text/plain")
+    second = store.put(io.BytesIO(b"report"), "b.txt")
+    assert first["sha256"] == second["sha256"]
+    assert (first["size"], first["content_type"], second["content_type"]) == (6, "text/plain", "application/octet-stream")
+    assert blobs(store) == [first["sha256"]]
+    assert b"".join(store.iter_chunks(first["sha256"], chunk_size=4)) == b"report"
+
+def test_garbage_collection_keeps_referenced_and_recent_blobs(store):
+    kept = store.put(io.BytesIO(b"kept"), "kept.txt")["sha256"]
+    dropped = store.put(io.BytesIO(b"dropped"), "dropped.txt")["sha256"]
+    recent = store.put(io.BytesIO(b"recent"), "recent.txt")["sha256"]
+    age(store, kept, 7200)
+    age(store, dropped, 7200)
+    assert store.collect_garbage({kept}) == len(b"dropped")
+    assert blobs(store) == sorted([kept, recent])
+
+def test_storing_again_renews_the_grace_period(store):
+    digest = store.put(io.BytesIO(b"shared"), "a.txt")["sha256"]
+    age(store, digest, 7200)
+    store.put(io.BytesIO(b"shared"), "b.txt")
+    assert store.collect_garbage(set()) == 0
+    assert store.exists(digest)
+
+def smtp_to_message(data):
+    """Undo SMTP dot-stuffing and line endings, as the receiving server would, and parse the result"""
+    assert data.endswith(b"\r\n")
+    return message_from_bytes(data.replace(b"\r\n..", b"\r\n.").replace(b"\r\n", b"\n"), policy=policy.default)
+
+@pytest.mark.parametrize("size", [0, 1, 56, 57, 58, READ_SIZE - 1, READ_SIZE, READ_SIZE + 1, 2 * READ_SIZE + 57])
+def test_streamed_message_round_trips_attachments(store, size):
+    content = os.urandom(size)
+    references = [store.put(io.BytesIO(content), "data.bin"), store.put(io.BytesIO(b"second file"), "notes.txt", "text/plain")]
+    headers = EmailMessage()
+    headers["From"] = "me@example.com"
+    headers["To"] = "you@example.com"
+    headers["Subject"] = "Files"
+    body = "Hello\n.starts with a dot\n"
+    data = b"".join(StreamedMessage(headers, body, references, store).iter_bytes())
+
+    # Every base64 line is a full 76 characters except the last of each part, even across read chunks
+    for part in re.split(rb"\r\n--=_[0-9a-f]+", data)[2:-1]:
+        lines = part.split(b"\r\n\r\n", 1)[1].split(b"\r\n")
+        assert all(len(line) == 76 for line in lines[:-2])
+    assert re.search(rb"(?m)^\.\.starts with a dot", data)
+
+    message = smtp_to_message(data)
+    assert message["Subject"] == "Files"
+    assert message.get_body().get_content() == body
+    attachments = list(message.iter_attachments())
+    assert [part.get_filename() for part in attachments] == ["data.bin", "notes.txt"]
+    assert attachments[0].get_payload(decode=True) == content
+    assert attachments[1].get_content_type() == "text/plain"
+    assert attachments[1].get_payload(decode=True) == b"second file"
@@ -0,0 +1,39 @@
+from streamlit.testing.v1 import AppTest
+from tools.contacts import ContactDirectory
+from tools.storage import Collection, MemoryBackend
+
+def directory():
+    contacts = ContactDirectory(Collection("contacts", backend=MemoryBackend(), namespace="test"))
+    contacts.add("Alice Smith", "+14155550100", groups=["Team"])
+    contacts.add("Bob Jones", "+14155550101")
+    contacts.add("Alicia Keys", "+14155550102", groups=["Team"])
+    return contacts
+
+def test_add_merges_by_number_and_search_uses_the_indexes():
+    contacts = directory()
+    contact, created = contacts.add("Bobby", "+1 415 555 0101", groups=["Team"])
+    assert not created and len(contacts) == 3
+    assert contacts.find_number("+14155550101")["id"] == contact["id"]
+    assert [c["name"] for c in contacts.search("al")] == ["Alice Smith", "Alicia Keys"]
+    assert [c["name"] for c in contacts.search("jones")] == ["Bob Jones"]
+    assert contacts.groups() == {"Team": 3}
+
+def picker_app():
+    import streamlit as st
+    from tools.contacts import ContactDirectory, pick_contacts
+    from tools.storage import Collection, MemoryBackend
+    if "contacts" not in st.session_state:
+        contacts = ContactDirectory(Collection("contacts", backend=MemoryBackend(), namespace="test"))
+        for name, number in [("Alice Smith", "+14155550100"), ("Bob Jones", "+14155550101")]:
+            contacts.add(name, number)
+        st.session_state.contacts = contacts
+    chosen = pick_contacts("to", st.session_state.contacts, multi=False)
+    st.markdown(f"chosen: {chosen['name'] if chosen else None}")
+
+def test_single_pick_survives_a_new_search():
+    at = AppTest.from_function(picker_app).run()
+    bob = next(c["id"] for c in at.session_state.contacts.search("bob"))
+    at.selectbox(key="to_id").set_value(bob).run()
+    at.text_input(key="to_query").input("ali").run()
+    assert not at.exception
+    assert at.markdown[-1].value == "chosen: Bob Jones"
@@ -0,0 +1,102 @@
+import uuid
+import pytest
+from tools import conversation as conversation_module
+from tools.conversation import SUMMARY_LINE_CHARS, WINDOW_PAGE, Conversation, message_tokens
+from tools.llm_providers import estimate_tokens
+from tools.storage import Collection, MemoryBackend
+
+@pytest.fixture
+def chat():
+    backend = MemoryBackend()
+    # A fresh namespace, so session-cached reads from other tests can't match
+    namespace = uuid.uuid4().hex
+    return Conversation(Collection("chat_history", backend, namespace), Collection("chat_summaries", backend, namespace))
+
+def fill(chat, count, length=40):
+    for index in range(count):
+        chat.add("user" if index % 2 == 0 else "assistant", f"Message {index:03d}. " + "x" * length)
+
+def summary_writes(chat):
+    return chat.summaries.backend.version(chat.summaries.name, chat.summaries.namespace)
+
+def test_token_counts_are_stored_once_and_used_by_the_window(chat):
+    chat.add("user", "x" * 40)
+    stored = chat.messages.all()[0]
+    assert stored["tokens"] == message_tokens("x" * 40) == 14
+    # The window trusts the stored count instead of recounting the text
+    chat.messages.update(dict(stored, tokens=1000))
+    chat.add("assistant", "short")
+    assert [message["content"] for message in chat.window(500)] == ["short"]
+    # Records saved before counts were kept are counted on the fly
+    legacy = chat.messages.all()[0]
+    del legacy["tokens"]
+    chat.messages.update(legacy)
+    assert len(chat.window(500)) == 2
+
+def test_window_is_the_newest_run_that_fits_the_budget(chat):
+    fill(chat, 10)
+    per_message = message_tokens("Message 000. " + "x" * 40)
+    window = chat.window(per_message * 3 + per_message - 1)
+    assert [message["content"][:11] for message in window] == ["Message 007", "Message 008", "Message 009"]
+    assert sum(Conversation.tokens(message) for message in window) <= per_message * 4 - 1
+    # The latest message is sent even when it alone is over budget
+    chat.add("user", "y" * 400)
+    assert [message["content"] for message in chat.window(10)] == ["y" * 400]
+
+def test_window_reads_past_one_storage_page(chat):
+    fill(chat, WINDOW_PAGE * 2 + 5, length=0)
+    window = chat.window(10 ** 6)
+    assert len(window) == WINDOW_PAGE * 2 + 5
+    assert [message["id"] for message in window] == sorted(message["id"] for message in window)
+
+def test_context_puts_the_summary_before_the_window(chat):
+    fill(chat, 30)
+    context = chat.context(200)
+    assert context["window"] + context["summarized"] == 30
+    assert context["summarized"] > 0
+    assert context["messages"][0]["role"] == "system"
+    assert context["messages"][0]["content"].startswith("Earlier in this conversation:")
+    assert context["tokens"] <= 200
+    # The newest summary lines that fit are sent, and only for messages outside the window
+    summary = context["messages"][0]["content"]
+    assert f"Message {29 - context['window']:03d}." in summary
+    assert f"Message {30 - context['window']:03d}." not in summary
+    assert "Message 000." not in summary
+
+def test_fold_is_idempotent(chat):
+    fill(chat, 30)
+    first = chat.context(200)
+    writes = summary_writes(chat)
+    assert chat.context(200) == first
+    assert summary_writes(chat) == writes
+    summary = chat.summary()
+    assert len(chat.summaries.all()) == 1
+    ids = [message_id for message_id, _ in summary["lines"]]
+    assert ids == sorted(set(ids))
+
+    # New turns are folded on top of the existing lines
+    fill(chat, 4)
+    chat.context(200)
+    later = chat.summary()
+    assert later["lines"][:len(summary["lines"])] == summary["lines"]
+    assert len(later["lines"]) == len(summary["lines"]) + 4
+
+def test_rendering_without_fold_never_writes(chat):
+    fill(chat, 30)
+    writes = summary_writes(chat)
+    context = chat.context(200, fold=False)
+    assert summary_writes(chat) == writes
+    assert chat.summary() is None
+    assert context["summarized"] > 0 and context["messages"][0]["role"] != "system"
+
+def test_summary_is_truncated_to_its_token_limit(chat, monkeypatch):
+    monkeypatch.setattr(conversation_module, "SUMMARY_MAX_TOKENS", 120)
+    fill(chat, 40, length=400)
+    chat.context(200)
+    summary = chat.summary()
+    assert sum(estimate_tokens(text) for _, text in summary["lines"]) <= 120
+    assert all(len(text) <= len("Assistant: ") + SUMMARY_LINE_CHARS for _, text in summary["lines"])
+    # The oldest lines are the ones dropped
+    window_start = chat.window(200 - int(200 * conversation_module.SUMMARY_SHARE))[0]["id"]
+    assert summary["lines"][-1][0] == window_start - 1
+    assert summary["dropped"] == window_start - 1 - len(summary["lines"])
@@ -0,0 +1,262 @@
+import smtplib
+import socket
+import threading
+import time
+from datetime import datetime
+from email import message_from_bytes
+from email.message import EmailMessage
+import pytest
+from tools.email_dispatch import (COLLECTION, RETRY_DELAYS, RETRY_TIME_FORMAT, TIME_FORMAT, EmailDispatcher,
+                                  LocalSMTPServer, SMTPTransport, is_transient, next_occurrence)
+from tools.storage import MemoryBackend
+
+def at(text):
+    return datetime.strptime(text, TIME_FORMAT)
+
+class FlakyTransport:
+    """Raises the queued errors in turn, then delivers"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.sent = []
+
+    def send(self, message):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(message)
+
+class SlowTransport(FlakyTransport):
+    """Blocks each send until ``release`` is set"""
+
+    max_connections = 1
+    relay = ("slow",)
+
+    def __init__(self, *errors):
+        super().__init__(*errors)
+        self.sending = threading.Event()
+        self.release = threading.Event()
+        self.attempts = 0
+
+    def send(self, message):
+        self.attempts += 1
+        self.sending.set()
+        self.release.wait(5)
+        super().send(message)
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = EmailDispatcher(MemoryBackend())
+    yield dispatcher
+    dispatcher.stop()
+
+def add_email(dispatcher, repeat="Never", scheduled_time="2024-01-31 09:00"):
+    email = {"recipient": "a@example.com", "subject": "Report", "body": "Hi", "priority": "Normal",
+             "repeat": repeat, "status": "Scheduled", "scheduled_time": scheduled_time}
+    email["id"] = dispatcher.backend.append(COLLECTION, "ns", email)
+    return email
+
+def stored(dispatcher, email):
+    return next(record for record in dispatcher.backend.fetch(COLLECTION, "ns") if record["id"] == email["id"])
+
+def test_next_occurrence_daily_and_weekly_skip_missed_runs():
+    email = {"repeat": "Daily", "scheduled_time": "2024-01-01 09:00"}
+    assert next_occurrence(email, at("2024-01-01 09:00")) == at("2024-01-02 09:00")
+    assert next_occurrence(email, at("2024-01-10 12:00")) == at("2024-01-11 09:00")
+    weekly = {"repeat": "Weekly", "scheduled_time": "2024-01-01 09:00"}
+    assert next_occurrence(weekly, at("2024-01-20 09:00")) == at("2024-01-22 09:00")
+    assert next_occurrence({"repeat": "Never", "scheduled_time": "2024-01-01 09:00"}, at("2024-01-02 00:00")) is None
+
+def test_next_occurrence_monthly_keeps_the_anchor_day():
+    email = {"repeat": "Monthly", "scheduled_time": "2024-01-31 09:00"}
+    february = next_occurrence(email, at("2024-01-31 09:00"))
+    assert february == at("2024-02-29 09:00")
+    email.update(anchor_time="2024-01-31 09:00", scheduled_time=february.strftime(TIME_FORMAT))
+    assert next_occurrence(email, february) == at("2024-03-31 09:00")
+
+def test_is_transient():
+    assert is_transient(smtplib.SMTPServerDisconnected("gone"))
+    assert is_transient(smtplib.SMTPResponseException(421, b"try later"))
+    assert is_transient(ConnectionRefusedError())
+    assert not is_transient(smtplib.SMTPResponseException(550, b"no such user"))
+    assert not is_transient(smtplib.SMTPAuthenticationError(535, b"bad credentials"))
+    assert not is_transient(FileNotFoundError("attachment"))
+
+def test_transient_failure_is_retried_with_backoff(dispatcher):
+    email = add_email(dispatcher)
+    transport = FlakyTransport(smtplib.SMTPServerDisconnected("gone"))
+    now = at("2024-01-31 09:00")
+    dispatcher._failed("ns", email, smtplib.SMTPServerDisconnected("gone"), now.replace(second=45))
+    record = stored(dispatcher, email)
+    assert record["status"] == "Scheduled"
+    assert record["attempts"] == 1
+    # The full delay, not rounded down to the minute
+    assert record["retry_time"] == "2024-01-31 09:01:45"
+    assert dispatcher.next_due("ns") == datetime.strptime("2024-01-31 09:01:45", RETRY_TIME_FORMAT)
+    assert dispatcher.failed == 0 and dispatcher.retries == 1
+
+    transport.errors.clear()
+    dispatcher._dispatch(transport, "ns", record)
+    record = stored(dispatcher, email)
+    assert record["status"] == "Sent"
+    assert "retry_time" not in record and "attempts" not in record and "error" not in record
+
+def test_one_off_email_fails_after_the_last_retry(dispatcher):
+    email = add_email(dispatcher)
+    transport = FlakyTransport(*[smtplib.SMTPServerDisconnected("gone")] * (len(RETRY_DELAYS) + 1))
+    for _ in range(len(RETRY_DELAYS) + 1):
+        dispatcher._dispatch(transport, "ns", stored(dispatcher, email))
+    record = stored(dispatcher, email)
+    assert record["status"] == "Failed"
+    assert dispatcher.retries == len(RETRY_DELAYS) and dispatcher.failed == 1
+
+def test_recurring_email_keeps_its_schedule_after_a_permanent_failure(dispatcher):
+    email = add_email(dispatcher, repeat="Monthly")
+    dispatcher._dispatch(FlakyTransport(smtplib.SMTPResponseException(550, b"rejected")), "ns", email)
+    record = stored(dispatcher, email)
+    assert record["status"] == "Scheduled"
+    assert record["failed_count"] == 1
+    assert record["anchor_time"] == "2024-01-31 09:00"
+    assert at(record["scheduled_time"]) > datetime.now()
+    assert dispatcher.retries == 0 and dispatcher.failed == 1
+
+def test_settings_are_restored_without_the_password():
+    backend = MemoryBackend()
+    first = EmailDispatcher(backend)
+    first.set_transport("open", SMTPTransport("relay.local", 25, starttls=False))
+    first.set_transport("secret", SMTPTransport("smtp.example.com", 587, "me", "hunter2"))
+    first.stop()
+    assert "hunter2" not in str(backend.fetch("email_settings", "secret"))
+
+    second = EmailDispatcher(backend, default_transport=SMTPTransport("default.local", 25))
+    try:
+        assert second.transport_for("open").host == "relay.local"
+        assert second.transport_for("secret") is None
+        assert second.awaiting_password("secret")["username"] == "me"
+        second.set_transport("secret", SMTPTransport("smtp.example.com", 587, "me", "hunter2"))
+        assert second.awaiting_password("secret") is None
+    finally:
+        second.stop()
+
+@pytest.mark.parametrize("repeat, errors", [("Daily", ()), ("Never", (smtplib.SMTPServerDisconnected("gone"),))])
+def test_email_deleted_while_sending_is_not_queued_again(repeat, errors):
+    transport = SlowTransport(*errors)
+    dispatcher = EmailDispatcher(MemoryBackend(), default_transport=transport)
+    try:
+        email = add_email(dispatcher, repeat=repeat)
+        dispatcher.schedule("ns", email)
+        assert transport.sending.wait(5)
+        dispatcher.cancel("ns", email["id"])
+        dispatcher.backend.delete(COLLECTION, "ns", email["id"])
+        transport.release.set()
+        deadline = time.monotonic() + 5
+        while dispatcher._in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not dispatcher._in_flight
+        # Neither the next occurrence nor a retry is queued, and the record stays deleted
+        assert dispatcher.pending("ns") == 0
+        assert dispatcher.backend.fetch(COLLECTION, "ns") == []
+        assert transport.attempts == 1
+    finally:
+        dispatcher.stop()
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+class CountingServer(LocalSMTPServer):
+    """Local sink that also records client connections and RSET commands"""
+
+    def __init__(self, port=None):
+        self.peers = set()
+        self.resets = 0
+        super().__init__(port=port or free_port())
+
+    async def handle_RSET(self, server, session, envelope):
+        self.resets += 1
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.peers.add(session.peer)
+        return await super().handle_DATA(server, session, envelope)
+
+    def subjects(self):
+        return sorted(message_from_bytes(message["data"])["Subject"] for message in self.messages)
+
+@pytest.fixture
+def sink():
+    server = CountingServer()
+    yield server
+    server.stop()
+
+def mail(subject, to="a@example.com"):
+    message = EmailMessage()
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content("body")
+    return message
+
+def test_transport_reuses_one_session_and_resets_between_messages(sink):
+    transport = sink.transport()
+    for index in range(5):
+        transport.send(mail(f"m{index}"))
+    transport.close()
+    assert sink.subjects() == [f"m{index}" for index in range(5)]
+    assert len(sink.peers) == 1
+    assert sink.resets == 5
+    stats = transport.stats.snapshot()
+    assert (stats["sent"], stats["sessions"], stats["reused"]) == (5, 1, 4)
+
+def test_transport_reconnects_when_the_server_dropped_the_session():
+    server = CountingServer()
+    transport = server.transport()
+    transport.send(mail("before"))
+    # Restarting the server drops the idle pooled session
+    server.stop()
+    restarted = CountingServer(port=server.port)
+    try:
+        transport.send(mail("after"))
+        transport.close()
+        assert restarted.subjects() == ["after"]
+        stats = transport.stats.snapshot()
+        assert (stats["sent"], stats["failed"], stats["sessions"]) == (2, 0, 2)
+    finally:
+        restarted.stop()
+
+def test_idle_sessions_past_the_timeout_are_replaced(sink):
+    transport = sink.transport()
+    transport.idle_timeout = 0
+    transport.send(mail("one"))
+    transport.send(mail("two"))
+    transport.close()
+    assert len(sink.peers) == 2 and transport.stats.snapshot()["reused"] == 0
+
+def test_dispatcher_groups_due_emails_by_relay():
+    first, second = CountingServer(), CountingServer()
+    dispatcher = EmailDispatcher(MemoryBackend())
+    try:
+        for namespace, server in (("a", first), ("b", second)):
+            transport = server.transport()
+            transport.max_connections = 1
+            dispatcher.set_transport(namespace, transport)
+        for index in range(6):
+            namespace = "ab"[index % 2]
+            email = {"recipient": f"{namespace}@example.com", "subject": f"{namespace}{index}", "body": "Hi",
+                     "priority": "Normal", "repeat": "Never", "status": "Scheduled",
+                     "scheduled_time": "2024-01-31 09:00"}
+            email["id"] = dispatcher.backend.append(COLLECTION, namespace, email)
+            dispatcher.schedule(namespace, email)
+        deadline = time.monotonic() + 10
+        while dispatcher.sent < 6 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert first.subjects() == ["a0", "a2", "a4"]
+        assert second.subjects() == ["b1", "b3", "b5"]
+        # One connection per relay, capped by its max_connections
+        assert len(first.peers) == len(second.peers) == 1
+    finally:
+        dispatcher.stop()
+        first.stop()
+        second.stop()
@@ -0,0 +1,52 @@
+import math
+from streamlit.testing.v1 import AppTest
+from tools.grocery_manager import _cell_number
+from tools.grocery_store import GroceryItemStore
+from tools.storage import Collection, MemoryBackend
+
+def make_store():
+    return GroceryItemStore(Collection("grocery_items", backend=MemoryBackend(), namespace="test"))
+
+def test_store_indexes_follow_updates_and_deletes():
+    store = make_store()
+    milk = store.add({"name": "Milk", "category": "Dairy", "priority": "High"})
+    bread = store.add({"name": "Bread", "category": "Bakery", "priority": "Low"})
+    cheese = store.add({"name": "Cheese", "category": "Dairy", "priority": "Low"})
+    assert store.filter_ids(category="Dairy") == [milk, cheese]
+    assert store.filter_ids(category="Dairy", priority="Low") == [cheese]
+    store.update(milk, completed=True)
+    assert store.filter_ids(completed=False) == [bread, cheese]
+    store.delete(cheese)
+    assert store.values("category") == ["Bakery", "Dairy"]
+    assert store.counts("priority") == {"High": 1, "Low": 1}
+    assert list(store.group_by_category([milk, bread])) == ["Bakery", "Dairy"]
+
+def test_store_reloads_from_storage():
+    store = make_store()
+    store.add({"name": "Milk", "category": "Dairy", "priority": "High"})
+    other = GroceryItemStore(store.collection)
+    assert [item["name"] for item in other.items()] == ["Milk"]
+    other.add({"name": "Eggs", "category": "Dairy", "priority": "Low"})
+    assert store.is_stale() and not other.is_stale()
+
+def test_cleared_editor_cells_keep_stored_value():
+    assert _cell_number(None, 2.0) == 2.0
+    assert _cell_number(math.nan, 1.5) == 1.5
+    assert _cell_number(3, 1.5) == 3.0
+
+def _budget_app():
+    import streamlit as st
+    from tools.grocery_manager import get_monthly_budget, set_monthly_budget
+    if st.button("Set"):
+        set_monthly_budget(200)
+    st.markdown(str(get_monthly_budget()))
+
+def test_budget_is_shared_by_sessions_of_a_profile():
+    first = AppTest.from_function(_budget_app)
+    first.query_params["profile"] = "budget-test"
+    first.run()
+    assert first.markdown[0].value == "500"
+    first.button[0].click().run()
+    second = AppTest.from_function(_budget_app)
+    second.query_params["profile"] = "budget-test"
+    assert second.run().markdown[0].value == "200"
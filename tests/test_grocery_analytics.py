@@ -0,0 +1,71 @@
+import random
+from datetime import datetime
+import pandas as pd
+from tools.grocery_analytics import GroceryAnalytics, _item_frame
+from tools.grocery_store import GroceryItemStore
+from tools.storage import Collection, MemoryBackend
+
+def make_analytics():
+    backend = MemoryBackend()
+    store = GroceryItemStore(Collection("grocery_items", backend=backend, namespace="test"))
+    history = Collection("grocery_history", backend=backend, namespace="test")
+    return store, history, GroceryAnalytics(store, history)
+
+def add_item(store, rng):
+    return store.add({"name": f"item{rng.random()}", "category": rng.choice(["A", "B", "C"]),
+                      "quantity": 1.0, "unit": "pcs", "priority": rng.choice(["Low", "High"]),
+                      "estimated_price": round(rng.uniform(0, 10), 2), "completed": False})
+
+def test_item_deltas_match_full_rebuild():
+    rng = random.Random(7)
+    store, _, analytics = make_analytics()
+    for _ in range(20):
+        add_item(store, rng)
+    analytics.refresh()
+    for _ in range(300):
+        action = rng.random()
+        ids = [item["id"] for item in store.items()]
+        if action < 0.4 or not ids:
+            add_item(store, rng)
+        elif action < 0.8:
+            store.update(rng.choice(ids), completed=rng.random() < 0.5, estimated_price=rng.uniform(0, 10),
+                         category=rng.choice(["A", "B", "C"]))
+        else:
+            store.delete(rng.choice(ids))
+        analytics.refresh()
+        expected = _item_frame(store.items())
+        pd.testing.assert_frame_equal(analytics.items, expected, check_dtype=False)
+    assert analytics.item_summary()["total"] == len(store)
+    assert analytics.category_breakdown()["items"].sum() == len(store)
+
+def test_clear_forces_rebuild():
+    rng = random.Random(1)
+    store, _, analytics = make_analytics()
+    add_item(store, rng)
+    analytics.refresh()
+    store.clear()
+    assert store.changed_since(analytics._items_version) is None
+    assert len(analytics.refresh().items) == 0
+
+def test_history_is_appended_and_aggregated():
+    store, history, analytics = make_analytics()
+    history.add({"name": "Milk", "category": "Dairy", "estimated_price": 2.0, "completed_date": "2024-03-01 10:00"})
+    analytics.refresh()
+    history.add({"name": "Cheese", "category": "Dairy", "estimated_price": 5.0, "completed_date": "2024-03-02 10:00"})
+    history.add({"name": "Bread", "category": "Bakery", "estimated_price": 3.0, "completed_date": "2024-03-09 10:00"})
+    analytics.refresh()
+    assert len(analytics.history) == 3
+    assert analytics.category_spend().loc["Dairy", "total"] == 7.0
+    assert analytics.spending_trend("W").sum() == 10.0
+
+def test_burn_rate_projection_and_missing_budget():
+    store, history, analytics = make_analytics()
+    history.add({"name": "Milk", "category": "Dairy", "estimated_price": 30.0, "completed_date": "2024-04-03 10:00"})
+    analytics.refresh()
+    now = datetime(2024, 4, 10)
+    burn = analytics.burn_rate(100, now=now)
+    assert burn["spent"] == 30.0 and burn["daily_rate"] == 3.0 and burn["projected"] == 90.0
+    assert burn["days_until_budget_exhausted"] is None
+    assert analytics.burn_rate(40, now=now)["days_until_budget_exhausted"] == 3
+    assert analytics.burn_rate(20, now=now)["days_until_budget_exhausted"] == 0
+    assert analytics.burn_rate(0, now=now)["days_until_budget_exhausted"] is None
@@ -0,0 +1,128 @@
+import io
+import json
+import threading
+import time
+from collections import Counter
+from tools.llm_batch import BatchRunner, chunk_text, iter_chunks
+from tools.llm_providers import LLMError, LLMProvider
+
+ANALYSES = {"Summary": "Summarize", "Topics": "List topics"}
+
+class EchoProvider(LLMProvider):
+    """Answers with the prompt and the start of the text; ``failures`` retryable errors come first"""
+
+    name = "Echo"
+
+    def __init__(self, delay=0.0, failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def stream(self, model, messages, **params):
+        with self._lock:
+            self.calls += 1
+            fail = self.failures > 0
+            self.failures -= fail
+        time.sleep(self.delay)
+        if fail:
+            raise LLMError("overloaded", retryable=True)
+        yield f"{messages[0]['content']}: {messages[1]['content'][:12]}"
+
+def llm(provider):
+    return {"provider": provider, "model": "echo", "api_model": "echo", "params": {}, "cache": False}
+
+def upload(name, data):
+    handle = io.BytesIO(data.encode())
+    handle.name = name
+    return handle
+
+def csv_upload(rows):
+    return upload("reviews.csv", "id,review\n" + "".join(f"{i},{text}\n" for i, text in enumerate(rows)))
+
+def wait_for(job, timeout=10):
+    deadline = time.monotonic() + timeout
+    while job.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not job.running
+
+def successes(runner, job_id):
+    found = Counter()
+    with open(runner.results_path("ns", job_id)) as handle:
+        for line in handle:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue  # the line a crash cut off
+            if "error" not in result:
+                found[(result["record"], result["part"], result["analysis"])] += 1
+    return found
+
+def status(runner, job_id):
+    return next(manifest["status"] for manifest, _ in runner.jobs("ns") if manifest["id"] == job_id)
+
+def test_chunk_text_respects_the_limit_and_sentences():
+    text = "One two. Three four five. " + "x" * 25
+    pieces = list(chunk_text(text, 12))
+    assert all(len(piece) <= 12 for piece in pieces)
+    assert pieces == ["One two.", "Three four f", "ive.", "x" * 12, "x" * 12, "x"]
+    assert list(chunk_text("   ", 10)) == []
+
+def test_iter_chunks_picks_the_text_field():
+    rows = list(iter_chunks(io.BytesIO(b"id,Review\n1,great\n2,bad\n"), "csv", 100))
+    assert rows == [(0, 0, "great"), (1, 0, "bad")]
+    lines = b'{"id": 1, "body": "hello"}\nnot json\n{"id": 2, "body": "world"}\n'
+    assert list(iter_chunks(io.BytesIO(lines), "jsonl", 100)) == [(0, 0, "hello"), (2, 0, "world")]
+    document = b"First paragraph.\n\nSecond one.\n\n" + b"z" * 30
+    assert [index for index, _, _ in iter_chunks(io.BytesIO(document), "txt", 30)] == [0, 1]
+
+def test_job_runs_every_chunk_and_coalesces_duplicates(tmp_path):
+    runner = BatchRunner(str(tmp_path))
+    provider = EchoProvider()
+    job_id = runner.create("ns", csv_upload(["great product", "too slow", "great product"]), ANALYSES)
+    job = runner.start("ns", job_id, llm(provider), concurrency=2)
+    wait_for(job)
+    assert status(runner, job_id) == "finished"
+    assert successes(runner, job_id) == Counter({(record, 0, analysis): 1 for record in range(3) for analysis in ANALYSES})
+    assert provider.calls == 4
+    assert job.coalesced == 2
+
+def test_retryable_errors_are_retried(tmp_path, monkeypatch):
+    runner = BatchRunner(str(tmp_path))
+    job_id = runner.create("ns", csv_upload(["hello"]), {"Summary": "Summarize"})
+    job = runner.start("ns", job_id, llm(EchoProvider(failures=1)), concurrency=1)
+    # Skip the one-second backoff
+    monkeypatch.setattr(job.cancel_event, "wait", lambda timeout=None: False)
+    wait_for(job)
+    assert successes(runner, job_id) == Counter({(0, 0, "Summary"): 1})
+
+def test_resume_skips_the_checkpoint_and_retries_failures(tmp_path):
+    runner = BatchRunner(str(tmp_path))
+    job_id = runner.create("ns", csv_upload([f"review {i}" for i in range(6)]), ANALYSES)
+    with open(runner.results_path("ns", job_id), "w") as handle:
+        handle.write(json.dumps({"record": 0, "part": 0, "analysis": "Summary", "result": "kept"}) + "\n")
+        handle.write(json.dumps({"record": 1, "part": 0, "analysis": "Summary", "error": "timeout"}) + "\n")
+        handle.write('{"record": 2, "part": 0, "analy')  # Cut off by a crash
+    provider = EchoProvider()
+    job = runner.start("ns", job_id, llm(provider))
+    wait_for(job)
+    assert job.skipped == 1
+    assert provider.calls == 11
+    assert successes(runner, job_id) == Counter({(record, 0, analysis): 1 for record in range(6) for analysis in ANALYSES})
+
+def test_paused_job_resumes_where_it_stopped(tmp_path):
+    runner = BatchRunner(str(tmp_path))
+    job_id = runner.create("ns", csv_upload([f"review {i}" for i in range(40)]), ANALYSES)
+    job = runner.start("ns", job_id, llm(EchoProvider(delay=0.02)), concurrency=2)
+    time.sleep(0.1)
+    job.cancel()
+    wait_for(job)
+    assert status(runner, job_id) == "paused"
+    partial = successes(runner, job_id)
+    assert 0 < sum(partial.values()) < 80
+
+    resumed = runner.start("ns", job_id, llm(EchoProvider()), concurrency=4)
+    wait_for(resumed)
+    assert resumed.skipped == sum(partial.values())
+    assert successes(runner, job_id) == Counter({(record, 0, analysis): 1 for record in range(40) for analysis in ANALYSES})
+    assert status(runner, job_id) == "finished"
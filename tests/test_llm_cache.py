@@ -0,0 +1,62 @@
+import pytest
+from tools import llm_cache
+from tools.llm_cache import ResponseCache, cache_key
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+PARAMS = {"temperature": 0.7, "top_p": 1.0, "max_tokens": 256, "frequency_penalty": 0.0}
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable ``time.time`` as seen by the cache"""
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    return now
+
+def test_cache_key_depends_on_everything_that_changes_the_answer():
+    key = cache_key(("openai", "url"), "gpt", MESSAGES, PARAMS)
+    assert key == cache_key(("openai", "url"), "gpt", [dict(MESSAGES[0])], dict(PARAMS, stream=True))
+    assert key != cache_key(("openai", "other"), "gpt", MESSAGES, PARAMS)
+    assert key != cache_key(("openai", "url"), "gpt-mini", MESSAGES, PARAMS)
+    assert key != cache_key(("openai", "url"), "gpt", MESSAGES, dict(PARAMS, temperature=0.2))
+    assert key != cache_key(("openai", "url"), "gpt", [{"role": "user", "content": "Hi"}], PARAMS)
+
+def test_hits_misses_and_tokens_saved(clock):
+    cache = ResponseCache(":memory:")
+    assert cache.get("k") is None
+    cache.put("k", "gpt", "answer", tokens=120)
+    assert cache.get("k") == {"response": "answer", "tokens": 120}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["tokens_saved"], stats["entries"]) == (1, 1, 120, 1)
+    assert stats["hit_rate"] == 0.5
+
+def test_expired_entries_are_misses(clock):
+    cache = ResponseCache(":memory:", ttl=60)
+    cache.put("k", "gpt", "answer", tokens=1)
+    clock[0] += 61
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = ResponseCache(":memory:", max_bytes=30)
+    for key in "abc":
+        cache.put(key, "gpt", "x" * 10, tokens=1)
+        clock[0] += 1
+    cache.get("a")
+    clock[0] += 1
+    cache.put("d", "gpt", "x" * 10, tokens=1)
+    assert cache.get("b") is None
+    assert all(cache.get(key) for key in "acd")
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 30
+
+def test_oversized_responses_are_not_stored():
+    cache = ResponseCache(":memory:", max_bytes=5)
+    cache.put("k", "gpt", "too long", tokens=1)
+    assert cache.stats()["entries"] == 0
+
+def test_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(path).put("k", "gpt", "answer", tokens=7)
+    reopened = ResponseCache(path)
+    assert reopened.get("k")["response"] == "answer"
+    assert reopened.stats()["bytes"] == len("answer")
@@ -0,0 +1,55 @@
+import os
+import random
+from types import SimpleNamespace
+import numpy as np
+from tools.llm_metering import LATENCY_BOUNDS, RECORD_DTYPE, UsageMeter, histogram_percentile
+
+def completion(prompt=10, completion_tokens=20, elapsed=0.5, ttft=0.1):
+    return SimpleNamespace(usage={"prompt_tokens": prompt, "completion_tokens": completion_tokens},
+                           elapsed=elapsed, ttft=ttft)
+
+def test_histogram_percentile_lands_in_the_right_bucket():
+    histogram = np.zeros(len(LATENCY_BOUNDS) + 1, dtype=np.int64)
+    assert histogram_percentile(histogram, 0.5) == 0.0
+    histogram[np.searchsorted(LATENCY_BOUNDS, 0.2)] = 90
+    histogram[np.searchsorted(LATENCY_BOUNDS, 3.0)] = 10
+    assert 0.2 <= histogram_percentile(histogram, 0.5) < 0.2 * 1.13
+    assert 3.0 <= histogram_percentile(histogram, 0.99) < 3.0 * 1.13
+
+def test_summary_counts_tokens_failures_and_cost():
+    meter = UsageMeter(None)
+    meter.record("gpt", completion(prompt=100, completion_tokens=400))
+    meter.record("gpt", completion(), ok=False)
+    meter.record("llama", completion(prompt=500, completion_tokens=500))
+    gpt = meter.summary("gpt", prices={"gpt": 2.0})
+    assert (gpt["requests"], gpt["failures"], gpt["tokens"]) == (2, 1, 500)
+    assert gpt["success_rate"] == 0.5 and gpt["cost"] == 1.0
+    total = meter.summary(prices={"gpt": 2.0, "llama": 1.0})
+    assert (total["requests"], total["tokens"], total["cost"]) == (3, 1500, 2.0)
+    assert meter.models() == ["gpt", "llama"]
+    assert meter.summary("unknown")["requests"] == 0
+
+def test_replaying_the_log_matches_live_totals(tmp_path):
+    directory = str(tmp_path / "usage")
+    live = UsageMeter(directory)
+    rng = random.Random(7)
+    for _ in range(300):
+        live.record(rng.choice(["a", "b"]), completion(rng.randint(1, 500), rng.randint(1, 500),
+                                                       rng.uniform(0.01, 20), rng.choice([None, 0.05, 0.4])),
+                    ok=rng.random() > 0.1)
+    replayed = UsageMeter(directory)
+    for model in (UsageMeter.ALL, "a", "b"):
+        assert replayed.summary(model) == live.summary(model)
+        assert replayed.timeline(model) == live.timeline(model)
+
+def test_partial_row_from_a_crash_is_dropped(tmp_path):
+    directory = str(tmp_path / "usage")
+    meter = UsageMeter(directory)
+    meter.record("gpt", completion())
+    meter._log.close()
+    with open(os.path.join(directory, "usage.bin"), "ab") as handle:
+        handle.write(b"\x00" * 5)
+    reopened = UsageMeter(directory)
+    reopened.record("gpt", completion())
+    assert os.path.getsize(os.path.join(directory, "usage.bin")) == 2 * RECORD_DTYPE.itemsize
+    assert UsageMeter(directory).summary("gpt")["requests"] == 2
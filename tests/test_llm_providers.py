@@ -0,0 +1,111 @@
+import json
+import socket
+import pytest
+import requests
+from tools.llm_providers import LLMError, MockOpenAIServer, MockProvider, OpenAICompatibleProvider, mock_reply
+
+MESSAGES = [{"role": "user", "content": "Hello there"}]
+
+@pytest.fixture(scope="module")
+def server():
+    server = MockOpenAIServer(port=0, provider=MockProvider(ttft=0, tokens_per_second=10000))
+    yield server
+    server.stop()
+
+class FakeResponse:
+    """Streaming response replaying raw SSE lines"""
+
+    def __init__(self, lines, status_code=200):
+        self.lines = lines
+        self.status_code = status_code
+        self.text = ""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_lines(self, chunk_size=None):
+        for line in self.lines:
+            if isinstance(line, Exception):
+                raise line
+            yield line
+
+def replaying(monkeypatch, *lines, status_code=200):
+    provider = OpenAICompatibleProvider("http://fake/v1")
+    monkeypatch.setattr(provider._session, "post", lambda *args, **kwargs: FakeResponse(list(lines), status_code))
+    return provider
+
+def event(**fields):
+    return b"data: " + json.dumps(fields).encode()
+
+def test_streams_the_reply_and_usage_from_the_mock_server(server):
+    completion = OpenAICompatibleProvider(server.base_url).complete("mock", MESSAGES)
+    chunks = list(completion)
+    assert "".join(chunks) == mock_reply("mock", MESSAGES)
+    assert len(chunks) > 1
+    assert completion.usage == {"prompt_tokens": 2, "completion_tokens": len(chunks)}
+    assert completion.ttft is not None
+
+def test_session_is_reused_between_requests(server):
+    provider = OpenAICompatibleProvider(server.base_url)
+    before = server.requests
+    assert list(provider.complete("mock", MESSAGES)) == list(provider.complete("mock", MESSAGES))
+    assert server.requests == before + 2
+
+def test_done_ends_the_stream_and_keep_alives_are_skipped(monkeypatch):
+    provider = replaying(
+        monkeypatch,
+        b": ping",
+        b"data:",
+        event(choices=[{"delta": {"role": "assistant"}}]),
+        event(choices=[{"delta": {"content": "Hi"}}]),
+        b"",
+        event(choices=[], usage={"prompt_tokens": 3, "completion_tokens": 1}),
+        b"data: [DONE]",
+        b"data: this is never read",
+    )
+    assert list(provider.stream("m", MESSAGES)) == ["Hi", {"prompt_tokens": 3, "completion_tokens": 1}]
+
+@pytest.mark.parametrize("line", [
+    b"data: {not json",
+    event(id="no choices"),
+    event(choices=[{"message": {"content": "no delta"}}]),
+    b"data: [1, 2]",
+])
+def test_malformed_events_are_llm_errors(monkeypatch, line):
+    provider = replaying(monkeypatch, event(choices=[{"delta": {"content": "ok"}}]), line)
+    stream = provider.stream("m", MESSAGES)
+    assert next(stream) == "ok"
+    with pytest.raises(LLMError, match="Malformed stream event") as error:
+        next(stream)
+    assert not error.value.retryable
+
+def test_error_events_and_http_status_are_mapped(monkeypatch):
+    with pytest.raises(LLMError, match="Model error: context too long") as error:
+        list(replaying(monkeypatch, event(error={"message": "context too long"})).stream("m", MESSAGES))
+    assert not error.value.retryable
+    with pytest.raises(LLMError) as error:
+        list(replaying(monkeypatch, status_code=429).stream("m", MESSAGES))
+    assert error.value.retryable
+    with pytest.raises(LLMError, match="HTTP 400") as error:
+        list(replaying(monkeypatch, status_code=400).stream("m", MESSAGES))
+    assert not error.value.retryable
+
+def test_broken_stream_is_retryable(monkeypatch):
+    provider = replaying(monkeypatch, event(choices=[{"delta": {"content": "par"}}]),
+                         requests.ConnectionError("reset by peer"))
+    stream = provider.stream("m", MESSAGES)
+    assert next(stream) == "par"
+    with pytest.raises(LLMError, match="broke off") as error:
+        next(stream)
+    assert error.value.retryable
+
+def test_refused_connection_is_retryable():
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    with pytest.raises(LLMError) as error:
+        list(OpenAICompatibleProvider(f"http://127.0.0.1:{port}/v1").stream("m", MESSAGES))
+    assert error.value.retryable
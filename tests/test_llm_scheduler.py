@@ -0,0 +1,97 @@
+import threading
+import pytest
+from tools.llm_scheduler import LLMScheduler, QueueFull
+
+def test_requests_within_the_limit_are_granted_at_once():
+    scheduler = LLMScheduler(default_limit=2, reserved=0)
+    first, second = scheduler.submit("m", "batch", "a"), scheduler.submit("m", "batch", "a")
+    third = scheduler.submit("m", "batch", "a")
+    assert first.granted and second.granted and not third.granted
+    assert scheduler.load("m") == {"limit": 2, "running": 2, "queued": 1}
+    scheduler.release(first)
+    assert third.granted
+    # Models have separate limits
+    assert scheduler.submit("other", "batch", "a").granted
+
+def test_reserved_slot_is_kept_for_chat():
+    scheduler = LLMScheduler(default_limit=2, reserved=1)
+    batch = scheduler.submit("m", "batch", "job")
+    assert batch.granted
+    assert not scheduler.submit("m", "generation", "a").granted
+    assert scheduler.submit("m", "chat", "b").granted
+
+def test_higher_priority_is_served_first():
+    scheduler = LLMScheduler(default_limit=1, reserved=0)
+    running = scheduler.submit("m", "batch", "job")
+    batch = scheduler.submit("m", "batch", "job")
+    generation = scheduler.submit("m", "generation", "a")
+    chat = scheduler.submit("m", "chat", "b")
+    assert [chat.position, generation.position, batch.position] == [1, 2, 3]
+    scheduler.release(running)
+    assert chat.granted and not generation.granted
+    scheduler.release(chat)
+    assert generation.granted and not batch.granted
+
+def test_sessions_take_turns_within_a_priority():
+    scheduler = LLMScheduler(default_limit=1, reserved=0)
+    running = scheduler.submit("m", "generation", "x")
+    busy = [scheduler.submit("m", "generation", "busy") for _ in range(3)]
+    other = scheduler.submit("m", "generation", "other")
+    assert other.position == 2
+    order = []
+    current = running
+    for _ in range(4):
+        scheduler.release(current)
+        current = next(ticket for ticket in busy + [other] if ticket.granted and ticket not in order)
+        order.append(current)
+    assert order == [busy[0], other, busy[1], busy[2]]
+
+def test_queue_full_and_withdrawal():
+    scheduler = LLMScheduler(default_limit=1, reserved=0, max_queued=2)
+    scheduler.submit("m", "batch", "a")
+    waiting = [scheduler.submit("m", "batch", "a") for _ in range(2)]
+    with pytest.raises(QueueFull):
+        scheduler.submit("m", "batch", "a")
+    scheduler.release(waiting[0])
+    assert waiting[0].position == 0 and not waiting[0].granted
+    assert scheduler.load("m")["queued"] == 1
+
+def test_cancelled_run_leaves_no_ticket_behind():
+    scheduler = LLMScheduler(default_limit=1, reserved=0)
+    holder = scheduler.submit("m", "chat", "a")
+    cancel = threading.Event()
+    positions = []
+
+    def on_wait(position):
+        positions.append(position)
+        cancel.set()
+
+    assert scheduler.run("m", "chat", "b", on_wait=on_wait, poll=0.01, cancel_event=cancel) is None
+    assert positions == [1]
+    assert scheduler.load("m") == {"limit": 1, "running": 1, "queued": 0}
+    scheduler.release(holder)
+
+def test_concurrent_load_never_exceeds_the_limit():
+    scheduler = LLMScheduler(default_limit=3, reserved=1)
+    lock = threading.Lock()
+    running = peak = 0
+
+    def worker(session, priority):
+        nonlocal running, peak
+        for _ in range(20):
+            ticket = scheduler.run("m", priority, session, poll=0.01)
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            with lock:
+                running -= 1
+            scheduler.release(ticket)
+
+    threads = [threading.Thread(target=worker, args=(f"s{i}", ("chat", "generation", "batch")[i % 3]))
+               for i in range(9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert peak <= 3
+    assert scheduler.load("m") == {"limit": 3, "running": 0, "queued": 0}
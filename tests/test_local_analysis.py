@@ -0,0 +1,48 @@
+import pytest
+from tools.local_analysis import LocalAnalyzer
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return LocalAnalyzer()
+
+def test_sentiment_labels(analyzer):
+    assert analyzer.sentiment("Great product, I love it!")["label"] == "Positive"
+    assert analyzer.sentiment("Terrible support, a complete waste of money")["label"] == "Negative"
+    assert analyzer.sentiment("The parcel arrived on Tuesday")["label"] == "Neutral"
+    result = analyzer.sentiment("good but slow")
+    assert result["positive"] == ["good"] and result["negative"] == ["slow"]
+
+def test_negation_and_intensifiers(analyzer):
+    good, very_good, not_good = analyzer.sentiment_scores(["good", "very good", "not good"])
+    assert very_good > good > 0
+    assert not_good < 0
+
+def test_batch_scores_match_single_documents(analyzer):
+    texts = ["I would not", "recommend this, it is great", "", "awful :(", "😍 amazing"]
+    batch = analyzer.sentiment_scores(texts)
+    # A negation at the end of one document must not reach into the next
+    for text, score in zip(texts, batch):
+        assert score == pytest.approx(analyzer.sentiment_scores([text])[0])
+
+@pytest.mark.parametrize("text, language", [
+    ("Thank you, the delivery was quick and everything works", "English"),
+    ("Muchas gracias, el pedido llegó ayer y todo funciona muy bien", "Spanish"),
+    ("Merci beaucoup, la commande est arrivée hier et tout fonctionne", "French"),
+    ("Vielen Dank, die Bestellung ist gestern angekommen", "German"),
+    ("Grazie mille, l'ordine è arrivato ieri e funziona tutto", "Italian"),
+    ("Спасибо, заказ пришёл вчера", "Russian"),
+    ("ありがとうございます、注文は昨日届きました", "Japanese"),
+    ("谢谢，订单昨天到了", "Chinese"),
+])
+def test_language_detection(analyzer, text, language):
+    assert analyzer.language(text)["language"] == language
+
+def test_text_without_letters_is_unknown(analyzer):
+    assert analyzer.languages_batch(["12345 !!!", ""]) == [("Unknown", 0.0), ("Unknown", 0.0)]
+
+def test_analyze_batch_wording(analyzer):
+    results = analyzer.analyze_batch("Sentiment Analysis", ["excellent", "meh"])
+    assert results[0].startswith("**Positive**") and "excellent" in results[0]
+    assert analyzer.analyze("Language Detection", "Hola, ¿cómo estás?").startswith("**Spanish**")
+    with pytest.raises(ValueError):
+        analyzer.analyze_batch("Summarization", ["text"])
@@ -0,0 +1,59 @@
+import json
+import sqlite3
+import pytest
+from tools.message_history import HISTORIES, MessageHistory
+from tools.storage import SCHEMAS, Collection, SQLiteBackend
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "test.db"), flush_interval=60)
+    yield backend
+    backend.close()
+
+def history(backend, name, tmp_path, **kwargs):
+    counter_field, counter_values, time_field = HISTORIES[name]
+    return MessageHistory(Collection(name, backend=backend, namespace="test"), counter_field, counter_values,
+                          time_field, archive_root=str(tmp_path / "archive"), **kwargs)
+
+@pytest.mark.parametrize("name", sorted(HISTORIES))
+def test_counter_fields_are_indexed(name):
+    counter_field, _, time_field = HISTORIES[name]
+    assert {counter_field, time_field, "recipient"} <= set(SCHEMAS[name])
+
+def test_whatsapp_history_counts_through_sqlite(backend, tmp_path):
+    log = history(backend, "whatsapp_messages", tmp_path)
+    for i, kind in enumerate(["sent", "received", "sent"]):
+        log.add({"recipient": "+15550100", "type": kind, "message": "hi", "time": f"2024-01-0{i + 1} 09:00"})
+    assert log.counts() == {"sent": 2, "received": 1}
+    # A fresh log rebuilds its counters with indexed counts
+    assert history(backend, "whatsapp_messages", tmp_path).counts() == {"sent": 2, "received": 1}
+
+def test_archived_segments_keep_their_counts(backend, tmp_path):
+    log = history(backend, "whatsapp_messages", tmp_path, live_limit=4, segment_size=3)
+    for i in range(10):
+        log.add({"recipient": "+15550100", "type": "received" if i % 2 else "sent", "time": f"2024-01-01 09:{i:02d}"})
+    assert log.segments
+    assert log.total == 10
+    assert log.counts() == {"sent": 5, "received": 5}
+    records, cursor = log.page(limit=20)
+    assert len(records) == 10 and cursor is None
+
+def test_old_database_gains_the_type_column(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE whatsapp_messages (id INTEGER PRIMARY KEY, namespace TEXT NOT NULL, "
+                 "created_at REAL NOT NULL, recipient, time, data TEXT NOT NULL)")
+    for record_id, kind in [(1, "sent"), (2, "received"), (3, "received")]:
+        record = {"id": record_id, "recipient": "+15550100", "type": kind, "time": "2024-01-01 09:00"}
+        conn.execute("INSERT INTO whatsapp_messages VALUES (?, 'test', 0, ?, ?, ?)",
+                     (record_id, record["recipient"], record["time"], json.dumps(record)))
+    conn.commit()
+    conn.close()
+
+    backend = SQLiteBackend(path, flush_interval=60)
+    try:
+        assert backend.count("whatsapp_messages", "test", type="received") == 2
+        indexes = {row[1] for row in backend._conn.execute("PRAGMA index_list(whatsapp_messages)")}
+        assert "idx_whatsapp_messages_type" in indexes
+    finally:
+        backend.close()
@@ -0,0 +1,42 @@
+import os
+from tools.output_buffer import OutputCapture
+
+def test_small_output_stays_in_memory():
+    capture = OutputCapture(max_bytes=100)
+    capture.write("hello\n")
+    capture.write(b"world\n")
+    assert not capture.truncated and not capture.spilled
+    assert capture.preview() == "hello\nworld\n"
+    assert capture.open().read() == b"hello\nworld\n"
+
+def test_spill_keeps_head_tail_and_full_file(tmp_path):
+    capture = OutputCapture(max_bytes=20, spill_dir=str(tmp_path))
+    data = "".join(f"line {i:03d}\n" for i in range(100))
+    for start in range(0, len(data), 7):
+        capture.write(data[start:start + 7])
+    capture.finish()
+    assert capture.spilled and capture.total_bytes == len(data)
+    assert capture.tail_text() == data[-10:]
+    assert capture.omitted_bytes == len(data) - 20
+    with capture.open() as handle:
+        assert handle.read().decode() == data
+    assert capture.search("line 050") == [(0, "line 050")]
+    path = capture.path
+    capture.cleanup()
+    assert not os.path.exists(path)
+
+def test_pages_end_on_line_boundaries(tmp_path):
+    capture = OutputCapture(max_bytes=10, spill_dir=str(tmp_path))
+    data = "".join(f"{i}\n" for i in range(1000))
+    capture.write(data)
+    pages = capture.page_count(100)
+    assert "".join(capture.read_page(page, 100) for page in range(pages)) == data
+    capture.cleanup()
+
+def test_without_spill_middle_is_dropped_and_counted(tmp_path):
+    capture = OutputCapture(max_bytes=10, spill_dir=str(tmp_path), spill=False)
+    capture.write("a" * 5 + "b" * 100 + "c" * 5)
+    assert capture.truncated and not capture.spilled and not os.listdir(tmp_path)
+    assert capture.omitted_bytes == 100
+    preview = capture.preview()
+    assert preview.startswith("aaaaa") and preview.endswith("ccccc") and "100 bytes omitted ..." in preview
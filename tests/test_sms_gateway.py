@@ -0,0 +1,94 @@
+import threading
+import time
+import pytest
+from tools.sms_gateway import BulkSender, FakeProvider, SMSError, TokenBucket
+
+class History:
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+class Account(FakeProvider):
+    """Simulated provider with its own account key, so it gets its own bucket and pool"""
+
+    def __init__(self, account, **kwargs):
+        super().__init__(latency=0, **kwargs)
+        self.account = account
+
+    @property
+    def key(self):
+        return (self.name, self.account)
+
+class FailingProvider(Account):
+    def __init__(self, errors):
+        super().__init__("failing")
+        self.errors = list(errors)
+
+    def send(self, number, body, sender=None):
+        if self.errors:
+            raise self.errors.pop(0)
+        return super().send(number, body, sender)
+
+def messages(count):
+    return [{"recipient": f"R{i}", "number": f"+1555000{i:04d}", "content": "hi"} for i in range(count)]
+
+def wait_for(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return not job.running
+
+@pytest.fixture
+def sender():
+    sender = BulkSender(max_workers=4)
+    yield sender
+    sender.shutdown()
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate=20, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+    for _ in range(4):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.15
+
+def test_token_bucket_acquire_stops_when_cancelled():
+    bucket = TokenBucket(rate=0.1, capacity=1)
+    bucket.acquire()
+    cancel = threading.Event()
+    threading.Timer(0.05, cancel.set).start()
+    start = time.monotonic()
+    assert bucket.acquire(cancel) is False
+    assert time.monotonic() - start < 1
+
+def test_slow_account_does_not_hold_up_other_providers(sender):
+    history = History()
+    slow = sender.submit(Account("slow"), messages(20), history, rate=1)
+    fast = sender.submit(Account("fast"), messages(20), history, rate=1000)
+    assert wait_for(fast, timeout=2)
+    assert fast.sent == 20
+    assert slow.running
+    slow.cancel()
+    assert wait_for(slow)
+    assert slow.sent + slow.cancelled == 20
+
+def test_jobs_on_one_account_share_its_rate_limit(sender):
+    first = Account("shared")
+    assert sender.bucket(first, 5) is sender.bucket(Account("shared"), 5)
+    assert sender.executor(first) is sender.executor(Account("shared"))
+    assert sender.executor(first) is not sender.executor(Account("other"))
+
+def test_retryable_errors_are_retried_then_logged(sender):
+    history = History()
+    provider = FailingProvider([SMSError("throttled", retryable=True), SMSError("bad number")])
+    job = sender.submit(provider, messages(2), history, rate=1000, base_backoff=0.01)
+    assert wait_for(job)
+    # One throttled attempt is retried; the permanent error is not
+    assert (job.sent, job.failed, job.retries) == (1, 1, 1)
+    assert sorted(record["status"] for record in history.records) == ["Failed", "Sent"]
@@ -0,0 +1,120 @@
+import threading
+import pytest
+from tools.ssh_pool import PoolTimeout, SSHConnectionPool
+
+class FakeTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def is_authenticated(self):
+        return True
+
+    def send_ignore(self):
+        pass
+
+class FakeClient:
+    def __init__(self):
+        self.transport = FakeTransport()
+        self.closed = False
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        self.closed = True
+        self.transport.active = False
+
+class FakePool(SSHConnectionPool):
+    """Pool whose connections are in-memory fakes"""
+
+    def _open(self, hostname, port, username, password):
+        return FakeClient()
+
+def test_connection_is_reused():
+    pool = FakePool()
+    with pool.connection("host", "user", "pw") as first:
+        pass
+    with pool.connection("host", "user", "pw") as second:
+        pass
+    assert first is second
+    assert pool.stats["created"] == 1 and pool.stats["reused"] == 1
+
+def test_other_credentials_get_their_own_connection():
+    pool = FakePool()
+    with pool.connection("host", "user", "pw") as first:
+        pass
+    with pool.connection("host", "user", "other") as second:
+        pass
+    assert first is not second
+
+def test_unhealthy_connection_is_replaced():
+    pool = FakePool()
+    with pool.connection("host", "user", "pw") as first:
+        pass
+    first.transport.active = False
+    with pool.connection("host", "user", "pw") as second:
+        pass
+    assert second is not first and first.closed
+    assert pool.stats["unhealthy"] == 1 and pool.stats["created"] == 2
+
+def test_failed_body_discards_connection():
+    pool = FakePool()
+    with pytest.raises(RuntimeError):
+        with pool.connection("host", "user", "pw") as client:
+            raise RuntimeError("boom")
+    assert client.closed
+    assert "user@host:22" not in pool.snapshot()
+
+def test_discarded_connections_leave_no_bookkeeping_behind():
+    pool = FakePool(idle_timeout=0)
+    for index in range(20):
+        with pool.connection(f"host{index}", "user", "pw") as client:
+            pass
+        client.transport.active = False  # fails its next health check
+        with pool.connection(f"host{index}", "user", "pw"):
+            pass
+    pool.close_idle()
+    with pytest.raises(ConnectionError):
+        with pool.connection("gone", "user", "pw"):
+            raise ConnectionError("dropped")
+    assert pool._in_use == {} and pool._idle == {}
+    assert pool.snapshot() == {}
+
+def test_idle_connections_expire():
+    pool = FakePool(idle_timeout=0)
+    with pool.connection("host", "user", "pw") as first:
+        pass
+    with pool.connection("host", "user", "pw"):
+        pass
+    assert first.closed and pool.stats["evicted"] == 1
+
+def test_acquire_times_out_when_host_is_full():
+    pool = FakePool(max_per_host=1)
+    key, conn = pool.acquire("host", "user", "pw")
+    with pytest.raises(PoolTimeout):
+        pool.acquire("host", "user", "pw", timeout=0.05)
+    pool.release(key, conn)
+
+def test_concurrent_checkouts_respect_limit_and_count_exactly():
+    pool = FakePool(max_per_host=3)
+    peak, lock, in_use = [0], threading.Lock(), [0]
+
+    def work():
+        for _ in range(50):
+            with pool.connection("host", "user", "pw"):
+                with lock:
+                    in_use[0] += 1
+                    peak[0] = max(peak[0], in_use[0])
+                with lock:
+                    in_use[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] <= 3
+    assert pool.stats["created"] + pool.stats["reused"] == 400
@@ -0,0 +1,186 @@
+import threading
+import time
+from tests.test_ssh_pool import FakeClient, FakePool
+from tools import ssh_utils
+from tools.ssh_utils import CommandRun, _iter_channel, parse_host_list, run_command_on_hosts
+
+class FakeChannel:
+    """Exec channel replaying scripted stdout/stderr chunks, then an exit status"""
+
+    def __init__(self, stdout=(), stderr=(), exit_status=0, hold=False):
+        self.stdout = list(stdout)
+        self.stderr = list(stderr)
+        self.exit_status = exit_status
+        self.hold = hold  # keep running until closed
+        self.closed = False
+        self.status_event = threading.Event()
+
+    def recv_ready(self):
+        return bool(self.stdout)
+
+    def recv(self, size):
+        return self.stdout.pop(0)
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv_stderr(self, size):
+        return self.stderr.pop(0)
+
+    def exit_status_ready(self):
+        return not self.hold or self.closed
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+    def close(self):
+        self.closed = True
+
+def test_iter_channel_drains_both_streams_and_splits_utf8():
+    euro = "€".encode()
+    channel = FakeChannel(stdout=[b"a" + euro[:1], euro[1:] + b"b"], stderr=[b"warn"], exit_status=3)
+    items = list(_iter_channel(channel))
+    assert "".join(text for stream, text in items if stream == "stdout") == "a€b"
+    assert ("stderr", "warn") in items
+    assert items[-1] == ("exit", 3)
+
+class LateChannel(FakeChannel):
+    """Delivers its last chunks in the same instant the exit status becomes ready"""
+
+    def __init__(self, late_stdout, late_stderr, **kwargs):
+        super().__init__(**kwargs)
+        self.late = (list(late_stdout), list(late_stderr))
+
+    def exit_status_ready(self):
+        stdout, stderr = self.late
+        self.stdout += stdout
+        self.stderr += stderr
+        self.late = ([], [])
+        return True
+
+def test_iter_channel_drains_output_arriving_with_the_exit_status():
+    euro = "€".encode()
+    channel = LateChannel([b"tail" + euro[:2], euro[2:]], [b"last warning"], stdout=[b"head "], exit_status=1)
+    items = list(_iter_channel(channel))
+    assert "".join(text for stream, text in items if stream == "stdout") == "head tail€"
+    assert ("stderr", "last warning") in items
+    assert items[-1] == ("exit", 1)
+
+def test_iter_channel_cancel_closes_channel():
+    channel = FakeChannel(hold=True)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    assert list(_iter_channel(channel, cancel_event=cancel_event)) == [("cancelled", "")]
+    assert channel.closed
+
+def test_command_run_reports_cancel(monkeypatch):
+    def stream(hostname, username, password, command, port=22, cancel_event=None, timeout=None):
+        channel = FakeChannel(stdout=[b"started\n"], hold=True)
+        yield from _iter_channel(channel, cancel_event=cancel_event, heartbeat=0.01)
+
+    monkeypatch.setattr(ssh_utils, "stream_remote_command", stream)
+    run = CommandRun("host", "user", "pw", "sleep 100")
+    deadline = time.monotonic() + 5
+    while "started" not in run.tail_text("stdout") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert run.running
+    run.cancel()
+    while run.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert run.status == "cancelled" and run.exit_status is None
+
+def test_command_run_records_exit_status(monkeypatch):
+    def stream(hostname, username, password, command, port=22, cancel_event=None, timeout=None):
+        yield from _iter_channel(FakeChannel(stdout=[b"x" * 1000], exit_status=0))
+
+    monkeypatch.setattr(ssh_utils, "stream_remote_command", stream)
+    run = CommandRun("host", "user", "pw", "yes", max_output_bytes=100)
+    deadline = time.monotonic() + 5
+    while run.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert run.status == "finished" and run.exit_status == 0
+    assert run.stdout.total_bytes == 1000 and run.stdout.spilled
+    run.stdout.cleanup()
+
+def test_parse_host_list_inventory_and_duplicates():
+    hosts = parse_host_list("[web]\nweb1 ansible_host=10.0.0.5 ansible_port=2222\nops@db:2200, db2 # note\nops@db:2200",
+                            default_username="root")
+    assert hosts == [
+        {"hostname": "10.0.0.5", "port": 2222, "username": "root"},
+        {"hostname": "db", "port": 2200, "username": "ops"},
+        {"hostname": "db2", "port": 22, "username": "root"},
+    ]
+
+def test_run_remote_command_bounds_output(monkeypatch):
+    def stream(hostname, username, password, command, port=22, cancel_event=None, timeout=None):
+        yield "stdout", "head"
+        for _ in range(1000):
+            yield "stdout", "x" * 1000
+        yield "stdout", "tail"
+        yield "exit", 0
+
+    monkeypatch.setattr(ssh_utils, "stream_remote_command", stream)
+    success, output = ssh_utils.run_remote_command("host", "user", "pw", "cat big", max_output_bytes=64)
+    assert success
+    assert output.startswith("head") and output.endswith("tail")
+    assert f"{1000 * 1000 + 8 - 64:,} bytes omitted" in output
+
+def test_run_remote_command_reports_stderr(monkeypatch):
+    def stream(hostname, username, password, command, port=22, cancel_event=None, timeout=None):
+        yield "stderr", "denied"
+        yield "exit", 1
+
+    monkeypatch.setattr(ssh_utils, "stream_remote_command", stream)
+    assert ssh_utils.run_remote_command("host", "user", "pw", "ls") == (False, "Error: denied")
+
+class HostChannel(FakeChannel):
+    """Channel answering with the host it runs on, after ``delay`` seconds"""
+
+    def __init__(self, hostname, delay):
+        super().__init__()
+        self.hostname = hostname
+        self.ready_at = None
+        self.delay = delay
+
+    def exec_command(self, command):
+        self.ready_at = time.monotonic() + self.delay
+        self.stdout.append(f"{command} on {self.hostname}".encode())
+
+    def exit_status_ready(self):
+        return time.monotonic() >= self.ready_at
+
+class HostClient(FakeClient):
+    def __init__(self, hostname, delay):
+        super().__init__()
+        self.transport.open_session = lambda: HostChannel(hostname, delay)
+
+class FleetPool(FakePool):
+    """Hosts named ``slow*`` answer after 0.3s, ``down*`` refuse to connect"""
+
+    def _open(self, hostname, port, username, password):
+        if hostname.startswith("down"):
+            raise ConnectionRefusedError(f"{hostname} refused the connection")
+        return HostClient(hostname, 0.3 if hostname.startswith("slow") else 0)
+
+def test_run_command_on_hosts_isolates_failures_and_reuses_connections(monkeypatch):
+    pool = FleetPool()
+    monkeypatch.setattr(ssh_utils, "PARAMIKO_AVAILABLE", True)
+    monkeypatch.setattr(ssh_utils, "get_ssh_pool", lambda: pool)
+    hosts = parse_host_list("slow1, web1, down1, web2", default_username="ops")
+
+    started = time.monotonic()
+    results = list(run_command_on_hosts(hosts, "pw", "uptime", max_workers=4))
+    # Results arrive as hosts finish, so the slow host comes last whatever its place in the list
+    assert time.monotonic() - started < 1
+    assert len(results) == 4 and results[-1]["target"] == "ops@slow1:22"
+    by_target = {result["target"]: result for result in results}
+    assert by_target["ops@down1:22"]["success"] is False
+    assert "refused" in by_target["ops@down1:22"]["output"]
+    for host in ("slow1", "web1", "web2"):
+        result = by_target[f"ops@{host}:22"]
+        assert (result["success"], result["output"]) == (True, f"uptime on {host}")
+    assert by_target["ops@slow1:22"]["elapsed"] >= 0.3
+
+    # A second run goes over the pooled connections instead of reconnecting
+    assert sorted(result["success"] for result in run_command_on_hosts(hosts, "pw", "uptime")) == [False, True, True, True]
+    assert pool.stats["created"] == 3 and pool.stats["reused"] == 3
@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import time
+import pytest
+from streamlit.testing.v1 import AppTest
+from tools.storage import DEFAULT_DB_PATH, Between, Collection, MemoryBackend, SQLiteBackend, data_path
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryBackend()
+        return
+    backend = SQLiteBackend(str(tmp_path / "test.db"), flush_interval=60)
+    yield backend
+    backend.close()
+
+def test_append_update_delete_roundtrip(backend):
+    first = backend.append("grocery_items", "a", {"name": "Milk", "category": "Dairy", "completed": False})
+    second = backend.append("grocery_items", "a", {"name": "Bread", "category": "Bakery", "completed": True})
+    backend.append("grocery_items", "b", {"name": "Eggs", "category": "Dairy", "completed": False})
+    assert [r["name"] for r in backend.fetch("grocery_items", "a")] == ["Milk", "Bread"]
+    assert backend.count("grocery_items", "a", completed=False) == 1
+    backend.update("grocery_items", "a", {"id": first, "name": "Milk", "category": "Dairy", "completed": True})
+    assert backend.count("grocery_items", "a", completed=True) == 2
+    backend.delete("grocery_items", "a", second)
+    assert [r["id"] for r in backend.fetch("grocery_items", "a")] == [first]
+    assert backend.count("grocery_items", "b") == 1
+
+def test_limit_paging_and_ranges(backend):
+    ids = [backend.append("sms_history", "a", {"recipient": "+1", "status": "sent", "sent_time": f"2024-01-{day:02d}"})
+           for day in range(1, 11)]
+    assert [r["id"] for r in backend.fetch("sms_history", "a", limit=3)] == ids[-3:]
+    assert [r["id"] for r in backend.fetch("sms_history", "a", limit=3, before_id=ids[-3])] == ids[-6:-3]
+    assert [r["id"] for r in backend.fetch("sms_history", "a", limit=2, newest_first=True)] == ids[:-3:-1]
+    assert backend.count("sms_history", "a", sent_time=Between("2024-01-03", "2024-01-06")) == 3
+    backend.prune("sms_history", "a", ids[5])
+    assert backend.count("sms_history", "a") == 5
+
+def test_collection_pages_newest_first(backend):
+    emails = Collection("scheduled_emails", backend=backend, namespace="a")
+    ids = [emails.add({"subject": str(i), "status": "Sent" if i % 2 else "Scheduled", "scheduled_time": "2024-01-01 09:00"})
+           for i in range(7)]
+    first, cursor = emails.page(3)
+    assert [r["id"] for r in first] == ids[:-4:-1]
+    second, cursor = emails.page(3, cursor)
+    last, cursor = emails.page(3, cursor)
+    assert [r["id"] for r in second + last] == ids[3::-1] and cursor is None
+    sent, cursor = emails.page(2, status="Sent")
+    assert [r["id"] for r in sent] == [ids[5], ids[3]]
+    assert [r["id"] for r in emails.page(2, cursor, status="Sent")[0]] == [ids[1]]
+
+def test_version_changes_on_write(backend):
+    before = backend.version("recipes", "a")
+    backend.append("recipes", "a", {"name": "Soup"})
+    assert backend.version("recipes", "a") != before
+    assert backend.version("recipes", "b") == 0
+
+def test_sqlite_rejects_unindexed_filter(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "test.db"))
+    with pytest.raises(ValueError):
+        backend.count("recipes", "a", cuisine="Thai")
+    backend.close()
+
+def test_sqlite_persists_across_instances(tmp_path):
+    path = str(tmp_path / "test.db")
+    backend = SQLiteBackend(path)
+    backend.append("chat_history", "a", {"role": "user", "content": "hi"})
+    backend.close()
+    backend = SQLiteBackend(path)
+    assert backend.fetch("chat_history", "a")[0]["content"] == "hi"
+    assert backend.append("chat_history", "a", {"role": "assistant"}) == 2
+    backend.close()
+
+def committed(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_background_flusher_commits_queued_writes(tmp_path):
+    path = str(tmp_path / "test.db")
+    backend = SQLiteBackend(path, flush_interval=0.05)
+    try:
+        backend.append("recipes", "a", {"name": "Soup"})
+        assert wait_until(lambda: committed(path, "recipes") == 1)
+    finally:
+        backend.close()
+
+def test_full_batch_is_flushed_without_waiting_for_the_interval(tmp_path):
+    path = str(tmp_path / "test.db")
+    backend = SQLiteBackend(path, flush_interval=60, max_batch=10)
+    try:
+        for i in range(10):
+            backend.append("recipes", "a", {"name": f"Dish {i}"})
+        assert wait_until(lambda: committed(path, "recipes") == 10)
+    finally:
+        backend.close()
+
+def test_locked_database_keeps_queued_writes(tmp_path):
+    path = str(tmp_path / "test.db")
+    backend = SQLiteBackend(path, flush_interval=60)
+    backend._conn.execute("PRAGMA busy_timeout = 50")
+    backend.append("recipes", "a", {"name": "Soup"})
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    with pytest.raises(sqlite3.OperationalError):
+        backend.flush()
+    assert backend.failed_flushes == 1 and backend.dropped_writes == 0
+    backend.append("recipes", "a", {"name": "Stew"})
+    blocker.execute("ROLLBACK")
+    blocker.close()
+    assert [r["name"] for r in backend.fetch("recipes", "a")] == ["Soup", "Stew"]
+    backend.close()
+
+def test_rejected_write_is_dropped_and_rest_committed(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "test.db"), flush_interval=60)
+    backend.append("recipes", "a", {"name": "Soup"})
+    # A duplicate primary key can never succeed
+    backend._queue("recipes", "a", "INSERT INTO recipes (id, namespace, created_at, name, data) VALUES (1, 'a', 0, 'x', '{}')", ())
+    backend.append("recipes", "a", {"name": "Stew"})
+    with pytest.raises(sqlite3.IntegrityError):
+        backend.flush()
+    assert backend.dropped_writes == 1
+    assert [r["name"] for r in backend.fetch("recipes", "a")] == ["Soup", "Stew"]
+    backend.close()
+
+def _show_namespace():
+    import streamlit as st
+    from tools.storage import get_namespace
+    st.write(get_namespace())
+
+def test_sessions_without_profile_get_private_namespaces():
+    first = AppTest.from_function(_show_namespace).run()
+    second = AppTest.from_function(_show_namespace).run()
+    namespace = first.markdown[0].value
+    assert namespace.startswith("session-") and namespace != second.markdown[0].value
+    assert first.query_params["profile"] == namespace
+    first.run()
+    assert first.markdown[0].value == namespace
+
+def test_profile_query_parameter_selects_namespace():
+    app = AppTest.from_function(_show_namespace)
+    app.query_params["profile"] = "team"
+    assert app.run().markdown[0].value == "team"
+
+def test_file_stores_stay_out_of_data_with_the_memory_backend(monkeypatch, tmp_path):
+    monkeypatch.setenv("DASHBOARD_ARCHIVE", str(tmp_path / "archive"))
+    monkeypatch.setenv("DASHBOARD_STORAGE", "memory")
+    data_root = os.path.dirname(DEFAULT_DB_PATH)
+    for name in ("archive", "attachments", "batches"):
+        path = data_path("DASHBOARD_" + name.upper(), os.path.join(data_root, name))
+        assert os.path.basename(path) == name
+        assert not path.startswith(data_root) and not path.startswith(str(tmp_path))
+    monkeypatch.setenv("DASHBOARD_STORAGE", "sqlite")
+    assert data_path("DASHBOARD_ARCHIVE", os.path.join(data_root, "archive")) == str(tmp_path / "archive")
+    assert data_path("DASHBOARD_BATCHES", os.path.join(data_root, "batches")) == os.path.join(data_root, "batches")
@@ -0,0 +1,70 @@
+import pytest
+from tools.templating import (CompiledTemplate, compile_template, field_key, render_for_contacts, sms_segments,
+                              text_stats)
+
+def segments(text):
+    return sms_segments(*text_stats(text))
+
+def test_placeholders_are_parsed_once_and_rendered():
+    template = CompiledTemplate("Hi [First Name], see you on [date] at [Place]. [ ] [Name]!")
+    assert template.fields == ["first name", "date", "place", "name"]
+    assert template.literals[0] == "Hi " and template.literals[-1] == "!"
+    assert template.render({"first name": "Ada", "date": "Monday", "name": "Ada L."}) == \
+        "Hi Ada, see you on Monday at [Place]. [ ] Ada L.!"
+    assert CompiledTemplate("No fields").render({"name": "x"}) == "No fields"
+    assert field_key(" First_name ") == "first name"
+
+def test_compile_template_reuses_compiled_templates():
+    assert compile_template("Dear [Name]") is compile_template("Dear [Name]")
+    assert compile_template("Dear [Name]") is not compile_template("Hello [Name]")
+
+def test_render_for_contacts_merges_contact_and_shared_fields():
+    template = compile_template("[First Name] ([Group]): [Number] on [Date]")
+    contacts = [{"name": "Ada Lovelace", "number": "+1555", "groups": ["VIP", "Staff"]},
+                {"name": "", "number": "+1666", "group": "Team"}]
+    assert render_for_contacts(template, contacts, {"date": "Friday", "name": "ignored"}) == [
+        "Ada (VIP, Staff): +1555 on Friday",
+        " (Team): +1666 on Friday",
+    ]
+
+@pytest.mark.parametrize("text, expected", [
+    ("", ("GSM-7", 1)),
+    ("a" * 160, ("GSM-7", 1)),
+    ("a" * 161, ("GSM-7", 2)),
+    ("a" * 306, ("GSM-7", 2)),
+    ("a" * 307, ("GSM-7", 3)),
+    ("Über café? Ñ £5 @ 10¥", ("GSM-7", 1)),
+    # Extension characters take two septets each
+    ("€" * 80, ("GSM-7", 1)),
+    ("€" * 81, ("GSM-7", 2)),
+    ("a" * 158 + "[", ("GSM-7", 1)),
+    ("a" * 159 + "{", ("GSM-7", 2)),
+    ("^{}\\[~]|€", ("GSM-7", 1)),
+    # Anything outside GSM-7 switches the whole message to UCS-2
+    ("ж" * 70, ("UCS-2", 1)),
+    ("ж" * 71, ("UCS-2", 2)),
+    ("ж" * 134, ("UCS-2", 2)),
+    ("ж" * 135, ("UCS-2", 3)),
+    ("a" * 69 + "ç", ("UCS-2", 1)),
+    # Emoji outside the BMP count as two UTF-16 units
+    ("😀" * 35, ("UCS-2", 1)),
+    ("😀" * 36, ("UCS-2", 2)),
+])
+def test_segment_counts(text, expected):
+    assert segments(text) == expected
+
+def test_text_stats_counts_septets_and_units():
+    assert text_stats("a€") == (True, 3, 2)
+    assert text_stats("a😀") == (False, 2, 3)
+
+@pytest.mark.parametrize("context", [
+    {},
+    {"name": "Bob"},
+    {"name": "€" * 70},
+    {"name": "Zoë", "place": "a" * 150},
+    {"name": "Дмитрий", "place": "Café"},
+    {"name": "😀" * 30},
+])
+def test_template_segments_match_the_rendered_text(context):
+    template = compile_template("Hello [Name], your table at [Place] is ready {ok}")
+    assert template.segments(context) == segments(template.render(context))
@@ -0,0 +1,125 @@
+import re
+import time
+from datetime import datetime, timezone
+from streamlit.testing.v1 import AppTest
+from tools.whatsapp_autoreply import AutoReplyEngine, RuleSet, TTLCache, _trie_pattern
+
+NOON = datetime(2024, 1, 3, 12, 0, tzinfo=timezone.utc)
+NIGHT = datetime(2024, 1, 3, 23, 0, tzinfo=timezone.utc)
+
+def test_trie_pattern_matches_exactly_the_words():
+    words = ["cat", "car", "cart", "dog", "do"]
+    pattern = re.compile(f"^{_trie_pattern(words)}$")
+    for word in words:
+        assert pattern.match(word)
+    for other in ["ca", "carts", "d", "dogs", ""]:
+        assert not pattern.match(other)
+
+def test_keywords_match_whole_words_and_first_rule_wins():
+    rules = RuleSet([
+        {"kind": "Keyword", "pattern": "price, price list", "reply": "A", "when": "Always"},
+        {"kind": "Regex", "pattern": r"order\s*#?\d{4,}", "reply": "B", "when": "Always"},
+        {"kind": "Keyword", "pattern": "order", "reply": "C", "when": "Always"},
+    ])
+    assert rules.matching_rules("What's the PRICE?") == [0]
+    assert rules.matching_rules("priceless") == []
+    assert rules.matching_rules("order #12345 and the price") == [0, 1, 2]
+    assert rules.choose("where is order 12345", NOON)[0] == "r1"
+
+def test_overlapping_keywords_all_fire():
+    rules = RuleSet([
+        {"kind": "Keyword", "pattern": "list price", "reply": "A"},
+        {"kind": "Keyword", "pattern": "price", "reply": "B"},
+        {"kind": "Keyword", "pattern": "price list", "reply": "C"},
+    ])
+    assert rules.matching_rules("send the list price list") == [0, 1, 2]
+
+def test_time_windows_and_fallback():
+    rules = RuleSet([{"kind": "Keyword", "pattern": "hi", "reply": "Hello", "when": "Working hours"}],
+                    fallback="Closed", working_hours=(9, 17), timezone="UTC")
+    assert rules.choose("hi", NOON)[0] == "r0"
+    assert rules.choose("hi", NIGHT)[0] == "fallback"
+    assert rules.choose("anything", NOON) is None
+
+def test_invalid_regex_is_reported_and_skipped():
+    rules = RuleSet([{"kind": "Regex", "pattern": "(", "reply": "x"},
+                     {"kind": "Keyword", "pattern": "ok", "reply": "y"}])
+    assert len(rules.errors) == 1
+    assert rules.matching_rules("ok") == [0]
+
+def test_ttl_cache_forgets_after_ttl():
+    cache = TTLCache(ttl=10)
+    assert cache.add("a", now=0)
+    assert not cache.add("a", now=5)
+    assert cache.add("a", now=10)
+    assert len(cache) == 1
+
+class Gateway:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, number, text):
+        self.sent.append((number, text))
+
+class History:
+    def __init__(self, broken=False):
+        self.records = []
+        self.broken = broken
+
+    def add(self, record):
+        if self.broken:
+            raise OSError("disk full")
+        self.records.append(record)
+
+def drain(engine, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while engine.received + engine.errors < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_engine_replies_once_per_rule_and_contact():
+    gateway = Gateway()
+    engine = AutoReplyEngine(gateway, History())
+    engine.configure(True, [{"kind": "Keyword", "pattern": "hi", "reply": "Hello [Name]", "when": "Always"}],
+                     "", (0, 24), "UTC")
+    for _ in range(3):
+        engine.submit("+15550100", "hi", NOON)
+    engine.submit("+15550101", "bye", NOON)
+    drain(engine, 4)
+    assert gateway.sent == [("+15550100", "Hello +15550100")]
+    assert (engine.replied, engine.deduped, engine.unmatched) == (1, 2, 1)
+
+def test_engine_failures_are_counted_not_swallowed(caplog):
+    engine = AutoReplyEngine(Gateway(), History(broken=True))
+    engine.submit("+15550100", "hi", NOON)
+    drain(engine, 1)
+    stats = engine.stats()
+    assert stats["errors"] == 1
+    assert "disk full" in stats["last_error"]
+    assert "Auto-reply failed" in caplog.text
+
+def bot_page():
+    from tools.whatsapp_bot import run_whatsapp_bot
+    run_whatsapp_bot()
+
+def open_page(profile):
+    at = AppTest.from_function(bot_page, default_timeout=30)
+    at.query_params["profile"] = profile
+    return at.run()
+
+def engine_for(profile):
+    from tools.whatsapp_autoreply import _engines
+    return next(engine for key, engine in _engines().items() if key[1] == profile)
+
+def test_opening_the_page_keeps_the_saved_configuration():
+    first = open_page("bot-team")
+    assert not first.exception
+    first.checkbox[0].check().run()
+    assert engine_for("bot-team").enabled is False  # nothing changes before saving
+    first.button(key="whatsapp_save_config").click().run()
+    assert engine_for("bot-team").enabled is True
+
+    # A new session starts from the saved configuration instead of switching the bot off
+    second = open_page("bot-team")
+    assert not second.exception
+    assert second.checkbox[0].value is True
+    assert engine_for("bot-team").enabled is True
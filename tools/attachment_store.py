@@ -0,0 +1,111 @@
+import streamlit as st
+import hashlib
+import os
+import tempfile
+import time
+from tools.storage import data_path
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "attachments")
+CHUNK_SIZE = 1024 * 1024
+
+class AttachmentStore:
+    """
+    Content-addressed file store for email attachments
+
+    Files are written once under their SHA-256 (``ab/abcdef...``), so the
+    same file attached to many emails is stored a single time. Emails keep
+    only a small reference dict; the content is read back in chunks when the
+    email is sent.
+
+    Args:
+        root (str): Directory holding the blobs
+    """
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, fileobj, filename, content_type=None):
+        """
+        Store a file-like object, streaming it to disk while hashing
+
+        Args:
+            fileobj: Binary file-like object (e.g. a Streamlit ``UploadedFile``)
+            filename (str): Name shown to the recipient
+            content_type (str): MIME type (default: application/octet-stream)
+
+        Returns:
+            dict: Reference with ``sha256``, ``size``, ``filename`` and ``content_type``
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                while True:
+                    chunk = fileobj.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    handle.write(chunk)
+                    size += len(chunk)
+            target = self.path(digest.hexdigest())
+            if os.path.exists(target):
+                os.remove(temp_path)
+                os.utime(target)  # keep recently reused blobs out of garbage collection
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return {
+            "sha256": digest.hexdigest(),
+            "size": size,
+            "filename": filename,
+            "content_type": content_type or "application/octet-stream",
+        }
+
+    def iter_chunks(self, digest, chunk_size=CHUNK_SIZE):
+        """Yield a blob's content in chunks of at most ``chunk_size`` bytes"""
+        with open(self.path(digest), "rb") as handle:
+            while True:
+                chunk = handle.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def collect_garbage(self, referenced, grace=3600):
+        """
+        Delete blobs no email refers to any more
+
+        Args:
+            referenced (set): Digests still in use
+            grace (float): Seconds a new blob is kept even if unreferenced,
+                so a file stored just before its email is saved survives
+
+        Returns:
+            int: Bytes freed
+        """
+        freed = 0
+        cutoff = time.time() - grace
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                if name in referenced or os.path.getmtime(path) > cutoff:
+                    continue
+                freed += os.path.getsize(path)
+                os.remove(path)
+        return freed
+
+@st.cache_resource
+def get_attachment_store():
+    """Return the shared attachment store (``DASHBOARD_ATTACHMENTS`` overrides the location)"""
+    return AttachmentStore(data_path("DASHBOARD_ATTACHMENTS", DEFAULT_ROOT))
@@ -0,0 +1,436 @@
+import streamlit as st
+import bisect
+import csv
+import io
+import re
+import threading
+from tools.fragments import rerun_fragment
+from tools.storage import Collection
+
+try:
+    import phonenumbers
+    PHONENUMBERS_AVAILABLE = True
+except ImportError:
+    PHONENUMBERS_AVAILABLE = False
+
+DEFAULT_GROUPS = ["Family", "Friends", "Work", "Other"]
+
+# Header names accepted for each field in imported CSV files
+CSV_COLUMNS = {
+    "name": ("name", "full name", "fn", "contact", "display name"),
+    "number": ("number", "phone", "phone number", "mobile", "mobile phone", "tel", "telephone", "cell"),
+    "groups": ("group", "groups", "category", "categories", "labels", "tags"),
+}
+
+_NON_DIGITS = re.compile(r"[^\d+]")
+_PHONE_QUERY = re.compile(r"[\d+() .-]*\d[\d+() .-]*")
+
+def normalize_number(raw, default_country_code="+1"):
+    """
+    Normalize a phone number to E.164 (``+<country><number>``)
+
+    Numbers without an international prefix are taken as national numbers
+    of ``default_country_code`` (a leading trunk ``0`` is dropped). Uses
+    ``phonenumbers`` for validation when it is installed.
+
+    Raises:
+        ValueError: If the input can't be a phone number
+    """
+    if PHONENUMBERS_AVAILABLE:
+        try:
+            region = phonenumbers.region_code_for_country_code(int(default_country_code.lstrip("+")))
+            parsed = phonenumbers.parse(raw, region)
+        except (phonenumbers.NumberParseException, ValueError) as e:
+            raise ValueError(f"Invalid phone number {raw!r}: {e}")
+        if not phonenumbers.is_possible_number(parsed):
+            raise ValueError(f"Invalid phone number {raw!r}")
+        return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+    number = _NON_DIGITS.sub("", str(raw))
+    if number.startswith("00"):
+        number = "+" + number[2:]
+    elif not number.startswith("+"):
+        number = default_country_code + number.lstrip("0")
+    digits = number[1:]
+    if "+" in digits or not 7 <= len(digits) <= 15:
+        raise ValueError(f"Invalid phone number {raw!r}")
+    return number
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class ContactDirectory:
+    """
+    Shared, indexed contact list for one profile
+
+    Contacts are stored in the ``contacts`` collection and indexed in memory:
+    a hash index on the E.164 number (one contact per number), group
+    membership sets, a sorted name-token list for prefix search and trigram
+    posting lists for substring search. Searching touches only the matching
+    contacts, so widgets never need the whole list.
+
+    Args:
+        collection (Collection): Backing collection (default: contacts)
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection or Collection("contacts")
+        self._lock = threading.RLock()
+        self.reload()
+
+    def reload(self):
+        """Rebuild every index from storage"""
+        with self._lock:
+            self._by_id = {}
+            self._by_number = {}
+            self._groups = {}
+            self._tokens = []         # sorted (token, id) for prefix search
+            self._tokens_dirty = False
+            self._postings = {}       # trigram -> ids, appended in id order
+            backend = self.collection.backend
+            for contact in backend.fetch(self.collection.name, self.collection.namespace):
+                self._index(contact)
+            self._tokens.sort()
+            self._version = backend.version(self.collection.name, self.collection.namespace)
+
+    def is_stale(self):
+        backend = self.collection.backend
+        return backend.version(self.collection.name, self.collection.namespace) != self._version
+
+    def _sync_version(self):
+        self._version = self.collection.backend.version(self.collection.name, self.collection.namespace)
+
+    def _index(self, contact):
+        contact_id = contact["id"]
+        self._by_id[contact_id] = contact
+        self._by_number[contact["number"]] = contact_id
+        for group in contact.get("groups", []):
+            self._groups.setdefault(group, set()).add(contact_id)
+        name = contact["name"].lower()
+        for token in set(name.split()):
+            self._tokens.append((token, contact_id))
+        self._tokens_dirty = True
+        for trigram in _trigrams(name) | _trigrams(contact["number"][1:]):
+            self._postings.setdefault(trigram, []).append(contact_id)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, contact_id):
+        return self._by_id.get(contact_id)
+
+    def find_number(self, number):
+        """Contact with this E.164 number, or None"""
+        contact_id = self._by_number.get(number)
+        return self._by_id.get(contact_id) if contact_id is not None else None
+
+    def groups(self):
+        """Group name -> number of members"""
+        with self._lock:
+            return {group: len(ids) for group, ids in sorted(self._groups.items()) if ids}
+
+    def group_members(self, groups):
+        """Ids of contacts in any of ``groups``, in id order"""
+        with self._lock:
+            ids = set()
+            for group in groups:
+                ids |= self._groups.get(group, set())
+            return sorted(ids)
+
+    def add(self, name, number, groups=(), default_country_code="+1"):
+        """
+        Add a contact, merging into an existing one with the same number
+
+        Returns:
+            tuple: (contact: dict, created: bool)
+
+        Raises:
+            ValueError: If the number is invalid
+        """
+        number = normalize_number(number, default_country_code)
+        name = " ".join(str(name).split()) or number
+        groups = sorted({group.strip() for group in groups if group and group.strip()})
+        with self._lock:
+            existing = self.find_number(number)
+            if existing is None:
+                contact = {"name": name, "number": number, "groups": groups}
+                self.collection.add(contact)
+                self._index(contact)
+                self._sync_version()
+                return contact, True
+
+            merged_groups = sorted(set(existing.get("groups", [])) | set(groups))
+            if merged_groups != existing.get("groups", []):
+                for group in merged_groups:
+                    self._groups.setdefault(group, set()).add(existing["id"])
+                existing["groups"] = merged_groups
+                self.collection.update(existing)
+                self._sync_version()
+            return existing, False
+
+    def delete(self, contact_id):
+        with self._lock:
+            contact = self._by_id.pop(contact_id, None)
+            if contact is None:
+                return None
+            self._by_number.pop(contact["number"], None)
+            for group in contact.get("groups", []):
+                self._groups.get(group, set()).discard(contact_id)
+            # Token and trigram entries are filtered out lazily via _by_id
+            self.collection.delete(contact_id)
+            self._sync_version()
+            return contact
+
+    def search(self, query, limit=50, groups=None):
+        """
+        Contacts whose name or number matches ``query``
+
+        One- and two-character queries match the start of a name word;
+        longer ones match anywhere in the name or number.
+
+        Args:
+            query (str): Search text
+            limit (int): Maximum results
+            groups (list): Only contacts in one of these groups
+
+        Returns:
+            list: Matching contacts in insertion order (prefix matches by name)
+        """
+        query = " ".join(query.lower().split())
+        if _PHONE_QUERY.fullmatch(query):
+            query = re.sub(r"\D", "", query)
+        allowed = set(self.group_members(groups)) if groups else None
+        with self._lock:
+            if not query:
+                candidates = iter(self._by_id)
+            elif len(query) < 3:
+                if self._tokens_dirty:
+                    self._tokens.sort()
+                    self._tokens_dirty = False
+                start = bisect.bisect_left(self._tokens, (query,))
+                candidates = _prefix_matches(self._tokens, start, query)
+            else:
+                lists = [self._postings.get(trigram, []) for trigram in _trigrams(query)]
+                candidates = iter(min(lists, key=len))
+
+            results, seen = [], set()
+            for contact_id in candidates:
+                contact = self._by_id.get(contact_id)
+                if contact is None or contact_id in seen or (allowed is not None and contact_id not in allowed):
+                    continue
+                if len(query) >= 3 and query not in contact["name"].lower() and query not in contact["number"]:
+                    continue
+                seen.add(contact_id)
+                results.append(contact)
+                if len(results) >= limit:
+                    break
+            return results
+
+    def import_rows(self, rows, default_country_code="+1", default_groups=()):
+        """
+        Add many contacts from an iterable of ``{"name", "number", "groups"}`` dicts
+
+        Rows are consumed one at a time, so a generator over a large file is
+        never held in memory as a whole.
+
+        Returns:
+            dict: Counts of ``added``, ``merged`` and ``invalid`` rows
+        """
+        counts = {"added": 0, "merged": 0, "invalid": 0}
+        for row in rows:
+            try:
+                _, created = self.add(row.get("name", ""), row.get("number", ""),
+                                      list(row.get("groups", [])) + list(default_groups), default_country_code)
+            except ValueError:
+                counts["invalid"] += 1
+                continue
+            counts["added" if created else "merged"] += 1
+        with self._lock:
+            if self._tokens_dirty:
+                self._tokens.sort()
+                self._tokens_dirty = False
+        return counts
+
+def _prefix_matches(tokens, start, prefix):
+    """Ids from the sorted token list, starting at ``start``, while the token starts with ``prefix``"""
+    for index in range(start, len(tokens)):
+        token, contact_id = tokens[index]
+        if not token.startswith(prefix):
+            return
+        yield contact_id
+
+def _split_groups(value):
+    return [group.strip() for group in re.split(r"[;,|]", value or "") if group.strip()]
+
+def iter_csv_contacts(binary_file, encoding="utf-8-sig"):
+    """
+    Stream contacts from a CSV file with a header row
+
+    Recognizes common header names (Name/Full Name, Phone/Mobile/Number,
+    Group/Groups/Labels); groups may be separated by ``;``, ``,`` or ``|``.
+    """
+    reader = csv.reader(io.TextIOWrapper(binary_file, encoding=encoding, errors="replace", newline=""))
+    header = [column.strip().lower() for column in next(reader, [])]
+    positions = {
+        field: next((header.index(alias) for alias in aliases if alias in header), None)
+        for field, aliases in CSV_COLUMNS.items()
+    }
+    if positions["number"] is None:
+        raise ValueError("CSV needs a phone number column (e.g. 'Phone' or 'Number')")
+    for row in reader:
+        def column(field):
+            position = positions[field]
+            return row[position] if position is not None and position < len(row) else ""
+        yield {"name": column("name"), "number": column("number"), "groups": _split_groups(column("groups"))}
+
+def iter_vcard_contacts(binary_file, encoding="utf-8"):
+    """Stream contacts from a vCard (.vcf) file, one per phone number (FN, TEL, CATEGORIES)"""
+    card = None
+    previous = None
+    text = io.TextIOWrapper(binary_file, encoding=encoding, errors="replace", newline="")
+
+    def unfolded():
+        # vCard folds long lines by starting the continuation with a space or tab
+        nonlocal previous
+        for raw in text:
+            line = raw.rstrip("\r\n")
+            if line[:1] in (" ", "\t") and previous is not None:
+                previous += line[1:]
+                continue
+            if previous is not None:
+                yield previous
+            previous = line
+        if previous is not None:
+            yield previous
+
+    for line in unfolded():
+        name, _, value = line.partition(":")
+        prop = name.split(";")[0].upper()
+        if prop == "BEGIN" and value.upper() == "VCARD":
+            card = {"name": "", "numbers": [], "groups": []}
+        elif card is None:
+            continue
+        elif prop == "FN":
+            card["name"] = value.replace("\\,", ",")
+        elif prop == "N" and not card["name"]:
+            parts = value.split(";")
+            card["name"] = " ".join(part for part in (parts[1:2] + parts[:1]) if part)
+        elif prop == "TEL":
+            card["numbers"].append(value.removeprefix("tel:"))
+        elif prop == "CATEGORIES":
+            card["groups"] = _split_groups(value)
+        elif prop == "END":
+            for number in card["numbers"]:
+                yield {"name": card["name"], "number": number, "groups": card["groups"]}
+            card = None
+
+@st.cache_resource
+def _directories():
+    return {}
+
+_directories_lock = threading.Lock()
+
+def get_contact_directory():
+    """Return the profile's contact directory, shared by every session on that profile"""
+    collection = Collection("contacts")
+    key = (id(collection.backend), collection.namespace)
+    with _directories_lock:
+        directories = _directories()
+        directory = directories.get(key)
+        if directory is None:
+            directory = directories[key] = ContactDirectory(collection)
+    if directory.is_stale():
+        directory.reload()
+    return directory
+
+def show_contact_manager(key, default_country_code="+1"):
+    """Add / import / search / delete contacts in the shared directory"""
+    directory = get_contact_directory()
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("#### Add Contact")
+        name = st.text_input("Contact Name", key=f"{key}_new_name")
+        number = st.text_input("Phone Number", placeholder="+1234567890", key=f"{key}_new_number")
+        groups = st.multiselect("Groups", sorted(set(DEFAULT_GROUPS) | set(directory.groups())),
+                                key=f"{key}_new_groups")
+
+        if st.button("Add Contact", key=f"{key}_add") and name and number:
+            try:
+                contact, created = directory.add(name, number, groups, default_country_code)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                if created:
+                    st.success(f"Added {contact['name']} ({contact['number']}) to contacts!")
+                else:
+                    st.info(f"{contact['number']} already belongs to {contact['name']}; groups merged.")
+
+        with st.expander("📥 Import Contacts (CSV / vCard)"):
+            upload = st.file_uploader("Contacts file", type=["csv", "vcf"], key=f"{key}_import_file")
+            import_groups = st.multiselect("Add imported contacts to", sorted(set(DEFAULT_GROUPS) | set(directory.groups())),
+                                           key=f"{key}_import_groups")
+            if upload is not None and st.button("Import", key=f"{key}_import"):
+                parser = iter_vcard_contacts if upload.name.lower().endswith(".vcf") else iter_csv_contacts
+                try:
+                    with st.spinner("Importing contacts..."):
+                        counts = directory.import_rows(parser(upload), default_country_code, import_groups)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.success(f"Imported {counts['added']:,} new, merged {counts['merged']:,} duplicates, "
+                               f"skipped {counts['invalid']:,} invalid numbers.")
+
+    with col2:
+        st.markdown(f"#### Contact List ({len(directory):,})")
+        if not len(directory):
+            st.info("No contacts added yet.")
+            return
+        query = st.text_input("🔍 Search", key=f"{key}_search", placeholder="Name or number")
+        group_filter = st.multiselect("Filter by group", list(directory.groups()), key=f"{key}_group_filter")
+        matches = directory.search(query, limit=20, groups=group_filter)
+        for contact in matches:
+            col_a, col_b = st.columns([5, 1])
+            with col_a:
+                group_text = f" ({', '.join(contact['groups'])})" if contact.get("groups") else ""
+                st.write(f"📞 **{contact['name']}** - {contact['number']}{group_text}")
+            with col_b:
+                if st.button("🗑️", key=f"{key}_delete_{contact['id']}"):
+                    directory.delete(contact["id"])
+                    rerun_fragment()
+        if len(matches) == 20:
+            st.caption("Showing the first 20 matches; refine the search to see others.")
+
+def pick_contacts(key, directory, label="Select Recipients", multi=True, limit=50):
+    """
+    Search-backed contact picker
+
+    Only the current search results (plus anything already selected) are
+    turned into widget options, however large the directory is.
+
+    Returns:
+        list or dict: Selected contacts (``multi``), or the selected contact / None
+    """
+    query = st.text_input(f"🔍 Find {'recipients' if multi else 'recipient'}", key=f"{key}_query",
+                          placeholder="Type a name or number")
+    # The multiselect keeps its ids under "_ids", the selectbox its single id under "_id"
+    if multi:
+        previous = st.session_state.get(f"{key}_ids", [])
+    else:
+        previous = [st.session_state[f"{key}_id"]] if st.session_state.get(f"{key}_id") is not None else []
+    selected_ids = [contact_id for contact_id in previous if directory.get(contact_id)]
+    option_ids = list(dict.fromkeys(selected_ids + [contact["id"] for contact in directory.search(query, limit=limit)]))
+
+    def describe(contact_id):
+        contact = directory.get(contact_id)
+        return f"{contact['name']} ({contact['number']})" if contact else "Deleted contact"
+
+    if multi:
+        chosen = st.multiselect(label, option_ids, format_func=describe, key=f"{key}_ids")
+        return [directory.get(contact_id) for contact_id in chosen if directory.get(contact_id)]
+    if not option_ids:
+        st.selectbox(label, ["No matching contacts"], disabled=True, key=f"{key}_none")
+        return None
+    chosen = st.selectbox(label, option_ids, format_func=describe, key=f"{key}_id")
+    return directory.get(chosen)
@@ -0,0 +1,161 @@
+import re
+from tools.llm_providers import estimate_tokens
+from tools.storage import get_collection
+
+# Tokens a chat message costs beyond its text (role and separators)
+MESSAGE_OVERHEAD = 4
+
+# Share of the context budget the rolling summary may take
+SUMMARY_SHARE = 0.25
+
+# Summary lines kept in storage; the newest that fit the budget are sent
+SUMMARY_MAX_TOKENS = 2000
+SUMMARY_LINE_CHARS = 160
+
+# Messages read per storage query while filling the window
+WINDOW_PAGE = 64
+
+def message_tokens(content):
+    """Token count of one chat message"""
+    return estimate_tokens(content) + MESSAGE_OVERHEAD
+
+def _summary_line(message):
+    # First sentence of the message, shortened
+    text = " ".join(message["content"].split())
+    first = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    if len(first) > SUMMARY_LINE_CHARS:
+        first = first[:SUMMARY_LINE_CHARS - 1].rstrip() + "…"
+    return f"{message['role'].capitalize()}: {first}"
+
+class Conversation:
+    """
+    Stored chat with a token-bounded context window
+
+    Each message's token count is worked out once, when it is added, and
+    stored with it. The context sent to the model is the newest run of
+    messages that fits the budget; turns that fall out of it are folded,
+    once each, into a rolling summary of one short line per message, which
+    is sent ahead of the window as a system message.
+
+    Args:
+        messages (Collection): Chat messages (``role``, ``content``, ``tokens``)
+        summaries (Collection): Holds the rolling summary record
+    """
+
+    def __init__(self, messages, summaries):
+        self.messages = messages
+        self.summaries = summaries
+
+    def add(self, role, content, **extra):
+        """Store a message with its token count"""
+        return self.messages.add({"role": role, "content": content, "tokens": message_tokens(content), **extra})
+
+    @staticmethod
+    def tokens(message):
+        """Stored token count (worked out for messages saved before counts were kept)"""
+        return message.get("tokens") or message_tokens(message["content"])
+
+    def count(self):
+        return self.messages.count()
+
+    def recent(self, limit):
+        """The newest ``limit`` messages, oldest first"""
+        return self.messages.recent(limit)
+
+    def window(self, budget):
+        """
+        The newest messages whose tokens fit ``budget``, oldest first
+
+        The latest message is always included, even on its own it is over budget.
+        """
+        def load():
+            backend, name, namespace = self.messages.backend, self.messages.name, self.messages.namespace
+            window, used, before_id = [], 0, None
+            while True:
+                page = backend.fetch(name, namespace, limit=WINDOW_PAGE, before_id=before_id, newest_first=True)
+                for message in page:
+                    tokens = self.tokens(message)
+                    if window and used + tokens > budget:
+                        return window[::-1]
+                    window.append(message)
+                    used += tokens
+                if len(page) < WINDOW_PAGE:
+                    return window[::-1]
+                before_id = page[-1]["id"]
+
+        return self.messages._cached(("window", budget), load)
+
+    def summary(self):
+        """The rolling summary record (``lines``: [message id, text] pairs), or None"""
+        records = self.summaries.recent(1)
+        return records[0] if records else None
+
+    def _fold(self, before_id):
+        # Summarize the messages between the last folded one and ``before_id``
+        summary = self.summary() or {"lines": [], "dropped": 0}
+        through_id = summary["lines"][-1][0] if summary["lines"] else 0
+        if through_id >= before_id - 1:
+            return summary
+        backend, name, namespace = self.messages.backend, self.messages.name, self.messages.namespace
+        new = backend.fetch(name, namespace, after_id=through_id, before_id=before_id)
+        if not new:
+            return summary
+        lines = summary["lines"] + [[message["id"], _summary_line(message)] for message in new]
+        used = sum(estimate_tokens(text) for _, text in lines)
+        dropped = 0
+        while used > SUMMARY_MAX_TOKENS and len(lines) > 1:
+            used -= estimate_tokens(lines[0][1])
+            lines.pop(0)
+            dropped += 1
+        summary = dict(summary, lines=lines, dropped=summary["dropped"] + dropped)
+        if "id" in summary:
+            self.summaries.update(summary)
+        else:
+            self.summaries.add(summary)
+        return summary
+
+    def context(self, budget, fold=True):
+        """
+        Messages to send for the next reply
+
+        Args:
+            budget (int): Tokens available for the prompt
+            fold (bool): Fold turns that left the window into the stored
+                summary first; without it the summary is only read, so
+                rendering the page never writes
+
+        Returns:
+            dict: ``messages`` (summary first, when there is one), ``tokens``,
+            ``window`` (messages sent verbatim) and ``summarized`` (older
+            messages covered by the summary)
+        """
+        summary_budget = int(budget * SUMMARY_SHARE)
+        window = self.window(budget - summary_budget)
+        messages = [{"role": message["role"], "content": message["content"]} for message in window]
+        tokens = sum(self.tokens(message) for message in window)
+        summarized = 0
+        if window and self.count() > len(window):
+            summary = self._fold(window[0]["id"]) if fold else self.summary() or {"lines": []}
+            # Newest summary lines that fit, and only for messages outside the window
+            lines, used = [], message_tokens("Earlier in this conversation:")
+            for message_id, text in reversed(summary["lines"]):
+                if message_id >= window[0]["id"]:
+                    continue
+                if used + estimate_tokens(text) + 1 > summary_budget:
+                    break
+                lines.append(text)
+                used += estimate_tokens(text) + 1
+            summarized = self.count() - len(window)
+            if lines:
+                text = "Earlier in this conversation:\n" + "\n".join(f"- {line}" for line in reversed(lines))
+                messages.insert(0, {"role": "system", "content": text})
+                tokens += used
+        return {"messages": messages, "tokens": tokens, "window": len(window), "summarized": summarized}
+
+    def clear(self):
+        self.messages.clear()
+        self.summaries.clear()
+
+def get_conversation():
+    """The chat of the current profile"""
+    return Conversation(get_collection("chat_history"), get_collection("chat_summaries"))
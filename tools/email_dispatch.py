@@ -0,0 +1,733 @@
+import streamlit as st
+import calendar
+import heapq
+import base64
+import itertools
+import os
+import re
+import smtplib
+import ssl
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import uuid
+from email import policy
+from email.message import EmailMessage, MIMEPart
+from email.utils import getaddresses
+from tools.storage import get_storage
+from tools.attachment_store import get_attachment_store
+
+try:
+    from aiosmtpd.controller import Controller
+    AIOSMTPD_AVAILABLE = True
+except ImportError:
+    AIOSMTPD_AVAILABLE = False
+
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+# Retries are timed to the second; a minute resolution would fire the first one almost at once
+RETRY_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+COLLECTION = "scheduled_emails"
+SETTINGS_COLLECTION = "email_settings"
+
+# Seconds before each retry of a send that failed transiently; past the last
+# one the email fails (a recurring email moves on to its next occurrence)
+RETRY_DELAYS = (60, 300, 900, 3600)
+
+def is_transient(error):
+    """True for send failures worth retrying: 4xx replies, dropped sessions and network errors"""
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    # Connection refused, timeouts, TLS errors; a missing attachment file won't come back
+    return isinstance(error, OSError) and not isinstance(error, (FileNotFoundError, PermissionError))
+
+class DeliveryStats:
+    """Rolling delivery counters and latencies for one transport"""
+
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.sessions = 0
+        self.reused = 0
+        self._latencies = deque(maxlen=window)
+        self._completed = deque(maxlen=window)
+
+    def record(self, latency, ok, reused):
+        with self._lock:
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self.reused += int(reused)
+            self._latencies.append(latency)
+            self._completed.append(time.monotonic())
+
+    def session_opened(self):
+        with self._lock:
+            self.sessions += 1
+
+    def snapshot(self):
+        """
+        Current counters
+
+        Returns:
+            dict: sent, failed, sessions, reused, throughput (messages/sec
+            over the recent window), p50_ms and p95_ms latency
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            completed = list(self._completed)
+            counters = {"sent": self.sent, "failed": self.failed, "sessions": self.sessions, "reused": self.reused}
+        span = completed[-1] - completed[0] if len(completed) > 1 else 0
+        counters["throughput"] = (len(completed) - 1) / span if span > 0 else 0.0
+        counters["p50_ms"] = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+        counters["p95_ms"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000 if latencies else 0.0
+        return counters
+
+class SMTPTransport:
+    """
+    Sends messages through a pool of authenticated SMTP sessions
+
+    Each session is opened (TLS + login) once and reused for many messages,
+    with ``RSET`` after each one so the next transaction starts clean. At
+    most ``max_connections`` messages are in flight to the relay at once;
+    sessions idle for longer than ``idle_timeout`` are closed instead of
+    reused, and a reused session the server has dropped is replaced
+    transparently.
+
+    Args:
+        host (str): SMTP server
+        port (int): SMTP port (465 means implicit TLS)
+        username (str): Login user, or empty for no authentication
+        password (str): Login password
+        sender (str): Default ``From`` address
+        starttls (bool): Upgrade the connection with STARTTLS
+        timeout (float): Socket timeout in seconds
+        max_connections (int): Concurrent sessions to this relay
+        idle_timeout (float): Seconds an unused session is kept open
+    """
+
+    def __init__(self, host, port=587, username="", password="", sender="", starttls=True, timeout=30,
+                 max_connections=4, idle_timeout=60):
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.stats = DeliveryStats()
+        self.local = False
+
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def __repr__(self):
+        return f"SMTPTransport({self.host}:{self.port})"
+
+    @property
+    def relay(self):
+        """Settings that identify this relay; equal relays can share one transport"""
+        return (self.host, self.port, self.username, self.password, self.sender, self.starttls)
+
+    def settings(self):
+        """Settings worth storing: everything but the password, which is only noted as required"""
+        return {"host": self.host, "port": self.port, "username": self.username, "sender": self.sender,
+                "starttls": self.starttls, "max_connections": self.max_connections,
+                "password_required": bool(self.password), "local": self.local}
+
+    def _connect(self):
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls(context=ssl.create_default_context())
+        if self.username:
+            server.login(self.username, self.password)
+        self.stats.session_opened()
+        return server
+
+    def _checkout(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                server, last_used = self._idle.pop()
+                if now - last_used < self.idle_timeout:
+                    return server, True
+                _quit(server)
+        return self._connect(), False
+
+    def _checkin(self, server):
+        try:
+            server.rset()
+        except (smtplib.SMTPException, OSError):
+            _quit(server)
+            return
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+
+    def send(self, message):
+        """Deliver one ``EmailMessage`` or ``StreamedMessage``"""
+        headers = message.headers if isinstance(message, StreamedMessage) else message
+        if not headers["From"] and self.sender:
+            headers["From"] = self.sender
+        transact = _send_streamed if isinstance(message, StreamedMessage) else smtplib.SMTP.send_message
+        with self._slots:
+            start = time.perf_counter()
+            server, reused = None, False
+            try:
+                server, reused = self._checkout()
+                try:
+                    transact(server, message)
+                except smtplib.SMTPServerDisconnected:
+                    if not reused:
+                        raise
+                    # The server dropped the idle session; retry once on a fresh one
+                    _quit(server)
+                    server, reused = None, False
+                    server = self._connect()
+                    transact(server, message)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # The server rejected this message but the session is still usable
+                self.stats.record(time.perf_counter() - start, False, reused)
+                if server is not None:
+                    self._checkin(server)
+                raise
+            except BaseException:
+                self.stats.record(time.perf_counter() - start, False, reused)
+                if server is not None:
+                    _quit(server)
+                raise
+            self.stats.record(time.perf_counter() - start, True, reused)
+            self._checkin(server)
+
+    def close(self):
+        """Close every idle session"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            _quit(server)
+
+    @classmethod
+    def from_env(cls):
+        """Transport configured from ``DASHBOARD_SMTP_*`` variables, or None"""
+        host = os.environ.get("DASHBOARD_SMTP_HOST")
+        if not host:
+            return None
+        return cls(
+            host,
+            port=os.environ.get("DASHBOARD_SMTP_PORT", 587),
+            username=os.environ.get("DASHBOARD_SMTP_USER", ""),
+            password=os.environ.get("DASHBOARD_SMTP_PASSWORD", ""),
+            sender=os.environ.get("DASHBOARD_SMTP_FROM", ""),
+            starttls=os.environ.get("DASHBOARD_SMTP_STARTTLS", "1") != "0",
+        )
+
+def _quit(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+class LocalSMTPServer:
+    """
+    Local SMTP sink for trying the scheduler without a real mail server
+
+    Runs an ``aiosmtpd`` server in a background thread and keeps every
+    message it receives in memory.
+
+    Args:
+        host (str): Interface to listen on
+        port (int): Port to listen on
+    """
+
+    def __init__(self, host="127.0.0.1", port=8025):
+        if not AIOSMTPD_AVAILABLE:
+            raise RuntimeError("aiosmtpd is not installed. Install it with: pip install aiosmtpd")
+        self.messages = []
+        self._controller = Controller(self, hostname=host, port=port, data_size_limit=100 * 1024 * 1024)
+        self._controller.start()
+        self.host, self.port = host, port
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append({
+            "from": envelope.mail_from,
+            "to": list(envelope.rcpt_tos),
+            "data": envelope.content,
+            "received_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        return "250 Message accepted for delivery"
+
+    def transport(self, sender="scheduler@localhost"):
+        """An ``SMTPTransport`` pointed at this server"""
+        transport = SMTPTransport(self.host, self.port, sender=sender, starttls=False)
+        transport.local = True
+        return transport
+
+    def stop(self):
+        self._controller.stop()
+
+class StreamedMessage:
+    """
+    Multipart email whose attachments are read from disk while it is sent
+
+    Only the headers and the text part are held in memory. Attachments are
+    read from the attachment store in chunks and base64-encoded on the fly,
+    so sending a large file needs a fixed amount of memory however big the
+    file is.
+
+    Args:
+        headers (EmailMessage): Message headers (no body)
+        body (str): Plain text body
+        attachments (list): Attachment references from ``AttachmentStore.put``
+        store (AttachmentStore): Store holding the attachment content
+    """
+
+    # Whole base64 lines per read: 57 input bytes encode to one 76 character line
+    READ_SIZE = 57 * 1152
+
+    def __init__(self, headers, body, attachments, store):
+        self.headers = headers
+        self.body = body
+        self.attachments = attachments
+        self.store = store
+
+    def iter_bytes(self):
+        """Yield the message as SMTP-ready bytes (CRLF line endings, dot-stuffed)"""
+        boundary = f"=_{uuid.uuid4().hex}".encode()
+        headers = EmailMessage()
+        for name, value in self.headers.items():
+            headers[name] = value
+        headers["MIME-Version"] = "1.0"
+        headers["Content-Type"] = f'multipart/mixed; boundary="{boundary.decode()}"'
+        yield _header_bytes(headers) + b"\r\n"
+
+        text = MIMEPart()
+        text.set_content(self.body)
+        yield b"--" + boundary + b"\r\n" + _DOT_AT_LINE_START.sub(b"..", text.as_bytes(policy=policy.SMTP))
+
+        for attachment in self.attachments:
+            part = MIMEPart()
+            part["Content-Type"] = attachment["content_type"]
+            part.add_header("Content-Disposition", "attachment", filename=attachment["filename"])
+            part["Content-Transfer-Encoding"] = "base64"
+            yield b"\r\n--" + boundary + b"\r\n" + _header_bytes(part) + b"\r\n"
+            # Base64 output never starts a line with ".", so no dot-stuffing is needed here
+            for chunk in self.store.iter_chunks(attachment["sha256"], chunk_size=self.READ_SIZE):
+                yield base64.encodebytes(chunk).replace(b"\n", b"\r\n")
+
+        yield b"\r\n--" + boundary + b"--\r\n"
+
+_DOT_AT_LINE_START = re.compile(rb"(?m)^\.")
+
+def _header_bytes(message):
+    return b"".join(policy.SMTP.fold_binary(name, value) for name, value in message.items())
+
+def _send_streamed(server, message):
+    """Run one SMTP transaction, writing the DATA section chunk by chunk"""
+    sender = getaddresses([message.headers["From"]])[0][1]
+    recipients = [address for _, address in getaddresses(message.headers.get_all("To", []) + message.headers.get_all("Cc", []))]
+
+    server.ehlo_or_helo_if_needed()
+    code, response = server.mail(sender)
+    if code != 250:
+        raise smtplib.SMTPSenderRefused(code, response, sender)
+    refused = {}
+    for recipient in recipients:
+        code, response = server.rcpt(recipient)
+        if code not in (250, 251):
+            refused[recipient] = (code, response)
+    if len(refused) == len(recipients):
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    code, response = server.docmd("data")
+    if code != 354:
+        raise smtplib.SMTPDataError(code, response)
+    for chunk in message.iter_bytes():
+        server.send(chunk)
+    server.send(b".\r\n")
+    code, response = server.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, response)
+    return refused
+
+def build_message(email, store=None):
+    """
+    Turn a scheduled email record into a message
+
+    Returns:
+        EmailMessage or StreamedMessage: A ``StreamedMessage`` when the
+        email has attachments (read from ``store``), else an ``EmailMessage``
+    """
+    message = EmailMessage()
+    message["To"] = email["recipient"]
+    message["Subject"] = email["subject"]
+    if email.get("sender"):
+        message["From"] = email["sender"]
+    if email.get("priority") in ("High", "Urgent"):
+        message["X-Priority"] = "1" if email["priority"] == "Urgent" else "2"
+        message["Importance"] = "high"
+    if email.get("attachments"):
+        return StreamedMessage(message, email["body"], email["attachments"], store)
+    message.set_content(email["body"])
+    return message
+
+def next_occurrence(email, after):
+    """
+    Next send time of a recurring email strictly after ``after``
+
+    Monthly emails are anchored on the day they were first scheduled, so an
+    email set for the 31st goes out on the last day of shorter months and
+    returns to the 31st afterwards.
+
+    Returns:
+        datetime: Next send time, or None for one-off emails
+    """
+    repeat = email.get("repeat", "Never")
+    anchor = datetime.strptime(email.get("anchor_time") or email["scheduled_time"], TIME_FORMAT)
+    current = datetime.strptime(email["scheduled_time"], TIME_FORMAT)
+
+    if repeat in ("Daily", "Weekly"):
+        step = timedelta(days=1 if repeat == "Daily" else 7)
+        # Skip occurrences missed while the dispatcher was down in one step
+        missed = max(0, int((after - current) / step))
+        current += step * missed
+        while current <= after:
+            current += step
+        return current
+
+    if repeat == "Monthly":
+        months = (current.year - anchor.year) * 12 + (current.month - anchor.month)
+        while current <= after:
+            months += 1
+            year, month = divmod(anchor.month - 1 + months, 12)
+            year += anchor.year
+            day = min(anchor.day, calendar.monthrange(year, month + 1)[1])
+            current = anchor.replace(year=year, month=month + 1, day=day)
+        return current
+
+    return None
+
+class EmailDispatcher:
+    """
+    Background sender for scheduled emails
+
+    Pending emails are kept in a heap ordered by send time. A single worker
+    thread sleeps on a condition until the earliest deadline (or until a new
+    email is scheduled ahead of it), so thousands of pending emails cost no
+    polling. An email cancelled while it is being sent is not written back
+    or queued again once the send finishes. Everything due at that moment is taken as one batch, grouped by
+    relay and handed to a small sender pool, with at most the relay's
+    ``max_connections`` senders per relay so one busy relay can't starve
+    the others. Recurring emails are pushed back with their next occurrence,
+    and every outcome is written back to the ``scheduled_emails``
+    collection. A transient failure is retried after each of
+    ``RETRY_DELAYS``; the attempt count and retry time are stored with the
+    email, so retries survive a restart. Emails that come due before their
+    namespace has a transport are held until one is set.
+
+    Transport settings are stored in ``email_settings`` without the
+    password and restored on start. A namespace whose relay needs a password
+    stays without a transport (``awaiting_password``) until it is entered
+    again.
+
+    Args:
+        backend: Storage backend holding the ``scheduled_emails`` collection
+        default_transport: Transport used by namespaces without their own
+        max_workers (int): Messages sent concurrently across all relays
+        attachments (AttachmentStore): Where attachment content is read from
+        local_server (callable): Returns the ``LocalSMTPServer`` for restoring "local test server" settings
+    """
+
+    def __init__(self, backend, default_transport=None, max_workers=8, attachments=None, local_server=None):
+        self.backend = backend
+        self.default_transport = default_transport
+        self.attachments = attachments
+        self.local_server = local_server
+        self.transports = {}
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+        self._relays = {} if default_transport is None else {default_transport.relay: default_transport}
+        self._senders = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="email-sender")
+
+        self._heap = []
+        self._jobs = {}
+        self._held = {}
+        self._in_flight = set()
+        self._cancelled = set()
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._awaiting_password = {}
+
+        for namespace in backend.namespaces(SETTINGS_COLLECTION):
+            self._restore_transport(namespace)
+        for namespace in backend.namespaces(COLLECTION):
+            for email in backend.fetch(COLLECTION, namespace, status="Scheduled"):
+                self.schedule(namespace, email)
+
+        self._thread = threading.Thread(target=self._run, name="email-dispatcher", daemon=True)
+        self._thread.start()
+
+    def set_transport(self, namespace, transport, persist=True):
+        """
+        Use ``transport`` for one namespace's emails (None restores the default)
+
+        Namespaces configured with the same relay share one transport, and
+        with it one session pool and concurrency cap. With ``persist`` the
+        settings (minus the password) are stored for the next start.
+        """
+        if persist:
+            self.backend.clear(SETTINGS_COLLECTION, namespace)
+            if transport is not None:
+                self.backend.append(SETTINGS_COLLECTION, namespace, transport.settings())
+        with self._condition:
+            self._awaiting_password.pop(namespace, None)
+            if transport is None:
+                self.transports.pop(namespace, None)
+            else:
+                transport = self._relays.setdefault(transport.relay, transport)
+                self.transports[namespace] = transport
+            held = [] if self.transport_for(namespace) is None else self._held.pop(namespace, [])
+        for email in held:
+            self.schedule(namespace, email)
+
+    def saved_settings(self, namespace):
+        """Stored transport settings for a namespace (no password), or None"""
+        records = self.backend.fetch(SETTINGS_COLLECTION, namespace, limit=1)
+        return records[0] if records else None
+
+    def _restore_transport(self, namespace):
+        settings = self.saved_settings(namespace)
+        if settings is None:
+            return
+        if settings.get("local"):
+            if self.local_server is not None:
+                self.set_transport(namespace, self.local_server().transport(), persist=False)
+            return
+        if settings.get("password_required"):
+            # The password is never stored; hold emails until it is entered again
+            self._awaiting_password[namespace] = settings
+            return
+        self.set_transport(namespace, SMTPTransport(
+            settings["host"], settings["port"], settings["username"], "", settings["sender"], settings["starttls"],
+            max_connections=settings["max_connections"],
+        ), persist=False)
+
+    def awaiting_password(self, namespace):
+        """Stored settings of a relay that can't be used until its password is re-entered, or None"""
+        with self._condition:
+            return self._awaiting_password.get(namespace)
+
+    def transport_for(self, namespace):
+        if namespace in self._awaiting_password:
+            # Its own relay is configured, just locked; don't fall back to the default
+            return None
+        return self.transports.get(namespace, self.default_transport)
+
+    def schedule(self, namespace, email):
+        """Queue (or re-queue after an edit) a stored email"""
+        # fromisoformat reads both TIME_FORMAT and RETRY_TIME_FORMAT
+        due = datetime.fromisoformat(email.get("retry_time") or email["scheduled_time"]).timestamp()
+        key = (namespace, email["id"])
+        with self._condition:
+            self._jobs[key] = (due, dict(email))
+            heapq.heappush(self._heap, (due, next(self._seq), key))
+            # Only wake the worker if this email is now the earliest one
+            if self._heap[0][2] == key:
+                self._condition.notify()
+
+    def cancel(self, namespace, email_id):
+        """Forget a queued email; its stale heap entry is skipped when it surfaces"""
+        key = (namespace, email_id)
+        with self._condition:
+            self._jobs.pop(key, None)
+            if key in self._in_flight:
+                self._cancelled.add(key)
+            if namespace in self._held:
+                self._held[namespace] = [email for email in self._held[namespace] if email["id"] != email_id]
+
+    def pending(self, namespace=None):
+        with self._condition:
+            return sum(1 for key in self._jobs if namespace is None or key[0] == namespace)
+
+    def held(self, namespace):
+        """Number of due emails waiting for the namespace to get a transport"""
+        with self._condition:
+            return len(self._held.get(namespace, []))
+
+    def next_due(self, namespace=None):
+        """Earliest pending send time, or None"""
+        with self._condition:
+            times = [due for key, (due, _) in self._jobs.items() if namespace is None or key[0] == namespace]
+        return datetime.fromtimestamp(min(times)) if times else None
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout=5)
+        self._senders.shutdown(wait=True)
+        for transport in self._relays.values():
+            transport.close()
+
+    def collect_attachments(self):
+        """Delete stored attachments that no scheduled or failed email refers to"""
+        if self.attachments is None:
+            return 0
+        referenced = set()
+        for namespace in self.backend.namespaces(COLLECTION):
+            for status in ("Scheduled", "Failed"):
+                for email in self.backend.fetch(COLLECTION, namespace, status=status):
+                    referenced.update(attachment["sha256"] for attachment in email.get("attachments", []))
+        return self.attachments.collect_garbage(referenced)
+
+    def _pop_due(self):
+        """Block until at least one email is due and return every due email, or None when stopped"""
+        with self._condition:
+            while not self._stopped:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                due, _, key = self._heap[0]
+                job = self._jobs.get(key)
+                if job is None or job[0] != due:
+                    heapq.heappop(self._heap)  # cancelled or rescheduled
+                    continue
+                delay = due - time.time()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+
+                batch = []
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due, _, key = heapq.heappop(self._heap)
+                    job = self._jobs.get(key)
+                    if job is not None and job[0] == due:
+                        del self._jobs[key]
+                        self._in_flight.add(key)
+                        batch.append((key[0], job[1]))
+                return batch
+        return None
+
+    def _run(self):
+        self.collect_attachments()
+        while True:
+            batch = self._pop_due()
+            if batch is None:
+                return
+
+            # Group the batch by relay; namespaces without a transport wait
+            groups = {}
+            with self._condition:
+                for namespace, email in batch:
+                    transport = self.transport_for(namespace)
+                    if transport is None:
+                        if self._land(namespace, email):
+                            continue
+                        self._held.setdefault(namespace, []).append(email)
+                    else:
+                        groups.setdefault(id(transport), (transport, deque()))[1].append((namespace, email))
+
+            for transport, queue in groups.values():
+                for _ in range(min(transport.max_connections, len(queue))):
+                    self._senders.submit(self._drain, transport, queue)
+
+    def _drain(self, transport, queue):
+        """Send queued emails for one relay until the queue is empty"""
+        while True:
+            try:
+                namespace, email = queue.popleft()
+            except IndexError:
+                return
+            self._dispatch(transport, namespace, email)
+
+    def _dispatch(self, transport, namespace, email):
+        now = datetime.now()
+        try:
+            transport.send(build_message(email, self.attachments))
+        except Exception as e:
+            self._failed(namespace, email, e, now)
+            return
+
+        with self._condition:
+            self.sent += 1
+        email["last_sent"] = now.strftime(TIME_FORMAT)
+        email["sent_count"] = email.get("sent_count", 0) + 1
+        for field in ("error", "attempts", "retry_time"):
+            email.pop(field, None)
+        self._advance(namespace, email, now, "Sent")
+
+    def _failed(self, namespace, email, error, now):
+        """Retry a transient failure after the next ``RETRY_DELAYS`` step, otherwise give up on this occurrence"""
+        attempts = email.get("attempts", 0) + 1
+        email.update(error=str(error), last_attempt=now.strftime(TIME_FORMAT))
+        if is_transient(error) and attempts <= len(RETRY_DELAYS):
+            with self._condition:
+                self.retries += 1
+            email["attempts"] = attempts
+            email["retry_time"] = (now + timedelta(seconds=RETRY_DELAYS[attempts - 1])).strftime(RETRY_TIME_FORMAT)
+            self.backend.update(COLLECTION, namespace, email)
+            self._requeue(namespace, email)
+            return
+
+        with self._condition:
+            self.failed += 1
+        email.pop("attempts", None)
+        email.pop("retry_time", None)
+        email["failed_count"] = email.get("failed_count", 0) + 1
+        self._advance(namespace, email, now, "Failed")
+
+    def _advance(self, namespace, email, now, final_status):
+        """Move a recurring email on to its next occurrence, or close a one-off one with ``final_status``"""
+        upcoming = next_occurrence(email, now)
+        if upcoming is None:
+            email["status"] = final_status
+            self.backend.update(COLLECTION, namespace, email)
+            self._land(namespace, email)
+            return
+
+        email.setdefault("anchor_time", email["scheduled_time"])
+        email["scheduled_time"] = upcoming.strftime(TIME_FORMAT)
+        self.backend.update(COLLECTION, namespace, email)
+        self._requeue(namespace, email)
+
+    def _land(self, namespace, email):
+        """Stop tracking an email taken off the queue; True if it was cancelled meanwhile"""
+        key = (namespace, email["id"])
+        with self._condition:
+            self._in_flight.discard(key)
+            if key in self._cancelled:
+                self._cancelled.discard(key)
+                return True
+            return False
+
+    def _requeue(self, namespace, email):
+        """Queue an email again after a send, unless it was cancelled (or deleted) while in flight"""
+        with self._condition:
+            if not self._land(namespace, email):
+                self.schedule(namespace, email)
+
+@st.cache_resource
+def get_dispatcher():
+    """Return the process-wide dispatcher, started on first use"""
+    return EmailDispatcher(get_storage(), default_transport=SMTPTransport.from_env(), attachments=get_attachment_store(),
+                           local_server=get_local_smtp_server if AIOSMTPD_AVAILABLE else None)
+
+@st.cache_resource
+def get_local_smtp_server(port=8025):
+    """Return the shared local test SMTP server, started on first use"""
+    return LocalSMTPServer(port=port)
@@ -1,30 +1,123 @@
 import streamlit as st
 from datetime import datetime, timedelta
-import time
+from tools.fragments import fragment, rerun_fragment
+from tools.storage import get_collection
+from tools.templating import compile_template, show_field_inputs
+from tools.attachment_store import get_attachment_store
+from tools.email_dispatch import AIOSMTPD_AVAILABLE, RETRY_DELAYS, SMTPTransport, get_dispatcher, get_local_smtp_server
+
+EMAILS_PER_PAGE = 10
 
 def run_email_scheduler():
     """Run the email scheduler tool"""
     st.markdown("## 📧 Email Scheduler")
     
-    st.info("📅 This is a simulated email scheduler interface. In a real implementation, you would integrate with email services like Gmail API, SMTP, etc.")
+    show_delivery_settings()
+    show_email_compose()
+    show_scheduled_emails()
+    show_email_templates()
+
+@fragment
+def show_delivery_settings():
+    """SMTP settings used by the background dispatcher for this profile"""
+    dispatcher = get_dispatcher()
+    namespace = get_collection("scheduled_emails").namespace
+    transport = dispatcher.transport_for(namespace)
+    # Stored settings (never the password) prefill the form
+    saved = dispatcher.saved_settings(namespace) or {}
+    
+    with st.expander("📮 Delivery Settings", expanded=transport is None):
+        options = ["SMTP server"] + (["Local test server"] if AIOSMTPD_AVAILABLE else [])
+        mode = st.radio("Send through", options, index=len(options) - 1 if saved.get("local") else 0,
+                        horizontal=True, key="email_transport_mode")
+        
+        if mode == "SMTP server":
+            col1, col2 = st.columns(2)
+            with col1:
+                host = st.text_input("SMTP Host", value=saved.get("host", ""), placeholder="smtp.gmail.com", key="smtp_host")
+                username = st.text_input("Username", value=saved.get("username", ""), key="smtp_username")
+                sender = st.text_input("From Address", value=saved.get("sender", ""), key="smtp_sender",
+                                       help="Defaults to the username")
+            with col2:
+                port = st.number_input("Port", min_value=1, max_value=65535, value=saved.get("port", 587), key="smtp_port")
+                password = st.text_input("Password", type="password", key="smtp_password",
+                                         help="Kept in memory only; re-enter it after a restart")
+                starttls = st.checkbox("Use STARTTLS", value=saved.get("starttls", True), key="smtp_starttls",
+                                       help="Port 465 always uses TLS")
+            max_connections = st.slider("Concurrent Connections", 1, 16, saved.get("max_connections", 4),
+                                        key="smtp_max_connections",
+                                        help="Sessions kept open to this server; each one sends many emails")
+            
+            if st.button("💾 Save Delivery Settings"):
+                if host:
+                    dispatcher.set_transport(namespace, SMTPTransport(host, port, username, password, sender, starttls,
+                                                                      max_connections=max_connections))
+                    st.success(f"Emails will be sent through {host}:{port}")
+                    rerun_fragment()
+                else:
+                    st.error("Please enter an SMTP host!")
+        else:
+            server = get_local_smtp_server()
+            st.caption(f"Messages are delivered to a local SMTP sink on {server.host}:{server.port} and kept in memory.")
+            if st.button("💾 Use Local Test Server"):
+                dispatcher.set_transport(namespace, server.transport())
+                rerun_fragment()
+            if server.messages:
+                st.write(f"**Received ({len(server.messages)}):**")
+                for message in server.messages[-5:][::-1]:
+                    st.caption(f"{message['received_at']} → {', '.join(message['to'])}")
+    
+    if transport is None:
+        held = dispatcher.held(namespace)
+        due = f" ({held} due now)." if held else "."
+        awaiting = dispatcher.awaiting_password(namespace)
+        if awaiting:
+            st.warning(f"⚠️ Emails are held: the password for {awaiting['username']}@{awaiting['host']} isn't stored "
+                       f"across restarts. Re-enter it under Delivery Settings to resume sending{due}")
+        else:
+            st.warning("⚠️ No SMTP server configured. Scheduled emails are held until one is set up" + due)
+    else:
+        st.caption(f"📤 Sending through {transport.host}:{transport.port} "
+                   f"(up to {transport.max_connections} connections)")
+        stats = transport.stats.snapshot()
+        if stats["sent"] or stats["failed"]:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Delivered", stats["sent"], help=f"{stats['failed']} failed")
+            with col2:
+                st.metric("Throughput", f"{stats['throughput']:.1f} msg/s")
+            with col3:
+                st.metric("Latency p50 / p95", f"{stats['p50_ms']:.0f} / {stats['p95_ms']:.0f} ms")
+            with col4:
+                st.metric("SMTP Sessions", stats["sessions"], help=f"{stats['reused']} sends reused an open session")
+
+@fragment
+def show_email_compose():
+    """Compose form, rerun on its own"""
+    scheduled_emails = get_collection("scheduled_emails")
     
-    # Initialize session state
-    if 'scheduled_emails' not in st.session_state:
-        st.session_state.scheduled_emails = []
+    if "email_pending_template" in st.session_state:
+        template = st.session_state.pop("email_pending_template")
+        st.session_state.email_subject = template["subject"]
+        st.session_state.email_body = template["body"]
     
     # Email composition
     with st.expander("✍️ Compose Email", expanded=True):
         col1, col2 = st.columns(2)
         
         with col1:
-            recipient = st.text_input("To (Email)")
-            subject = st.text_input("Subject")
+            recipient = st.text_input("To (Email)", help="Separate multiple recipients with commas")
+            subject = st.text_input("Subject", key="email_subject")
         
         with col2:
-            schedule_date = st.date_input("Schedule Date", min_value=datetime.now().date())
-            schedule_time = st.time_input("Schedule Time", value=datetime.now().time())
+            schedule_date = st.date_input("Schedule Date", min_value=datetime.now().date(), key="email_schedule_date")
+            schedule_time = st.time_input("Schedule Time", value=datetime.now().time(), key="email_schedule_time")
+        
+        message_body = st.text_area("Message Body", height=200, key="email_body")
         
-        message_body = st.text_area("Message Body", height=200)
+        # Placeholders are filled in once for the whole email
+        subject_template, body_template = compile_template(subject), compile_template(message_body)
+        fields = show_field_inputs(compile_template(subject + "\n" + message_body), "email_fields", exclude=())
         
         # Email options
         col1, col2, col3 = st.columns(3)
@@ -33,17 +126,19 @@ def run_email_scheduler():
         with col2:
             repeat = st.selectbox("Repeat", ["Never", "Daily", "Weekly", "Monthly"])
         with col3:
-            attachments = st.file_uploader("Attachments", accept_multiple_files=True)
+            # A fresh key after each scheduled email drops the uploaded bytes from memory
+            upload_round = st.session_state.get("email_attachments_round", 0)
+            attachments = st.file_uploader("Attachments", accept_multiple_files=True,
+                                           key=f"email_attachments_{upload_round}")
         
         if st.button("📅 Schedule Email", type="primary"):
             if recipient and subject and message_body:
                 scheduled_datetime = datetime.combine(schedule_date, schedule_time)
                 
                 new_email = {
-                    "id": len(st.session_state.scheduled_emails) + 1,
                     "recipient": recipient,
-                    "subject": subject,
-                    "body": message_body,
+                    "subject": subject_template.render(fields),
+                    "body": body_template.render(fields),
                     "scheduled_time": scheduled_datetime.strftime("%Y-%m-%d %H:%M"),
                     "priority": priority,
                     "repeat": repeat,
@@ -51,26 +146,68 @@ def run_email_scheduler():
                     "created_at": datetime.now().strftime("%Y-%m-%d %H:%M")
                 }
                 
-                st.session_state.scheduled_emails.append(new_email)
+                # Content goes to the shared attachment store; the email keeps only references
+                if attachments:
+                    store = get_attachment_store()
+                    new_email["attachments"] = [store.put(upload, upload.name, upload.type) for upload in attachments]
+                    st.session_state.email_attachments_round = upload_round + 1
+                
+                scheduled_emails.add(new_email)
+                get_dispatcher().schedule(scheduled_emails.namespace, new_email)
                 st.success(f"Email scheduled for {scheduled_datetime.strftime('%Y-%m-%d %H:%M')}!")
+                # The scheduled list is a separate fragment, so refresh the whole page
                 st.rerun()
             else:
                 st.error("Please fill in all required fields!")
+
+@fragment(run_every=15)
+def show_scheduled_emails():
+    """Scheduled list and statistics, refreshed periodically to pick up sends"""
+    scheduled_emails = get_collection("scheduled_emails")
+    dispatcher = get_dispatcher()
     
     # Scheduled emails list
     st.markdown("### 📋 Scheduled Emails")
     
-    if not st.session_state.scheduled_emails:
+    if not scheduled_emails.count():
         st.info("No emails scheduled yet.")
     else:
-        for email in st.session_state.scheduled_emails:
+        status = st.selectbox("Show", ["All", "Scheduled", "Sent", "Failed"], key="scheduled_emails_status")
+        filters = {} if status == "All" else {"status": status}
+        # Cursors of the pages above the current one; changing the filter starts over
+        state = st.session_state.setdefault("scheduled_emails_pages", {"status": None, "cursors": [None]})
+        if state["status"] != status:
+            state.update(status=status, cursors=[None])
+        emails, next_cursor = scheduled_emails.page(EMAILS_PER_PAGE, state["cursors"][-1], **filters)
+        if not emails:
+            st.caption(f"No {status.lower()} emails.")
+        
+        for email in emails:
             with st.container():
                 col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
                 
                 with col1:
-                    st.write(f"**{email['subject']}**")
-                    st.caption(f"To: {email['recipient']}")
-                    st.caption(f"Scheduled: {email['scheduled_time']}")
+                    status_icon = {"Scheduled": "⏳", "Sent": "✅", "Failed": "❌"}.get(email['status'], "")
+                    st.write(f"{status_icon} **{email['subject']}**")
+                    recipients = [address.strip() for address in email['recipient'].split(",")]
+                    more = f" (+{len(recipients) - 3} more)" if len(recipients) > 3 else ""
+                    st.caption(f"To: {', '.join(recipients[:3])}{more}")
+                    if email.get('attachments'):
+                        total_mb = sum(attachment['size'] for attachment in email['attachments']) / (1024 * 1024)
+                        names = ", ".join(attachment['filename'] for attachment in email['attachments'])
+                        st.caption(f"📎 {names} ({total_mb:.1f} MB)")
+                    if email['status'] == "Scheduled":
+                        st.caption(f"Scheduled: {email['scheduled_time']}")
+                        if email.get('retry_time'):
+                            st.caption(f"⚠️ Retry {email['attempts']}/{len(RETRY_DELAYS)} at {email['retry_time']}: "
+                                       f"{email.get('error', 'unknown error')}")
+                        elif email.get('error'):
+                            st.caption(f"⚠️ Last occurrence failed: {email['error']} "
+                                       f"({email.get('failed_count', 1)} failed so far)")
+                    if email.get('last_sent'):
+                        st.caption(f"Last sent: {email['last_sent']} ({email.get('sent_count', 1)} total)")
+                    if email['status'] == "Failed":
+                        st.caption(f"Failed: {email.get('error', 'unknown error')}")
                 
                 with col2:
                     priority_color = {"Normal": "🟢", "High": "🟡", "Urgent": "🔴"}
@@ -80,12 +217,63 @@ def run_email_scheduler():
                     st.write(f"🔄 {email['repeat']}")
                 
                 with col4:
-                    if st.button("❌", key=f"delete_{email['id']}"):
-                        st.session_state.scheduled_emails = [e for e in st.session_state.scheduled_emails if e['id'] != email['id']]
-                        st.rerun()
+                    if email['status'] == "Failed" and st.button("🔁", key=f"retry_{email['id']}", help="Retry now"):
+                        email.update(status="Scheduled", scheduled_time=datetime.now().strftime("%Y-%m-%d %H:%M"))
+                        for field in ('error', 'attempts', 'retry_time'):
+                            email.pop(field, None)
+                        scheduled_emails.update(email)
+                        dispatcher.schedule(scheduled_emails.namespace, email)
+                        rerun_fragment()
+                    if st.button("🗑️", key=f"delete_{email['id']}"):
+                        dispatcher.cancel(scheduled_emails.namespace, email['id'])
+                        scheduled_emails.delete(email['id'])
+                        if email.get('attachments'):
+                            dispatcher.collect_attachments()
+                        rerun_fragment()
                 
                 st.divider()
+        
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("⬅️ Newer", key="scheduled_emails_newer", disabled=len(state["cursors"]) == 1):
+                state["cursors"].pop()
+                rerun_fragment()
+        with col2:
+            st.caption(f"Page {len(state['cursors'])} · {scheduled_emails.count(**filters):,} emails")
+        with col3:
+            if st.button("Older ➡️", key="scheduled_emails_older", disabled=next_cursor is None):
+                state["cursors"].append(next_cursor)
+                rerun_fragment()
+    
+    # Statistics
+    st.markdown("### 📊 Statistics")
+    
+    total_scheduled = scheduled_emails.count()
+    pending_emails = scheduled_emails.count(status="Scheduled")
+    sent_emails = scheduled_emails.count(status="Sent")
+    failed_emails = scheduled_emails.count(status="Failed")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Total Scheduled", total_scheduled)
     
+    with col2:
+        st.metric("Pending", pending_emails)
+    
+    with col3:
+        st.metric("Sent", sent_emails)
+    
+    with col4:
+        st.metric("Failed", failed_emails)
+    
+    next_due = dispatcher.next_due(scheduled_emails.namespace)
+    if next_due:
+        st.caption(f"⏰ Next send: {next_due.strftime('%Y-%m-%d %H:%M')}")
+
+@fragment
+def show_email_templates():
+    """Template picker, rerun on its own"""
     # Email templates
     st.markdown("### 📝 Email Templates")
     
@@ -113,22 +301,6 @@ def run_email_scheduler():
         
         if st.button("Use Template"):
             st.session_state.email_template = template
+            # The compose form picks this up before it is drawn on the next page run
+            st.session_state.email_pending_template = template
             st.rerun()
-    
-    # Statistics
-    st.markdown("### 📊 Statistics")
-    
-    total_scheduled = len(st.session_state.scheduled_emails)
-    pending_emails = len([e for e in st.session_state.scheduled_emails if e['status'] == 'Scheduled'])
-    sent_emails = len([e for e in st.session_state.scheduled_emails if e['status'] == 'Sent'])
-    
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.metric("Total Scheduled", total_scheduled)
-    
-    with col2:
-        st.metric("Pending", pending_emails)
-    
-    with col3:
-        st.metric("Sent", sent_emails)
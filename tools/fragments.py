@@ -0,0 +1,28 @@
+import streamlit as st
+from streamlit.errors import StreamlitAPIException
+
+def fragment(func=None, *, run_every=None):
+    """
+    Mark a panel as independently rerunnable
+
+    Widget interactions inside a fragment rerun only that function instead
+    of the whole app script (CSS, sidebar, routing and every other panel).
+    Needs ``st.fragment`` (Streamlit 1.37+), which the requirements pin.
+
+    Args:
+        func (callable): Panel function to wrap
+        run_every (float): Optional auto-refresh interval in seconds
+    """
+    def decorate(panel):
+        if run_every is None:
+            return st.fragment(panel)
+        return st.fragment(run_every=run_every)(panel)
+
+    return decorate(func) if func is not None else decorate
+
+def rerun_fragment():
+    """Rerun only the current fragment, or the whole app when called outside one"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
@@ -0,0 +1,220 @@
+import streamlit as st
+import calendar
+from datetime import datetime
+import pandas as pd
+from tools.storage import Collection
+
+ITEM_COLUMNS = ["id", "name", "category", "quantity", "unit", "priority", "estimated_price", "completed"]
+HISTORY_COLUMNS = ["id", "date", "name", "category", "amount"]
+
+def _item_frame(records):
+    """Columnar view of shopping list items, indexed by item id"""
+    frame = pd.DataFrame.from_records(records, columns=ITEM_COLUMNS)
+    frame["estimated_price"] = pd.to_numeric(frame["estimated_price"], errors="coerce").fillna(0.0)
+    frame["completed"] = frame["completed"].fillna(False).astype(bool)
+    frame.index = pd.Index(frame["id"].tolist())
+    return frame
+
+def _history_frame(records):
+    """Columnar view of history records (one row per purchase)"""
+    frame = pd.DataFrame.from_records(records, columns=["id", "completed_date", "name", "category", "estimated_price"])
+    frame = frame.rename(columns={"completed_date": "date", "estimated_price": "amount"})
+    frame["date"] = pd.to_datetime(frame["date"], errors="coerce")
+    frame["amount"] = pd.to_numeric(frame["amount"], errors="coerce").fillna(0.0)
+    return frame[HISTORY_COLUMNS]
+
+class GroceryAnalytics:
+    """
+    Columnar view of the shopping list and purchase history
+
+    Items and history are held as DataFrames and every aggregate is a
+    vectorized groupby / resample over them. History is append-only, so new
+    purchases are fetched by id and concatenated instead of reloading the
+    whole table; likewise only the items the store reports as changed are
+    replaced, added or dropped in the items frame. Aggregates are memoized
+    on the (items, history) version pair, so a rerun with unchanged data
+    never recomputes anything.
+
+    Args:
+        item_store (GroceryItemStore): Indexed shopping list
+        history (Collection): Purchase history (default: grocery_history)
+    """
+
+    def __init__(self, item_store, history=None):
+        self.item_store = item_store
+        self.history_collection = history or Collection("grocery_history")
+        self.items = _item_frame([])
+        self.history = _history_frame([])
+        self._items_version = None
+        self._history_version = None
+        self._cache = {}
+
+    def refresh(self):
+        """Bring both frames up to date with storage"""
+        revision = self.item_store.revision
+        if revision != self._items_version:
+            changed = None if self._items_version is None else self.item_store.changed_since(self._items_version)
+            # Past half the list, one rebuild is cheaper than the deltas
+            if changed is None or len(changed) > len(self.items) // 2:
+                self.items = _item_frame(self.item_store.items())
+            else:
+                self._apply_item_changes(changed)
+            self._items_version = revision
+
+        backend = self.history_collection.backend
+        name, namespace = self.history_collection.name, self.history_collection.namespace
+        version = backend.version(name, namespace)
+        if version != self._history_version:
+            last_id = int(self.history["id"].max()) if len(self.history) else None
+            new_rows = backend.fetch(name, namespace, after_id=last_id)
+            # Anything other than appends (deletes, a cleared history) means a full reload
+            if len(self.history) + len(new_rows) != backend.count(name, namespace):
+                self.history = _history_frame(backend.fetch(name, namespace))
+            elif new_rows:
+                self.history = pd.concat([self.history, _history_frame(new_rows)], ignore_index=True)
+            self._history_version = version
+        return self
+
+    def _apply_item_changes(self, item_ids):
+        """Replace, add or drop the rows of changed items"""
+        records = [self.item_store.get(item_id) for item_id in item_ids]
+        gone = [item_id for item_id, record in zip(item_ids, records) if record is None]
+        items = self.items.drop(index=self.items.index.intersection(gone))
+        present = [record for record in records if record is not None]
+        if present:
+            changed = _item_frame(present)
+            existing = changed.index.isin(items.index)
+            if existing.any():
+                items.loc[changed.index[existing], ITEM_COLUMNS] = changed.loc[existing, ITEM_COLUMNS]
+            if not existing.all():
+                # Ids only grow, so new items land at the end in order
+                items = pd.concat([items, changed[~existing]])
+        self.items = items
+
+    def _memoized(self, key, compute):
+        version = (self._items_version, self._history_version)
+        entry = self._cache.get(key)
+        if entry is None or entry[0] != version:
+            entry = self._cache[key] = (version, compute())
+        return entry[1]
+
+    def item_summary(self):
+        """Totals for the shopping list: items, completed, pending, pending value"""
+        def compute():
+            completed = int(self.items["completed"].sum())
+            pending_value = float(self.items.loc[~self.items["completed"], "estimated_price"].sum())
+            return {
+                "total": len(self.items),
+                "completed": completed,
+                "pending": len(self.items) - completed,
+                "pending_value": pending_value,
+            }
+        return self._memoized("item_summary", compute)
+
+    def category_breakdown(self):
+        """Items, pending items and pending value per category"""
+        def compute():
+            items = self.items.assign(
+                pending=~self.items["completed"],
+                pending_value=self.items["estimated_price"].where(~self.items["completed"], 0.0),
+            )
+            return (items.groupby("category")
+                    .agg(items=("id", "size"), pending=("pending", "sum"), pending_value=("pending_value", "sum"))
+                    .sort_values("items", ascending=False))
+        return self._memoized("category_breakdown", compute)
+
+    def priority_counts(self):
+        return self._memoized("priority_counts", lambda: self.items["priority"].value_counts())
+
+    def _spending(self):
+        # Purchases with a date and a price; free items don't count as spending
+        return self._memoized(
+            "spending",
+            lambda: self.history[self.history["date"].notna() & (self.history["amount"] > 0)].set_index("date").sort_index(),
+        )
+
+    def category_spend(self):
+        """Total spend, purchase count and average price per category"""
+        def compute():
+            return (self._spending().groupby("category")["amount"]
+                    .agg(total="sum", purchases="size", average="mean")
+                    .sort_values("total", ascending=False))
+        return self._memoized("category_spend", compute)
+
+    def spending_trend(self, freq="D"):
+        """
+        Spending per period
+
+        Args:
+            freq (str): Pandas offset alias, e.g. ``D`` (daily), ``W`` (weekly) or ``MS`` (monthly)
+
+        Returns:
+            pd.Series: Amount spent per period, empty periods included as 0
+        """
+        return self._memoized(("trend", freq), lambda: self._spending()["amount"].resample(freq).sum())
+
+    def category_trend(self, freq="MS"):
+        """Spending per period and category (one column per category)"""
+        def compute():
+            spending = self._spending()
+            return spending.groupby([pd.Grouper(freq=freq), "category"])["amount"].sum().unstack(fill_value=0.0)
+        return self._memoized(("category_trend", freq), compute)
+
+    def recent_transactions(self, limit=10):
+        def compute():
+            recent = self._spending().tail(limit).reset_index()
+            return recent[["date", "name", "category", "amount"]].iloc[::-1]
+        return self._memoized(("recent", limit), compute)
+
+    def burn_rate(self, monthly_budget, now=None):
+        """
+        This month's spending rate and where it is heading
+
+        Args:
+            monthly_budget (float): Budget for the calendar month
+            now (datetime): Reference time (default: now)
+
+        Returns:
+            dict: spent, daily_rate, projected (month-end total), days_left
+            (in the month) and days_until_budget_exhausted (None when the
+            budget won't run out this month at the current rate, or when
+            there is no budget)
+        """
+        now = now or datetime.now()
+        month_start = pd.Timestamp(now.year, now.month, 1)
+        day = now.day
+
+        def compute():
+            spending = self._spending()["amount"]
+            return float(spending[spending.index >= month_start].sum())
+
+        spent = self._memoized(("month_spent", month_start), compute)
+        days_in_month = calendar.monthrange(now.year, now.month)[1]
+        daily_rate = spent / day
+        remaining = monthly_budget - spent
+        if monthly_budget <= 0:
+            exhausted_in = None
+        elif remaining <= 0:
+            exhausted_in = 0
+        elif daily_rate > 0 and remaining / daily_rate < days_in_month - day:
+            exhausted_in = int(remaining / daily_rate)
+        else:
+            exhausted_in = None
+        return {
+            "spent": spent,
+            "daily_rate": daily_rate,
+            "projected": daily_rate * days_in_month,
+            "days_left": days_in_month - day,
+            "days_until_budget_exhausted": exhausted_in,
+        }
+
+def get_analytics(item_store):
+    """Return this session's analytics engine, refreshed against storage"""
+    analytics = st.session_state.get("grocery_analytics")
+    history = Collection("grocery_history")
+    if (analytics is None or analytics.item_store is not item_store
+            or analytics.history_collection.namespace != history.namespace
+            or analytics.history_collection.backend is not history.backend):
+        analytics = GroceryAnalytics(item_store, history)
+        st.session_state.grocery_analytics = analytics
+    return analytics.refresh()
@@ -3,27 +3,40 @@ import json
 import os
 from datetime import datetime, timedelta
 import pandas as pd
+from tools.fragments import fragment, rerun_fragment
+from tools.storage import get_collection
+from tools.grocery_store import get_item_store
+from tools.grocery_analytics import get_analytics
+
+DEFAULT_MONTHLY_BUDGET = 500
+
+def get_monthly_budget():
+    """The profile's monthly budget, stored next to the purchase history"""
+    records = get_collection("grocery_budget").recent(1)
+    return records[0]["monthly"] if records else DEFAULT_MONTHLY_BUDGET
+
+def set_monthly_budget(monthly):
+    budget = get_collection("grocery_budget")
+    records = budget.recent(1)
+    if records:
+        budget.update(dict(records[0], monthly=monthly))
+    else:
+        budget.add({"monthly": monthly})
+
+def _cell_number(value, default):
+    """A data editor cell as a float; cleared cells (None/NaN) keep ``default``"""
+    if value is None or pd.isna(value):
+        return default
+    return float(value)
 
 def run_grocery_manager():
     """Run the grocery manager tool"""
     st.markdown("## �� Grocery Manager")
     
-    # Initialize session state
-    if 'grocery_list' not in st.session_state:
-        st.session_state.grocery_list = []
-    
-    if 'grocery_history' not in st.session_state:
-        st.session_state.grocery_history = []
-    
+    # Items, history, budget and recipes live in persistent storage; the rest is per session
     if 'shopping_lists' not in st.session_state:
         st.session_state.shopping_lists = []
     
-    if 'budget' not in st.session_state:
-        st.session_state.budget = {"monthly": 500, "spent": 0, "remaining": 500}
-    
-    if 'recipes' not in st.session_state:
-        st.session_state.recipes = []
-    
     # Sidebar for navigation
     with st.sidebar:
         st.markdown("### 🧭 Navigation")
@@ -43,10 +56,13 @@ def run_grocery_manager():
     elif page == "⚙️ Settings":
         show_settings()
 
+@fragment
 def show_shopping_list():
     """Show the main shopping list interface"""
     st.markdown("### 📝 Shopping List")
     
+    item_store = get_item_store()
+    
     # Add new item section
     with st.expander("➕ Add New Item", expanded=False):
         col1, col2, col3 = st.columns(3)
@@ -71,7 +87,6 @@ def show_shopping_list():
         if st.button("➕ Add Item", use_container_width=True):
             if item_name:
                 new_item = {
-                    "id": len(st.session_state.grocery_list) + 1,
                     "name": item_name,
                     "quantity": quantity,
                     "unit": unit,
@@ -83,41 +98,53 @@ def show_shopping_list():
                     "completed": False,
                     "notes": ""
                 }
-                st.session_state.grocery_list.append(new_item)
+                item_store.add(new_item)
                 st.success(f"✅ Added {item_name} to your shopping list!")
-                st.rerun()
+                rerun_fragment()
     
     # Current list display
-    if not st.session_state.grocery_list:
+    if not len(item_store):
         st.info("🛒 Your shopping list is empty. Add some items to get started!")
     else:
         # Filter options
         col1, col2, col3 = st.columns(3)
         with col1:
-            filter_category = st.selectbox("Filter by Category", ["All"] + list(set([item["category"] for item in st.session_state.grocery_list])))
+            filter_category = st.selectbox("Filter by Category", ["All"] + item_store.values("category"))
         with col2:
             filter_priority = st.selectbox("Filter by Priority", ["All", "Low", "Medium", "High", "Urgent"])
         with col3:
             filter_status = st.selectbox("Filter by Status", ["All", "Pending", "Completed"])
         
-        # Apply filters
-        filtered_items = st.session_state.grocery_list
-        if filter_category != "All":
-            filtered_items = [item for item in filtered_items if item["category"] == filter_category]
-        if filter_priority != "All":
-            filtered_items = [item for item in filtered_items if item["priority"] == filter_priority]
-        if filter_status == "Pending":
-            filtered_items = [item for item in filtered_items if not item["completed"]]
-        elif filter_status == "Completed":
-            filtered_items = [item for item in filtered_items if item["completed"]]
+        # Apply filters through the store's indexes
+        filtered_ids = item_store.filter_ids(
+            category=None if filter_category == "All" else filter_category,
+            priority=None if filter_priority == "All" else filter_priority,
+            completed={"All": None, "Pending": False, "Completed": True}[filter_status],
+        )
+        
+        # View and paging options; only the visible page gets widgets
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            view_mode = st.radio("View", ["🗂️ Cards", "📋 Compact table"], horizontal=True, key="grocery_view_mode")
+        with col2:
+            page_size = st.selectbox("Items per page", [10, 25, 50, 100, 250], index=1, key="grocery_page_size")
+        with col3:
+            page_count = max(1, -(-len(filtered_ids) // page_size))
+            # The page lives in session state only, so it can be clamped when filters shrink the list
+            st.session_state.setdefault("grocery_page", 1)
+            if st.session_state.grocery_page > page_count:
+                st.session_state.grocery_page = page_count
+            page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, key="grocery_page")
+        
+        page_ids = filtered_ids[(page - 1) * page_size:page * page_size]
+        st.caption(f"Showing {len(page_ids)} of {len(filtered_ids)} matching items ({len(item_store)} total)")
+        
+        if view_mode == "📋 Compact table":
+            show_item_table(item_store, page_ids)
+            return
         
         # Group by category
-        categories = {}
-        for item in filtered_items:
-            cat = item["category"]
-            if cat not in categories:
-                categories[cat] = []
-            categories[cat].append(item)
+        categories = item_store.group_by_category(page_ids)
         
         # Display items
         for category, items in categories.items():
@@ -148,12 +175,8 @@ def show_shopping_list():
                         with col5:
                             if not item["completed"]:
                                 if st.button("✅", key=f"complete_{item['id']}"):
-                                    item["completed"] = True
-                                    item["completed_date"] = datetime.now().strftime("%Y-%m-%d %H:%M")
-                                    st.session_state.grocery_history.append(item.copy())
-                                    st.session_state.budget["spent"] += item["estimated_price"]
-                                    st.session_state.budget["remaining"] = st.session_state.budget["monthly"] - st.session_state.budget["spent"]
-                                    st.rerun()
+                                    complete_item(item_store, item)
+                                    rerun_fragment()
                             else:
                                 st.write("✅")
                         
@@ -163,43 +186,133 @@ def show_shopping_list():
                             with col_a1:
                                 if st.button("✏️ Edit", key=f"edit_{item['id']}"):
                                     st.session_state.editing_item = item['id']
-                                    st.rerun()
+                                    rerun_fragment()
                             with col_a2:
                                 if st.button("🗑️ Delete", key=f"delete_{item['id']}"):
-                                    st.session_state.grocery_list.remove(item)
-                                    st.rerun()
+                                    item_store.delete(item["id"])
+                                    rerun_fragment()
                             with col_a3:
                                 notes = st.text_input("Notes", value=item.get("notes", ""), key=f"notes_{item['id']}")
                                 if notes != item.get("notes", ""):
-                                    item["notes"] = notes
+                                    item_store.update(item["id"], notes=notes)
+
+def complete_item(item_store, item, **changes):
+    """Mark an item as bought and record it in the history (which is what the budget is charged from)"""
+    item = item_store.update(item["id"], completed=True, completed_date=datetime.now().strftime("%Y-%m-%d %H:%M"), **changes)
+    get_collection("grocery_history").add({k: v for k, v in item.items() if k != "id"})
+
+def show_item_table(item_store, page_ids):
+    """Compact, editable table of one page of items with bulk actions"""
+    if not page_ids:
+        st.info("No items match the selected filters.")
+        return
+    
+    items = [item_store.get(item_id) for item_id in page_ids]
+    table = pd.DataFrame({
+        "Select": False,
+        "ID": [item["id"] for item in items],
+        "Item": [item["name"] for item in items],
+        "Category": [item["category"] for item in items],
+        "Quantity": [item["quantity"] for item in items],
+        "Unit": [item["unit"] for item in items],
+        "Priority": [item["priority"] for item in items],
+        "Price ($)": [item["estimated_price"] for item in items],
+        "Done": [item["completed"] for item in items],
+        "Notes": [item.get("notes", "") for item in items],
+    })
+    
+    editor_key = f"grocery_table_{page_ids[0]}_{len(page_ids)}"
+    edited = st.data_editor(
+        table,
+        key=editor_key,
+        hide_index=True,
+        use_container_width=True,
+        disabled=["ID", "Item", "Category", "Unit"],
+        column_config={
+            "Select": st.column_config.CheckboxColumn("Select", help="Select rows for bulk actions"),
+            "Priority": st.column_config.SelectboxColumn("Priority", options=["Low", "Medium", "High", "Urgent"]),
+            "Quantity": st.column_config.NumberColumn("Quantity", min_value=0.1, step=0.1),
+            "Price ($)": st.column_config.NumberColumn("Price ($)", min_value=0.0, step=0.01, format="$%.2f"),
+        },
+    )
+    
+    selected_ids = edited.loc[edited["Select"], "ID"].tolist()
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("💾 Save Changes", use_container_width=True):
+            changed = 0
+            for row in edited.to_dict("records"):
+                item = item_store.get(row["ID"])
+                notes = row["Notes"]
+                changes = {
+                    "quantity": _cell_number(row["Quantity"], item["quantity"]),
+                    "priority": row["Priority"] or item["priority"],
+                    "estimated_price": _cell_number(row["Price ($)"], item["estimated_price"]),
+                    "notes": "" if notes is None or pd.isna(notes) else notes,
+                }
+                if row["Done"] and not item["completed"]:
+                    complete_item(item_store, item, **changes)
+                    changed += 1
+                    continue
+                elif not row["Done"] and item["completed"]:
+                    changes["completed"] = False
+                if any(item.get(key) != value for key, value in changes.items()):
+                    item_store.update(row["ID"], **changes)
+                    changed += 1
+            st.success(f"Saved changes to {changed} item(s)")
+            # Drop the editor's pending edits so it shows the stored values again
+            st.session_state.pop(editor_key, None)
+            rerun_fragment()
+    with col2:
+        if st.button(f"✅ Complete Selected ({len(selected_ids)})", use_container_width=True, disabled=not selected_ids):
+            for item_id in selected_ids:
+                item = item_store.get(item_id)
+                if not item["completed"]:
+                    complete_item(item_store, item)
+            st.session_state.pop(editor_key, None)
+            rerun_fragment()
+    with col3:
+        if st.button(f"🗑️ Delete Selected ({len(selected_ids)})", use_container_width=True, disabled=not selected_ids):
+            for item_id in selected_ids:
+                item_store.delete(item_id)
+            st.session_state.pop(editor_key, None)
+            rerun_fragment()
 
+@fragment
 def show_budget_tracker():
     """Show budget tracking interface"""
     st.markdown("### 💰 Budget Tracker")
     
+    # Spending is this month's purchase history, so it survives refreshes like the budget does
+    monthly = get_monthly_budget()
+    analytics = get_analytics(get_item_store())
+    burn = analytics.burn_rate(monthly)
+    spent = burn['spent']
+    
     # Budget overview
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Monthly Budget", f"${st.session_state.budget['monthly']:.2f}")
+        st.metric("Monthly Budget", f"${monthly:.2f}")
     
     with col2:
-        st.metric("Spent", f"${st.session_state.budget['spent']:.2f}")
+        st.metric("Spent", f"${spent:.2f}")
     
     with col3:
-        st.metric("Remaining", f"${st.session_state.budget['remaining']:.2f}")
+        st.metric("Remaining", f"${monthly - spent:.2f}")
     
     with col4:
-        if st.session_state.budget['monthly'] > 0:
-            progress = st.session_state.budget['spent'] / st.session_state.budget['monthly']
+        if monthly > 0:
+            progress = spent / monthly
             st.metric("Progress", f"{progress:.1%}")
         else:
             st.metric("Progress", "0%")
     
     # Budget progress bar
-    if st.session_state.budget['monthly'] > 0:
-        progress = st.session_state.budget['spent'] / st.session_state.budget['monthly']
-        st.progress(progress)
+    if monthly > 0:
+        progress = spent / monthly
+        st.progress(min(progress, 1.0))
         
         if progress > 0.9:
             st.warning("⚠️ You're approaching your monthly budget limit!")
@@ -210,51 +323,65 @@ def show_budget_tracker():
     with st.expander("⚙️ Budget Settings", expanded=False):
         col1, col2 = st.columns(2)
         with col1:
-            new_budget = st.number_input("Monthly Budget ($)", min_value=0, value=int(st.session_state.budget['monthly']), step=50)
+            new_budget = st.number_input("Monthly Budget ($)", min_value=0, value=int(monthly), step=50)
         with col2:
             if st.button("Update Budget"):
-                st.session_state.budget['monthly'] = new_budget
-                st.session_state.budget['remaining'] = new_budget - st.session_state.budget['spent']
+                set_monthly_budget(new_budget)
                 st.success("Budget updated successfully!")
-                st.rerun()
+                rerun_fragment()
+    
+    # Forecast from this month's purchases
+    st.markdown("### 🔥 Burn Rate")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Spent This Month", f"${burn['spent']:.2f}")
+    with col2:
+        st.metric("Daily Average", f"${burn['daily_rate']:.2f}")
+    with col3:
+        st.metric("Projected Month-End", f"${burn['projected']:.2f}")
+    with col4:
+        exhausted_in = burn['days_until_budget_exhausted']
+        if monthly <= 0:
+            lasts = "n/a"
+        else:
+            lasts = "Rest of month" if exhausted_in is None else f"{exhausted_in} days"
+        st.metric("Budget Lasts", lasts)
+    
+    if burn['projected'] > monthly > 0:
+        st.warning(f"⚠️ At this rate you'll spend ${burn['projected']:.2f}, "
+                   f"${burn['projected'] - monthly:.2f} over budget.")
     
     # Spending history
     st.markdown("### 📊 Spending History")
     
-    if st.session_state.grocery_history:
-        # Create spending data
-        spending_data = []
-        for item in st.session_state.grocery_history:
-            if item.get("completed_date") and item.get("estimated_price", 0) > 0:
-                spending_data.append({
-                    "date": item["completed_date"][:10],
-                    "item": item["name"],
-                    "amount": item["estimated_price"],
-                    "category": item["category"]
-                })
+    if len(analytics.recent_transactions()):
+        granularity = st.radio("Group by", ["Day", "Week", "Month"], horizontal=True, key="spending_granularity")
+        trend = analytics.spending_trend({"Day": "D", "Week": "W", "Month": "MS"}[granularity])
+        st.line_chart(trend.rename("Spent ($)"))
         
-        if spending_data:
-            df = pd.DataFrame(spending_data)
-            df['date'] = pd.to_datetime(df['date'])
-            
-            # Group by date
-            daily_spending = df.groupby('date')['amount'].sum().reset_index()
-            
-            # Display chart
-            st.line_chart(daily_spending.set_index('date'))
-            
-            # Recent transactions
-            st.markdown("#### Recent Transactions")
-            recent_transactions = df.tail(10)
-            for _, row in recent_transactions.iterrows():
-                st.write(f"📅 {row['date'].strftime('%Y-%m-%d')} - {row['item']} (${row['amount']:.2f})")
+        # Recent transactions
+        st.markdown("#### Recent Transactions")
+        st.dataframe(
+            analytics.recent_transactions(),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "date": st.column_config.DatetimeColumn("Date", format="YYYY-MM-DD HH:mm"),
+                "name": "Item",
+                "category": "Category",
+                "amount": st.column_config.NumberColumn("Amount", format="$%.2f"),
+            },
+        )
     else:
         st.info("No spending history available yet.")
 
+@fragment
 def show_recipe_manager():
     """Show recipe management interface"""
     st.markdown("### 📋 Recipe Manager")
     
+    recipes = get_collection("recipes")
+    
     # Add new recipe
     with st.expander("➕ Add New Recipe", expanded=False):
         recipe_name = st.text_input("Recipe Name")
@@ -286,7 +413,6 @@ def show_recipe_manager():
         if st.button("Save Recipe"):
             if recipe_name:
                 new_recipe = {
-                    "id": len(st.session_state.recipes) + 1,
                     "name": recipe_name,
                     "description": recipe_description,
                     "prep_time": prep_time,
@@ -296,14 +422,15 @@ def show_recipe_manager():
                     "ingredients": ingredients,
                     "created_date": datetime.now().strftime("%Y-%m-%d %H:%M")
                 }
-                st.session_state.recipes.append(new_recipe)
+                recipes.add(new_recipe)
                 st.success(f"✅ Recipe '{recipe_name}' saved successfully!")
-                st.rerun()
+                rerun_fragment()
     
     # Display recipes
-    if st.session_state.recipes:
+    saved_recipes = recipes.all()
+    if saved_recipes:
         st.markdown("#### Saved Recipes")
-        for recipe in st.session_state.recipes:
+        for recipe in saved_recipes:
             with st.expander(f"🍳 {recipe['name']} ({recipe['difficulty']})", expanded=False):
                 col1, col2 = st.columns([2, 1])
                 
@@ -317,9 +444,9 @@ def show_recipe_manager():
                 
                 with col2:
                     if st.button("🛒 Add to Shopping List", key=f"add_recipe_{recipe['id']}"):
+                        item_store = get_item_store()
                         for ingredient in recipe['ingredients']:
                             new_item = {
-                                "id": len(st.session_state.grocery_list) + 1,
                                 "name": ingredient['name'],
                                 "quantity": ingredient['amount'],
                                 "unit": ingredient['unit'],
@@ -331,89 +458,108 @@ def show_recipe_manager():
                                 "completed": False,
                                 "notes": f"From recipe: {recipe['name']}"
                             }
-                            st.session_state.grocery_list.append(new_item)
+                            item_store.add(new_item)
                         st.success(f"✅ Added all ingredients from '{recipe['name']}' to shopping list!")
-                        st.rerun()
+                        rerun_fragment()
     else:
         st.info("No recipes saved yet. Add your first recipe!")
 
+@fragment
 def show_analytics():
     """Show analytics and insights"""
     st.markdown("### 📊 Analytics & Insights")
     
-    if not st.session_state.grocery_list and not st.session_state.grocery_history:
+    item_store = get_item_store()
+    if not len(item_store) and not get_collection("grocery_history").count():
         st.info("No data available for analytics yet. Start adding items to your shopping list!")
         return
     
+    analytics = get_analytics(item_store)
+    summary = analytics.item_summary()
+    
     # Basic statistics
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_items = len(st.session_state.grocery_list)
-        st.metric("Total Items", total_items)
+        st.metric("Total Items", summary["total"])
     
     with col2:
-        completed_items = len([item for item in st.session_state.grocery_list if item["completed"]])
-        st.metric("Completed Items", completed_items)
+        st.metric("Completed Items", summary["completed"])
     
     with col3:
-        pending_items = total_items - completed_items
-        st.metric("Pending Items", pending_items)
+        st.metric("Pending Items", summary["pending"], help=f"${summary['pending_value']:.2f} still to buy")
     
     with col4:
-        if total_items > 0:
-            completion_rate = completed_items / total_items
-            st.metric("Completion Rate", f"{completion_rate:.1%}")
+        if summary["total"] > 0:
+            st.metric("Completion Rate", f"{summary['completed'] / summary['total']:.1%}")
         else:
             st.metric("Completion Rate", "0%")
     
     # Category analysis
-    if st.session_state.grocery_list:
+    if summary["total"]:
         st.markdown("#### 📈 Category Analysis")
         
-        category_counts = {}
-        for item in st.session_state.grocery_list:
-            cat = item["category"]
-            category_counts[cat] = category_counts.get(cat, 0) + 1
+        breakdown = analytics.category_breakdown()
+        col1, col2 = st.columns(2)
         
-        if category_counts:
-            # Create bar chart
-            categories = list(category_counts.keys())
-            counts = list(category_counts.values())
-            
-            chart_data = pd.DataFrame({
-                'Category': categories,
-                'Count': counts
-            })
-            
-            st.bar_chart(chart_data.set_index('Category'))
+        with col1:
+            st.bar_chart(breakdown["items"])
+        
+        with col2:
+            st.dataframe(
+                breakdown,
+                use_container_width=True,
+                column_config={
+                    "items": "Items",
+                    "pending": "Pending",
+                    "pending_value": st.column_config.NumberColumn("Pending Value", format="$%.2f"),
+                },
+            )
     
     # Priority analysis
-    if st.session_state.grocery_list:
+    if summary["total"]:
         st.markdown("#### 🎯 Priority Analysis")
         
-        priority_counts = {}
-        for item in st.session_state.grocery_list:
-            priority = item["priority"]
-            priority_counts[priority] = priority_counts.get(priority, 0) + 1
+        priority_counts = analytics.priority_counts()
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.write("**Priority Distribution:**")
+            for priority, count in priority_counts.items():
+                st.write(f"• {priority}: {count} items")
         
-        if priority_counts:
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.write("**Priority Distribution:**")
-                for priority, count in priority_counts.items():
-                    st.write(f"• {priority}: {count} items")
-            
-            with col2:
-                # Priority pie chart
-                priority_data = pd.DataFrame({
-                    'Priority': list(priority_counts.keys()),
-                    'Count': list(priority_counts.values())
-                })
-                
-                st.bar_chart(priority_data.set_index('Priority'))
+        with col2:
+            st.bar_chart(priority_counts)
+    
+    # Spending analysis
+    category_spend = analytics.category_spend()
+    if len(category_spend):
+        st.markdown("#### 💸 Spending by Category")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.bar_chart(category_spend["total"])
+        
+        with col2:
+            st.dataframe(
+                category_spend,
+                use_container_width=True,
+                column_config={
+                    "total": st.column_config.NumberColumn("Total", format="$%.2f"),
+                    "purchases": "Purchases",
+                    "average": st.column_config.NumberColumn("Average", format="$%.2f"),
+                },
+            )
+        
+        st.markdown("#### 📅 Trends")
+        tab_weekly, tab_monthly = st.tabs(["Weekly", "Monthly by Category"])
+        with tab_weekly:
+            st.line_chart(analytics.spending_trend("W").rename("Spent ($)"))
+        with tab_monthly:
+            st.bar_chart(analytics.category_trend("MS"))
 
+@fragment
 def show_settings():
     """Show settings interface"""
     st.markdown("### ⚙️ Settings")
@@ -444,13 +590,12 @@ def show_settings():
     with col2:
         if st.button("🗑️ Clear All Data", use_container_width=True):
             if st.checkbox("I understand this will delete all my data"):
-                st.session_state.grocery_list = []
-                st.session_state.grocery_history = []
+                get_item_store().clear()
+                for name in ["grocery_history", "grocery_budget", "recipes"]:
+                    get_collection(name).clear()
                 st.session_state.shopping_lists = []
-                st.session_state.budget = {"monthly": 500, "spent": 0, "remaining": 500}
-                st.session_state.recipes = []
                 st.success("All data cleared successfully!")
-                st.rerun()
+                rerun_fragment()
     
     # About
     st.markdown("#### About")
@@ -0,0 +1,190 @@
+import streamlit as st
+from collections import OrderedDict
+from tools.storage import Collection
+
+# Secondary indexes kept for every item: field -> value -> set of item ids
+INDEXED_FIELDS = ("category", "priority", "completed")
+
+class GroceryItemStore:
+    """
+    Indexed in-memory view of the shopping list
+
+    Items are held in an id -> item dict (ids come from the storage backend,
+    so they are monotonic and never reused after a delete), with secondary
+    indexes by category, priority and completion status. Filtering and
+    grouping are set lookups instead of scans over the whole list, and every
+    change is written through to the ``grocery_items`` collection. Each
+    change also bumps ``revision``, so views built on the list can ask which
+    items changed (``changed_since``) instead of rereading all of them.
+
+    Args:
+        collection (Collection): Backing collection (default: grocery_items)
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection or Collection("grocery_items")
+        self.reload()
+
+    def reload(self):
+        """Rebuild the item map and indexes from storage"""
+        backend = self.collection.backend
+        self._items = {}
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        self._reset()
+        for item in backend.fetch(self.collection.name, self.collection.namespace):
+            self._insert(item)
+        self._version = backend.version(self.collection.name, self.collection.namespace)
+
+    def is_stale(self):
+        """True when another session changed the list since it was loaded"""
+        backend = self.collection.backend
+        return backend.version(self.collection.name, self.collection.namespace) != self._version
+
+    def _reset(self):
+        # Everything changed: views must rebuild rather than apply deltas
+        self.revision = getattr(self, "revision", 0) + 1
+        self.reset_revision = self.revision
+        self._changed = OrderedDict()  # item id -> revision of its last change, oldest first
+
+    def _touch(self, item_id):
+        self.revision += 1
+        self._changed[item_id] = self.revision
+        self._changed.move_to_end(item_id)
+
+    def changed_since(self, revision):
+        """
+        Ids of items added, updated or deleted after ``revision``
+
+        Returns:
+            list: Item ids, or None when the whole list was replaced since
+            (a reload or clear) and the caller has to start over
+        """
+        if revision < self.reset_revision:
+            return None
+        changed = []
+        for item_id in reversed(self._changed):
+            if self._changed[item_id] <= revision:
+                break
+            changed.append(item_id)
+        return changed
+
+    def _sync_version(self):
+        self._version = self.collection.backend.version(self.collection.name, self.collection.namespace)
+
+    def _insert(self, item):
+        self._items[item["id"]] = item
+        for field in INDEXED_FIELDS:
+            self._indexes[field].setdefault(item.get(field), set()).add(item["id"])
+
+    def _unindex(self, item):
+        for field in INDEXED_FIELDS:
+            ids = self._indexes[field].get(item.get(field))
+            if ids is not None:
+                ids.discard(item["id"])
+                if not ids:
+                    del self._indexes[field][item.get(field)]
+
+    @property
+    def version(self):
+        """Storage version this view was last synced with"""
+        return self._version
+
+    def items(self):
+        """Every item, in id order"""
+        return list(self._items.values())
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, item_id):
+        return self._items.get(item_id)
+
+    def add(self, item):
+        """Store a new item and return its id"""
+        item.setdefault("completed", False)
+        item.setdefault("notes", "")
+        self.collection.add(item)
+        self._insert(item)
+        self._touch(item["id"])
+        self._sync_version()
+        return item["id"]
+
+    def update(self, item_id, **changes):
+        """Change fields of an item, keeping the indexes in step"""
+        item = self._items[item_id]
+        self._unindex(item)
+        item.update(changes)
+        self._insert(item)
+        self.collection.update(item)
+        self._touch(item_id)
+        self._sync_version()
+        return item
+
+    def delete(self, item_id):
+        item = self._items.pop(item_id, None)
+        if item is not None:
+            self._unindex(item)
+            self.collection.delete(item_id)
+            self._touch(item_id)
+            self._sync_version()
+        return item
+
+    def clear(self):
+        self.collection.clear()
+        self._items = {}
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        self._reset()
+        self._sync_version()
+
+    def values(self, field):
+        """Distinct values of an indexed field currently in use"""
+        return sorted(self._indexes[field], key=str)
+
+    def counts(self, field):
+        """Number of items per value of an indexed field"""
+        return {value: len(ids) for value, ids in self._indexes[field].items()}
+
+    def filter_ids(self, category=None, priority=None, completed=None):
+        """
+        Ids of items matching every given filter, in insertion order
+
+        Args:
+            category (str): Exact category, or None for any
+            priority (str): Exact priority, or None for any
+            completed (bool): Completion status, or None for any
+
+        Returns:
+            list: Matching item ids
+        """
+        candidates = [
+            self._indexes[field].get(value, set())
+            for field, value in (("category", category), ("priority", priority), ("completed", completed))
+            if value is not None
+        ]
+        if not candidates:
+            return list(self._items)
+        # Intersect starting from the smallest set to keep the work proportional to the result
+        candidates.sort(key=len)
+        ids = set(candidates[0]).intersection(*candidates[1:])
+        return sorted(ids)
+
+    def group_by_category(self, ids):
+        """Group item ids by category, preserving id order within each group"""
+        wanted = set(ids)
+        groups = {}
+        for category in self.values("category"):
+            members = self._indexes["category"][category]
+            matching = members & wanted if len(wanted) < len(self._items) else members
+            if matching:
+                groups[category] = [self._items[item_id] for item_id in sorted(matching)]
+        return groups
+
+def get_item_store():
+    """Return this session's item store, reloading it if the data changed elsewhere"""
+    store = st.session_state.get("grocery_item_store")
+    collection = Collection("grocery_items")
+    if (store is None or store.collection.namespace != collection.namespace
+            or store.collection.backend is not collection.backend or store.is_stale()):
+        store = GroceryItemStore(collection)
+        st.session_state.grocery_item_store = store
+    return store
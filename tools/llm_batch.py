@@ -0,0 +1,531 @@
+import streamlit as st
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from tools.llm_cache import cache_key
+from tools.llm_providers import LLMError
+from tools.local_analysis import LOCAL_ANALYSES
+from tools.storage import data_path
+
+DEFAULT_BATCH_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "batches")
+
+# Upload extension -> reader
+BATCH_FORMATS = {"csv": "CSV", "jsonl": "JSON Lines", "txt": "Text"}
+
+# Column/field names tried, in order, when none is given
+TEXT_FIELDS = ("text", "content", "body", "message", "review", "comment", "description")
+
+# Characters per token, matching ``estimate_tokens``
+CHARS_PER_TOKEN = 4
+
+def chunk_text(text, max_chars):
+    """Split ``text`` into pieces of at most ``max_chars``, at sentence boundaries where possible"""
+    text = text.strip()
+    if len(text) <= max_chars:
+        if text:
+            yield text
+        return
+    piece = ""
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        while len(sentence) > max_chars:
+            if piece:
+                yield piece
+                piece = ""
+            yield sentence[:max_chars]
+            sentence = sentence[max_chars:]
+        if piece and len(piece) + 1 + len(sentence) > max_chars:
+            yield piece
+            piece = ""
+        piece = f"{piece} {sentence}" if piece else sentence
+    if piece:
+        yield piece
+
+def _pick_field(fields, field):
+    if field:
+        if field not in fields:
+            raise ValueError(f"No {field!r} column/field (found: {', '.join(fields)})")
+        return field
+    lowered = {name.strip().lower(): name for name in fields}
+    return next((lowered[name] for name in TEXT_FIELDS if name in lowered), fields[0] if fields else None)
+
+def iter_chunks(binary_file, fmt, max_chars, field=None, encoding="utf-8-sig"):
+    """
+    Stream ``(record, part, text)`` chunks from an input file
+
+    CSV rows and JSON lines are records, with the text taken from ``field``
+    (or the first of ``TEXT_FIELDS`` present); rows longer than
+    ``max_chars`` are split into numbered parts. A text file is one
+    document, cut at paragraph breaks into records of up to ``max_chars``.
+    Only the current record is held in memory.
+    """
+    text = io.TextIOWrapper(binary_file, encoding=encoding, errors="replace", newline="" if fmt == "csv" else None)
+    if fmt == "csv":
+        reader = csv.reader(text)
+        header = next(reader, [])
+        column = header.index(_pick_field(header, field)) if header else 0
+        for index, row in enumerate(reader):
+            if column < len(row):
+                for part, piece in enumerate(chunk_text(row[column], max_chars)):
+                    yield index, part, piece
+    elif fmt == "jsonl":
+        name = field
+        for index, line in enumerate(text):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, str):
+                value = record
+            elif isinstance(record, dict):
+                name = name or _pick_field(list(record), None)
+                value = record.get(name)
+            else:
+                continue
+            if isinstance(value, str):
+                for part, piece in enumerate(chunk_text(value, max_chars)):
+                    yield index, part, piece
+    else:
+        def paragraphs():
+            lines = []
+            for line in text:
+                if line.strip():
+                    lines.append(line.strip())
+                elif lines:
+                    yield " ".join(lines)
+                    lines = []
+            if lines:
+                yield " ".join(lines)
+
+        # Pack whole paragraphs into records; only over-long ones are split
+        index, buffer = 0, ""
+        for paragraph in paragraphs():
+            for piece in chunk_text(paragraph, max_chars):
+                if buffer and len(buffer) + 2 + len(piece) > max_chars:
+                    yield index, 0, buffer
+                    index, buffer = index + 1, ""
+                buffer = f"{buffer}\n\n{piece}" if buffer else piece
+        if buffer:
+            yield index, 0, buffer
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+class BatchJob:
+    """
+    Live state of one batch run
+
+    Results go to ``results.jsonl`` in the job directory as they finish,
+    one line per (record, part, analysis); that file doubles as the
+    checkpoint a resumed run skips over.
+    """
+
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self.id = manifest["id"]
+        self.requests = 0
+        self.done = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.cached = 0
+        self.skipped = 0
+        self.local = 0
+        self.progress = 0.0
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self._latencies = deque(maxlen=10000)
+        self._ttfts = deque(maxlen=10000)
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.finished is None
+
+    @property
+    def rate(self):
+        """Results written per second in this run"""
+        elapsed = (self.finished or time.time()) - self.started
+        return (self.done + self.failed) / elapsed if elapsed > 0 else 0.0
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def report(self, now=None):
+        """
+        Throughput and latency of this run (up to ``now`` while it is still running)
+
+        Returns:
+            dict: counters, ``elapsed``, ``rate`` (results/s) and request latency
+            ``p50``/``p95``/``p99`` plus ``ttft_p50``, in seconds
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            ttfts = sorted(self._ttfts)
+        elapsed = (self.finished or now or time.time()) - self.started
+        return {
+            "requests": self.requests,
+            "done": self.done,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "cached": self.cached,
+            "skipped": self.skipped,
+            "local": self.local,
+            "elapsed": elapsed,
+            "rate": (self.done + self.failed) / elapsed if elapsed > 0 else 0.0,
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "ttft_p50": _percentile(ttfts, 0.50),
+        }
+
+class _Cancelled(Exception):
+    """A request was still queued for the model when its job was paused"""
+
+class BatchRunner:
+    """
+    Runs batch analyses in the background, one directory per job
+
+    Each job streams its input file through ``iter_chunks`` and sends one
+    request per chunk and analysis type through a pool of ``concurrency``
+    threads; the reader waits while that many requests are queued, so
+    memory stays flat however long the file is. Identical chunks are
+    coalesced: a duplicate of a request in flight waits for it, and a
+    duplicate of a recent one reuses its result. Transient backend errors
+    are retried with backoff. Analyses a ``LocalAnalyzer`` can answer skip
+    the model and are scored in blocks of ``LOCAL_BATCH`` chunks. With an
+    ``LLMScheduler`` every request also waits for a batch-priority slot, so
+    jobs yield to interactive use of the same model.
+
+    Args:
+        root (str): Directory holding job directories, per namespace
+    """
+
+    RECENT_RESULTS = 10000
+    MAX_ATTEMPTS = 3
+    LOCAL_BATCH = 512
+
+    def __init__(self, root=DEFAULT_BATCH_ROOT):
+        self.root = root
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _directory(self, namespace, job_id=""):
+        return os.path.join(self.root, namespace, job_id)
+
+    def create(self, namespace, upload, analyses, field=None, chunk_tokens=1000):
+        """
+        Store an uploaded file as a new job
+
+        Args:
+            namespace (str): Owner of the job
+            upload: File-like object with a ``name`` (e.g. ``st.file_uploader``'s result)
+            analyses (dict): Analysis type -> system prompt
+            field (str): Text column/field (None to guess)
+            chunk_tokens (int): Maximum tokens per request
+
+        Returns:
+            str: Job id
+        """
+        fmt = os.path.splitext(upload.name)[1].lstrip(".").lower()
+        if fmt not in BATCH_FORMATS:
+            raise ValueError(f"Unsupported file type {fmt!r}; use {', '.join(BATCH_FORMATS)}")
+        job_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        directory = self._directory(namespace, job_id)
+        os.makedirs(directory)
+        with open(os.path.join(directory, "input." + fmt), "wb") as handle:
+            shutil.copyfileobj(upload, handle, 1024 * 1024)
+        self._write_manifest(directory, {
+            "id": job_id,
+            "name": upload.name,
+            "format": fmt,
+            "field": field or None,
+            "analyses": analyses,
+            "chunk_tokens": chunk_tokens,
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "status": "new",
+        })
+        return job_id
+
+    @staticmethod
+    def _write_manifest(directory, manifest):
+        temp_path = os.path.join(directory, ".manifest.json")
+        with open(temp_path, "w") as handle:
+            json.dump(manifest, handle)
+        os.replace(temp_path, os.path.join(directory, "manifest.json"))
+
+    def jobs(self, namespace):
+        """
+        Every job of ``namespace``, newest first
+
+        Returns:
+            list: ``(manifest, BatchJob or None)`` pairs; the job is the latest run in this process
+        """
+        root = self._directory(namespace)
+        if not os.path.isdir(root):
+            return []
+        found = []
+        for job_id in sorted(os.listdir(root), reverse=True):
+            try:
+                with open(os.path.join(root, job_id, "manifest.json")) as handle:
+                    manifest = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            with self._lock:
+                job = self._jobs.get((namespace, job_id))
+            if job is None and manifest["status"] == "running":
+                # The process that ran it is gone
+                manifest["status"] = "paused"
+            found.append((manifest, job))
+        return found
+
+    def results_path(self, namespace, job_id):
+        return os.path.join(self._directory(namespace, job_id), "results.jsonl")
+
+    def delete(self, namespace, job_id):
+        with self._lock:
+            job = self._jobs.pop((namespace, job_id), None)
+        if job is not None:
+            job.cancel()
+        shutil.rmtree(self._directory(namespace, job_id), ignore_errors=True)
+
+    def start(self, namespace, job_id, llm, concurrency=8, meter=None, tracker=None, cache=None, local=None,
+              scheduler=None):
+        """
+        Run (or resume) a job in the background
+
+        Args:
+            namespace (str): Owner of the job
+            job_id (str): Id from ``create``
+            llm (dict): ``provider``, ``model``, ``api_model``, ``params`` and ``cache``
+            concurrency (int): Requests in flight
+            meter (UsageMeter): Logs every request
+            tracker (LatencyTracker): Receives every response's timing
+            cache (ResponseCache): Consulted when ``llm["cache"]`` is set
+            local (LocalAnalyzer): Answers ``LOCAL_ANALYSES`` without the model
+            scheduler (LLMScheduler): Admits each model request at ``batch`` priority
+
+        Returns:
+            BatchJob: Live progress
+        """
+        directory = self._directory(namespace, job_id)
+        with open(os.path.join(directory, "manifest.json")) as handle:
+            manifest = json.load(handle)
+        with self._lock:
+            job = self._jobs.get((namespace, job_id))
+            if job is not None and job.running:
+                return job
+            job = self._jobs[(namespace, job_id)] = BatchJob(directory, manifest)
+        manifest.update(status="running", model=llm["model"], concurrency=concurrency)
+        self._write_manifest(directory, manifest)
+        threading.Thread(target=self._run, args=(job, llm, concurrency, meter, tracker, cache, local, scheduler),
+                         name=f"llm-batch-{job_id}", daemon=True).start()
+        return job
+
+    def _checkpoint(self, path):
+        # (record, part, analysis) of every result already written
+        done = set()
+        if not os.path.exists(path):
+            return done
+        with open(path, "rb+") as handle:
+            for line in handle:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                if "error" not in result:
+                    done.add((result["record"], result["part"], result["analysis"]))
+            # A crash can leave half a line; start the next write on a fresh one
+            if handle.tell():
+                handle.seek(-1, os.SEEK_END)
+                if handle.read(1) != b"\n":
+                    handle.write(b"\n")
+        return done
+
+    def _run(self, job, llm, concurrency, meter, tracker, cache, local, scheduler):
+        manifest = job.manifest
+        local_pending = {}
+        results_path = os.path.join(job.directory, "results.jsonl")
+        slots = threading.BoundedSemaphore(concurrency * 2)
+        inflight = {}
+        recent = OrderedDict()
+        write_lock = threading.Lock()
+        try:
+            done = self._checkpoint(results_path)
+            input_path = os.path.join(job.directory, "input." + manifest["format"])
+            size = os.path.getsize(input_path) or 1
+            with open(input_path, "rb") as raw, open(results_path, "a") as output, \
+                    ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm-batch") as pool:
+
+                def write(entries, latency, error, reused=False):
+                    # entries: ((record, part, analysis), result) pairs
+                    with write_lock:
+                        for (record, part, analysis), result in entries:
+                            line = {"record": record, "part": part, "analysis": analysis}
+                            if error is None:
+                                line.update(result=result, latency_ms=round(latency * 1000, 3))
+                                if reused:
+                                    line["coalesced"] = True
+                            else:
+                                line["error"] = error
+                            output.write(json.dumps(line, ensure_ascii=False) + "\n")
+                        output.flush()
+                    with job._lock:
+                        if error is None:
+                            job.done += len(entries)
+                        else:
+                            job.failed += len(entries)
+
+                def analyze_locally(analysis):
+                    # One vectorized call for a block of chunks
+                    pending = local_pending.pop(analysis, [])
+                    if pending:
+                        started = time.perf_counter()
+                        results = local.analyze_batch(analysis, [text for _, text in pending])
+                        job.local += len(pending)
+                        write([(waiter, result) for (waiter, _), result in zip(pending, results)],
+                              (time.perf_counter() - started) / len(pending), None)
+
+                def request(key, text, prompt):
+                    result, latency, error = None, 0.0, None
+                    try:
+                        result, latency = self._complete(job, llm, prompt, text, meter, tracker, cache, scheduler)
+                    except _Cancelled:
+                        # Paused while queued: nothing to record, a resume sends it
+                        with write_lock:
+                            inflight.pop(key)
+                        return
+                    except Exception as e:
+                        error = str(e)
+                    finally:
+                        slots.release()
+                    with write_lock:
+                        waiters = inflight.pop(key)
+                        if error is None:
+                            recent[key] = result
+                            if len(recent) > self.RECENT_RESULTS:
+                                recent.popitem(last=False)
+                    write([(waiter, result) for waiter in waiters], latency, error)
+
+                for record, part, text in iter_chunks(raw, manifest["format"],
+                                                      manifest["chunk_tokens"] * CHARS_PER_TOKEN, manifest["field"]):
+                    job.progress = min(1.0, raw.tell() / size)
+                    if job.cancel_event.is_set():
+                        break
+                    digest = hashlib.sha1(text.encode()).hexdigest()
+                    for analysis, prompt in manifest["analyses"].items():
+                        waiter = (record, part, analysis)
+                        if waiter in done:
+                            job.skipped += 1
+                            continue
+                        if local is not None and analysis in LOCAL_ANALYSES:
+                            local_pending.setdefault(analysis, []).append((waiter, text))
+                            if len(local_pending[analysis]) >= self.LOCAL_BATCH:
+                                analyze_locally(analysis)
+                            continue
+                        key = (analysis, digest)
+                        with write_lock:
+                            if key in recent:
+                                recent.move_to_end(key)
+                                result = recent[key]
+                            elif key in inflight:
+                                inflight[key].append(waiter)
+                                job.coalesced += 1
+                                continue
+                            else:
+                                result = None
+                                inflight[key] = [waiter]
+                        if result is not None:
+                            job.coalesced += 1
+                            write([(waiter, result)], 0.0, None, reused=True)
+                            continue
+                        # Backpressure: don't read ahead of the pool
+                        while not slots.acquire(timeout=0.5):
+                            if job.cancel_event.is_set():
+                                break
+                        else:
+                            job.requests += 1
+                            pool.submit(request, key, text, prompt)
+                            continue
+                        with write_lock:
+                            inflight.pop(key, None)
+                        break
+                for analysis in list(local_pending):
+                    analyze_locally(analysis)
+            finished = not job.cancel_event.is_set()
+            if finished:
+                job.progress = 1.0
+            manifest["status"] = "finished" if finished else "paused"
+        except Exception as e:
+            job.error = str(e)
+            manifest["status"] = "failed"
+            manifest["error"] = job.error
+        finished = time.time()
+        try:
+            manifest["report"] = job.report(finished)
+            self._write_manifest(job.directory, manifest)
+        finally:
+            # Only now does the job read as finished, so its manifest is already final
+            job.finished = finished
+
+    def _complete(self, job, llm, prompt, text, meter, tracker, cache, scheduler):
+        messages = [{"role": "system", "content": prompt}, {"role": "user", "content": text}]
+        key = cache_key(llm["provider"].key, llm["api_model"], messages, llm["params"]) \
+            if cache is not None and llm.get("cache") else None
+        if key:
+            cached = cache.get(key)
+            if cached:
+                with job._lock:
+                    job.cached += 1
+                return cached["response"], 0.0
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            # Jobs take turns with each other and with every session using this model
+            ticket = None
+            if scheduler is not None:
+                ticket = scheduler.run(llm["model"], "batch", f"batch:{job.id}", cancel_event=job.cancel_event)
+                if ticket is None:
+                    raise _Cancelled()
+            try:
+                completion = llm["provider"].complete(llm["api_model"], messages, **llm["params"])
+                for _ in completion:
+                    pass
+                break
+            except LLMError as e:
+                if meter is not None:
+                    meter.record(llm["model"], completion, ok=False)
+                if not e.retryable or attempt == self.MAX_ATTEMPTS or job.cancel_event.is_set():
+                    raise
+            finally:
+                # Free the slot before any backoff
+                if ticket is not None:
+                    scheduler.release(ticket)
+            job.cancel_event.wait(2 ** (attempt - 1))
+        if meter is not None:
+            meter.record(llm["model"], completion)
+        if tracker is not None:
+            tracker.record(completion, llm["model"])
+        if key:
+            cache.put(key, llm["api_model"], completion.text, sum(completion.usage.values()))
+        with job._lock:
+            job._latencies.append(completion.elapsed)
+            if completion.ttft is not None:
+                job._ttfts.append(completion.ttft)
+        return completion.text, completion.elapsed
+
+@st.cache_resource
+def get_batch_runner():
+    """Return the process-wide batch runner (``DASHBOARD_BATCHES`` overrides the location)"""
+    return BatchRunner(data_path("DASHBOARD_BATCHES", DEFAULT_BATCH_ROOT))
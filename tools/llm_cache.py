@@ -0,0 +1,160 @@
+import streamlit as st
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "llm_cache.db")
+
+def cache_key(backend, model, messages, params):
+    """
+    Cache key for one request
+
+    Args:
+        backend (tuple): Provider identity (``LLMProvider.key``)
+        model (str): Model name sent to the backend
+        messages (list): Chat messages
+        params (dict): ``temperature``, ``top_p``, ``max_tokens``, ``frequency_penalty``
+    """
+    sampling = [params.get(name) for name in ("temperature", "top_p", "max_tokens", "frequency_penalty")]
+    payload = json.dumps([list(backend), model, messages, sampling], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class ResponseCache:
+    """
+    Persistent LLM response cache with LRU and TTL eviction
+
+    Entries live in their own SQLite file. Lookups refresh an entry's last
+    use; entries older than ``ttl`` are treated as missing and deleted, and
+    when the stored responses exceed ``max_bytes`` the least recently used
+    ones are evicted. Lifetime hit, miss and tokens-saved counts are kept
+    alongside the entries.
+
+    Args:
+        path (str): Database file (``:memory:`` for a throwaway cache)
+        max_bytes (int): Size cap for stored responses
+        ttl (float): Seconds an entry stays valid
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=50 * 1024 * 1024, ttl=7 * 24 * 3600):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, "
+            "tokens INTEGER NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _bump(self, **counters):
+        for name, amount in counters.items():
+            self._conn.execute(
+                "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?",
+                (name, amount, amount),
+            )
+
+    def get(self, key):
+        """
+        Cached response for ``key``
+
+        Returns:
+            dict: ``response`` and ``tokens``, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, tokens, size, created FROM responses WHERE key = ?",
+                                     (key,)).fetchone()
+            self._conn.execute("BEGIN")
+            if row is not None and now - row[3] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._size -= row[2]
+                row = None
+            if row is None:
+                self._bump(misses=1)
+                self._conn.execute("COMMIT")
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._bump(hits=1, tokens_saved=row[1])
+            self._conn.execute("COMMIT")
+        return {"response": row[0], "tokens": row[1]}
+
+    def put(self, key, model, response, tokens):
+        """Store a response (``tokens``: prompt + completion tokens it cost), evicting LRU entries past the size cap"""
+        size = len(response.encode())
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, tokens, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, response, tokens, size, now, now),
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.execute("COMMIT")
+
+    def _evict(self):
+        # Expired entries go first, then least recently used until under the cap
+        expired = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses WHERE created < ?",
+                                     (time.time() - self.ttl,)).fetchone()[0]
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        self._size -= expired
+        while self._size > self.max_bytes:
+            oldest = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 32").fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                if self._size <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._size -= size
+                self._bump(evictions=1)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._size = 0
+
+    def stats(self):
+        """
+        Returns:
+            dict: ``hits``, ``misses``, ``hit_rate``, ``tokens_saved``, ``evictions``, ``entries`` and ``bytes``
+        """
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "tokens_saved": counters.get("tokens_saved", 0),
+            "evictions": counters.get("evictions", 0),
+            "entries": entries,
+            "bytes": self._size,
+        }
+
+@st.cache_resource
+def get_response_cache():
+    """
+    Return the shared response cache
+
+    ``DASHBOARD_LLM_CACHE`` changes the file; with ``DASHBOARD_STORAGE=memory``
+    the cache is kept in RAM like everything else.
+    """
+    if os.environ.get("DASHBOARD_STORAGE", "sqlite") == "memory":
+        return ResponseCache(":memory:")
+    return ResponseCache(os.environ.get("DASHBOARD_LLM_CACHE", DEFAULT_CACHE_PATH))
@@ -0,0 +1,263 @@
+import streamlit as st
+import bisect
+import json
+import os
+import threading
+import time
+import numpy as np
+
+DEFAULT_USAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "llm_usage")
+
+# One fixed-size little-endian row per request (27 bytes)
+RECORD_DTYPE = np.dtype([
+    ("time", "<f8"),        # Unix time the request finished
+    ("model", "<u2"),       # Index into models.json
+    ("ok", "u1"),           # 1 = success, 0 = failure
+    ("prompt", "<u4"),      # Prompt tokens
+    ("completion", "<u4"),  # Completion tokens
+    ("latency", "<f4"),     # Seconds to the last chunk (or the failure)
+    ("ttft", "<f4"),        # Seconds to the first chunk, -1 when none arrived
+])
+
+# Latency histogram bucket upper bounds: 1 ms to 10 minutes, about 12% apart
+LATENCY_BOUNDS = np.geomspace(0.001, 600, 120)
+LATENCY_BUCKET_LIST = LATENCY_BOUNDS.tolist()
+
+# Minutes of per-minute histograms kept for the latency chart
+CHART_MINUTES = 60
+
+def _buckets(seconds):
+    return np.searchsorted(LATENCY_BOUNDS, seconds)
+
+def histogram_percentile(histogram, fraction):
+    """Upper bound of the bucket holding the ``fraction`` quantile (0.0 for an empty histogram)"""
+    total = histogram.sum()
+    if not total:
+        return 0.0
+    index = int(np.searchsorted(np.cumsum(histogram), fraction * total))
+    return float(LATENCY_BOUNDS[min(index, len(LATENCY_BOUNDS) - 1)])
+
+class ModelUsage:
+    """
+    Running totals and latency histograms for one model
+
+    Counters and fixed-bucket histograms make every figure, percentiles
+    included, a constant-time read however many requests were made.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency = np.zeros(len(LATENCY_BOUNDS) + 1, dtype=np.int64)
+        self.ttft = np.zeros(len(LATENCY_BOUNDS) + 1, dtype=np.int64)
+        # Ring of per-minute latency histograms, slot = minute % CHART_MINUTES
+        self.minutes = np.zeros((CHART_MINUTES, len(LATENCY_BOUNDS) + 1), dtype=np.int64)
+        self.minute_of_slot = np.full(CHART_MINUTES, -1, dtype=np.int64)
+
+    def add(self, rows):
+        """Fold a block of ``RECORD_DTYPE`` rows into the totals"""
+        ok = rows[rows["ok"] == 1]
+        self.requests += len(rows)
+        self.failures += len(rows) - len(ok)
+        self.prompt_tokens += int(rows["prompt"].sum())
+        self.completion_tokens += int(rows["completion"].sum())
+        buckets = _buckets(ok["latency"])
+        self.latency += np.bincount(buckets, minlength=len(self.latency))
+        self.ttft += np.bincount(_buckets(ok["ttft"][ok["ttft"] >= 0]), minlength=len(self.ttft))
+
+        minutes = (ok["time"] // 60).astype(np.int64)
+        recent = minutes > minutes.max(initial=0) - CHART_MINUTES
+        for minute in np.unique(minutes[recent]):
+            slot = minute % CHART_MINUTES
+            if self.minute_of_slot[slot] < minute:
+                self.minutes[slot] = 0
+                self.minute_of_slot[slot] = minute
+            if self.minute_of_slot[slot] == minute:
+                self.minutes[slot] += np.bincount(buckets[recent][minutes[recent] == minute],
+                                                  minlength=len(self.latency))
+
+    def add_one(self, finished, ok, prompt, completion, latency, ttft):
+        """Fold in a single request (the per-request path; ``add`` is for replaying the log)"""
+        self.requests += 1
+        self.prompt_tokens += prompt
+        self.completion_tokens += completion
+        if not ok:
+            self.failures += 1
+            return
+        bucket = bisect.bisect_left(LATENCY_BUCKET_LIST, latency)
+        self.latency[bucket] += 1
+        if ttft >= 0:
+            self.ttft[bisect.bisect_left(LATENCY_BUCKET_LIST, ttft)] += 1
+        minute = int(finished // 60)
+        slot = minute % CHART_MINUTES
+        if self.minute_of_slot[slot] != minute:
+            self.minutes[slot] = 0
+            self.minute_of_slot[slot] = minute
+        self.minutes[slot, bucket] += 1
+
+    def summary(self, cost_per_1k=0.0):
+        """
+        Returns:
+            dict: counts, ``success_rate``, ``cost`` and latency ``p50``/``p95``/``p99``
+            plus ``ttft_p50``, in seconds
+        """
+        tokens = self.prompt_tokens + self.completion_tokens
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "success_rate": (self.requests - self.failures) / self.requests if self.requests else 1.0,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tokens": tokens,
+            "cost": tokens / 1000 * cost_per_1k,
+            "p50": histogram_percentile(self.latency, 0.50),
+            "p95": histogram_percentile(self.latency, 0.95),
+            "p99": histogram_percentile(self.latency, 0.99),
+            "ttft_p50": histogram_percentile(self.ttft, 0.50),
+        }
+
+    def timeline(self, now=None):
+        """
+        Latency percentiles per minute over the last ``CHART_MINUTES`` minutes
+
+        Returns:
+            list: ``(minute start: float, p50, p95, p99)`` for minutes with requests, oldest first
+        """
+        current = int((now or time.time()) // 60)
+        points = []
+        for minute in range(current - CHART_MINUTES + 1, current + 1):
+            slot = minute % CHART_MINUTES
+            if self.minute_of_slot[slot] == minute and self.minutes[slot].any():
+                histogram = self.minutes[slot]
+                points.append((minute * 60.0, *(histogram_percentile(histogram, q) for q in (0.50, 0.95, 0.99))))
+        return points
+
+class UsageMeter:
+    """
+    Per-request LLM usage log with in-memory aggregates
+
+    Every request (success or failure) is appended to ``usage.bin`` as one
+    27-byte ``RECORD_DTYPE`` row; model names are stored once, in
+    ``models.json``. On start the log is read back with a single
+    ``numpy.fromfile`` and folded into per-model ``ModelUsage`` totals,
+    which are then kept current as requests are recorded.
+
+    Args:
+        directory (str): Where the log lives (None keeps it in memory only)
+    """
+
+    ALL = "All models"
+
+    def __init__(self, directory=DEFAULT_USAGE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._models = []
+        self._ids = {}
+        self._usage = {self.ALL: ModelUsage()}
+        self._log = None
+        if directory is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, "models.json")) as handle:
+                self._models = json.load(handle)
+        except FileNotFoundError:
+            pass
+        self._ids = {name: index for index, name in enumerate(self._models)}
+
+        log_path = os.path.join(directory, "usage.bin")
+        if os.path.exists(log_path):
+            # A crash mid-write can leave a partial row; drop it so appends stay aligned
+            whole = os.path.getsize(log_path) // RECORD_DTYPE.itemsize * RECORD_DTYPE.itemsize
+            if whole != os.path.getsize(log_path):
+                os.truncate(log_path, whole)
+            rows = np.fromfile(log_path, dtype=RECORD_DTYPE)
+            self._usage[self.ALL].add(rows)
+            for model_id in np.unique(rows["model"]):
+                if model_id < len(self._models):
+                    self._model_usage(self._models[model_id]).add(rows[rows["model"] == model_id])
+        self._log = open(log_path, "ab")
+
+    def _model_usage(self, model):
+        usage = self._usage.get(model)
+        if usage is None:
+            usage = self._usage[model] = ModelUsage()
+        return usage
+
+    def _model_id(self, model):
+        model_id = self._ids.get(model)
+        if model_id is None:
+            model_id = self._ids[model] = len(self._models)
+            self._models.append(model)
+            if self.directory is not None:
+                temp_path = os.path.join(self.directory, ".models.json")
+                with open(temp_path, "w") as handle:
+                    json.dump(self._models, handle)
+                os.replace(temp_path, os.path.join(self.directory, "models.json"))
+        return model_id
+
+    def record(self, model, completion, ok=True):
+        """
+        Log one request
+
+        Args:
+            model (str): Dashboard model name
+            completion (Completion): The streamed response, finished or failed
+            ok (bool): Whether it succeeded
+        """
+        usage = completion.usage if ok else {}
+        values = (time.time(), int(ok), usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+                  completion.elapsed or 0.0, -1.0 if completion.ttft is None else completion.ttft)
+        with self._lock:
+            if self._log is not None:
+                finished, ok, prompt, completion_tokens, latency, ttft = values
+                self._log.write(np.array([(finished, self._model_id(model), ok, prompt, completion_tokens, latency,
+                                           ttft)], dtype=RECORD_DTYPE).tobytes())
+                self._log.flush()
+            else:
+                self._model_id(model)
+            self._usage[self.ALL].add_one(*values)
+            self._model_usage(model).add_one(*values)
+
+    def models(self):
+        """Models with recorded requests, in first-use order"""
+        with self._lock:
+            return [model for model in self._models if model in self._usage]
+
+    def summary(self, model=ALL, prices=None):
+        """
+        Totals for one model, or every model with ``ALL``
+
+        Args:
+            prices (dict): Model -> dollars per 1K tokens, for ``cost``
+        """
+        prices = prices or {}
+        with self._lock:
+            if model != self.ALL:
+                usage = self._usage.get(model) or ModelUsage()
+                return usage.summary(prices.get(model, 0.0))
+            summary = self._usage[self.ALL].summary()
+            summary["cost"] = sum(tokens / 1000 * prices.get(name, 0.0) for name, tokens in
+                                  ((name, usage.prompt_tokens + usage.completion_tokens)
+                                   for name, usage in self._usage.items() if name != self.ALL))
+            return summary
+
+    def timeline(self, model=ALL):
+        """Per-minute latency percentiles (see ``ModelUsage.timeline``)"""
+        with self._lock:
+            usage = self._usage.get(model)
+            return usage.timeline() if usage is not None else []
+
+@st.cache_resource
+def get_usage_meter():
+    """
+    Return the process-wide usage meter
+
+    ``DASHBOARD_LLM_USAGE`` changes the directory; with ``DASHBOARD_STORAGE=memory``
+    nothing is written to disk.
+    """
+    if os.environ.get("DASHBOARD_STORAGE", "sqlite") == "memory":
+        return UsageMeter(None)
+    return UsageMeter(os.environ.get("DASHBOARD_LLM_USAGE", DEFAULT_USAGE_DIR))
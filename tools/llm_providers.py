@@ -0,0 +1,390 @@
+import streamlit as st
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import requests
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
+
+DEFAULT_BASE_URL = "http://localhost:8080/v1"
+
+class LLMError(Exception):
+    """A completion failed; ``retryable`` marks rate limits and transient server errors"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) for when a backend doesn't report usage"""
+    return max(1, len(text) // 4) if text else 0
+
+class Completion:
+    """
+    One streamed model response
+
+    Iterating yields text chunks as they arrive, so it can be handed
+    straight to ``st.write_stream``. Timing and usage are filled in while
+    it streams.
+
+    Attributes:
+        ttft (float): Seconds from the request to the first chunk
+        elapsed (float): Seconds from the request to the last chunk (or the failure)
+        usage (dict): ``prompt_tokens`` / ``completion_tokens`` (reported or estimated)
+    """
+
+    def __init__(self, chunks, model, messages, on_finish=None):
+        self.model = model
+        self.messages = messages
+        self.ttft = None
+        self.elapsed = None
+        self.usage = {}
+        self._chunks = chunks
+        self._parts = []
+        self._on_finish = on_finish
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    @property
+    def tokens_per_second(self):
+        if not self.elapsed or self.ttft is None or self.elapsed <= self.ttft:
+            return None
+        return self.usage.get("completion_tokens", 0) / (self.elapsed - self.ttft)
+
+    def __iter__(self):
+        started = time.monotonic()
+        try:
+            for chunk in self._chunks:
+                if isinstance(chunk, dict):
+                    self.usage = chunk
+                    continue
+                if not chunk:
+                    continue
+                if self.ttft is None:
+                    self.ttft = time.monotonic() - started
+                self._parts.append(chunk)
+                yield chunk
+        finally:
+            # Set on failure too, so failed requests can be timed
+            self.elapsed = time.monotonic() - started
+        if not self.usage:
+            self.usage = {
+                "prompt_tokens": sum(estimate_tokens(message["content"]) for message in self.messages),
+                "completion_tokens": estimate_tokens(self.text),
+            }
+        if self._on_finish is not None:
+            self._on_finish(self)
+
+class LLMProvider:
+    """Base class for chat model backends; ``stream`` yields text chunks, then optionally a usage dict"""
+
+    name = "Custom"
+
+    @property
+    def key(self):
+        return (self.name,)
+
+    def stream(self, model, messages, temperature=0.7, max_tokens=1000, top_p=1.0, frequency_penalty=0.0):
+        raise NotImplementedError
+
+    def complete(self, model, messages, on_finish=None, **params):
+        """Start a streamed completion; nothing is sent until it is iterated"""
+        return Completion(self.stream(model, messages, **params), model, messages, on_finish)
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Any server speaking the OpenAI chat completions API with SSE streaming
+
+    Works with OpenAI itself and with local servers such as llama.cpp's
+    ``llama-server``, vLLM or Ollama. One HTTP session is kept per
+    provider, so connections are reused between requests.
+
+    Args:
+        base_url (str): API root, e.g. ``http://localhost:8080/v1``
+        api_key (str): Bearer token (optional for most local servers)
+        timeout (float): Seconds to wait for the next chunk
+    """
+
+    name = "OpenAI-compatible"
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, api_key="", timeout=60):
+        if not REQUESTS_AVAILABLE:
+            raise LLMError("requests is not installed. Install it with: pip install requests")
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    @property
+    def key(self):
+        return (self.name, self.base_url)
+
+    def stream(self, model, messages, temperature=0.7, max_tokens=1000, top_p=1.0, frequency_penalty=0.0):
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "top_p": top_p,
+            "frequency_penalty": frequency_penalty,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        try:
+            response = self._session.post(f"{self.base_url}/chat/completions", json=payload, headers=headers,
+                                          stream=True, timeout=(5, self.timeout))
+        except requests.RequestException as e:
+            raise LLMError(f"Request to {self.base_url} failed: {e}", retryable=True)
+
+        with response:
+            if response.status_code == 429 or response.status_code >= 500:
+                raise LLMError(f"{self.base_url} returned HTTP {response.status_code}", retryable=True)
+            if response.status_code >= 400:
+                raise LLMError(f"{self.base_url} returned HTTP {response.status_code}: {response.text[:200]}")
+            try:
+                # chunk_size=None hands over each network read as it arrives instead of buffering
+                for line in response.iter_lines(chunk_size=None):
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        break
+                    if not data:
+                        continue  # keep-alive
+                    yield from _parse_event(data, self.base_url)
+            except requests.RequestException as e:
+                raise LLMError(f"Stream from {self.base_url} broke off: {e}", retryable=True)
+
+def _parse_event(data, source):
+    """
+    Text chunks and usage carried by one SSE ``data:`` payload
+
+    Raises:
+        LLMError: The payload is an error event, isn't JSON, or lacks ``choices`` / ``delta``
+    """
+    try:
+        event = json.loads(data)
+        if event.get("error"):
+            error = event["error"]
+            raise LLMError(f"Model error: {error.get('message', error) if isinstance(error, dict) else error}")
+        usage = event.get("usage")
+        if "choices" not in event and not usage:
+            raise KeyError("choices")
+        chunks = [choice["delta"].get("content") for choice in event.get("choices") or []]
+        if usage:
+            chunks.append({"prompt_tokens": usage.get("prompt_tokens", 0),
+                           "completion_tokens": usage.get("completion_tokens", 0)})
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise LLMError(f"Malformed stream event from {source}: {data[:200]!r}") from e
+    return [chunk for chunk in chunks if chunk]
+
+def mock_reply(model, messages):
+    """The canned answer the simulated backends give"""
+    prompt = next((message["content"] for message in reversed(messages) if message["role"] == "user"), "")
+    return (f"This is a simulated response from {model}. In a real implementation, this would be the "
+            f"actual AI response to: '{prompt}'")
+
+class MockProvider(LLMProvider):
+    """
+    In-process simulated model, streaming a canned reply word by word
+
+    Args:
+        ttft (float): Seconds before the first word
+        tokens_per_second (float): Words streamed per second after that
+    """
+
+    name = "Simulated"
+
+    def __init__(self, ttft=0.2, tokens_per_second=60.0):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+
+    def stream(self, model, messages, temperature=0.7, max_tokens=1000, top_p=1.0, frequency_penalty=0.0):
+        words = mock_reply(model, messages).split(" ")[:max_tokens]
+        time.sleep(self.ttft)
+        for index, word in enumerate(words):
+            yield word if index == 0 else " " + word
+            time.sleep(1 / self.tokens_per_second)
+        yield {"prompt_tokens": sum(estimate_tokens(message["content"]) for message in messages),
+               "completion_tokens": len(words)}
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections isn't worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class MockOpenAIServer:
+    """
+    Local OpenAI-compatible HTTP server backed by ``MockProvider``
+
+    Lets the real HTTP/SSE client path be exercised without a model or an
+    API key: point ``OpenAICompatibleProvider`` at ``base_url``.
+
+    Args:
+        host (str): Interface to listen on
+        port (int): Port to listen on
+        provider (MockProvider): Where replies come from
+    """
+
+    def __init__(self, host="127.0.0.1", port=8089, provider=None):
+        self.provider = provider or MockProvider()
+        self.requests = 0
+        self._server = _QuietHTTPServer((host, port), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        # Port 0 picks a free port; report the one actually bound
+        self.host, self.port = self._server.server_address[:2]
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _write_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+                else:
+                    self._send_json(404, {"error": {"message": "Not found"}})
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found"}})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                server.requests += 1
+                model = request.get("model", "mock")
+                params = {key: request[key] for key in ("temperature", "max_tokens", "top_p", "frequency_penalty")
+                          if key in request}
+                chunks = server.provider.stream(model, request.get("messages", []), **params)
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+                if not request.get("stream"):
+                    parts = list(chunks)
+                    self._send_json(200, {
+                        "id": completion_id, "object": "chat.completion", "model": model,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": "".join(p for p in parts if isinstance(p, str))}}],
+                        "usage": next((p for p in parts if isinstance(p, dict)), {}),
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                include_usage = (request.get("stream_options") or {}).get("include_usage")
+                for chunk in chunks:
+                    if isinstance(chunk, dict):
+                        if not include_usage:
+                            continue
+                        event = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                                 "choices": [], "usage": {**chunk, "total_tokens": sum(chunk.values())}}
+                    else:
+                        event = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                                 "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]}
+                    self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+        return Handler
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+class LatencyTracker:
+    """
+    Recent time-to-first-token and generation speed per model
+
+    Args:
+        window (int): Responses remembered per model
+    """
+
+    def __init__(self, window=50):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, completion, model=None):
+        """Add a finished ``Completion``, under ``model`` if given (default: the model it was sent to)"""
+        if completion.ttft is None:
+            return
+        with self._lock:
+            samples = self._samples.setdefault(model or completion.model, deque(maxlen=self.window))
+            samples.append((completion.ttft, completion.tokens_per_second))
+
+    def summary(self, model):
+        """
+        Returns:
+            dict: ``ttft_p50``, ``ttft_last``, ``tokens_per_second`` (median) and ``samples``, or None
+        """
+        with self._lock:
+            samples = list(self._samples.get(model, ()))
+        if not samples:
+            return None
+        ttfts = sorted(ttft for ttft, _ in samples)
+        speeds = sorted(speed for _, speed in samples if speed)
+        return {
+            "ttft_p50": ttfts[len(ttfts) // 2],
+            "ttft_last": samples[-1][0],
+            "tokens_per_second": speeds[len(speeds) // 2] if speeds else None,
+            "samples": len(samples),
+        }
+
+@st.cache_resource
+def get_latency_tracker():
+    """Process-wide per-model latency stats"""
+    return LatencyTracker()
+
+@st.cache_resource
+def get_mock_provider():
+    """Shared in-process simulated model"""
+    return MockProvider()
+
+@st.cache_resource
+def get_openai_provider(base_url, api_key=""):
+    """Shared client per API endpoint, so its connection pool outlives reruns"""
+    return OpenAICompatibleProvider(base_url, api_key)
+
+@st.cache_resource
+def get_mock_llm_server(port=8089):
+    """Return the shared local mock OpenAI-compatible server, started on first use"""
+    return MockOpenAIServer(port=port)
+
+def default_connection():
+    """Base URL and API key from ``DASHBOARD_LLM_BASE_URL`` / ``DASHBOARD_LLM_API_KEY``"""
+    return os.environ.get("DASHBOARD_LLM_BASE_URL", DEFAULT_BASE_URL), os.environ.get("DASHBOARD_LLM_API_KEY", "")
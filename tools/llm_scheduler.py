@@ -0,0 +1,233 @@
+import streamlit as st
+import threading
+import uuid
+from collections import OrderedDict, deque
+from tools.llm_providers import LLMError
+
+# Request classes, most urgent first
+PRIORITIES = ("chat", "generation", "batch")
+
+class QueueFull(LLMError):
+    """A session already has as many requests waiting as it may"""
+
+    def __init__(self, message):
+        super().__init__(message, retryable=True)
+
+class Ticket:
+    """
+    One request's place in the scheduler
+
+    Wait on it until ``granted``, then hand it back with
+    ``LLMScheduler.release`` (also the way to give up a queued request).
+    """
+
+    def __init__(self, scheduler, model, priority, session):
+        self.scheduler = scheduler
+        self.model = model
+        self.priority = priority
+        self.session = session
+        self.granted = False
+        self.released = False
+        self._event = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until the request may run; returns False on timeout"""
+        return self._event.wait(timeout)
+
+    @property
+    def position(self):
+        """1-based place in the model's queue (0 once granted)"""
+        return self.scheduler.position(self)
+
+class _ModelQueue:
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = {priority: 0 for priority in PRIORITIES}
+        # Per priority: session -> FIFO of tickets, in round-robin order
+        self.waiting = {priority: OrderedDict() for priority in PRIORITIES}
+
+    @property
+    def running(self):
+        return sum(self.active.values())
+
+    def queued(self):
+        return sum(len(tickets) for sessions in self.waiting.values() for tickets in sessions.values())
+
+class LLMScheduler:
+    """
+    Process-wide admission control for LLM requests
+
+    Each model gets a concurrency limit shared by every session on the
+    server. Waiting requests are granted strictly by priority (``chat``
+    before ``generation`` before ``batch``); within a priority, sessions
+    take turns, one request each, so one user queueing many requests
+    doesn't hold everyone else back. ``reserved`` slots per model are only
+    ever given to chat, so a new chat message doesn't wait for a long
+    generation or a batch job to finish.
+
+    Args:
+        default_limit (int): Concurrent requests per model unless ``set_limit`` says otherwise
+        reserved (int): Slots per model kept for chat (when the limit allows)
+        max_queued (int): Requests one session may have waiting per model
+    """
+
+    def __init__(self, default_limit=4, reserved=1, max_queued=50):
+        self.default_limit = default_limit
+        self.reserved = reserved
+        self.max_queued = max_queued
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _queue(self, model):
+        queue = self._models.get(model)
+        if queue is None:
+            queue = self._models[model] = _ModelQueue(self.default_limit)
+        return queue
+
+    def set_limit(self, model, limit):
+        """Change a model's concurrency limit (waiting requests are granted if it grew)"""
+        with self._lock:
+            queue = self._queue(model)
+            queue.limit = max(1, int(limit))
+            self._grant(queue)
+
+    def _can_run(self, queue, priority):
+        free = queue.limit - queue.running
+        if priority == "chat":
+            return free > 0
+        # Chat always finds a reserved slot; with a limit of 1 there is nothing to reserve
+        return free > (self.reserved if queue.limit > self.reserved else 0)
+
+    def _grant(self, queue):
+        for priority in PRIORITIES:
+            sessions = queue.waiting[priority]
+            while sessions and self._can_run(queue, priority):
+                session, tickets = next(iter(sessions.items()))
+                ticket = tickets.popleft()
+                # Round robin: the session goes to the back of the line
+                del sessions[session]
+                if tickets:
+                    sessions[session] = tickets
+                ticket.granted = True
+                queue.active[priority] += 1
+                ticket._event.set()
+            if sessions:
+                # Lower priorities wait until this one has drained
+                return
+
+    def submit(self, model, priority="chat", session=None):
+        """
+        Queue a request
+
+        Args:
+            model (str): Dashboard model name
+            priority (str): One of ``PRIORITIES``
+            session (str): Fair-queuing key (browser session or batch job)
+
+        Returns:
+            Ticket: Already granted when a slot was free
+
+        Raises:
+            QueueFull: ``session`` has ``max_queued`` requests waiting for ``model``
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}")
+        with self._lock:
+            queue = self._queue(model)
+            tickets = queue.waiting[priority].get(session)
+            if tickets is not None and len(tickets) >= self.max_queued:
+                raise QueueFull(f"{len(tickets)} requests already waiting for {model}; try again shortly")
+            ticket = Ticket(self, model, priority, session)
+            queue.waiting[priority].setdefault(session, deque()).append(ticket)
+            self._grant(queue)
+            return ticket
+
+    def release(self, ticket):
+        """Free a granted request's slot, or withdraw a waiting one"""
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            queue = self._queue(ticket.model)
+            if ticket.granted:
+                queue.active[ticket.priority] -= 1
+            else:
+                sessions = queue.waiting[ticket.priority]
+                tickets = sessions.get(ticket.session)
+                if tickets is not None and ticket in tickets:
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del sessions[ticket.session]
+            self._grant(queue)
+
+    def position(self, ticket):
+        """
+        Requests ahead of ``ticket``, plus one, if nothing else arrives
+
+        Everything waiting at a higher priority goes first; at the same
+        priority, round robin serves each session ahead in turn order up
+        to as many requests as this one's own session has ahead of it.
+        """
+        with self._lock:
+            if ticket.granted or ticket.released:
+                return 0
+            queue = self._queue(ticket.model)
+            ahead = 0
+            for priority in PRIORITIES:
+                if priority == ticket.priority:
+                    break
+                ahead += sum(len(tickets) for tickets in queue.waiting[priority].values())
+            sessions = queue.waiting[ticket.priority]
+            own = sessions.get(ticket.session, ())
+            index = own.index(ticket) if ticket in own else 0
+            before = True
+            for session, tickets in sessions.items():
+                if session == ticket.session:
+                    before = False
+                    ahead += index
+                else:
+                    ahead += min(len(tickets), index + 1 if before else index)
+            return ahead + 1
+
+    def load(self, model):
+        """
+        Returns:
+            dict: ``limit``, ``running`` and ``queued`` for ``model``
+        """
+        with self._lock:
+            queue = self._queue(model)
+            return {"limit": queue.limit, "running": queue.running, "queued": queue.queued()}
+
+    def run(self, model, priority, session, on_wait=None, poll=0.25, cancel_event=None):
+        """
+        Wait for a slot, reporting the queue position while waiting
+
+        Args:
+            on_wait (callable): Called with the 1-based queue position each ``poll`` seconds
+            cancel_event (threading.Event): Stop waiting when set
+
+        Returns:
+            Ticket: Granted ticket (release it when done), or None if cancelled
+        """
+        ticket = self.submit(model, priority, session)
+        try:
+            while not ticket.wait(poll):
+                if cancel_event is not None and cancel_event.is_set():
+                    self.release(ticket)
+                    return None
+                if on_wait is not None:
+                    on_wait(ticket.position)
+        except BaseException:
+            # Script stopped (rerun, closed tab) while queued
+            self.release(ticket)
+            raise
+        return ticket
+
+@st.cache_resource
+def get_llm_scheduler():
+    """Return the process-wide LLM scheduler"""
+    return LLMScheduler()
+
+def session_key():
+    """Fair-queuing key for the current browser session"""
+    return st.session_state.setdefault("_llm_session", uuid.uuid4().hex)
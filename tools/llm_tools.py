@@ -1,13 +1,40 @@
 import streamlit as st
+import os
 import time
+import pandas as pd
 from datetime import datetime
+from tools.conversation import get_conversation
+from tools.fragments import fragment, rerun_fragment
+from tools.llm_batch import BATCH_FORMATS, get_batch_runner
+from tools.llm_cache import cache_key, get_response_cache
+from tools.llm_metering import get_usage_meter
+from tools.llm_providers import (
+    LLMError, default_connection, get_latency_tracker, get_mock_llm_server, get_mock_provider,
+    get_openai_provider,
+)
+from tools.llm_scheduler import get_llm_scheduler, session_key
+from tools.local_analysis import LOCAL_ANALYSES, get_local_analyzer
+from tools.storage import get_namespace
+
+# Chat messages rendered per "load older" step
+CHAT_PAGE_SIZE = 20
+
+# Prompt tokens are never squeezed below this, whatever the reply length
+MIN_CONTEXT_TOKENS = 256
+
+BACKENDS = ["Simulated", "OpenAI-compatible API", "Local mock server"]
+
+def parse_cost(cost_per_1k):
+    """Dollars per 1K tokens from a "$0.03"-style price ("Free ..." is 0)"""
+    try:
+        return float(cost_per_1k.lstrip("$"))
+    except ValueError:
+        return 0.0
 
 def run_llm_tools():
     """Run the LLM tools panel"""
     st.markdown("## 🤖 LLMs Panel")
     
-    st.info("🧠 This is a simulated LLM tools interface. In a real implementation, you would integrate with actual LLM APIs like OpenAI, Anthropic, etc.")
-    
     # LLM selection
     st.markdown("### 🤖 Select LLM Model")
     
@@ -16,30 +43,43 @@ def run_llm_tools():
             "description": "OpenAI's most advanced language model",
             "capabilities": ["Text generation", "Code completion", "Analysis", "Creative writing"],
             "max_tokens": 8192,
-            "cost_per_1k": "$0.03"
+            "cost_per_1k": "$0.03",
+            "api_model": "gpt-4",
+            "concurrency": 4
         },
         "Claude-3": {
             "description": "Anthropic's advanced AI assistant",
             "capabilities": ["Reasoning", "Analysis", "Writing", "Coding"],
             "max_tokens": 200000,
-            "cost_per_1k": "$0.015"
+            "cost_per_1k": "$0.015",
+            "api_model": "claude-3-opus",
+            "concurrency": 4
         },
         "Gemini Pro": {
             "description": "Google's multimodal AI model",
             "capabilities": ["Text generation", "Image analysis", "Code generation", "Reasoning"],
             "max_tokens": 32768,
-            "cost_per_1k": "$0.0025"
+            "cost_per_1k": "$0.0025",
+            "api_model": "gemini-pro",
+            "concurrency": 8
         },
         "Llama 2": {
             "description": "Meta's open-source language model",
             "capabilities": ["Text generation", "Conversation", "Code generation"],
             "max_tokens": 4096,
-            "cost_per_1k": "Free (self-hosted)"
+            "cost_per_1k": "Free (self-hosted)",
+            "api_model": "llama-2-7b-chat",
+            "concurrency": 2
         }
     }
     
     selected_model = st.selectbox("Choose LLM Model", list(llm_models.keys()))
     
+    # Requests each model runs at once, across all sessions
+    scheduler = get_llm_scheduler()
+    for name, info in llm_models.items():
+        scheduler.set_limit(name, info["concurrency"])
+    
     # Display model info
     if selected_model:
         model_info = llm_models[selected_model]
@@ -50,172 +90,477 @@ def run_llm_tools():
             st.markdown(f"**Description:** {model_info['description']}")
             st.markdown(f"**Max Tokens:** {model_info['max_tokens']:,}")
             st.markdown(f"**Cost per 1K tokens:** {model_info['cost_per_1k']}")
+            latency = get_latency_tracker().summary(selected_model)
+            if latency:
+                speed = f" · {latency['tokens_per_second']:.0f} tokens/s" if latency['tokens_per_second'] else ""
+                st.markdown(f"**Time to first token:** {latency['ttft_p50']:.2f}s median "
+                            f"(last {latency['ttft_last']:.2f}s, {latency['samples']} responses){speed}")
+            else:
+                st.markdown("**Time to first token:** not measured yet")
+            load = scheduler.load(selected_model)
+            st.markdown(f"**Load:** {load['running']} of {load['limit']} request slots in use · {load['queued']} queued")
         
         with col2:
             st.markdown("**Capabilities:**")
             for capability in model_info['capabilities']:
                 st.write(f"• {capability}")
     
+    llm = show_backend_settings(selected_model, model_info)
+    
+    # Settings
+    st.markdown("### ⚙️ Settings")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        temperature = st.slider("Temperature (Creativity)", 0.0, 2.0, 0.7, key="llm_temperature")
+        max_tokens = st.slider("Max Tokens", 100, 4000, 1000, key="llm_max_tokens")
+    
+    with col2:
+        top_p = st.slider("Top P", 0.1, 1.0, 0.9, key="llm_top_p")
+        frequency_penalty = st.slider("Frequency Penalty", -2.0, 2.0, 0.0, key="llm_frequency_penalty")
+    
+    # Sampled replies vary between calls, so only cache them when asked to
+    cache_sampled = st.checkbox("Cache responses when temperature is above 0", key="llm_cache_sampled",
+                                help="Identical prompts with identical settings get the stored reply instead of a new one")
+    llm["cache"] = temperature == 0 or cache_sampled
+    st.caption("⚡ Response cache is on" if llm["cache"] else "Response cache is off while temperature is above 0")
+    
+    llm["params"] = {
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "top_p": top_p,
+        "frequency_penalty": frequency_penalty,
+    }
+    # The model's context holds the prompt and the reply
+    llm["context_tokens"] = max(MIN_CONTEXT_TOKENS, model_info["max_tokens"] - max_tokens)
+    
+    show_chat(llm)
+    
+    # Advanced features
+    st.markdown("### ⚙️ Advanced Features")
+    
+    tab1, tab2, tab3 = st.tabs(["📝 Text Generation", "🔍 Analysis", "💻 Code Generation"])
+    
+    with tab1:
+        show_text_generation(llm)
+    
+    with tab2:
+        show_text_analysis(llm)
+        show_batch_analysis(llm)
+        show_batch_jobs(llm)
+    
+    with tab3:
+        show_code_generation(llm)
+    
+    # Usage statistics
+    st.markdown("### 📊 Usage Statistics")
+    
+    meter = get_usage_meter()
+    prices = {name: parse_cost(info["cost_per_1k"]) for name, info in llm_models.items()}
+    usage = meter.summary(prices=prices)
+    cache = get_response_cache()
+    cache_stats = cache.stats()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Total Requests", f"{usage['requests']:,}")
+    
+    with col2:
+        st.metric("Tokens Used", f"{usage['tokens']:,}",
+                  help=f"{usage['prompt_tokens']:,} prompt + {usage['completion_tokens']:,} completion")
+    
+    with col3:
+        st.metric("Cost", f"${usage['cost']:,.4f}")
+    
+    with col4:
+        st.metric("Success Rate", f"{usage['success_rate']:.1%}")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Cache Hit Rate", f"{cache_stats['hit_rate']:.1%}")
+    
+    with col2:
+        st.metric("Tokens Saved", f"{cache_stats['tokens_saved']:,}")
+    
+    with col3:
+        st.metric("Cached Responses", f"{cache_stats['entries']:,}", f"{cache_stats['bytes'] / 1024:,.0f} KB",
+                  delta_color="off")
+    
+    with col4:
+        if st.button("🗑️ Clear Cache", key="llm_clear_cache"):
+            cache.clear()
+            st.rerun()
+    
+    if usage["requests"]:
+        show_usage_breakdown(meter, prices)
+
+def show_usage_breakdown(meter, prices):
+    """Per-model usage table and latency percentiles over the last hour"""
+    rows = []
+    for model in meter.models():
+        summary = meter.summary(model, prices)
+        rows.append({
+            "Model": model,
+            "Requests": summary["requests"],
+            "Failed": summary["failures"],
+            "Prompt tokens": summary["prompt_tokens"],
+            "Completion tokens": summary["completion_tokens"],
+            "Cost": summary["cost"],
+            "p50": summary["p50"],
+            "p95": summary["p95"],
+            "p99": summary["p99"],
+            "TTFT p50": summary["ttft_p50"],
+        })
+    seconds = {name: st.column_config.NumberColumn(name, format="%.2f s") for name in ("p50", "p95", "p99", "TTFT p50")}
+    st.dataframe(
+        pd.DataFrame(rows),
+        hide_index=True,
+        column_config={"Cost": st.column_config.NumberColumn("Cost", format="$%.4f"), **seconds},
+    )
+    
+    chart_model = st.selectbox("Latency percentiles (last hour)", [meter.ALL] + meter.models(),
+                               key="llm_usage_chart_model")
+    points = meter.timeline(chart_model)
+    if points:
+        timeline = pd.DataFrame(points, columns=["Minute", "p50", "p95", "p99"])
+        timeline["Minute"] = pd.to_datetime(timeline["Minute"], unit="s")
+        st.line_chart(timeline.set_index("Minute"))
+        st.caption("Seconds per successful request, per minute")
+    else:
+        st.caption("No requests in the last hour")
+
+def show_backend_settings(selected_model, model_info):
+    """
+    Where requests for the selected model go
+
+    Returns:
+        dict: ``provider``, ``model`` (display name) and ``api_model``
+    """
+    with st.expander("🔌 Model Backend", expanded=False):
+        backend = st.radio("Backend", BACKENDS, horizontal=True, key="llm_backend",
+                           help="OpenAI-compatible covers OpenAI and local servers such as llama.cpp, vLLM and Ollama")
+        api_model = st.text_input("Model name sent to the API", value=model_info["api_model"],
+                                  key=f"llm_api_model_{selected_model}", disabled=backend == "Simulated")
+        provider = None
+        if backend == "OpenAI-compatible API":
+            base_url, api_key = default_connection()
+            col1, col2 = st.columns(2)
+            with col1:
+                base_url = st.text_input("Base URL", value=base_url, key="llm_base_url")
+            with col2:
+                api_key = st.text_input("API Key", value=api_key, type="password", key="llm_api_key")
+            try:
+                provider = get_openai_provider(base_url, api_key)
+            except LLMError as e:
+                st.error(str(e))
+        elif backend == "Local mock server":
+            try:
+                server = get_mock_llm_server()
+                provider = get_openai_provider(server.base_url)
+                st.caption(f"📡 Mock OpenAI-compatible server at {server.base_url} ({server.requests} requests so far)")
+            except (LLMError, OSError) as e:
+                st.error(f"Could not start the mock server: {e}")
+        else:
+            provider = get_mock_provider()
+    
+    if backend == "Simulated":
+        st.info("🧠 Simulated backend: replies are canned and streamed locally. Choose an OpenAI-compatible API under **Model Backend** to use a real model.")
+    
+    return {"provider": provider, "model": selected_model, "api_model": api_model}
+
+def stream_reply(llm, messages, priority="generation"):
+    """
+    Stream a completion into the page with ``st.write_stream``
+
+    The request first waits its turn in the ``LLMScheduler`` at
+    ``priority``, showing its queue position while it does.
+
+    Returns:
+        str: The full reply, or None if there is no backend or the request failed
+    """
+    if llm["provider"] is None:
+        st.error("No model backend configured.")
+        return None
+    cache = get_response_cache()
+    key = cache_key(llm["provider"].key, llm["api_model"], messages, llm["params"]) if llm.get("cache") else None
+    if key:
+        cached = cache.get(key)
+        if cached:
+            st.markdown(cached["response"])
+            st.caption(f"⚡ Cached response · {cached['tokens']:,} tokens saved")
+            return cached["response"]
+    meter = get_usage_meter()
+    tracker = get_latency_tracker()
+    scheduler = get_llm_scheduler()
+    waiting = st.empty()
+    try:
+        ticket = scheduler.run(llm["model"], priority, session_key(), on_wait=lambda position: waiting.caption(
+            f"⏳ {llm['model']} is busy: position {position} in the queue"))
+    except LLMError as e:
+        waiting.empty()
+        st.warning(str(e))
+        return None
+    waiting.empty()
+    # Latency is tracked under the dashboard's model name, not the API's
+    completion = llm["provider"].complete(llm["api_model"], messages,
+                                          on_finish=lambda done: tracker.record(done, llm["model"]), **llm["params"])
+    try:
+        st.write_stream(completion)
+    except LLMError as e:
+        meter.record(llm["model"], completion, ok=False)
+        st.error(f"{llm['model']} request failed: {e}")
+        return None
+    finally:
+        scheduler.release(ticket)
+    meter.record(llm["model"], completion)
+    if key:
+        cache.put(key, llm["api_model"], completion.text, sum(completion.usage.values()))
+    return completion.text
+
+@fragment
+def show_chat(llm):
+    """Chat history and input, rerun on their own"""
     # Chat interface
     st.markdown("### 💬 Chat Interface")
     
-    # Initialize chat history
-    if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+    conversation = get_conversation()
+    total = conversation.count()
+    
+    # Only the tail is rendered; older messages are paged in on request
+    visible = st.session_state.setdefault("llm_chat_visible", CHAT_PAGE_SIZE)
+    if total > visible:
+        if st.button(f"⬆️ Load older messages ({total - visible:,} more)", key="llm_chat_older"):
+            st.session_state.llm_chat_visible += CHAT_PAGE_SIZE
+            rerun_fragment()
     
     # Display chat history
-    for message in st.session_state.chat_history:
+    for message in conversation.recent(visible):
         with st.chat_message(message["role"]):
             st.write(message["content"])
     
     # Chat input
     if prompt := st.chat_input("Ask me anything..."):
         # Add user message to chat history
-        st.session_state.chat_history.append({"role": "user", "content": prompt})
+        conversation.add("user", prompt)
         
         # Display user message
         with st.chat_message("user"):
             st.write(prompt)
         
-        # Generate AI response
+        # Stream the AI response as it is generated
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                time.sleep(1)  # Simulate processing time
-                
-                # Simulated AI response
-                ai_response = f"This is a simulated response from {selected_model}. In a real implementation, this would be the actual AI response to: '{prompt}'"
-                
-                st.write(ai_response)
-                
-                # Add AI response to chat history
-                st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
+            context = conversation.context(llm["context_tokens"])
+            ai_response = stream_reply(llm, context["messages"], priority="chat")
+            
+            # Add AI response to chat history
+            if ai_response:
+                conversation.add("assistant", ai_response, model=llm["model"])
+    
+    if total:
+        # Read-only: turns are folded into the summary when a message is sent, not on every render
+        context = conversation.context(llm["context_tokens"], fold=False)
+        note = f" · {context['summarized']:,} earlier messages summarized" if context["summarized"] else ""
+        st.caption(f"🧠 Context: last {context['window']:,} messages, "
+                   f"{context['tokens']:,} of {llm['context_tokens']:,} tokens{note}")
+        if context["summarized"] and context["messages"][0]["role"] == "system":
+            with st.expander("Conversation summary"):
+                st.text(context["messages"][0]["content"])
     
     # Clear chat button
     if st.button("🗑️ Clear Chat"):
-        st.session_state.chat_history = []
-        st.rerun()
+        conversation.clear()
+        st.session_state.llm_chat_visible = CHAT_PAGE_SIZE
+        rerun_fragment()
+
+@fragment
+def show_text_generation(llm):
+    """Text generation tab"""
+    st.markdown("#### Text Generation")
     
-    # Advanced features
-    st.markdown("### ⚙️ Advanced Features")
+    generation_type = st.selectbox("Generation Type", ["Article", "Story", "Email", "Report", "Creative Writing"])
     
-    tab1, tab2, tab3 = st.tabs(["📝 Text Generation", "🔍 Analysis", "💻 Code Generation"])
+    topic = st.text_input("Topic/Subject")
+    tone = st.selectbox("Tone", ["Professional", "Casual", "Academic", "Creative", "Technical"])
+    length = st.slider("Length (words)", 50, 1000, 200)
     
-    with tab1:
-        st.markdown("#### Text Generation")
-        
-        generation_type = st.selectbox("Generation Type", ["Article", "Story", "Email", "Report", "Creative Writing"])
-        
-        topic = st.text_input("Topic/Subject")
-        tone = st.selectbox("Tone", ["Professional", "Casual", "Academic", "Creative", "Technical"])
-        length = st.slider("Length (words)", 50, 1000, 200)
-        
-        if st.button("📝 Generate Text"):
-            if topic:
-                with st.spinner("Generating text..."):
-                    time.sleep(2)
-                    
-                    # Simulated generated text
-                    generated_text = f"""
-This is a simulated {generation_type.lower()} about {topic} written in a {tone.lower()} tone. 
-
-In a real implementation, this would be an actual AI-generated {generation_type.lower()} with approximately {length} words, tailored to your specific requirements and the selected {selected_model} model.
-
-The content would be relevant, well-structured, and match the requested tone and length specifications.
-                    """
-                    
-                    st.text_area("Generated Text", generated_text, height=200)
-            else:
-                st.error("Please enter a topic!")
+    if st.button("📝 Generate Text"):
+        if topic:
+            messages = [
+                {"role": "system", "content": "You are a skilled writer. Reply with the requested text only."},
+                {"role": "user", "content": f"Write a {generation_type.lower()} of about {length} words about "
+                                            f"{topic}, in a {tone.lower()} tone."},
+            ]
+            with st.container(border=True):
+                stream_reply(llm, messages)
+        else:
+            st.error("Please enter a topic!")
+
+# Instruction sent for each analysis type
+ANALYSIS_PROMPTS = {
+    "Sentiment Analysis": "Classify the sentiment of the text as positive, negative or neutral, with a confidence percentage and a one-sentence reason.",
+    "Topic Extraction": "List the main topics of the text as a comma-separated list.",
+    "Key Points": "List the key points of the text as a numbered list.",
+    "Summary": "Summarize the text in two or three sentences.",
+    "Language Detection": "Name the language the text is written in, with a confidence percentage.",
+}
+
+@fragment
+def show_text_analysis(llm):
+    """Text analysis tab"""
+    st.markdown("#### Text Analysis")
     
-    with tab2:
-        st.markdown("#### Text Analysis")
-        
-        analysis_type = st.selectbox("Analysis Type", ["Sentiment Analysis", "Topic Extraction", "Key Points", "Summary", "Language Detection"])
-        
-        text_to_analyze = st.text_area("Text to Analyze", height=150)
-        
-        if st.button("🔍 Analyze"):
-            if text_to_analyze:
-                with st.spinner("Analyzing..."):
-                    time.sleep(1.5)
-                    
-                    # Simulated analysis results
-                    if analysis_type == "Sentiment Analysis":
-                        result = "Positive sentiment detected (confidence: 85%)"
-                    elif analysis_type == "Topic Extraction":
-                        result = "Main topics: technology, AI, automation, productivity"
-                    elif analysis_type == "Key Points":
-                        result = "1. AI tools improve efficiency\n2. Automation reduces manual work\n3. Integration is key for success"
-                    elif analysis_type == "Summary":
-                        result = "This text discusses the benefits of AI-powered automation tools and their impact on productivity and workflow efficiency."
-                    else:
-                        result = "Language: English (confidence: 95%)"
-                    
-                    st.success(f"Analysis Result: {result}")
-            else:
-                st.error("Please enter text to analyze!")
+    analysis_type = st.selectbox("Analysis Type", list(ANALYSIS_PROMPTS))
     
-    with tab3:
-        st.markdown("#### Code Generation")
-        
-        programming_language = st.selectbox("Programming Language", ["Python", "JavaScript", "Java", "C++", "Go", "Rust"])
-        code_type = st.selectbox("Code Type", ["Function", "Class", "Script", "API", "Algorithm"])
-        
-        code_description = st.text_area("Describe what you want the code to do", height=100)
-        
-        if st.button("💻 Generate Code"):
-            if code_description:
-                with st.spinner("Generating code..."):
-                    time.sleep(2)
-                    
-                    # Simulated code generation
-                    if programming_language == "Python":
-                        generated_code = f'''
-def {code_type.lower()}_{code_description.replace(" ", "_").lower()}():
-    """
-    {code_description}
-    """
-    # TODO: Implement the actual functionality
-    pass
-
-# Example usage
-if __name__ == "__main__":
-    result = {code_type.lower()}_{code_description.replace(" ", "_").lower()}()
-    print(result)
-'''
-                    else:
-                        generated_code = f"// {code_description}\n// TODO: Implement in {programming_language}"
-                    
-                    st.code(generated_code, language=programming_language.lower())
-            else:
-                st.error("Please describe what you want the code to do!")
+    text_to_analyze = st.text_area("Text to Analyze", height=150)
     
-    # Settings
-    st.markdown("### ⚙️ Settings")
+    if st.button("🔍 Analyze"):
+        if text_to_analyze:
+            messages = [
+                {"role": "system", "content": ANALYSIS_PROMPTS[analysis_type]},
+                {"role": "user", "content": text_to_analyze},
+            ]
+            st.markdown("**Analysis Result:**")
+            if analysis_type in LOCAL_ANALYSES:
+                # Classification doesn't need a model round trip
+                analyzer = get_local_analyzer()
+                started = time.perf_counter()
+                result = analyzer.analyze(analysis_type, text_to_analyze)
+                elapsed = time.perf_counter() - started
+                st.markdown(result)
+                st.caption(f"⚡ Answered locally in {elapsed * 1e6:,.0f} µs, no model call")
+            else:
+                stream_reply(llm, messages)
+        else:
+            st.error("Please enter text to analyze!")
+
+def start_batch(llm, job_id):
+    """Run or resume a batch job with the current backend and settings"""
+    return get_batch_runner().start(get_namespace(), job_id, llm, st.session_state.get("llm_batch_concurrency", 8),
+                                    meter=get_usage_meter(), tracker=get_latency_tracker(),
+                                    cache=get_response_cache(), local=get_local_analyzer(),
+                                    scheduler=get_llm_scheduler())
+
+@fragment
+def show_batch_analysis(llm):
+    """Batch analysis form, rerun on its own"""
+    st.markdown("#### 📂 Batch Analysis")
+    st.caption("Analyze every row of a CSV or JSONL file, or a long text file chunk by chunk. Results are written "
+               "as they finish, and an interrupted run picks up where it stopped.")
     
-    col1, col2 = st.columns(2)
+    upload = st.file_uploader("Input file", type=list(BATCH_FORMATS), key="llm_batch_file")
+    analyses = st.multiselect("Analyses", list(ANALYSIS_PROMPTS), default=["Sentiment Analysis"],
+                              key="llm_batch_analyses")
     
+    col1, col2, col3 = st.columns(3)
     with col1:
-        temperature = st.slider("Temperature (Creativity)", 0.0, 2.0, 0.7)
-        max_tokens = st.slider("Max Tokens", 100, 4000, 1000)
-    
+        field = st.text_input("Text column / field", key="llm_batch_field",
+                              help="Leave empty to use the first of text, content, body, message, review...")
     with col2:
-        top_p = st.slider("Top P", 0.1, 1.0, 0.9)
-        frequency_penalty = st.slider("Frequency Penalty", -2.0, 2.0, 0.0)
-    
-    # Usage statistics
-    st.markdown("### 📊 Usage Statistics")
+        st.slider("Concurrent requests", 1, 32, 8, key="llm_batch_concurrency")
+    with col3:
+        chunk_tokens = st.slider("Max tokens per chunk", 200, 4000, 1000, step=100, key="llm_batch_chunk_tokens")
     
-    col1, col2, col3, col4 = st.columns(4)
+    if st.button("🚀 Start Batch", key="llm_batch_start"):
+        if upload is None:
+            st.error("Please upload a file!")
+        elif not analyses:
+            st.error("Please pick at least one analysis!")
+        elif llm["provider"] is None:
+            st.error("No model backend configured.")
+        else:
+            job_id = get_batch_runner().create(get_namespace(), upload,
+                                               {analysis: ANALYSIS_PROMPTS[analysis] for analysis in analyses},
+                                               field.strip(), chunk_tokens)
+            start_batch(llm, job_id)
+            st.rerun()
+
+def batch_report(report):
+    """One-line throughput and latency summary of a batch run"""
+    reused = [f"{report[name]:,} {name}" for name in ("skipped", "coalesced", "cached") if report[name]]
+    if report.get("local"):
+        reused.append(f"{report['local']:,} answered locally")
+    return (f"{report['done']:,} results" + (f" ({', '.join(reused)})" if reused else "")
+            + f" · {report['failed']:,} failed · {report['requests']:,} requests in {report['elapsed']:.1f}s"
+            + f" · {report['rate']:.1f} results/s · latency p50 {report['p50'] * 1000:.0f} ms, "
+              f"p95 {report['p95'] * 1000:.0f} ms, p99 {report['p99'] * 1000:.0f} ms"
+            + (f" · TTFT p50 {report['ttft_p50'] * 1000:.0f} ms" if report["ttft_p50"] else ""))
+
+def show_batch_jobs(llm):
+    """Live progress of running batch jobs, then earlier ones"""
+    runner = get_batch_runner()
+    jobs = runner.jobs(get_namespace())
+    if any(job is not None and job.running for _, job in jobs):
+        show_batch_progress()
     
-    with col1:
-        st.metric("Total Requests", 156)
+    icons = {"finished": "✅", "paused": "⏸️", "failed": "❌", "new": "🆕"}
+    for manifest, job in jobs:
+        if job is not None and job.running:
+            continue
+        job_id = manifest["id"]
+        with st.expander(f"{icons.get(manifest['status'], '📄')} {manifest['name']} · "
+                         f"{', '.join(manifest['analyses'])} · {manifest['status']} · {manifest['created']}"):
+            if manifest.get("report"):
+                st.caption(batch_report(manifest["report"]))
+            if manifest.get("error"):
+                st.error(manifest["error"])
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                if manifest["status"] != "finished" and st.button("▶️ Resume", key=f"llm_batch_resume_{job_id}"):
+                    start_batch(llm, job_id)
+                    st.rerun()
+            with col2:
+                # Reading the results only when asked keeps big files out of every rerun
+                if st.button("📦 Prepare download", key=f"llm_batch_prepare_{job_id}"):
+                    st.session_state[f"llm_batch_ready_{job_id}"] = True
+                path = runner.results_path(get_namespace(), job_id)
+                if st.session_state.get(f"llm_batch_ready_{job_id}") and os.path.exists(path):
+                    with open(path, "rb") as handle:
+                        st.download_button("📥 Download results", handle.read(),
+                                           file_name=f"{os.path.splitext(manifest['name'])[0]}-results.jsonl",
+                                           mime="application/jsonl", key=f"llm_batch_download_{job_id}")
+            with col3:
+                if st.button("🗑️ Delete", key=f"llm_batch_delete_{job_id}"):
+                    runner.delete(get_namespace(), job_id)
+                    st.rerun()
+
+@fragment(run_every=1)
+def show_batch_progress():
+    """Progress of running batch jobs, refreshed every second"""
+    jobs = [job for _, job in get_batch_runner().jobs(get_namespace()) if job is not None and job.running]
+    if not jobs:
+        # Everything finished: rerun the page so the job list catches up
+        st.rerun()
+    for job in jobs:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.progress(job.progress, text=f"{job.manifest['name']} · {job.progress:.0%} read · "
+                                           f"{job.done:,} results · {job.failed:,} failed · {job.rate:.1f}/s")
+            st.caption(batch_report(job.report()))
+        with col2:
+            if st.button("⏸️ Pause", key=f"llm_batch_pause_{job.id}", disabled=job.cancel_event.is_set()):
+                job.cancel()
+
+@fragment
+def show_code_generation(llm):
+    """Code generation tab"""
+    st.markdown("#### Code Generation")
     
-    with col2:
-        st.metric("Tokens Used", "45.2K")
+    programming_language = st.selectbox("Programming Language", ["Python", "JavaScript", "Java", "C++", "Go", "Rust"])
+    code_type = st.selectbox("Code Type", ["Function", "Class", "Script", "API", "Algorithm"])
     
-    with col3:
-        st.metric("Cost", "$1.35")
+    code_description = st.text_area("Describe what you want the code to do", height=100)
     
-    with col4:
-        st.metric("Success Rate", "98.5%")
+    if st.button("💻 Generate Code"):
+        if code_description:
+            messages = [
+                {"role": "system", "content": f"You are an expert {programming_language} developer. Reply with one "
+                                              f"fenced {programming_language.lower()} code block and nothing else."},
+                {"role": "user", "content": f"Write a {code_type.lower()} that does the following: {code_description}"},
+            ]
+            stream_reply(llm, messages)
+        else:
+            st.error("Please describe what you want the code to do!")
@@ -0,0 +1,301 @@
+import streamlit as st
+import re
+import numpy as np
+
+# Analysis types answered here instead of by a model
+LOCAL_ANALYSES = ("Sentiment Analysis", "Language Detection")
+
+# Word -> valence (-3..3); English only
+SENTIMENT_LEXICON = {
+    **dict.fromkeys("good nice fine ok okay glad pleased helpful useful easy fast quick clean fair solid decent "
+                    "recommend recommended works working worth comfortable friendly polite smooth reliable "
+                    "satisfied thanks thank cool happy enjoy enjoyed like liked likes pretty well improved "
+                    "improvement support supportive positive calm safe fresh accurate affordable cheap".split(), 1.5),
+    **dict.fromkeys("great love loved loves lovely excellent awesome amazing wonderful fantastic beautiful "
+                    "brilliant perfect perfectly superb delighted impressive impressed outstanding best favorite "
+                    "favourite excited exciting recommendable gorgeous incredible terrific".split(), 2.5),
+    **dict.fromkeys("exceptional flawless phenomenal masterpiece extraordinary marvelous marvellous".split(), 3.0),
+    **dict.fromkeys("bad poor slow late wrong broken issue issues problem problems bug bugs error errors "
+                    "difficult hard confusing confused expensive overpriced noisy dirty rude annoying annoyed "
+                    "disappointing disappointed dislike unhappy sad sorry missing lost fail failed fails failure "
+                    "unreliable weak cheaply meh mediocre boring delay delayed damaged complaint crash crashes "
+                    "crashed refund cancel cancelled canceled negative worried upset tired useless".split(), -1.5),
+    **dict.fromkeys("terrible awful horrible hate hated hates worst scam angry furious disgusting pathetic "
+                    "ridiculous unacceptable nightmare garbage trash rubbish frustrating frustrated "
+                    "waste wasted dreadful appalling".split(), -2.5),
+    **dict.fromkeys("abysmal atrocious catastrophic fraud despise".split(), -3.0),
+    ":)": 1.5, ":-)": 1.5, ":d": 2.0, ";)": 1.0, ":(": -1.5, ":-(": -1.5,
+    "🙂": 1.5, "😀": 2.0, "😊": 2.0, "😍": 2.5, "👍": 1.5, "❤": 2.5, "🎉": 2.0,
+    "🙁": -1.5, "😞": -2.0, "😠": -2.5, "😡": -2.5, "👎": -1.5, "💩": -2.0,
+}
+NEGATIONS = frozenset("not no never nothing nobody none neither nor cannot can't cant don't dont doesn't doesnt "
+                      "didn't didnt isn't isnt wasn't wasnt aren't arent won't wont wouldn't wouldnt shouldn't "
+                      "couldn't hardly barely without".split())
+INTENSIFIERS = {"very": 0.3, "really": 0.3, "so": 0.2, "extremely": 0.5, "super": 0.4, "incredibly": 0.5,
+                "absolutely": 0.4, "totally": 0.3, "highly": 0.4, "too": 0.2, "quite": 0.1, "most": 0.3}
+
+# Tokens after a negation word whose valence is flipped (and damped)
+NEGATION_SCOPE = 3
+NEGATION_FACTOR = -0.74
+# Compound scores within this distance of 0 are neutral
+NEUTRAL_BAND = 0.05
+
+# Language name -> short sample of everyday text and function words (Latin script)
+LANGUAGE_SAMPLES = {
+    "English": "All human beings are born free and equal in dignity and rights. They are endowed with reason and "
+               "conscience and should act towards one another in a spirit of brotherhood. Thank you very much for "
+               "your help, the order arrived yesterday and everything works well. Could you please tell me when "
+               "the shop is open this weekend? I would like to know what time the meeting starts. "
+               "the of and to in is that it was for on are with as at be this have from or by what which "
+               "their there would about when your they we he she you not but all were been has who will",
+    "Spanish": "Todos los seres humanos nacen libres e iguales en dignidad y derechos y, dotados como están de "
+               "razón y conciencia, deben comportarse fraternalmente los unos con los otros. Muchas gracias por "
+               "su ayuda, el pedido llegó ayer y todo funciona bien. ¿Podría decirme cuándo está abierta la "
+               "tienda este fin de semana? Quisiera saber a qué hora empieza la reunión. "
+               "de la que el en y los se del las un por con no una su para es al lo como más pero sus le ya "
+               "este porque cuando muy sin sobre también me hasta hay donde quien desde todo nos durante",
+    "French": "Tous les êtres humains naissent libres et égaux en dignité et en droits. Ils sont doués de raison "
+              "et de conscience et doivent agir les uns envers les autres dans un esprit de fraternité. Merci "
+              "beaucoup pour votre aide, la commande est arrivée hier et tout fonctionne bien. Pourriez-vous me "
+              "dire quand le magasin est ouvert ce week-end ? Je voudrais savoir à quelle heure commence la "
+              "réunion. de la le et les des en un du une que est pour qui dans par plus pas au sur ne se ce "
+              "avec il elle nous vous mais ou sont cette aussi leur comme tout très sans être avoir fait",
+    "German": "Alle Menschen sind frei und gleich an Würde und Rechten geboren. Sie sind mit Vernunft und "
+              "Gewissen begabt und sollen einander im Geist der Brüderlichkeit begegnen. Vielen Dank für Ihre "
+              "Hilfe, die Bestellung ist gestern angekommen und alles funktioniert gut. Könnten Sie mir sagen, "
+              "wann das Geschäft an diesem Wochenende geöffnet ist? Ich möchte wissen, wann die Besprechung "
+              "beginnt. der die und in den von zu das mit sich des auf für ist im dem nicht ein eine als auch "
+              "es an werden aus er hat dass sie nach wird bei einer um noch wie einem über einen so zum",
+    "Italian": "Tutti gli esseri umani nascono liberi ed eguali in dignità e diritti. Essi sono dotati di ragione "
+               "e di coscienza e devono agire gli uni verso gli altri in spirito di fratellanza. Grazie mille "
+               "per il vostro aiuto, l'ordine è arrivato ieri e tutto funziona bene. Potrebbe dirmi quando il "
+               "negozio è aperto questo fine settimana? Vorrei sapere a che ora inizia la riunione. "
+               "di che il la e per un non in una sono mi ho lo ma ha le si con questo cosa se io del della "
+               "anche come ci nel alla più perché gli delle quando molto sempre degli",
+    "Portuguese": "Todos os seres humanos nascem livres e iguais em dignidade e em direitos. Dotados de razão e "
+                  "de consciência, devem agir uns para com os outros em espírito de fraternidade. Muito obrigado "
+                  "pela sua ajuda, o pedido chegou ontem e tudo funciona bem. Você poderia me dizer quando a "
+                  "loja está aberta neste fim de semana? Gostaria de saber a que horas começa a reunião. "
+                  "de que não o da em um para é com uma os no se na por mais as dos como mas foi ao ele das tem "
+                  "seu sua ou ser quando muito há nos já está também só pelo pela até isso ela entre você",
+    "Dutch": "Alle mensen worden vrij en gelijk in waardigheid en rechten geboren. Zij zijn begiftigd met "
+             "verstand en geweten, en behoren zich jegens elkander in een geest van broederschap te gedragen. "
+             "Hartelijk dank voor uw hulp, de bestelling is gisteren aangekomen en alles werkt goed. Kunt u mij "
+             "vertellen wanneer de winkel dit weekend open is? Ik zou graag weten hoe laat de vergadering "
+             "begint. de en van het een is dat op te zijn voor met die niet aan er om ook als bij maar uit "
+             "dan nog wel naar heeft hij ze wat wordt zijn door over tot kan hebben meer geen",
+}
+
+# Non-Latin scripts that identify the language on their own: (first code point, last, language)
+SCRIPT_LANGUAGES = [
+    (0x0370, 0x03FF, "Greek"),
+    (0x0400, 0x04FF, "Russian"),
+    (0x0590, 0x05FF, "Hebrew"),
+    (0x0600, 0x06FF, "Arabic"),
+    (0x0900, 0x097F, "Hindi"),
+    (0x0E00, 0x0E7F, "Thai"),
+    (0x1100, 0x11FF, "Korean"),
+    (0x3040, 0x30FF, "Japanese"),
+    (0x4E00, 0x9FFF, "Chinese"),
+    (0xAC00, 0xD7AF, "Korean"),
+]
+
+_TOKEN = re.compile(r"[\w']+|[:;]-?[()dp]|[\U0001F300-\U0001FAFF☀-➿]")
+_NON_LETTERS = re.compile(r"[\W\d_]+")
+
+def _trigrams(text):
+    padded = " " + _NON_LETTERS.sub(" ", text.lower()).strip() + " "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+class LocalAnalyzer:
+    """
+    CPU-only sentiment scoring and language detection
+
+    Sentiment is a lexicon model: word valences summed with negation and
+    intensifier handling, then squashed into a -1..1 compound score.
+    Languages are told apart by script (code-point ranges) and, for
+    Latin-script text, by a character-trigram naive Bayes model built
+    from ``LANGUAGE_SAMPLES``. Both models are NumPy arrays, and the batch
+    methods score many documents with a handful of vectorized operations.
+    """
+
+    def __init__(self):
+        words = list(SENTIMENT_LEXICON) + sorted(NEGATIONS - set(SENTIMENT_LEXICON)) + sorted(INTENSIFIERS)
+        self._vocab = {word: index for index, word in enumerate(words)}
+        self._valence = np.zeros(len(words) + 1, dtype=np.float32)  # last slot: unknown word
+        self._negation = np.zeros(len(words) + 1, dtype=bool)
+        self._boost = np.zeros(len(words) + 1, dtype=np.float32)
+        for word, index in self._vocab.items():
+            self._valence[index] = SENTIMENT_LEXICON.get(word, 0.0)
+            self._negation[index] = word in NEGATIONS
+            self._boost[index] = INTENSIFIERS.get(word, 0.0)
+
+        self.languages = list(LANGUAGE_SAMPLES)
+        grams = [_trigrams(sample) for sample in LANGUAGE_SAMPLES.values()]
+        self._grams = {gram: index for index, gram in enumerate(sorted({g for sample in grams for g in sample}))}
+        counts = np.ones((len(self.languages), len(self._grams)), dtype=np.float32)  # add-one smoothing
+        for row, sample in enumerate(grams):
+            np.add.at(counts[row], [self._grams[gram] for gram in sample], 1)
+        self._log_probs = np.log(counts / counts.sum(axis=1, keepdims=True)).T.copy()
+        bounds = []
+        for low, high, _ in SCRIPT_LANGUAGES:
+            bounds += [low, high + 1]
+        self._script_bounds = np.array(bounds, dtype=np.uint32)
+        self._script_names = [language for _, _, language in SCRIPT_LANGUAGES]
+
+    # Sentiment
+
+    def _token_ids(self, texts):
+        unknown = len(self._vocab)
+        ids, docs = [], []
+        for doc, text in enumerate(texts):
+            tokens = [self._vocab.get(token, unknown) for token in _TOKEN.findall(text.lower())]
+            ids += tokens
+            docs += [doc] * len(tokens)
+        return np.array(ids, dtype=np.int32), np.array(docs, dtype=np.int32)
+
+    def sentiment_scores(self, texts):
+        """
+        Compound sentiment per document
+
+        Returns:
+            numpy.ndarray: Scores in -1..1 (negative to positive)
+        """
+        ids, docs = self._token_ids(texts)
+        valence = self._valence[ids]
+        # Intensifiers push the next word's valence further from zero
+        boost = np.zeros_like(valence)
+        boost[1:] = self._boost[ids[:-1]] * (docs[1:] == docs[:-1])
+        valence = valence + np.sign(valence) * boost
+        # A negation flips the sentiment words in the next few tokens of the same document
+        negated = np.zeros(len(ids), dtype=bool)
+        is_negation = self._negation[ids]
+        for shift in range(1, NEGATION_SCOPE + 1):
+            negated[shift:] |= is_negation[:-shift] & (docs[shift:] == docs[:-shift])
+        valence = np.where(negated, valence * NEGATION_FACTOR, valence)
+        totals = np.bincount(docs, weights=valence, minlength=len(texts))
+        return totals / np.sqrt(totals * totals + 15)
+
+    def sentiment(self, text):
+        """
+        Returns:
+            dict: ``label`` (Positive/Negative/Neutral), ``confidence`` (0..1), ``score``
+            and the ``positive``/``negative`` words found
+        """
+        score = float(self.sentiment_scores([text])[0])
+        words = _TOKEN.findall(text.lower())
+        return {
+            **self._sentiment_label(score),
+            "score": score,
+            "positive": sorted({word for word in words if SENTIMENT_LEXICON.get(word, 0) > 0}),
+            "negative": sorted({word for word in words if SENTIMENT_LEXICON.get(word, 0) < 0}),
+        }
+
+    @staticmethod
+    def _sentiment_label(score):
+        if score >= NEUTRAL_BAND:
+            return {"label": "Positive", "confidence": 0.5 + score / 2}
+        if score <= -NEUTRAL_BAND:
+            return {"label": "Negative", "confidence": 0.5 - score / 2}
+        return {"label": "Neutral", "confidence": 1 - abs(score) * 10}
+
+    # Language
+
+    def language_probabilities(self, texts):
+        """
+        Latin-script language probabilities per document
+
+        Returns:
+            numpy.ndarray: (documents, ``languages``) probabilities
+        """
+        lookup = self._grams.get
+        ids, counts = [], np.zeros(len(texts), dtype=np.int64)
+        for doc, text in enumerate(texts):
+            grams = [index for index in map(lookup, _trigrams(text)) if index is not None]
+            ids += grams
+            counts[doc] = len(grams)
+        # Documents are contiguous runs of rows, so each one's score is a segment sum
+        scores = np.zeros((len(texts), len(self.languages)), dtype=np.float32)
+        if ids:
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            present = counts > 0
+            scores[present] = np.add.reduceat(self._log_probs[np.array(ids)], starts[present], axis=0)
+        # Naive Bayes is overconfident; scale by the evidence before normalizing
+        scores /= np.sqrt(np.maximum(counts, 1))[:, None]
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    def _scripts(self, texts):
+        # Letters per non-Latin script range and Latin letters, per document, in one pass over all code points
+        points = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32)
+        docs = np.repeat(np.arange(len(texts)), [len(text) for text in texts])
+        slots = np.searchsorted(self._script_bounds, points, side="right")
+        inside = slots % 2 == 1
+        ranges = len(SCRIPT_LANGUAGES)
+        found = np.bincount(docs[inside] * ranges + slots[inside] // 2,
+                            minlength=len(texts) * ranges).reshape(len(texts), ranges)
+        lowered = points | 0x20
+        latin = ((lowered >= ord("a")) & (lowered <= ord("z"))) | ((points >= 0xC0) & (points <= 0x24F))
+        return found, np.bincount(docs[latin], minlength=len(texts))
+
+    def languages_batch(self, texts):
+        """
+        Returns:
+            list: ``(language, confidence)`` per document; ``("Unknown", 0.0)`` without letters
+        """
+        found, latin_letters = self._scripts(texts)
+        best = found.argmax(axis=1)
+        letters = found.sum(axis=1) + latin_letters
+        results, latin = [], []
+        for index, (column, count) in enumerate(zip(best, found[np.arange(len(texts)), best])):
+            if not letters[index]:
+                results.append(("Unknown", 0.0))
+            elif count * 2 > letters[index]:
+                # Mostly one non-Latin script; Han characters with any kana are Japanese
+                name = self._script_names[column]
+                if name == "Chinese" and found[index, self._script_names.index("Japanese")]:
+                    name = "Japanese"
+                results.append((name, min(0.99, float(count / letters[index]))))
+            else:
+                results.append(None)
+                latin.append(index)
+        if latin:
+            probabilities = self.language_probabilities([texts[index] for index in latin])
+            for index, row in zip(latin, probabilities):
+                column = int(row.argmax())
+                results[index] = (self.languages[column], float(row[column]))
+        return results
+
+    def language(self, text):
+        """
+        Returns:
+            dict: ``language`` and ``confidence`` (0..1)
+        """
+        language, confidence = self.languages_batch([text])[0]
+        return {"language": language, "confidence": confidence}
+
+    # Results in the panel's wording
+
+    def analyze(self, analysis_type, text):
+        """Markdown result for one of ``LOCAL_ANALYSES``"""
+        return self.analyze_batch(analysis_type, [text])[0]
+
+    def analyze_batch(self, analysis_type, texts):
+        """Markdown results for many documents at once"""
+        if analysis_type == "Sentiment Analysis":
+            results = []
+            for text, score in zip(texts, self.sentiment_scores(texts)):
+                label = self._sentiment_label(float(score))
+                words = _TOKEN.findall(text.lower())
+                found = [word for word in dict.fromkeys(words) if SENTIMENT_LEXICON.get(word)]
+                reason = f"Sentiment words: {', '.join(found[:8])}." if found else "No strongly positive or negative words."
+                results.append(f"**{label['label']}** ({label['confidence']:.0%} confidence). {reason}")
+            return results
+        if analysis_type == "Language Detection":
+            return [f"**{language}** ({confidence:.0%} confidence)" for language, confidence in self.languages_batch(texts)]
+        raise ValueError(f"{analysis_type!r} is not a local analysis")
+
+@st.cache_resource
+def get_local_analyzer():
+    """Shared local analyzer (models are built once per process)"""
+    return LocalAnalyzer()
@@ -0,0 +1,270 @@
+import streamlit as st
+import gzip
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from tools.fragments import rerun_fragment
+from tools.storage import Between, Collection, data_path, record_matches
+
+DEFAULT_ARCHIVE_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "archive")
+
+# Collection -> (counted field, its usual values, time field); times are "YYYY-MM-DD HH:MM" strings
+HISTORIES = {
+    "sms_history": ("status", ("Sent", "Failed", "Pending"), "sent_time"),
+    "whatsapp_messages": ("type", ("sent", "received"), "time"),
+}
+
+class MessageHistory:
+    """
+    Append-only message log with running counters and archived segments
+
+    Recent messages live in a storage collection. Once it holds more than
+    ``live_limit + segment_size`` records, the oldest ``segment_size`` are
+    written to a gzip-compressed JSON-lines segment file and pruned from
+    storage, so the live table stays bounded however many messages are
+    sent. Counts per value of ``counter_field`` cover live and archived
+    messages and are updated as messages are added, so statistics never
+    scan the log.
+
+    Args:
+        collection (Collection): Live message collection
+        counter_field (str): Field counted per value (e.g. ``status``)
+        counter_values (tuple): Values of ``counter_field`` to count when
+            rebuilding the counters from storage
+        time_field (str): Sortable timestamp field used for date filters
+        live_limit (int): Messages kept in storage after archiving
+        segment_size (int): Messages per archived segment
+        archive_root (str): Directory holding the segments
+    """
+
+    def __init__(self, collection, counter_field, counter_values, time_field, live_limit=5000, segment_size=1000,
+                 archive_root=DEFAULT_ARCHIVE_ROOT):
+        self.collection = collection
+        self.counter_field = counter_field
+        self.counter_values = tuple(counter_values)
+        self.time_field = time_field
+        self.live_limit = live_limit
+        self.segment_size = segment_size
+        self.directory = os.path.join(archive_root, collection.name, collection.namespace)
+        self._lock = threading.Lock()
+        self._manifest = self._read_manifest()
+        self._counts = {}
+        self._recount()
+
+    @property
+    def name(self):
+        return self.collection.name
+
+    @property
+    def namespace(self):
+        return self.collection.namespace
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path()) as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return {"segments": [], "counts": {}, "total": 0}
+
+    def _write_manifest(self):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".manifest-")
+        with os.fdopen(fd, "w") as handle:
+            json.dump(self._manifest, handle)
+        os.replace(temp_path, self._manifest_path())
+
+    def _recount(self):
+        """Rebuild the counters from storage and the archive manifest"""
+        backend = self.collection.backend
+        self._version = backend.version(self.name, self.namespace)
+        self._live = backend.count(self.name, self.namespace)
+        counts = dict(self._manifest["counts"])
+        for value in set(self.counter_values) | set(counts) | set(self._counts):
+            counts[value] = counts.get(value, 0) + backend.count(self.name, self.namespace, **{self.counter_field: value})
+        self._counts = {value: count for value, count in counts.items() if count}
+        self._total = self._manifest["total"] + self._live
+
+    @property
+    def total(self):
+        """Messages ever added, archived ones included"""
+        self._check_version()
+        return self._total
+
+    def counts(self):
+        """``counter_field`` value -> number of messages"""
+        self._check_version()
+        return dict(self._counts)
+
+    def _check_version(self):
+        # Something wrote to the collection without going through this log
+        with self._lock:
+            if self.collection.backend.version(self.name, self.namespace) != self._version:
+                self._recount()
+
+    def add(self, record):
+        """Append a message, archiving the oldest segment when storage is full"""
+        backend = self.collection.backend
+        with self._lock:
+            in_sync = backend.version(self.name, self.namespace) == self._version
+            record_id = self.collection.add(record)
+            if not in_sync:
+                self._recount()
+            else:
+                value = record.get(self.counter_field)
+                self._counts[value] = self._counts.get(value, 0) + 1
+                self._total += 1
+                self._live += 1
+                self._version = backend.version(self.name, self.namespace)
+            if self._live > self.live_limit + self.segment_size:
+                self._archive_segment()
+            return record_id
+
+    def _archive_segment(self):
+        backend = self.collection.backend
+        keep_from = backend.fetch(self.name, self.namespace, limit=self.live_limit + 1, newest_first=True)[-1]["id"]
+        old = backend.fetch(self.name, self.namespace, before_id=keep_from)
+        if not old:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        file_name = f"{old[0]['id']:012d}-{old[-1]['id']:012d}.jsonl.gz"
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".segment-")
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as handle:
+            for record in old:
+                handle.write(json.dumps(record).encode() + b"\n")
+        os.replace(temp_path, os.path.join(self.directory, file_name))
+
+        times = [record.get(self.time_field) or "" for record in old]
+        self._manifest["segments"].append({
+            "file": file_name,
+            "first_id": old[0]["id"],
+            "last_id": old[-1]["id"],
+            "first_time": min(times),
+            "last_time": max(times),
+            "count": len(old),
+        })
+        for record in old:
+            value = record.get(self.counter_field)
+            self._manifest["counts"][value] = self._manifest["counts"].get(value, 0) + 1
+        self._manifest["total"] += len(old)
+        self._write_manifest()
+
+        backend.prune(self.name, self.namespace, keep_from)
+        self._live -= len(old)
+        self._version = backend.version(self.name, self.namespace)
+
+    @property
+    def segments(self):
+        """Archived segments, oldest first"""
+        return list(self._manifest["segments"])
+
+    def _read_segment(self, segment):
+        with gzip.open(os.path.join(self.directory, segment["file"]), "rt") as handle:
+            return [json.loads(line) for line in handle]
+
+    def page(self, before_id=None, limit=10, recipient=None, day=None):
+        """
+        One page of messages, newest first
+
+        Args:
+            before_id (int): Cursor from the previous page (None for the newest)
+            limit (int): Page size
+            recipient (str): Only messages to this recipient
+            day (date): Only messages from this day
+
+        Returns:
+            tuple: (messages: list, next_cursor: int or None when there are no older messages)
+        """
+        filters = {}
+        if recipient:
+            filters["recipient"] = recipient
+        if day:
+            filters[self.time_field] = Between(day.isoformat(), (day + timedelta(days=1)).isoformat())
+
+        # One extra row tells whether there is an older page
+        query = ("page", before_id, limit) + tuple(sorted(filters.items()))
+        records = list(self.collection._cached(query, lambda: self.collection.backend.fetch(
+            self.name, self.namespace, limit=limit + 1, before_id=before_id, newest_first=True, **filters)))
+
+        # Carry on into the archive, newest segment first, skipping segments outside the day
+        time_range = filters.get(self.time_field)
+        for segment in reversed(self._manifest["segments"]):
+            if len(records) > limit:
+                break
+            if before_id is not None and segment["first_id"] >= before_id:
+                continue
+            if time_range and (segment["last_time"] < time_range.low or segment["first_time"] >= time_range.high):
+                continue
+            older = [record for record in reversed(self._read_segment(segment))
+                     if (before_id is None or record["id"] < before_id) and record_matches(record, filters)]
+            records.extend(older[:limit + 1 - len(records)])
+
+        if len(records) > limit:
+            return records[:limit], records[limit - 1]["id"]
+        return records, None
+
+@st.cache_resource
+def _histories():
+    return {}
+
+_histories_lock = threading.Lock()
+
+def get_message_history(name):
+    """Return the message log for a collection in ``HISTORIES``, shared by every session on the profile"""
+    collection = Collection(name)
+    key = (name, id(collection.backend), collection.namespace)
+    with _histories_lock:
+        histories = _histories()
+        history = histories.get(key)
+        if history is None:
+            counter_field, counter_values, time_field = HISTORIES[name]
+            archive_root = data_path("DASHBOARD_ARCHIVE", DEFAULT_ARCHIVE_ROOT)
+            history = histories[key] = MessageHistory(collection, counter_field, counter_values, time_field,
+                                                      archive_root=archive_root)
+    return history
+
+def show_history_page(history, key, render, page_size=10):
+    """
+    Filterable, cursor-paged message list
+
+    Args:
+        history (MessageHistory): Log to show
+        key (str): Widget key prefix
+        render (callable): Draws one message
+        page_size (int): Messages per page
+
+    Returns:
+        int: Number of messages shown
+    """
+    col1, col2 = st.columns(2)
+    with col1:
+        recipient = st.text_input("Filter by recipient", key=f"{key}_recipient").strip()
+    with col2:
+        day = st.date_input("Filter by date", value=None, key=f"{key}_day")
+
+    # Cursors of the pages above the current one; any filter change starts over
+    state = st.session_state.setdefault(f"{key}_pages", {"filters": None, "cursors": [None]})
+    if state["filters"] != (recipient, day):
+        state.update(filters=(recipient, day), cursors=[None])
+
+    records, next_cursor = history.page(state["cursors"][-1], page_size, recipient=recipient, day=day)
+    for record in records:
+        render(record)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("⬅️ Newer", key=f"{key}_newer", disabled=len(state["cursors"]) == 1):
+            state["cursors"].pop()
+            rerun_fragment()
+    with col2:
+        st.caption(f"Page {len(state['cursors'])} · {history.total:,} messages"
+                   + (f" · {sum(s['count'] for s in history.segments):,} archived" if history.segments else ""))
+    with col3:
+        if st.button("Older ➡️", key=f"{key}_older", disabled=next_cursor is None):
+            state["cursors"].append(next_cursor)
+            rerun_fragment()
+    return len(records)
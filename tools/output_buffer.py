@@ -0,0 +1,248 @@
+import streamlit as st
+import io
+import mmap
+import os
+import re
+import tempfile
+import weakref
+from collections import deque
+
+# Default in-memory budget for one command's output (head + tail)
+DEFAULT_MAX_BYTES = 256 * 1024
+
+class OutputCapture:
+    """
+    Bounded capture of a command's output
+
+    Output is kept entirely in memory until it exceeds ``max_bytes``. From
+    then on only the first and last ``max_bytes // 2`` bytes stay in memory
+    (the tail as a ring of chunks) and the full output is spilled to a
+    temporary file, which is memory-mapped for paging and searching.
+    Without ``spill`` the middle is simply dropped and only counted.
+
+    Args:
+        max_bytes (int): In-memory budget for head + tail
+        spill_dir (str): Directory for the spill file (default: system temp)
+        spill (bool): Keep the full output on disk once it is truncated
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, spill_dir=None, spill=True):
+        self.max_bytes = max(2, int(max_bytes))
+        self.spill_dir = spill_dir
+        self.spill = spill
+        self.total_bytes = 0
+        self.truncated = False   # head + tail mode
+        self.path = None
+
+        self._buffer = bytearray()   # full output until the first spill
+        self._head = b""
+        self._tail = deque()
+        self._tail_bytes = 0
+        self._file = None
+        self._finalizer = None
+
+    @property
+    def spilled(self):
+        return self.path is not None
+
+    @property
+    def omitted_bytes(self):
+        """Bytes held neither in the head nor in the tail"""
+        return self.total_bytes - len(self._head) - self._tail_bytes if self.truncated else 0
+
+    def write(self, data):
+        """Append output (``str`` is encoded as UTF-8)"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not data:
+            return
+        self.total_bytes += len(data)
+
+        if not self.truncated:
+            self._buffer += data
+            if len(self._buffer) <= self.max_bytes:
+                return
+            self._truncate()
+            return
+
+        if self._file is not None:
+            self._file.write(data)
+        self._push_tail(data)
+
+    def _truncate(self):
+        """Switch to head + tail mode, moving the in-memory buffer to disk when spilling"""
+        if self.spill:
+            fd, self.path = tempfile.mkstemp(prefix="ssh-output-", suffix=".log", dir=self.spill_dir)
+            self._file = os.fdopen(fd, "wb")
+            self._finalizer = weakref.finalize(self, _remove_file, self._file, self.path)
+            self._file.write(self._buffer)
+
+        self.truncated = True
+        half = self.max_bytes // 2
+        self._head = bytes(self._buffer[:half])
+        self._push_tail(bytes(self._buffer[-half:]))
+        self._buffer = bytearray()
+
+    def _push_tail(self, data):
+        limit = self.max_bytes // 2
+        if len(data) >= limit:
+            self._tail.clear()
+            self._tail.append(data[-limit:])
+            self._tail_bytes = limit
+            return
+        self._tail.append(data)
+        self._tail_bytes += len(data)
+        # Drop whole chunks from the front, then trim the oldest remaining one
+        while self._tail_bytes - len(self._tail[0]) >= limit:
+            self._tail_bytes -= len(self._tail.popleft())
+        excess = self._tail_bytes - limit
+        if excess > 0:
+            self._tail[0] = self._tail[0][excess:]
+            self._tail_bytes -= excess
+
+    def finish(self):
+        """Flush the spill file once the command has exited"""
+        if self._file is not None and not self._file.closed:
+            self._file.flush()
+
+    def tail_text(self, max_chars=None):
+        """Return the most recent output as text"""
+        data = bytes(self._buffer) if not self.truncated else b"".join(self._tail)
+        text = data.decode("utf-8", errors="replace")
+        return text[-max_chars:] if max_chars else text
+
+    def preview(self):
+        """Return the full output, or head + tail with the omitted size noted"""
+        if not self.truncated:
+            return self._buffer.decode("utf-8", errors="replace")
+        hint = ", use the viewer below to page through them" if self.spilled else ""
+        return (
+            self._head.decode("utf-8", errors="replace")
+            + f"\n\n... {self.omitted_bytes:,} bytes omitted{hint} ...\n\n"
+            + b"".join(self._tail).decode("utf-8", errors="replace")
+        )
+
+    def _map(self):
+        self.finish()
+        with open(self.path, "rb") as handle:
+            return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def page_count(self, page_bytes):
+        if not self.spilled:
+            return 1
+        return max(1, -(-self.total_bytes // page_bytes))
+
+    def read_page(self, page, page_bytes):
+        """
+        Return one page of the spilled output
+
+        Pages are fixed byte ranges widened to whole lines, so a page never
+        starts or ends in the middle of a line.
+        """
+        if not self.spilled:
+            return self.preview()
+        with self._map() as mm:
+            start = page * page_bytes
+            end = min(len(mm), start + page_bytes)
+            if start > 0:
+                start = mm.find(b"\n", start - 1) + 1 or end
+            if end < len(mm):
+                newline = mm.find(b"\n", end - 1)
+                end = len(mm) if newline == -1 else newline + 1
+            return mm[start:end].decode("utf-8", errors="replace")
+
+    def search(self, pattern, max_results=200, page_bytes=None):
+        """
+        Find lines matching a regex in the full output
+
+        Returns:
+            list: (page: int, line: str) tuples, at most ``max_results``
+        """
+        regex = re.compile(pattern.encode("utf-8"), re.IGNORECASE | re.MULTILINE)
+        results = []
+
+        if not self.spilled:
+            for line in self._memory().splitlines():
+                if regex.search(line):
+                    results.append((0, line.decode("utf-8", errors="replace")))
+                    if len(results) >= max_results:
+                        break
+            return results
+
+        with self._map() as mm:
+            last_line_start = -1
+            for match in regex.finditer(mm):
+                line_start = mm.rfind(b"\n", 0, match.start()) + 1
+                if line_start == last_line_start:
+                    continue
+                last_line_start = line_start
+                line_end = mm.find(b"\n", match.start())
+                line_end = len(mm) if line_end == -1 else line_end
+                page = line_start // page_bytes if page_bytes else 0
+                results.append((page, mm[line_start:line_end].decode("utf-8", errors="replace")))
+                if len(results) >= max_results:
+                    break
+        return results
+
+    def open(self):
+        """Open the full output for reading as a binary file"""
+        if not self.spilled:
+            return io.BytesIO(self._memory())
+        self.finish()
+        return open(self.path, "rb")
+
+    def _memory(self):
+        # Everything held in memory: the full output, or head + tail when not spilled
+        if not self.truncated:
+            return bytes(self._buffer)
+        return self._head + b"".join(self._tail)
+
+    def cleanup(self):
+        """Delete the spill file"""
+        if self._finalizer is not None:
+            self._finalizer()
+
+def _remove_file(handle, path):
+    try:
+        handle.close()
+        os.remove(path)
+    except OSError:
+        pass
+
+def show_output_viewer(capture, key, page_bytes=64 * 1024):
+    """Show a paged, searchable viewer with a download link for a capture"""
+    if not capture.spilled:
+        st.code(capture.preview() or " ")
+        st.download_button("📥 Download output", capture.open(), file_name="output.log", key=f"{key}_download")
+        return
+
+    st.caption(f"📦 {capture.total_bytes:,} bytes captured; showing head and tail. Full output is on disk.")
+
+    tab_preview, tab_pages, tab_search = st.tabs(["👀 Head & Tail", "📄 Pages", "🔍 Search"])
+
+    with tab_preview:
+        st.code(capture.preview())
+
+    with tab_pages:
+        pages = capture.page_count(page_bytes)
+        page = st.number_input(f"Page (1-{pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+        st.code(capture.read_page(page - 1, page_bytes))
+
+    with tab_search:
+        pattern = st.text_input("Search (regex, case-insensitive)", key=f"{key}_search")
+        if pattern:
+            try:
+                matches = capture.search(pattern, page_bytes=page_bytes)
+            except re.error as e:
+                st.error(f"Invalid pattern: {e}")
+            else:
+                st.caption(f"{len(matches)} matching line(s) shown")
+                st.code("\n".join(f"[p{page + 1}] {line}" for page, line in matches) or "No matches")
+
+    # Reading the file only when asked keeps big artifacts out of every rerun
+    if st.button("📦 Prepare full download", key=f"{key}_prepare"):
+        st.session_state[f"{key}_download_ready"] = True
+    if st.session_state.get(f"{key}_download_ready"):
+        with capture.open() as handle:
+            st.download_button("📥 Download full output", handle.read(), file_name="output.log",
+                               mime="text/plain", key=f"{key}_download")
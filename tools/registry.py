@@ -0,0 +1,87 @@
+"""
+Lazy registry of the dashboard's tool modules.
+
+Tools are imported the first time their section is selected instead of on
+every script run. ``python -m tools.registry`` prints each module's cold
+import time.
+"""
+import importlib
+import os
+import subprocess
+import sys
+
+# Tool key -> (module, entry point)
+TOOLS = {
+    "grocery_manager": ("tools.grocery_manager", "run_grocery_manager"),
+    "whatsapp_bot": ("tools.whatsapp_bot", "run_whatsapp_bot"),
+    "email_scheduler": ("tools.email_scheduler", "run_email_scheduler"),
+    "linkedin_automation": ("tools.linkedin_automation", "run_linkedin_automation"),
+    "instagram_bot": ("tools.instagram_bot", "run_instagram_bot"),
+    "sms_sender": ("tools.sms_sender", "run_sms_sender"),
+    "llm_tools": ("tools.llm_tools", "run_llm_tools"),
+}
+
+# Helper modules that are not tools but are also only needed by some sections
+MODULES = {
+    "ssh_utils": "tools.ssh_utils",
+    "output_buffer": "tools.output_buffer",
+}
+
+def load_module(name):
+    """Import a registered helper module on first use"""
+    return importlib.import_module(MODULES[name])
+
+def load_tool(name):
+    """
+    Return a tool's ``run_*`` entry point, importing its module on first use
+
+    Args:
+        name (str): Tool key from ``TOOLS``
+
+    Returns:
+        callable: The tool's entry point
+    """
+    module_name, entry_point = TOOLS[name]
+    return getattr(importlib.import_module(module_name), entry_point)
+
+def run_tool(name):
+    """Import (if needed) and run a tool"""
+    load_tool(name)()
+
+def benchmark_imports(python=sys.executable, repeat=3):
+    """
+    Measure the cold import time of every registered module
+
+    Each measurement runs in a fresh interpreter with streamlit already
+    imported, so the numbers show what each module adds on top of the
+    framework itself.
+
+    Returns:
+        list: (module: str, best_seconds: float) sorted slowest first
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    modules = [module for module, _ in TOOLS.values()] + list(MODULES.values())
+    results = []
+
+    for module in modules:
+        code = (
+            "import time, streamlit\n"
+            "start = time.perf_counter()\n"
+            f"import {module}\n"
+            "print(time.perf_counter() - start)\n"
+        )
+        timings = []
+        for _ in range(repeat):
+            completed = subprocess.run([python, "-c", code], cwd=root, capture_output=True, text=True)
+            if completed.returncode != 0:
+                raise RuntimeError(f"Importing {module} failed:\n{completed.stderr}")
+            timings.append(float(completed.stdout.strip().splitlines()[-1]))
+        results.append((module, min(timings)))
+
+    return sorted(results, key=lambda result: result[1], reverse=True)
+
+if __name__ == "__main__":
+    print(f"{'Module':<32} {'Import time':>12}")
+    print("-" * 45)
+    for module, seconds in benchmark_imports():
+        print(f"{module:<32} {seconds * 1000:>9.1f} ms")
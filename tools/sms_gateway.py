@@ -0,0 +1,420 @@
+import streamlit as st
+import itertools
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+try:
+    import requests
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
+
+try:
+    import boto3
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+class SMSError(Exception):
+    """A message could not be sent; ``retryable`` marks throttling and transient failures"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+class TokenBucket:
+    """
+    Thread-safe token bucket
+
+    Allows bursts of up to ``capacity`` sends, refilling at ``rate`` tokens
+    per second.
+
+    Args:
+        rate (float): Tokens added per second
+        capacity (float): Maximum burst size (default: one second's worth)
+    """
+
+    def __init__(self, rate, capacity=None):
+        self._lock = threading.Lock()
+        self.configure(rate, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def configure(self, rate, capacity=None):
+        with self._lock:
+            self.rate = max(float(rate), 1e-6)
+            self.capacity = max(1.0, float(capacity if capacity is not None else rate))
+
+    def acquire(self, cancel_event=None):
+        """
+        Wait until a token is available and take it
+
+        Returns:
+            bool: False if ``cancel_event`` was set while waiting
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if cancel_event is None:
+                time.sleep(wait)
+            elif cancel_event.wait(wait):
+                return False
+
+class SMSProvider:
+    """Base class for SMS providers; ``send`` returns the provider's message id"""
+
+    name = "Custom"
+    default_rate = 10.0
+
+    @property
+    def key(self):
+        """Identity of the account, used to share one rate limit between jobs"""
+        return (self.name,)
+
+    def send(self, number, body, sender=None):
+        raise NotImplementedError
+
+def _raise_for_response(response, provider):
+    if response.status_code == 429 or response.status_code >= 500:
+        raise SMSError(f"{provider} returned HTTP {response.status_code}", retryable=True)
+    if response.status_code >= 400:
+        raise SMSError(f"{provider} returned HTTP {response.status_code}: {response.text[:200]}")
+
+def _post(url, provider, **kwargs):
+    if not REQUESTS_AVAILABLE:
+        raise SMSError("requests is not installed. Install it with: pip install requests")
+    try:
+        response = requests.post(url, timeout=15, **kwargs)
+    except requests.RequestException as e:
+        raise SMSError(f"{provider} request failed: {e}", retryable=True)
+    _raise_for_response(response, provider)
+    return response.json()
+
+class TwilioProvider(SMSProvider):
+    """Twilio Programmable Messaging"""
+
+    name = "Twilio"
+    default_rate = 1.0  # one message per second per long-code number
+
+    def __init__(self, account_sid, auth_token, from_number):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+
+    @property
+    def key(self):
+        return (self.name, self.account_sid, self.from_number)
+
+    def send(self, number, body, sender=None):
+        data = _post(
+            f"https://api.twilio.com/2010-04-01/Accounts/{self.account_sid}/Messages.json",
+            self.name,
+            data={"To": number, "From": self.from_number, "Body": body},
+            auth=(self.account_sid, self.auth_token),
+        )
+        return data["sid"]
+
+class SNSProvider(SMSProvider):
+    """Amazon SNS direct SMS publishing (credentials come from the usual AWS chain)"""
+
+    name = "AWS SNS"
+    default_rate = 20.0
+
+    def __init__(self, region):
+        if not BOTO3_AVAILABLE:
+            raise SMSError("boto3 is not installed. Install it with: pip install boto3")
+        self.region = region
+        self._client = boto3.client("sns", region_name=region)
+
+    @property
+    def key(self):
+        return (self.name, self.region)
+
+    def send(self, number, body, sender=None):
+        attributes = {"AWS.SNS.SMS.SMSType": {"DataType": "String", "StringValue": "Transactional"}}
+        if sender:
+            attributes["AWS.SNS.SMS.SenderID"] = {"DataType": "String", "StringValue": sender[:11]}
+        try:
+            return self._client.publish(PhoneNumber=number, Message=body, MessageAttributes=attributes)["MessageId"]
+        except Exception as e:
+            code = getattr(e, "response", {}).get("Error", {}).get("Code", "")
+            raise SMSError(f"SNS publish failed: {e}", retryable=code in ("Throttling", "ThrottlingException", "InternalError"))
+
+class VonageProvider(SMSProvider):
+    """Vonage (Nexmo) SMS API"""
+
+    name = "Vonage"
+    default_rate = 30.0
+
+    def __init__(self, api_key, api_secret):
+        self.api_key = api_key
+        self.api_secret = api_secret
+
+    @property
+    def key(self):
+        return (self.name, self.api_key)
+
+    def send(self, number, body, sender=None):
+        data = _post(
+            "https://rest.nexmo.com/sms/json",
+            self.name,
+            data={"api_key": self.api_key, "api_secret": self.api_secret,
+                  "from": sender or "Vonage", "to": number.lstrip("+"), "text": body},
+        )
+        message = data["messages"][0]
+        if message["status"] != "0":
+            # Status 1 is Vonage's "throttled"
+            raise SMSError(f"Vonage error {message['status']}: {message.get('error-text', '')}",
+                           retryable=message["status"] == "1")
+        return message["message-id"]
+
+class CustomProvider(SMSProvider):
+    """Any HTTP endpoint accepting ``{"to", "from", "message"}`` JSON with a bearer token"""
+
+    name = "Custom"
+    default_rate = 10.0
+
+    def __init__(self, endpoint, api_key=""):
+        self.endpoint = endpoint
+        self.api_key = api_key
+
+    @property
+    def key(self):
+        return (self.name, self.endpoint)
+
+    def send(self, number, body, sender=None):
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        data = _post(self.endpoint, self.name, json={"to": number, "from": sender, "message": body}, headers=headers)
+        return str(data.get("id", "")) if isinstance(data, dict) else ""
+
+class FakeProvider(SMSProvider):
+    """
+    In-process provider for demos and tests
+
+    Nothing leaves the machine; every "sent" message is kept in ``sent``.
+
+    Args:
+        latency (float): Seconds each send takes
+        failure_rate (float): Fraction of sends that fail with a retryable error
+    """
+
+    name = "Simulated"
+    default_rate = 50.0
+
+    def __init__(self, latency=0.05, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.sent = deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+    def send(self, number, body, sender=None):
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise SMSError("Simulated carrier timeout", retryable=True)
+        message_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self.sent.append({"id": message_id, "number": number, "body": body, "sender": sender})
+        return message_id
+
+class BulkJob:
+    """Progress of one bulk send; counters are updated by the sender threads"""
+
+    def __init__(self, job_id, total, provider_name):
+        self.id = job_id
+        self.total = total
+        self.provider_name = provider_name
+        self.sent = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.retries = 0
+        self.started = time.time()
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.sent + self.failed + self.cancelled
+
+    @property
+    def running(self):
+        return self.finished is None
+
+    @property
+    def rate(self):
+        """Messages completed per second so far"""
+        elapsed = (self.finished or time.time()) - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _record(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            if self.done == self.total:
+                self.finished = time.time()
+
+class BulkSender:
+    """
+    Background pipeline for sending many SMS messages
+
+    Each provider account has its own small thread pool and token bucket,
+    shared by every job using it, so a large job on a slow account waits on
+    its own workers instead of tying up the senders of the others. Sends can
+    also be spaced by a per-job delay. Throttling and transient errors are
+    retried with exponential backoff and jitter. Every result is written to
+    the ``sms_history`` log as it completes, so the script thread
+    never blocks on a send.
+
+    Args:
+        max_workers (int): Messages in flight per provider account
+    """
+
+    KEEP_FINISHED = 20
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self._executors = {}
+        self._buckets = {}
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def bucket(self, provider, rate):
+        """The shared token bucket for a provider account, updated to ``rate``"""
+        with self._lock:
+            bucket = self._buckets.get(provider.key)
+            if bucket is None:
+                bucket = self._buckets[provider.key] = TokenBucket(rate)
+            elif bucket.rate != rate:
+                bucket.configure(rate)
+            return bucket
+
+    def executor(self, provider):
+        """The thread pool that sends for a provider account"""
+        with self._lock:
+            executor = self._executors.get(provider.key)
+            if executor is None:
+                executor = self._executors[provider.key] = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=f"sms-{provider.name.lower().replace(' ', '-')}")
+            return executor
+
+    def shutdown(self):
+        """Stop every sender pool once queued messages are done"""
+        with self._lock:
+            executors, self._executors = list(self._executors.values()), {}
+        for executor in executors:
+            executor.shutdown(wait=True)
+
+    def submit(self, provider, messages, history, rate=None, delay=0.0, retry=True, max_attempts=4,
+               base_backoff=1.0, sender=None, priority="Normal", namespace=None):
+        """
+        Start sending in the background
+
+        Args:
+            provider (SMSProvider): Where messages go
+            messages (list): ``{"recipient", "number", "content"}`` dicts
+            history (MessageHistory): Log that receives one record per message
+            rate (float): Provider messages/sec (default: the provider's default)
+            delay (float): Extra minimum seconds between this job's messages
+            retry (bool): Retry throttled/transient failures
+            max_attempts (int): Attempts per message when retrying
+            base_backoff (float): First retry delay in seconds, doubled each attempt
+            sender (str): Sender name passed to the provider
+            priority (str): Priority stored with each history record
+            namespace (str): Owner of the job, for ``jobs()``
+
+        Returns:
+            BulkJob: Live progress of the job
+        """
+        provider_bucket = self.bucket(provider, rate or provider.default_rate)
+        executor = self.executor(provider)
+        job_bucket = TokenBucket(1 / delay, capacity=1) if delay > 0 else None
+        job = BulkJob(next(self._ids), len(messages), provider.name)
+        with self._lock:
+            self._jobs[job.id] = (namespace, job)
+            # Keep a short history of finished jobs for the progress panel
+            finished = [job_id for job_id, (_, old) in self._jobs.items() if not old.running]
+            for job_id in finished[:-self.KEEP_FINISHED]:
+                del self._jobs[job_id]
+        if not messages:
+            job.finished = job.started
+        for message in messages:
+            executor.submit(self._send_one, job, provider, provider_bucket, job_bucket, message, history,
+                                  retry, max_attempts, base_backoff, sender, priority)
+        return job
+
+    def jobs(self, namespace=None):
+        """Jobs started by ``namespace`` (all when None), newest first"""
+        with self._lock:
+            return [job for owner, job in reversed(self._jobs.values()) if namespace is None or owner == namespace]
+
+    def _send_one(self, job, provider, provider_bucket, job_bucket, message, history,
+                  retry, max_attempts, base_backoff, sender, priority):
+        attempts, error, message_id = 0, None, None
+        while True:
+            if job.cancel_event.is_set():
+                if attempts == 0:
+                    job._record("cancelled")
+                    return
+                break
+            if job_bucket is not None and not job_bucket.acquire(job.cancel_event):
+                continue
+            if not provider_bucket.acquire(job.cancel_event):
+                continue
+            attempts += 1
+            try:
+                message_id = provider.send(message["number"], message["content"], sender)
+                error = None
+                break
+            except SMSError as e:
+                error = str(e)
+                if not (retry and e.retryable and attempts < max_attempts):
+                    break
+            except Exception as e:
+                error = str(e)
+                break
+            with job._lock:
+                job.retries += 1
+            # Exponential backoff with jitter so retries from many threads don't line up
+            job.cancel_event.wait(base_backoff * 2 ** (attempts - 1) * random.uniform(0.5, 1.5))
+
+        record = {
+            "recipient": message["recipient"],
+            "number": message["number"],
+            "content": message["content"],
+            "status": "Sent" if error is None else "Failed",
+            "sent_time": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "priority": priority,
+            "provider": provider.name,
+            "attempts": attempts,
+            "job": job.id,
+        }
+        if message_id:
+            record["message_id"] = message_id
+        if error:
+            record["error"] = error
+        history.add(record)
+        job._record("sent" if error is None else "failed")
+
+@st.cache_resource
+def get_bulk_sender():
+    """Return the process-wide bulk sender"""
+    return BulkSender()
+
+@st.cache_resource
+def get_fake_provider():
+    """Shared simulated provider, so its rate limit and sent log span reruns"""
+    return FakeProvider()
@@ -1,78 +1,148 @@
 import streamlit as st
 from datetime import datetime
-import time
+from tools.contacts import get_contact_directory, normalize_number, pick_contacts, show_contact_manager
+from tools.fragments import fragment, rerun_fragment
+from tools.message_history import get_message_history, show_history_page
+from tools.storage import get_namespace
+from tools.templating import compile_template, contact_context, render_for_contacts, show_field_inputs
+from tools.sms_gateway import (
+    CustomProvider, SMSError, SNSProvider, TwilioProvider, VonageProvider,
+    get_bulk_sender, get_fake_provider,
+)
+
+PROVIDERS = ["Simulated", "Twilio", "AWS SNS", "Vonage", "Custom"]
+COST_SAMPLE_SIZE = 1000
 
 def run_sms_sender():
     """Run the SMS sender tool"""
     st.markdown("## 📱 SMS Sender")
     
-    st.info("📞 This is a simulated SMS sender interface. In a real implementation, you would integrate with SMS services like Twilio, AWS SNS, etc.")
-    
-    # Initialize session state
-    if 'sms_history' not in st.session_state:
-        st.session_state.sms_history = []
-    
     # SMS configuration
     with st.expander("⚙️ SMS Configuration", expanded=True):
         col1, col2 = st.columns(2)
         
         with col1:
             sender_name = st.text_input("Sender Name", value="YourApp")
-            api_key = st.text_input("API Key", type="password", placeholder="Enter your SMS API key")
-            service_provider = st.selectbox("Service Provider", ["Twilio", "AWS SNS", "Vonage", "Custom"])
+            service_provider = st.selectbox("Service Provider", PROVIDERS,
+                                            help="Simulated sends nothing and is handy for trying things out")
+            credentials = show_provider_credentials(service_provider)
         
         with col2:
             default_country_code = st.selectbox("Default Country Code", ["+1", "+44", "+91", "+86", "+81", "+49"])
             delivery_reports = st.checkbox("Enable Delivery Reports", value=True)
-            retry_failed = st.checkbox("Retry Failed Messages", value=True)
+            retry_failed = st.checkbox("Retry Failed Messages", value=True,
+                                       help="Retry throttled and transient failures with exponential backoff")
+            cost_per_segment = st.number_input("Cost per Segment ($)", min_value=0.0, value=0.0079, step=0.001,
+                                               format="%.4f", help="Used for the bulk send cost estimate")
+            provider, error = build_provider(service_provider, credentials)
+            default_rate = provider.default_rate if provider else 10.0
+            rate_limit = st.number_input("Rate Limit (messages/sec)", min_value=0.1, max_value=1000.0,
+                                         value=float(default_rate), step=1.0, key=f"sms_rate_{service_provider}",
+                                         help="Shared by every send through this account")
     
-    # Contact management
-    st.markdown("### 👥 Contact Management")
+    if service_provider == "Simulated":
+        st.info("📞 Simulated provider: messages are not delivered anywhere. Pick a real provider above to send SMS.")
+    elif error:
+        st.warning(f"⚠️ {error}")
     
-    contacts = st.session_state.get('sms_contacts', [])
+    config = {
+        "provider": provider,
+        "sender_name": sender_name,
+        "country_code": default_country_code,
+        "retry_failed": retry_failed,
+        "rate_limit": rate_limit,
+        "cost_per_segment": cost_per_segment,
+    }
+    show_sms_messaging(config)
+    show_bulk_jobs()
+    show_sms_templates()
+
+def show_provider_credentials(service_provider):
+    """Provider-specific credential fields"""
+    if service_provider == "Twilio":
+        return {
+            "account_sid": st.text_input("Account SID"),
+            "auth_token": st.text_input("Auth Token", type="password"),
+            "from_number": st.text_input("From Number", placeholder="+15005550006"),
+        }
+    if service_provider == "AWS SNS":
+        return {"region": st.text_input("AWS Region", value="us-east-1",
+                                        help="Credentials come from the environment or ~/.aws")}
+    if service_provider == "Vonage":
+        return {
+            "api_key": st.text_input("API Key"),
+            "api_secret": st.text_input("API Secret", type="password"),
+        }
+    if service_provider == "Custom":
+        return {
+            "endpoint": st.text_input("Endpoint URL", placeholder="https://sms.example.com/send"),
+            "api_key": st.text_input("API Key", type="password", placeholder="Enter your SMS API key"),
+        }
+    return {}
+
+def build_provider(service_provider, credentials):
+    """
+    Create the selected provider
     
-    col1, col2 = st.columns(2)
+    Returns:
+        tuple: (provider or None, error message or None)
+    """
+    if service_provider == "Simulated":
+        return get_fake_provider(), None
+    missing = [name.replace("_", " ") for name, value in credentials.items() if not value]
+    if missing:
+        return None, f"{service_provider} needs: {', '.join(missing)}"
+    try:
+        if service_provider == "Twilio":
+            return TwilioProvider(**credentials), None
+        if service_provider == "AWS SNS":
+            return SNSProvider(**credentials), None
+        if service_provider == "Vonage":
+            return VonageProvider(**credentials), None
+        return CustomProvider(**credentials), None
+    except SMSError as e:
+        return None, str(e)
+
+@fragment
+def show_sms_messaging(config):
+    """Contacts, sending, history and statistics, rerun together as one fragment"""
+    sms_history = get_message_history("sms_history")
+    provider = config["provider"]
     
-    with col1:
-        st.markdown("#### Add Contact")
-        new_contact_name = st.text_input("Contact Name")
-        new_contact_number = st.text_input("Phone Number", placeholder="+1234567890")
-        new_contact_group = st.selectbox("Group", ["Family", "Friends", "Work", "Other"])
-        
-        if st.button("Add Contact") and new_contact_name and new_contact_number:
-            contacts.append({
-                "name": new_contact_name,
-                "number": new_contact_number,
-                "group": new_contact_group
-            })
-            st.session_state.sms_contacts = contacts
-            st.success(f"Added {new_contact_name} to contacts!")
-            st.rerun()
+    # Contact management
+    st.markdown("### 👥 Contact Management")
     
-    with col2:
-        st.markdown("#### Contact List")
-        if contacts:
-            for contact in contacts:
-                st.write(f"📞 **{contact['name']}** - {contact['number']} ({contact['group']})")
-        else:
-            st.info("No contacts added yet.")
+    show_contact_manager("sms_contacts", config["country_code"])
+    directory = get_contact_directory()
     
     # Send SMS
     st.markdown("### 📤 Send SMS")
     
+    if "sms_pending_template" in st.session_state:
+        template_text = st.session_state.pop("sms_pending_template")
+        st.session_state.sms_single_message = template_text
+        st.session_state.sms_bulk_message = template_text
+    
     col1, col2 = st.columns(2)
     
     with col1:
         # Single recipient
         st.markdown("#### Send to Single Recipient")
         
-        if contacts:
-            recipient = st.selectbox("Select Recipient", [contact['name'] for contact in contacts])
+        contact = pick_contacts("sms_single", directory, "Select Recipient", multi=False) if len(directory) else None
+        if contact:
+            recipient = contact['name']
         else:
             recipient = st.text_input("Recipient Name")
+            contact = {"name": recipient, "number": ""}
         
-        phone_number = st.text_input("Phone Number", placeholder="+1234567890")
-        message_content = st.text_area("Message Content", height=150)
+        phone_number = st.text_input("Phone Number", placeholder=contact['number'] or "+1234567890",
+                                     help="Leave empty to use the contact's number")
+        message_content = st.text_area("Message Content", height=150, key="sms_single_message")
+        single_template = compile_template(message_content)
+        single_fields = show_field_inputs(single_template, "sms_single_fields")
+        if single_template.slots:
+            st.caption(f"Preview: {single_template.render({**single_fields, **contact_context(contact)})}")
         
         # Message options
         col1, col2 = st.columns(2)
@@ -85,25 +155,40 @@ def run_sms_sender():
             schedule_date = st.date_input("Schedule Date", min_value=datetime.now().date())
             schedule_time = st.time_input("Schedule Time", value=datetime.now().time())
         
-        if st.button("📤 Send SMS", type="primary"):
-            if phone_number and message_content:
-                # Simulate sending
+        if st.button("📤 Send SMS", type="primary", disabled=provider is None):
+            phone_number = phone_number or contact['number']
+            number, number_error = None, None
+            try:
+                number = normalize_number(phone_number, config["country_code"]) if phone_number else None
+            except ValueError as e:
+                number_error = str(e)
+            if number_error:
+                st.error(number_error)
+            elif number and message_content:
+                message_content = single_template.render({**single_fields, **contact_context(contact)})
                 with st.spinner("Sending SMS..."):
-                    time.sleep(1)
-                    
+                    get_bulk_sender().bucket(provider, config["rate_limit"]).acquire()
                     new_sms = {
-                        "id": len(st.session_state.sms_history) + 1,
                         "recipient": recipient if recipient else "Unknown",
-                        "number": phone_number,
+                        "number": number,
                         "content": message_content,
-                        "status": "Sent",
                         "sent_time": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                        "priority": priority
+                        "priority": priority,
+                        "provider": provider.name,
                     }
+                    try:
+                        new_sms["message_id"] = provider.send(number, message_content, config["sender_name"])
+                        new_sms["status"] = "Sent"
+                    except Exception as e:
+                        # Network and HTTP errors from provider SDKs aren't all wrapped in SMSError
+                        new_sms.update(status="Failed", error=str(e))
                     
-                    st.session_state.sms_history.append(new_sms)
-                    st.success("SMS sent successfully!")
-                    st.rerun()
+                    sms_history.add(new_sms)
+                    if new_sms["status"] == "Sent":
+                        st.success("SMS sent successfully!")
+                        rerun_fragment()
+                    else:
+                        st.error(f"Sending failed: {new_sms['error']}")
             else:
                 st.error("Please fill in all required fields!")
     
@@ -111,96 +196,101 @@ def run_sms_sender():
         # Bulk SMS
         st.markdown("#### Send Bulk SMS")
         
-        bulk_recipients = st.multiselect("Select Recipients", 
-                                       [contact['name'] for contact in contacts] if contacts else [])
+        bulk_groups = st.multiselect("Send to Groups", list(directory.groups()), key="sms_bulk_groups",
+                                     format_func=lambda group: f"{group} ({directory.groups().get(group, 0):,})")
+        picked_contacts = pick_contacts("sms_bulk", directory, "Select Recipients")
+        # Group members and individually picked contacts, each number once
+        recipient_ids = dict.fromkeys(directory.group_members(bulk_groups))
+        recipient_ids.update(dict.fromkeys(contact['id'] for contact in picked_contacts))
+        selected_contacts = [directory.get(contact_id) for contact_id in recipient_ids if directory.get(contact_id)]
         
-        bulk_message = st.text_area("Bulk Message Content", height=150)
+        bulk_message = st.text_area("Bulk Message Content", height=150, key="sms_bulk_message",
+                                    help="[Name], [First Name], [Number] and [Group] are filled in per contact")
+        bulk_template = compile_template(bulk_message)
+        bulk_fields = show_field_inputs(bulk_template, "sms_bulk_fields")
+        
+        if selected_contacts and bulk_message:
+            # Large groups are costed from an evenly spaced sample
+            step = max(1, len(selected_contacts) // COST_SAMPLE_SIZE)
+            sample = selected_contacts[::step]
+            contexts = [{**bulk_fields, **contact_context(contact)} for contact in sample]
+            segment_counts = [bulk_template.segments(context) for context in contexts]
+            total_segments = round(sum(segments for _, segments in segment_counts) * len(selected_contacts) / len(sample))
+            encodings = sorted({encoding for encoding, _ in segment_counts})
+            approx = "≈" if step > 1 else ""
+            st.caption(f"Preview for {selected_contacts[0]['name']}: {bulk_template.render(contexts[0])}")
+            st.caption(f"✉️ {len(selected_contacts):,} messages · {approx}{total_segments:,} segments ({' / '.join(encodings)}) · "
+                       f"est. {approx}${total_segments * config['cost_per_segment']:,.2f}")
         
         # Bulk options
         col1, col2 = st.columns(2)
         with col1:
             bulk_priority = st.selectbox("Priority", ["Normal", "High", "Urgent"], key="bulk_priority")
         with col2:
-            delay_between_messages = st.slider("Delay (seconds)", 1, 10, 2)
+            delay_between_messages = st.slider("Delay (seconds)", 0.0, 10.0, 0.0, step=0.5,
+                                               help="Minimum gap between this batch's messages; 0 sends as fast as the rate limit allows")
         
-        if st.button("📤 Send Bulk SMS", disabled=not bulk_recipients or not bulk_message):
-            if bulk_recipients and bulk_message:
-                with st.spinner(f"Sending {len(bulk_recipients)} messages..."):
-                    for i, recipient in enumerate(bulk_recipients):
-                        time.sleep(0.5)  # Simulate delay
-                        
-                        new_sms = {
-                            "id": len(st.session_state.sms_history) + 1 + i,
-                            "recipient": recipient,
-                            "number": "Bulk SMS",
-                            "content": bulk_message,
-                            "status": "Sent",
-                            "sent_time": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                            "priority": bulk_priority
-                        }
-                        
-                        st.session_state.sms_history.append(new_sms)
-                    
-                    st.success(f"Bulk SMS sent to {len(bulk_recipients)} recipients!")
-                    st.rerun()
-    
-    # Message templates
-    st.markdown("### 📝 Message Templates")
-    
-    templates = {
-        "Appointment Reminder": "Hi [Name], this is a reminder about your appointment on [Date] at [Time]. Please confirm your attendance.",
-        "Meeting Notification": "Hi [Name], you have a meeting scheduled for [Date] at [Time]. Location: [Location]",
-        "Birthday Wish": "Happy Birthday [Name]! 🎉 Wishing you a wonderful day filled with joy and happiness!",
-        "Custom": ""
-    }
-    
-    selected_template = st.selectbox("Select Template", list(templates.keys()))
-    
-    if selected_template == "Custom":
-        custom_template = st.text_area("Custom Template")
-    else:
-        custom_template = templates[selected_template]
-        st.text_area("Template Preview", custom_template, disabled=True)
-    
-    if st.button("📝 Use Template"):
-        st.session_state.selected_template = custom_template
-        st.rerun()
+        if st.button("📤 Send Bulk SMS", disabled=not selected_contacts or not bulk_message or provider is None):
+            if selected_contacts and bulk_message:
+                messages = [
+                    {"recipient": contact['name'], "number": contact['number'], "content": content}
+                    for contact, content in zip(selected_contacts, render_for_contacts(bulk_template, selected_contacts, bulk_fields))
+                ]
+                get_bulk_sender().submit(
+                    provider, messages, sms_history,
+                    rate=config["rate_limit"],
+                    delay=delay_between_messages,
+                    retry=config["retry_failed"],
+                    sender=config["sender_name"],
+                    priority=bulk_priority,
+                    namespace=sms_history.namespace,
+                )
+                # Progress is shown by its own panel outside this fragment
+                st.rerun()
     
     # SMS history
     st.markdown("### 📋 SMS History")
     
-    if not st.session_state.sms_history:
+    def show_sms(sms):
+        with st.container():
+            col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+            
+            with col1:
+                st.write(f"**{sms['recipient']}** ({sms['number']})")
+                st.caption(sms['content'][:50] + "..." if len(sms['content']) > 50 else sms['content'])
+            
+            with col2:
+                st.write(f"📅 {sms['sent_time']}")
+            
+            with col3:
+                priority_color = {"Normal": "🟢", "High": "🟡", "Urgent": "🔴"}
+                st.write(f"{priority_color[sms['priority']]} {sms['priority']}")
+            
+            with col4:
+                status_color = {"Sent": "✅", "Failed": "❌", "Pending": "⏳"}
+                st.write(f"{status_color[sms['status']]} {sms['status']}")
+                if sms.get('error'):
+                    st.caption(sms['error'])
+            
+            st.divider()
+    
+    if not sms_history.total:
         st.info("No SMS messages sent yet.")
     else:
-        for sms in reversed(st.session_state.sms_history[-10:]):  # Show last 10 messages
-            with st.container():
-                col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
-                
-                with col1:
-                    st.write(f"**{sms['recipient']}** ({sms['number']})")
-                    st.caption(sms['content'][:50] + "..." if len(sms['content']) > 50 else sms['content'])
-                
-                with col2:
-                    st.write(f"📅 {sms['sent_time']}")
-                
-                with col3:
-                    priority_color = {"Normal": "🟢", "High": "🟡", "Urgent": "🔴"}
-                    st.write(f"{priority_color[sms['priority']]} {sms['priority']}")
-                
-                with col4:
-                    status_color = {"Sent": "✅", "Failed": "❌", "Pending": "⏳"}
-                    st.write(f"{status_color[sms['status']]} {sms['status']}")
-                
-                st.divider()
+        show_history_page(sms_history, "sms_history", show_sms)
     
     # Statistics
     st.markdown("### 📊 Statistics")
     
-    total_sent = len(st.session_state.sms_history)
-    successful_sends = len([sms for sms in st.session_state.sms_history if sms['status'] == 'Sent'])
-    failed_sends = total_sent - successful_sends
+    counts = sms_history.counts()
+    total_sent = sms_history.total
+    successful_sends = counts.get("Sent", 0)
+    failed_sends = counts.get("Failed", 0)
+    # Messages still queued in running bulk sends
+    pending = counts.get("Pending", 0) + sum(
+        job.total - job.done for job in get_bulk_sender().jobs(sms_history.namespace) if job.running)
     
-    col1, col2, col3, col4 = st.columns(4)
+    col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
         st.metric("Total Sent", total_sent)
@@ -212,5 +302,64 @@ def run_sms_sender():
         st.metric("Failed", failed_sends)
     
     with col4:
+        st.metric("Pending", pending)
+    
+    with col5:
         success_rate = (successful_sends / total_sent * 100) if total_sent > 0 else 0
         st.metric("Success Rate", f"{success_rate:.1f}%")
+
+def show_bulk_jobs():
+    """Live progress of running bulk sends, or a summary of the last one"""
+    jobs = get_bulk_sender().jobs(get_namespace())
+    if any(job.running for job in jobs):
+        show_bulk_progress()
+    elif jobs:
+        job = jobs[0]
+        st.caption(f"📨 Last bulk send via {job.provider_name}: {job.sent} sent, {job.failed} failed"
+                   + (f", {job.cancelled} cancelled" if job.cancelled else "")
+                   + f" in {job.finished - job.started:.1f}s ({job.rate:.1f} msg/s, {job.retries} retries)")
+
+@fragment(run_every=1)
+def show_bulk_progress():
+    """Progress bars for running bulk sends, refreshed every second"""
+    st.markdown("### 📨 Bulk Send Progress")
+    jobs = [job for job in get_bulk_sender().jobs(get_namespace()) if job.running]
+    if not jobs:
+        # Everything finished: rerun the page so history and statistics catch up
+        st.rerun()
+    for job in jobs:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.progress(job.done / job.total,
+                        text=f"{job.done}/{job.total} · {job.sent} sent · {job.failed} failed · "
+                             f"{job.retries} retries · {job.rate:.1f} msg/s")
+        with col2:
+            if st.button("⏹️ Cancel", key=f"cancel_bulk_{job.id}", disabled=job.cancel_event.is_set()):
+                job.cancel()
+
+@fragment
+def show_sms_templates():
+    """Template picker, rerun on its own"""
+    # Message templates
+    st.markdown("### 📝 Message Templates")
+    
+    templates = {
+        "Appointment Reminder": "Hi [Name], this is a reminder about your appointment on [Date] at [Time]. Please confirm your attendance.",
+        "Meeting Notification": "Hi [Name], you have a meeting scheduled for [Date] at [Time]. Location: [Location]",
+        "Birthday Wish": "Happy Birthday [Name]! 🎉 Wishing you a wonderful day filled with joy and happiness!",
+        "Custom": ""
+    }
+    
+    selected_template = st.selectbox("Select Template", list(templates.keys()))
+    
+    if selected_template == "Custom":
+        custom_template = st.text_area("Custom Template")
+    else:
+        custom_template = templates[selected_template]
+        st.text_area("Template Preview", custom_template, disabled=True)
+    
+    if st.button("📝 Use Template"):
+        st.session_state.selected_template = custom_template
+        # The message boxes pick this up before they are drawn on the next page run
+        st.session_state.sms_pending_template = custom_template
+        st.rerun()
@@ -0,0 +1,228 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import paramiko
+    PARAMIKO_AVAILABLE = True
+except ImportError:
+    PARAMIKO_AVAILABLE = False
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free in time"""
+
+
+class _PooledConnection:
+    """A connected SSH client plus the bookkeeping the pool needs"""
+
+    def __init__(self, client, credential_digest):
+        self.client = client
+        self.credential_digest = credential_digest
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def is_healthy(self):
+        """Check that the underlying transport is still usable"""
+        transport = self.client.get_transport()
+        if transport is None or not transport.is_active() or not transport.is_authenticated():
+            return False
+        try:
+            # A cheap no-op packet surfaces half-closed sockets early
+            transport.send_ignore()
+        except Exception:
+            return False
+        return True
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class SSHConnectionPool:
+    """
+    Process-wide pool of authenticated SSH connections.
+
+    Connections are keyed by (hostname, port, username). Each checkout lends
+    out one connected ``paramiko.SSHClient`` whose Transport is reused for
+    every ``exec_command`` channel opened on it, so the TCP + key exchange +
+    auth handshake is only paid once per pooled connection.
+
+    Args:
+        max_per_host (int): Maximum open connections per (host, port, user)
+        idle_timeout (float): Seconds an unused connection is kept around
+        keepalive_interval (int): Seconds between SSH keepalive packets
+        connect_timeout (float): Timeout for new TCP/SSH handshakes
+    """
+
+    def __init__(self, max_per_host=4, idle_timeout=300, keepalive_interval=30, connect_timeout=10):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.connect_timeout = connect_timeout
+
+        self._lock = threading.Condition()
+        self._idle = {}      # key -> list of idle _PooledConnection
+        self._in_use = {}    # key -> number of connections currently lent out
+        self.stats = {"created": 0, "reused": 0, "evicted": 0, "unhealthy": 0}
+
+    @staticmethod
+    def _digest(password):
+        # Never hand a connection to a caller who authenticated differently
+        return hashlib.sha256((password or "").encode("utf-8")).hexdigest()
+
+    def _open(self, hostname, port, username, password):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(hostname, port=port, username=username, password=password, timeout=self.connect_timeout)
+        transport = client.get_transport()
+        if transport is not None and self.keepalive_interval:
+            transport.set_keepalive(self.keepalive_interval)
+        return client
+
+    def _evict_idle_locked(self, now):
+        """Drop connections that have been idle longer than idle_timeout"""
+        expired = []
+        for key, conns in list(self._idle.items()):
+            keep = []
+            for conn in conns:
+                if now - conn.last_used > self.idle_timeout:
+                    expired.append(conn)
+                else:
+                    keep.append(conn)
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+        self.stats["evicted"] += len(expired)
+        return expired
+
+    def _free_slot_locked(self, key):
+        """Give back a checked-out slot, forgetting hosts with nothing lent out"""
+        remaining = self._in_use.get(key, 0) - 1
+        if remaining > 0:
+            self._in_use[key] = remaining
+        else:
+            self._in_use.pop(key, None)
+        self._lock.notify()
+
+    def _total_locked(self, key):
+        return len(self._idle.get(key, [])) + self._in_use.get(key, 0)
+
+    def acquire(self, hostname, username, password, port=22, timeout=30):
+        """
+        Check out a connection, reusing an idle one when possible
+
+        Returns:
+            tuple: (key, _PooledConnection)
+        """
+        key = (hostname, int(port), username)
+        digest = self._digest(password)
+        deadline = time.monotonic() + timeout
+        to_close = []
+
+        with self._lock:
+            while True:
+                to_close.extend(self._evict_idle_locked(time.monotonic()))
+
+                # Reuse the most recently used idle connection with matching credentials
+                idle = self._idle.get(key, [])
+                for index in range(len(idle) - 1, -1, -1):
+                    if idle[index].credential_digest == digest:
+                        conn = idle.pop(index)
+                        self._in_use[key] = self._in_use.get(key, 0) + 1
+                        if not idle:
+                            del self._idle[key]
+                        break
+                else:
+                    conn = None
+
+                if conn is None and self._total_locked(key) >= self.max_per_host and idle:
+                    # Pool is full of idle connections for other credentials: make room
+                    to_close.append(idle.pop(0))
+                    if not idle:
+                        del self._idle[key]
+
+                if conn is not None or self._total_locked(key) < self.max_per_host:
+                    if conn is None:
+                        # Reserve a slot before connecting outside the lock
+                        self._in_use[key] = self._in_use.get(key, 0) + 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No free SSH connection to {hostname}:{port} after {timeout}s")
+                self._lock.wait(remaining)
+
+        for stale in to_close:
+            stale.close()
+
+        if conn is not None:
+            healthy = conn.is_healthy()
+            with self._lock:
+                self.stats["reused" if healthy else "unhealthy"] += 1
+            if healthy:
+                return key, conn
+            conn.close()
+
+        try:
+            client = self._open(hostname, port, username, password)
+        except Exception:
+            with self._lock:
+                self._free_slot_locked(key)
+            raise
+
+        with self._lock:
+            self.stats["created"] += 1
+        return key, _PooledConnection(client, digest)
+
+    def release(self, key, conn, discard=False):
+        """Return a connection to the pool (or close it if it is broken)"""
+        with self._lock:
+            self._free_slot_locked(key)
+            if not discard:
+                conn.last_used = time.monotonic()
+                self._idle.setdefault(key, []).append(conn)
+        if discard:
+            conn.close()
+
+    @contextmanager
+    def connection(self, hostname, username, password, port=22, timeout=30):
+        """
+        Context manager yielding a connected ``paramiko.SSHClient``
+
+        The connection goes back to the pool on a clean exit and is discarded
+        if the body raised, since the transport may be in an unknown state.
+        """
+        key, conn = self.acquire(hostname, username, password, port=port, timeout=timeout)
+        try:
+            yield conn.client
+        except BaseException:
+            # Includes GeneratorExit from abandoned streaming readers
+            self.release(key, conn, discard=True)
+            raise
+        else:
+            self.release(key, conn, discard=not conn.is_healthy())
+
+    def close_idle(self):
+        """Close every idle connection in the pool"""
+        with self._lock:
+            conns = [conn for conns in self._idle.values() for conn in conns]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+    def snapshot(self):
+        """Return per-host idle/in-use counts for display"""
+        with self._lock:
+            keys = set(self._idle) | set(self._in_use)
+            return {
+                f"{user}@{host}:{port}": {
+                    "idle": len(self._idle.get((host, port, user), [])),
+                    "in_use": self._in_use.get((host, port, user), 0),
+                }
+                for host, port, user in keys
+            }
@@ -1,16 +1,90 @@
 import streamlit as st
+import codecs
+import socket
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 try:
     import paramiko
     PARAMIKO_AVAILABLE = True
 except ImportError:
+    # The SSH sections warn about this when they are opened
     PARAMIKO_AVAILABLE = False
-    st.warning("⚠️ Paramiko not installed. SSH functionality will be limited. Install with: `pip install paramiko`")
 
-def run_remote_command(hostname, username, password, command, port=22):
+from tools.output_buffer import DEFAULT_MAX_BYTES, OutputCapture
+from tools.ssh_pool import SSHConnectionPool
+
+@st.cache_resource
+def get_ssh_pool():
+    """Return the SSH connection pool shared by all sessions and reruns"""
+    return SSHConnectionPool(max_per_host=4, idle_timeout=300, keepalive_interval=30)
+
+def _iter_channel(channel, cancel_event=None, heartbeat=0.5, timeout=None):
     """
-    Run a command on a remote server via SSH
+    Multiplex stdout and stderr of an exec channel without blocking
+    
+    Both streams are drained as data arrives, so a chatty stderr can never
+    fill its window and stall the command while we wait on stdout.
+    
+    Yields:
+        tuple: (stream, text) where stream is ``"stdout"``, ``"stderr"``,
+        ``"heartbeat"`` (no output for ``heartbeat`` seconds), ``"cancelled"``
+        or ``"exit"`` (text is then the exit status)
+    """
+    decoders = {
+        "stdout": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+        "stderr": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+    }
+    started = last_activity = time.monotonic()
+    
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            channel.close()
+            yield "cancelled", ""
+            return
+        
+        received = False
+        if channel.recv_ready():
+            text = decoders["stdout"].decode(channel.recv(32768))
+            received = True
+            if text:
+                yield "stdout", text
+        if channel.recv_stderr_ready():
+            text = decoders["stderr"].decode(channel.recv_stderr(32768))
+            received = True
+            if text:
+                yield "stderr", text
+        
+        now = time.monotonic()
+        if received:
+            last_activity = now
+            continue
+        
+        if channel.exit_status_ready():
+            # The last output can land together with the exit status; read both streams dry first
+            if channel.recv_ready() or channel.recv_stderr_ready():
+                continue
+            break
+        if timeout is not None and now - started > timeout:
+            channel.close()
+            raise socket.timeout(f"Command timed out after {timeout}s")
+        if now - last_activity >= heartbeat:
+            last_activity = now
+            yield "heartbeat", ""
+        
+        # Nothing buffered on either stream: wait briefly for more data
+        channel.status_event.wait(0.05)
+    
+    for stream, decoder in decoders.items():
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield stream, tail
+    yield "exit", channel.recv_exit_status()
+
+def stream_remote_command(hostname, username, password, command, port=22, cancel_event=None, timeout=None):
+    """
+    Run a command on a remote server and yield its output as it arrives
     
     Args:
         hostname (str): Server IP or hostname
@@ -18,38 +92,136 @@ def run_remote_command(hostname, username, password, command, port=22):
         password (str): SSH password
         command (str): Command to execute
         port (int): SSH port (default: 22)
+        cancel_event (threading.Event): Set it to close the channel early
+        timeout (float): Seconds before the command is abandoned
     
-    Returns:
-        tuple: (success: bool, output: str)
+    Yields:
+        tuple: (stream, text) as produced by ``_iter_channel``; connection
+        errors are reported as a final ``("error", message)`` item
     """
     if not PARAMIKO_AVAILABLE:
-        return False, "Paramiko not installed. Please install it with: pip install paramiko"
+        yield "error", "Paramiko not installed. Please install it with: pip install paramiko"
+        return
     
     try:
-        # Create SSH client
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        # Connect to server
-        ssh.connect(hostname, port=port, username=username, password=password, timeout=10)
-        
-        # Execute command
-        stdin, stdout, stderr = ssh.exec_command(command)
-        
-        # Get output
-        output = stdout.read().decode('utf-8')
-        error = stderr.read().decode('utf-8')
-        
-        # Close connection
-        ssh.close()
-        
-        if error:
-            return False, f"Error: {error}"
-        else:
-            return True, output
-            
+        with get_ssh_pool().connection(hostname, username, password, port=port) as ssh:
+            channel = ssh.get_transport().open_session()
+            try:
+                channel.exec_command(command)
+                yield from _iter_channel(channel, cancel_event=cancel_event, timeout=timeout)
+            finally:
+                channel.close()
+    except socket.timeout:
+        yield "error", f"Command timed out after {timeout}s"
     except Exception as e:
-        return False, f"Connection failed: {str(e)}"
+        yield "error", f"Connection failed: {str(e)}"
+
+class CommandRun:
+    """
+    A remote command streaming into bounded captures on a background thread
+
+    The run outlives the script run that started it, so a page can poll it
+    and a Cancel button can set ``cancel_event`` while it is going. Cancelling
+    closes only the command's channel; the pooled connection is kept.
+
+    Args:
+        hostname (str): Server IP or hostname
+        username (str): SSH username
+        password (str): SSH password
+        command (str): Command to execute
+        port (int): SSH port (default: 22)
+        max_output_bytes (int): In-memory budget per stream (see ``OutputCapture``)
+    """
+
+    def __init__(self, hostname, username, password, command, port=22, max_output_bytes=DEFAULT_MAX_BYTES):
+        self.command = command
+        self.stdout = OutputCapture(max_bytes=max_output_bytes)
+        self.stderr = OutputCapture(max_bytes=max_output_bytes)
+        self.cancel_event = threading.Event()
+        self.status = "running"  # running, finished, cancelled or error
+        self.exit_status = None
+        self.error = None
+        self.started = time.monotonic()
+        self.finished = None
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, args=(hostname, username, password, port),
+                         name=f"ssh-command-{hostname}", daemon=True).start()
+
+    @property
+    def running(self):
+        return self.finished is None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def cancel(self):
+        """Ask the command to stop; ``status`` becomes ``"cancelled"`` once it has"""
+        self.cancel_event.set()
+
+    def tail_text(self, stream, max_chars=None):
+        """Most recent ``"stdout"`` or ``"stderr"`` output, safe to call while running"""
+        with self._lock:
+            return getattr(self, stream).tail_text(max_chars)
+
+    def _run(self, hostname, username, password, port):
+        try:
+            for stream, text in stream_remote_command(hostname, username, password, self.command, port=port,
+                                                      cancel_event=self.cancel_event):
+                with self._lock:
+                    if stream in ("stdout", "stderr"):
+                        getattr(self, stream).write(text)
+                    elif stream == "exit":
+                        self.exit_status = text
+                    elif stream == "cancelled":
+                        self.status = "cancelled"
+                    elif stream == "error":
+                        self.status, self.error = "error", text
+        except Exception as e:
+            self.status, self.error = "error", str(e)
+        finally:
+            with self._lock:
+                self.stdout.finish()
+                self.stderr.finish()
+                if self.status == "running":
+                    self.status = "finished"
+                self.finished = time.monotonic()
+
+def run_remote_command(hostname, username, password, command, port=22, timeout=None,
+                       max_output_bytes=DEFAULT_MAX_BYTES):
+    """
+    Run a command on a remote server via SSH
+    
+    Output past ``max_output_bytes`` per stream keeps only its head and tail,
+    with the number of omitted bytes noted in between.
+    
+    Args:
+        hostname (str): Server IP or hostname
+        username (str): SSH username
+        password (str): SSH password
+        command (str): Command to execute
+        port (int): SSH port (default: 22)
+        timeout (float): Seconds to wait for the command (default: no limit)
+        max_output_bytes (int): In-memory budget per stream
+    
+    Returns:
+        tuple: (success: bool, output: str)
+    """
+    output = OutputCapture(max_bytes=max_output_bytes, spill=False)
+    error = OutputCapture(max_bytes=max_output_bytes, spill=False)
+    
+    for stream, text in stream_remote_command(hostname, username, password, command, port=port, timeout=timeout):
+        if stream == "stdout":
+            output.write(text)
+        elif stream == "stderr":
+            error.write(text)
+        elif stream == "error":
+            return False, text
+    
+    if error.total_bytes:
+        return False, f"Error: {error.preview()}"
+    else:
+        return True, output.preview()
 
 def start_apache_server(hostname, username, password, port=22):
     """
@@ -68,28 +240,19 @@ def start_apache_server(hostname, username, password, port=22):
         return False, "Paramiko not installed. Please install it with: pip install paramiko"
     
     try:
-        # Create SSH client
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        # Connect to server
-        ssh.connect(hostname, port=port, username=username, password=password, timeout=10)
-        
-        # Start Apache
-        stdin, stdout, stderr = ssh.exec_command("sudo systemctl start apache2")
-        error = stderr.read().decode('utf-8')
-        
-        if error:
-            # Try alternative command
-            stdin, stdout, stderr = ssh.exec_command("sudo service apache2 start")
+        with get_ssh_pool().connection(hostname, username, password, port=port) as ssh:
+            # Start Apache
+            stdin, stdout, stderr = ssh.exec_command("sudo systemctl start apache2")
             error = stderr.read().decode('utf-8')
-        
-        # Check if Apache is running
-        stdin, stdout, stderr = ssh.exec_command("systemctl is-active apache2")
-        status = stdout.read().decode('utf-8').strip()
-        
-        # Close connection
-        ssh.close()
+            
+            if error:
+                # Try alternative command
+                stdin, stdout, stderr = ssh.exec_command("sudo service apache2 start")
+                error = stderr.read().decode('utf-8')
+            
+            # Check if Apache is running
+            stdin, stdout, stderr = ssh.exec_command("systemctl is-active apache2")
+            status = stdout.read().decode('utf-8').strip()
         
         if status == "active":
             return True, "Apache server is now running and accessible"
@@ -98,3 +261,105 @@ def start_apache_server(hostname, username, password, port=22):
             
     except Exception as e:
         return False, f"Connection failed: {str(e)}"
+
+
+def parse_host_list(text, default_username="", default_port=22):
+    """
+    Parse a host list or a simple Ansible-style inventory
+    
+    Accepts one target per line (or comma separated) as ``host``,
+    ``host:port`` or ``user@host:port``. Inventory lines such as
+    ``web1 ansible_host=10.0.0.5 ansible_port=2222 ansible_user=ops`` are
+    understood too; ``[group]`` headers, blank lines and ``#``/``;``
+    comments are skipped. Duplicate targets are dropped.
+    
+    Args:
+        text (str): Raw host list or inventory file contents
+        default_username (str): Username when a line does not set one
+        default_port (int): Port when a line does not set one
+    
+    Returns:
+        list: dicts with ``hostname``, ``port`` and ``username`` keys
+    """
+    hosts = []
+    seen = set()
+    
+    for raw_line in text.splitlines():
+        line = raw_line.split("#", 1)[0].split(";", 1)[0].strip()
+        if not line or (line.startswith("[") and line.endswith("]")):
+            continue
+        
+        # Inventory style: first token is the alias, the rest are key=value vars
+        if "=" in line:
+            alias, *pairs = line.split()
+            variables = dict(pair.split("=", 1) for pair in pairs if "=" in pair)
+            entries = [(
+                variables.get("ansible_user", ""),
+                variables.get("ansible_host", alias),
+                variables.get("ansible_port", ""),
+            )]
+        else:
+            entries = []
+            for token in line.replace(",", " ").split():
+                user, _, hostport = token.rpartition("@")
+                host, _, port = hostport.partition(":")
+                entries.append((user, host, port))
+        
+        for user, host, port in entries:
+            target = {
+                "hostname": host,
+                "port": int(port) if port else int(default_port),
+                "username": user or default_username,
+            }
+            key = (target["hostname"], target["port"], target["username"])
+            if host and key not in seen:
+                seen.add(key)
+                hosts.append(target)
+    
+    return hosts
+
+def run_command_on_hosts(hosts, password, command, max_workers=10, timeout=30):
+    """
+    Run the same command on many hosts in parallel
+    
+    Commands are dispatched through a bounded thread pool, so total wall
+    time tracks the slowest host rather than the sum of all hosts. Results
+    are yielded in completion order so callers can render them as they
+    arrive.
+    
+    Args:
+        hosts (list): Targets as returned by ``parse_host_list``
+        password (str): SSH password used for every host
+        command (str): Command to execute
+        max_workers (int): Maximum number of hosts contacted at once
+        timeout (float): Per-host limit in seconds for command output
+    
+    Yields:
+        dict: ``target``, ``success``, ``output`` and ``elapsed`` (seconds)
+    """
+    def run_one(host):
+        started = time.monotonic()
+        success, output = run_remote_command(
+            host["hostname"], host["username"], password, command,
+            port=host["port"], timeout=timeout
+        )
+        return success, output, time.monotonic() - started
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(hosts) or 1)),
+                                  thread_name_prefix="ssh-fanout")
+    try:
+        pending = {executor.submit(run_one, host): host for host in hosts}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                host = pending.pop(future)
+                success, output, elapsed = future.result()
+                yield {
+                    "target": f"{host['username']}@{host['hostname']}:{host['port']}",
+                    "success": success,
+                    "output": output,
+                    "elapsed": elapsed,
+                }
+    finally:
+        # Don't start hosts that are still queued if the caller stopped listening
+        executor.shutdown(wait=False, cancel_futures=True)
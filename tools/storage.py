@@ -0,0 +1,494 @@
+import streamlit as st
+import atexit
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Collection name -> indexed columns copied out of each record for filtering
+SCHEMAS = {
+    "grocery_items": ["category", "priority", "completed"],
+    "grocery_history": ["category", "completed_date"],
+    "grocery_budget": [],
+    "recipes": ["name"],
+    "sms_history": ["recipient", "status", "sent_time"],
+    "scheduled_emails": ["status", "scheduled_time"],
+    "email_settings": [],
+    "whatsapp_messages": ["recipient", "type", "time"],
+    "whatsapp_bot_config": [],
+    "chat_history": ["role"],
+    "chat_summaries": [],
+    "contacts": ["number"],
+}
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "dashboard.db")
+
+def _indexed_value(value):
+    # Booleans are stored as 0/1 so filters like completed=False work in SQL
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+class Between(namedtuple("Between", ["low", "high"])):
+    """Range filter for an indexed column: ``low <= value < high``"""
+    __slots__ = ()
+
+    def matches(self, value):
+        return value is not None and self.low <= value < self.high
+
+def record_matches(record, filters):
+    """True when ``record`` satisfies every equality or ``Between`` filter"""
+    for column, expected in filters.items():
+        value = _indexed_value(record.get(column))
+        if isinstance(expected, Between):
+            if not expected.matches(value):
+                return False
+        elif value != _indexed_value(expected):
+            return False
+    return True
+
+class MemoryBackend:
+    """
+    In-process storage backend
+
+    Keeps records in plain dicts. Useful for tests and for running the
+    dashboard without writing anything to disk.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._tables = {name: {} for name in SCHEMAS}
+        self._next_id = {name: 1 for name in SCHEMAS}
+        self._versions = {}
+
+    def version(self, table, namespace):
+        return self._versions.get((table, namespace), 0)
+
+    def _bump(self, table, namespace):
+        self._versions[(table, namespace)] = self.version(table, namespace) + 1
+
+    def append(self, table, namespace, record):
+        with self._lock:
+            record_id = self._next_id[table]
+            self._next_id[table] += 1
+            stored = dict(record, id=record_id)
+            self._tables[table][record_id] = (namespace, time.time(), stored)
+            self._bump(table, namespace)
+            return record_id
+
+    def update(self, table, namespace, record):
+        with self._lock:
+            entry = self._tables[table].get(record["id"])
+            if entry and entry[0] == namespace:
+                self._tables[table][record["id"]] = (namespace, entry[1], dict(record))
+                self._bump(table, namespace)
+
+    def delete(self, table, namespace, record_id):
+        with self._lock:
+            entry = self._tables[table].get(record_id)
+            if entry and entry[0] == namespace:
+                del self._tables[table][record_id]
+                self._bump(table, namespace)
+
+    def clear(self, table, namespace):
+        with self._lock:
+            for record_id in [rid for rid, entry in self._tables[table].items() if entry[0] == namespace]:
+                del self._tables[table][record_id]
+            self._bump(table, namespace)
+
+    def prune(self, table, namespace, before_id):
+        """Delete every record older than ``before_id``"""
+        with self._lock:
+            for record_id in [rid for rid, entry in self._tables[table].items()
+                              if entry[0] == namespace and rid < before_id]:
+                del self._tables[table][record_id]
+            self._bump(table, namespace)
+
+    def _matching(self, table, namespace, filters):
+        for namespace_, _, record in self._tables[table].values():
+            if namespace_ != namespace:
+                continue
+            if record_matches(record, filters):
+                yield record
+
+    def fetch(self, table, namespace, limit=None, before_id=None, after_id=None, newest_first=False, **filters):
+        with self._lock:
+            records = [dict(record) for record in self._matching(table, namespace, filters)
+                       if (before_id is None or record["id"] < before_id)
+                       and (after_id is None or record["id"] > after_id)]
+        records.sort(key=lambda record: record["id"], reverse=newest_first or limit is not None)
+        if limit is not None:
+            records = records[:limit]
+            if not newest_first:
+                records.reverse()
+        return records
+
+    def count(self, table, namespace, **filters):
+        with self._lock:
+            return sum(1 for _ in self._matching(table, namespace, filters))
+
+    def namespaces(self, table):
+        """Every namespace with records in a collection"""
+        with self._lock:
+            return sorted({entry[0] for entry in self._tables[table].values()})
+
+    def flush(self):
+        pass
+
+class SQLiteBackend:
+    """
+    SQLite storage backend in WAL mode
+
+    Each collection is its own table with an integer primary key, the owning
+    namespace, a creation timestamp, the collection's indexed columns and the
+    full record as JSON. Writes are queued and committed in batches by a
+    background thread (or as soon as a read needs them), so a burst of
+    interactions costs one transaction instead of one per change. A batch
+    that fails goes back on the queue and is retried; a statement the
+    database rejects outright is logged and dropped so it can't block the
+    writes queued behind it.
+
+    Args:
+        path (str): Database file
+        flush_interval (float): Maximum seconds a queued write waits
+        max_batch (int): Queue length that triggers an immediate flush
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, flush_interval=0.25, max_batch=256):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+        self._pending = []
+        self.failed_flushes = 0
+        self.dropped_writes = 0
+        self.last_error = None
+        self._versions = {}
+        self._next_id = {
+            table: (self._conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0] + 1)
+            for table in SCHEMAS
+        }
+
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_loop, name="storage-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _create_schema(self):
+        for table, columns in SCHEMAS.items():
+            extra = "".join(f", {column}" for column in columns)
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "id INTEGER PRIMARY KEY, namespace TEXT NOT NULL, created_at REAL NOT NULL"
+                f"{extra}, data TEXT NOT NULL)"
+            )
+            self._migrate(table, columns)
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ns_id ON {table} (namespace, id)")
+            for column in columns:
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} (namespace, {column}, id)"
+                )
+
+    def _migrate(self, table, columns):
+        """Add indexed columns missing from a table created by an older schema, filled from each record"""
+        existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+        missing = [column for column in columns if column not in existing]
+        if not missing:
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for column in missing:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+                self._conn.execute(f"UPDATE {table} SET {column} = json_extract(data, '$.{column}')")
+            self._conn.execute("COMMIT")
+        except sqlite3.Error:
+            self._conn.execute("ROLLBACK")
+            raise
+        logger.info("Added indexed columns %s to %s", ", ".join(missing), table)
+
+    def version(self, table, namespace):
+        return self._versions.get((table, namespace), 0)
+
+    def _queue(self, table, namespace, sql, params):
+        with self._lock:
+            self._pending.append((sql, params))
+            self._versions[(table, namespace)] = self.version(table, namespace) + 1
+            if len(self._pending) >= self.max_batch:
+                self._wakeup.set()
+
+    def append(self, table, namespace, record):
+        with self._lock:
+            record_id = self._next_id[table]
+            self._next_id[table] += 1
+        stored = dict(record, id=record_id)
+        columns = SCHEMAS[table]
+        self._queue(
+            table, namespace,
+            f"INSERT INTO {table} (id, namespace, created_at{''.join(', ' + c for c in columns)}, data) "
+            f"VALUES (?, ?, ?{', ?' * len(columns)}, ?)",
+            (record_id, namespace, time.time(), *[_indexed_value(stored.get(c)) for c in columns], json.dumps(stored)),
+        )
+        return record_id
+
+    def update(self, table, namespace, record):
+        columns = SCHEMAS[table]
+        assignments = "".join(f"{column} = ?, " for column in columns)
+        self._queue(
+            table, namespace,
+            f"UPDATE {table} SET {assignments}data = ? WHERE id = ? AND namespace = ?",
+            (*[_indexed_value(record.get(c)) for c in columns], json.dumps(record), record["id"], namespace),
+        )
+
+    def delete(self, table, namespace, record_id):
+        self._queue(table, namespace, f"DELETE FROM {table} WHERE id = ? AND namespace = ?", (record_id, namespace))
+
+    def clear(self, table, namespace):
+        self._queue(table, namespace, f"DELETE FROM {table} WHERE namespace = ?", (namespace,))
+
+    def prune(self, table, namespace, before_id):
+        """Delete every record older than ``before_id``"""
+        self._queue(table, namespace, f"DELETE FROM {table} WHERE namespace = ? AND id < ?", (namespace, before_id))
+
+    @staticmethod
+    def _where(table, namespace, filters):
+        clauses = ["namespace = ?"]
+        params = [namespace]
+        for column, value in filters.items():
+            if column not in SCHEMAS[table]:
+                raise ValueError(f"{column!r} is not an indexed column of {table}")
+            if isinstance(value, Between):
+                clauses.append(f"{column} >= ? AND {column} < ?")
+                params.extend((_indexed_value(value.low), _indexed_value(value.high)))
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(_indexed_value(value))
+        return " AND ".join(clauses), params
+
+    def fetch(self, table, namespace, limit=None, before_id=None, after_id=None, newest_first=False, **filters):
+        where, params = self._where(table, namespace, filters)
+        if before_id is not None:
+            where += " AND id < ?"
+            params.append(before_id)
+        if after_id is not None:
+            where += " AND id > ?"
+            params.append(after_id)
+        # With a limit we always want the newest rows, returned in the requested order
+        descending = newest_first or limit is not None
+        sql = f"SELECT data FROM {table} WHERE {where} ORDER BY id {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        records = [json.loads(data) for (data,) in rows]
+        if limit is not None and not newest_first:
+            records.reverse()
+        return records
+
+    def count(self, table, namespace, **filters):
+        where, params = self._where(table, namespace, filters)
+        self.flush()
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0]
+
+    def namespaces(self, table):
+        """Every namespace with records in a collection"""
+        self.flush()
+        with self._lock:
+            return [namespace for (namespace,) in self._conn.execute(f"SELECT DISTINCT namespace FROM {table}")]
+
+    def flush(self):
+        """
+        Commit every queued write in one transaction
+
+        Raises:
+            sqlite3.Error: The batch failed; its writes are queued again
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            index = 0
+            try:
+                self._conn.execute("BEGIN")
+                for index, (sql, params) in enumerate(batch):
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                self.failed_flushes += 1
+                self.last_error = str(e)
+                if not isinstance(e, sqlite3.OperationalError):
+                    # The statement itself is bad (a constraint, say); retrying can't help
+                    sql, params = batch.pop(index)
+                    self.dropped_writes += 1
+                    logger.error("Dropped a write the database rejected (%s): %s %r", e, sql, params)
+                # Writes queued meanwhile stay behind the ones that came first
+                self._pending[:0] = batch
+                raise
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                # Queued writes are kept and retried on the next interval
+                logger.warning("Storage flush failed, %d writes queued for retry: %s", len(self._pending), e)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+@st.cache_resource
+def get_storage():
+    """
+    Return the process-wide storage backend
+
+    ``DASHBOARD_STORAGE=memory`` keeps everything in RAM; otherwise data goes
+    to SQLite at ``DASHBOARD_DB`` (default: ``data/dashboard.db``).
+    """
+    if os.environ.get("DASHBOARD_STORAGE", "sqlite") == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(os.environ.get("DASHBOARD_DB", DEFAULT_DB_PATH))
+
+@st.cache_resource
+def _scratch_root():
+    """Temporary directory standing in for ``data/`` while storage is in memory, removed at exit"""
+    root = tempfile.mkdtemp(prefix="dashboard-")
+    atexit.register(shutil.rmtree, root, ignore_errors=True)
+    return root
+
+def data_path(env_var, default):
+    """
+    Location of a file-based store (history archive, attachments, batches)
+
+    ``env_var`` overrides ``default``; with ``DASHBOARD_STORAGE=memory`` the
+    store goes to a temporary directory instead, so nothing lands in ``data/``.
+    """
+    if os.environ.get("DASHBOARD_STORAGE", "sqlite") == "memory":
+        return os.path.join(_scratch_root(), os.path.basename(default))
+    return os.environ.get(env_var, default)
+
+def get_namespace():
+    """
+    Data namespace for this browser session (``?profile=name``)
+
+    A session opened without a profile gets a private random one, which is
+    written to the URL so a refresh or a bookmark finds the same data.
+    Nobody shares data unless they share a profile name.
+    """
+    try:
+        profile = st.query_params.get("profile")
+    except AttributeError:
+        # Streamlit before st.query_params: the profile lasts for the session
+        profile = None
+    if not profile:
+        profile = st.session_state.setdefault("_profile", f"session-{uuid.uuid4().hex[:12]}")
+        try:
+            st.query_params["profile"] = profile
+        except AttributeError:
+            pass
+    return profile
+
+class Collection:
+    """
+    One user's view of a stored collection
+
+    Reads are cached in ``st.session_state`` and reused until the collection
+    changes (in this session or any other one sharing the namespace), so a
+    rerun that doesn't touch the data doesn't touch the database either.
+    Only the queries a page actually makes are cached, which keeps session
+    memory independent of how much history has been stored.
+    """
+
+    def __init__(self, name, backend=None, namespace=None):
+        self.name = name
+        self.backend = backend or get_storage()
+        self.namespace = namespace or get_namespace()
+
+    def _cached(self, query, loader):
+        cache = st.session_state.setdefault("_storage_cache", {})
+        key = (self.name, self.namespace)
+        version = self.backend.version(self.name, self.namespace)
+        entry = cache.get(key)
+        if entry is None or entry["version"] != version:
+            entry = cache[key] = {"version": version, "queries": {}}
+        if query not in entry["queries"]:
+            entry["queries"][query] = loader()
+        return entry["queries"][query]
+
+    def all(self):
+        """Every record, oldest first"""
+        return self._cached(("all",), lambda: self.backend.fetch(self.name, self.namespace))
+
+    def recent(self, limit):
+        """The newest ``limit`` records, oldest first"""
+        return self._cached(("recent", limit), lambda: self.backend.fetch(self.name, self.namespace, limit=limit))
+
+    def find(self, **filters):
+        """Records whose indexed columns match ``filters``, oldest first"""
+        query = ("find",) + tuple(sorted(filters.items()))
+        return self._cached(query, lambda: self.backend.fetch(self.name, self.namespace, **filters))
+
+    def page(self, limit, before_id=None, **filters):
+        """
+        One page of matching records, newest first
+
+        Returns:
+            tuple: (records, cursor) where ``cursor`` is the ``before_id`` of
+            the next page, or None on the last one
+        """
+        query = ("page", limit, before_id) + tuple(sorted(filters.items()))
+        records = self._cached(query, lambda: self.backend.fetch(
+            self.name, self.namespace, limit=limit + 1, before_id=before_id, newest_first=True, **filters))
+        if len(records) > limit:
+            return records[:limit], records[limit - 1]["id"]
+        return records, None
+
+    def count(self, **filters):
+        query = ("count",) + tuple(sorted(filters.items()))
+        return self._cached(query, lambda: self.backend.count(self.name, self.namespace, **filters))
+
+    def add(self, record):
+        """Store a new record and return its id (also set on ``record``)"""
+        record["id"] = self.backend.append(self.name, self.namespace, record)
+        return record["id"]
+
+    def update(self, record):
+        self.backend.update(self.name, self.namespace, record)
+
+    def delete(self, record_id):
+        self.backend.delete(self.name, self.namespace, record_id)
+
+    def clear(self):
+        self.backend.clear(self.name, self.namespace)
+
+def get_collection(name):
+    """Shortcut for ``Collection(name)`` with the shared backend and current namespace"""
+    return Collection(name)
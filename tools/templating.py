@@ -0,0 +1,174 @@
+import streamlit as st
+import re
+from datetime import datetime
+
+# [Name], [Date], [Your name]... but not markdown-ish [ ] or long bracketed prose
+PLACEHOLDER = re.compile(r"\[([A-Za-z][A-Za-z0-9 _/-]{0,39})\]")
+
+# Fields filled from each contact record; everything else is shared by the whole batch
+CONTACT_FIELDS = frozenset({"name", "first name", "number", "group"})
+
+GSM7_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENSION = frozenset("^{}\\[~]|€\f")  # each costs two septets (escape + char)
+
+_DROP_BASIC = {ord(char): None for char in GSM7_BASIC}
+_DROP_EXTENSION = {ord(char): None for char in GSM7_EXTENSION}
+
+def field_key(name):
+    """Normalized placeholder name: ``[First Name]`` and ``[first name]`` are the same field"""
+    return " ".join(name.lower().replace("_", " ").split())
+
+def text_stats(text):
+    """
+    Encoding facts about a piece of SMS text
+
+    Returns:
+        tuple: (gsm7: bool, septets: int, ucs2_units: int)
+    """
+    rest = text.translate(_DROP_BASIC)
+    extension = len(rest) - len(rest.translate(_DROP_EXTENSION))
+    # Characters outside the BMP (most emoji) take two UTF-16 code units
+    ucs2_units = len(text) + sum(1 for char in rest if ord(char) > 0xFFFF)
+    return len(rest) == extension, len(text) + extension, ucs2_units
+
+def sms_segments(gsm7, septets, ucs2_units):
+    """
+    Number of SMS segments a message is billed as
+
+    GSM-7 fits 160 characters in one segment (153 per part when split),
+    UCS-2 fits 70 (67 per part).
+
+    Returns:
+        tuple: (encoding: str, segments: int)
+    """
+    if gsm7:
+        return "GSM-7", 1 if septets <= 160 else -(-septets // 153)
+    return "UCS-2", 1 if ucs2_units <= 70 else -(-ucs2_units // 67)
+
+class CompiledTemplate:
+    """
+    A message template parsed once into literal text and field slots
+
+    Rendering is a list build and a join, with no regex work per message.
+    Encoding statistics for the literal text are also computed up front,
+    so per-message segment counts only need to look at the substituted
+    values.
+
+    Args:
+        text (str): Template with ``[Field]`` placeholders
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.literals = []
+        self.slots = []  # (field key, original placeholder text)
+        position = 0
+        for match in PLACEHOLDER.finditer(text):
+            self.literals.append(text[position:match.start()])
+            self.slots.append((field_key(match.group(1)), match.group(0)))
+            position = match.end()
+        self.literals.append(text[position:])
+
+        literal_stats = [text_stats(literal) for literal in self.literals]
+        self._gsm7 = all(stats[0] for stats in literal_stats)
+        self._septets = sum(stats[1] for stats in literal_stats)
+        self._ucs2_units = sum(stats[2] for stats in literal_stats)
+
+    @property
+    def fields(self):
+        """Field keys in order of first appearance"""
+        return list(dict.fromkeys(key for key, _ in self.slots))
+
+    def values(self, context):
+        """Substituted value of every slot; missing fields keep their placeholder"""
+        return [context.get(key, placeholder) for key, placeholder in self.slots]
+
+    def render(self, context):
+        """
+        Fill in the template
+
+        Args:
+            context (dict): Field key -> value (see ``field_key``)
+
+        Returns:
+            str: The rendered message
+        """
+        literals = self.literals
+        if not self.slots:
+            return literals[0]
+        parts = [literals[0]]
+        for literal, (key, placeholder) in zip(literals[1:], self.slots):
+            parts.append(context.get(key, placeholder))
+            parts.append(literal)
+        return "".join(parts)
+
+    def segments(self, context):
+        """SMS encoding and segment count of the rendered message, without rendering it"""
+        gsm7, septets, ucs2_units = self._gsm7, self._septets, self._ucs2_units
+        for value in self.values(context):
+            value_gsm7, value_septets, value_units = text_stats(value)
+            gsm7 = gsm7 and value_gsm7
+            septets += value_septets
+            ucs2_units += value_units
+        return sms_segments(gsm7, septets, ucs2_units)
+
+_compiled = {}
+
+def compile_template(text):
+    """Compile a template, reusing the result for text seen before"""
+    template = _compiled.get(text)
+    if template is None:
+        if len(_compiled) >= 256:
+            _compiled.clear()
+        template = _compiled[text] = CompiledTemplate(text)
+    return template
+
+def contact_context(contact):
+    """Per-recipient fields from a contact record"""
+    name = contact.get("name", "")
+    return {
+        "name": name,
+        "first name": name.split()[0] if name.split() else name,
+        "number": contact.get("number", ""),
+        "group": contact.get("group") or ", ".join(contact.get("groups", ())),
+    }
+
+def render_for_contacts(template, contacts, shared=None):
+    """
+    Render a template for many contacts
+
+    Args:
+        template (CompiledTemplate): Compiled template
+        contacts (list): Contact dicts with ``name``/``number``/``groups``
+        shared (dict): Fields that are the same for every recipient
+
+    Returns:
+        list: Rendered messages, in contact order
+    """
+    shared = shared or {}
+    return [template.render({**shared, **contact_context(contact)}) for contact in contacts]
+
+def show_field_inputs(template, key, exclude=CONTACT_FIELDS):
+    """
+    Text inputs for the template's shared fields (dates, places...)
+
+    ``[Date]`` and ``[Time]`` default to today and now.
+
+    Returns:
+        dict: Field key -> value entered
+    """
+    fields = [field for field in template.fields if field not in exclude]
+    if not fields:
+        return {}
+    defaults = {"date": datetime.now().strftime("%Y-%m-%d"), "time": datetime.now().strftime("%H:%M")}
+    values = {}
+    columns = st.columns(min(len(fields), 3))
+    for index, field in enumerate(fields):
+        with columns[index % len(columns)]:
+            value = st.text_input(f"[{field.title()}]", value=defaults.get(field, ""), key=f"{key}_{field}")
+        if value:
+            values[field] = value
+    return values
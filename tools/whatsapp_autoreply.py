@@ -0,0 +1,376 @@
+import streamlit as st
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from tools.storage import Collection
+from tools.templating import compile_template, contact_context
+
+logger = logging.getLogger(__name__)
+
+# Timezone choices in the bot configuration -> IANA zone
+TIMEZONES = {
+    "UTC": "UTC",
+    "EST": "America/New_York",
+    "PST": "America/Los_Angeles",
+    "IST": "Asia/Kolkata",
+    "GMT": "Europe/London",
+}
+
+RULE_KINDS = ["Keyword", "Regex"]
+RULE_WINDOWS = ["Always", "Working hours", "Outside working hours"]
+
+DEFAULT_RULES = [
+    {"kind": "Keyword", "pattern": "price, pricing, cost, quote", "reply": "Hi [First Name]! Our price list is at example.com/pricing.", "when": "Always"},
+    {"kind": "Keyword", "pattern": "hello, hi, hey", "reply": "Hello [First Name]! How can I help you today?", "when": "Working hours"},
+    {"kind": "Regex", "pattern": r"\border\s*#?\d{4,}", "reply": "Thanks, we're checking on your order and will update you shortly.", "when": "Always"},
+]
+
+CONFIG_COLLECTION = "whatsapp_bot_config"
+
+# Bot settings until a profile saves its own
+DEFAULT_CONFIG = {
+    "enabled": False,
+    "fallback": "Thanks for your message! I'll get back to you soon.",
+    "working_hours": [9, 17],
+    "timezone": "UTC",
+    "rules": DEFAULT_RULES,
+    "revision": 0,
+}
+
+def load_bot_config(collection):
+    """The profile's saved bot settings (``DEFAULT_CONFIG`` until first saved)"""
+    records = collection.recent(1)
+    return dict(DEFAULT_CONFIG, **records[0]) if records else dict(DEFAULT_CONFIG)
+
+def save_bot_config(collection, config):
+    """Store new bot settings; ``revision`` goes up by one on every save"""
+    records = collection.recent(1)
+    if records:
+        collection.update(dict(records[0], **config, revision=records[0].get("revision", 0) + 1))
+    else:
+        collection.add(dict(config, revision=1))
+
+def _trie_pattern(words):
+    """
+    Regex matching any of ``words``, shaped as a trie
+
+    ``re`` tries alternatives one after another, so ``cat|car|cart`` retries
+    the shared prefix for each; ``ca(?:t|r(?:t)?)`` walks it once, which is
+    what keeps hundreds of keywords cheap.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        ending = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ending:
+            body = f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+class RuleSet:
+    """
+    Auto-reply rules compiled into one regular expression
+
+    Keyword rules (comma-separated, whole words, case-insensitive) share a
+    single trie-shaped pattern, so one pass over a message finds every
+    keyword in it, overlapping ones included; each regex rule is searched on
+    its own. The first triggered rule in list order wins.
+
+    Args:
+        rules (list): ``{"kind", "pattern", "reply", "when"}`` dicts
+        fallback (str): Reply when no rule matches outside working hours ("" for none)
+        working_hours (tuple): (start hour, end hour) in ``timezone``
+        timezone (str): Key of ``TIMEZONES``
+
+    Attributes:
+        errors (list): Messages for rules that couldn't be compiled (skipped)
+    """
+
+    def __init__(self, rules, fallback="", working_hours=(9, 17), timezone="UTC"):
+        self.rules = []
+        self.errors = []
+        self.fallback = compile_template(fallback) if fallback else None
+        self.working_hours = tuple(working_hours)
+        self.zone = ZoneInfo(TIMEZONES.get(timezone, timezone))
+        self._keywords = {}  # lowercase keyword -> indexes of rules using it
+
+        self._regexes = []   # (rule index, compiled pattern)
+        for rule in rules:
+            pattern = (rule.get("pattern") or "").strip()
+            if not pattern or not rule.get("reply"):
+                continue
+            index = len(self.rules)
+            if rule.get("kind", "Keyword") == "Regex":
+                try:
+                    self._regexes.append((index, re.compile(pattern, re.IGNORECASE)))
+                except re.error as e:
+                    self.errors.append(f"Rule {pattern!r}: {e}")
+                    continue
+            else:
+                for keyword in pattern.split(","):
+                    keyword = " ".join(keyword.lower().split())
+                    if keyword:
+                        self._keywords.setdefault(keyword, []).append(index)
+            self.rules.append({**rule, "template": compile_template(rule["reply"])})
+
+        # A lookahead finds the longest keyword starting at each word, without consuming it
+        self.pattern = None
+        if self._keywords:
+            self.pattern = re.compile(rf"(?<!\w)(?=({_trie_pattern(self._keywords)})(?!\w))", re.IGNORECASE)
+
+    def in_working_hours(self, when):
+        """Whether ``when`` (naive datetimes are local time) falls inside working hours"""
+        start, end = self.working_hours
+        hour = when.astimezone(self.zone).hour
+        return start <= hour < end if start <= end else (hour >= start or hour < end)
+
+    def matching_rules(self, text):
+        """Indexes of every rule ``text`` triggers, in rule order"""
+        found = set()
+        if self.pattern is not None:
+            for match in self.pattern.finditer(text):
+                phrase = match.group(1).lower()
+                # Shorter keywords ending on a word boundary inside the match ("price" in "price list") fire too
+                for end in range(1, len(phrase) + 1):
+                    if end == len(phrase) or not (phrase[end].isalnum() or phrase[end] == "_"):
+                        found.update(self._keywords.get(phrase[:end], ()))
+        for index, regex in self._regexes:
+            if regex.search(text):
+                found.add(index)
+        return sorted(found)
+
+    def choose(self, text, when):
+        """
+        The reply rule for a message received at ``when``
+
+        Returns:
+            tuple: (rule key: str, template: CompiledTemplate), or None for no reply
+        """
+        working = self.in_working_hours(when)
+        for index in self.matching_rules(text):
+            window = self.rules[index].get("when", "Always")
+            if window == "Always" or (window == "Working hours") == working:
+                return f"r{index}", self.rules[index]["template"]
+        if self.fallback is not None and not working:
+            return "fallback", self.fallback
+        return None
+
+class TTLCache:
+    """
+    Set of recently seen keys that forget themselves after ``ttl`` seconds
+
+    Expiry is a deque in insertion order, so checking and adding are O(1)
+    amortized; ``max_size`` bounds memory under bursts.
+    """
+
+    def __init__(self, ttl=3600, max_size=100_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._expiry = {}
+        self._order = deque()
+
+    def _expire(self, now):
+        while self._order and (self._order[0][0] <= now or len(self._expiry) > self.max_size):
+            expires, key = self._order.popleft()
+            if self._expiry.get(key) == expires:
+                del self._expiry[key]
+
+    def add(self, key, now=None):
+        """Remember ``key``; returns False if it was already remembered and not expired"""
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        if key in self._expiry:
+            return False
+        self._expiry[key] = now + self.ttl
+        self._order.append((now + self.ttl, key))
+        return True
+
+    def __len__(self):
+        return len(self._expiry)
+
+class MockWhatsAppGateway:
+    """
+    In-process stand-in for a WhatsApp Business API account
+
+    Outgoing messages go to a bounded ``sent`` log; ``simulate`` feeds
+    made-up inbound traffic to an auto-reply engine.
+    """
+
+    SAMPLE_MESSAGES = [
+        "Hi there!", "hello, are you open today?", "What's the price for the premium plan?",
+        "Can I get a quote?", "Where is my order #48213?", "thanks!", "Hey", "ok see you tomorrow",
+        "Is there any discount on pricing?", "order 99120 hasn't arrived", "Good morning 🙂",
+    ]
+
+    def __init__(self):
+        self.sent = deque(maxlen=1000)
+        self.sent_count = 0
+        self._lock = threading.Lock()
+
+    def send(self, number, text):
+        with self._lock:
+            self.sent.append({"number": number, "text": text, "time": time.time()})
+            self.sent_count += 1
+
+    def simulate(self, engine, count, senders):
+        """Queue ``count`` inbound messages from random ``senders`` (E.164 numbers)"""
+        senders = list(senders) or [f"+1555{n:07d}" for n in range(100)]
+        now = datetime.now().astimezone()
+        for _ in range(count):
+            engine.submit(random.choice(senders), random.choice(self.SAMPLE_MESSAGES), now)
+
+class AutoReplyEngine:
+    """
+    Background worker answering inbound WhatsApp messages
+
+    Inbound messages are queued by ``submit`` (the webhook side) and
+    handled by a worker thread in batches: each is stored in the message
+    history, matched against the current ``RuleSet`` and, unless the same
+    rule already answered that contact within the dedupe TTL, answered
+    through the gateway. A message that fails is logged and counted in
+    ``errors``; the worker carries on with the next one.
+
+    Args:
+        gateway: Object with ``send(number, text)``
+        history (MessageHistory): Log receiving inbound messages and replies
+        contacts (ContactDirectory): Used to put names on numbers
+        dedupe_ttl (float): Seconds before a contact can get the same reply again
+        batch_size (int): Messages taken off the queue per wakeup
+    """
+
+    def __init__(self, gateway, history, contacts=None, dedupe_ttl=3600, batch_size=500):
+        self.gateway = gateway
+        self.history = history
+        self.contacts = contacts
+        self.batch_size = batch_size
+        self.enabled = False
+        self.ruleset = RuleSet([])
+        self.received = 0
+        self.replied = 0
+        self.deduped = 0
+        self.unmatched = 0
+        self.errors = 0
+        self.last_error = None
+        self._dedupe = TTLCache(dedupe_ttl)
+        self._recent = deque(maxlen=2000)  # (finished, seconds in queue) per message
+        self._config = None
+        self._queue = queue.SimpleQueue()
+        self._worker = threading.Thread(target=self._run, name="whatsapp-autoreply", daemon=True)
+        self._worker.start()
+
+    def configure(self, enabled, rules, fallback, working_hours, timezone):
+        """Swap in new settings; rules are only recompiled when they changed"""
+        config = (tuple(tuple(sorted(rule.items())) for rule in rules), fallback, tuple(working_hours), timezone)
+        if config != self._config:
+            self.ruleset = RuleSet(rules, fallback, working_hours, timezone)
+            self._config = config
+        self.enabled = enabled
+        return self.ruleset
+
+    def apply(self, config):
+        """``configure`` from a saved bot configuration (see ``load_bot_config``)"""
+        return self.configure(config["enabled"], config["rules"], config["fallback"], config["working_hours"],
+                              config["timezone"])
+
+    def submit(self, number, text, received=None):
+        """Queue an inbound message (``received`` defaults to now)"""
+        self._queue.put((number, text, received or datetime.now().astimezone(), time.monotonic()))
+
+    @property
+    def backlog(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        """Counters plus throughput and queueing delay over the last 2,000 messages"""
+        recent = list(self._recent)
+        rate = 0.0
+        if len(recent) > 1 and recent[-1][0] > recent[0][0]:
+            rate = (len(recent) - 1) / (recent[-1][0] - recent[0][0])
+        waits = sorted(wait for _, wait in recent)
+        return {
+            "received": self.received,
+            "replied": self.replied,
+            "deduped": self.deduped,
+            "unmatched": self.unmatched,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "backlog": self.backlog,
+            "rate": rate,
+            "p95_ms": waits[int(len(waits) * 0.95)] * 1000 if waits else 0.0,
+        }
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            for _ in range(self.batch_size - 1):
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                try:
+                    self._handle(*item)
+                except Exception as e:
+                    # One bad message (or a storage hiccup) must not stop the worker
+                    logger.exception("Auto-reply failed for a message from %s", item[0])
+                    self.errors += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+
+    def _handle(self, number, text, received, queued):
+        contact = (self.contacts.find_number(number) if self.contacts else None) or {"name": number, "number": number}
+        stamp = received.strftime("%Y-%m-%d %H:%M")
+        self.history.add({"sender": contact["name"], "recipient": "You", "number": number,
+                          "content": text, "time": stamp, "type": "received"})
+        self.received += 1
+
+        ruleset = self.ruleset
+        choice = ruleset.choose(text, received) if self.enabled else None
+        if choice is None:
+            self.unmatched += 1
+        elif not self._dedupe.add((number, choice[0])):
+            self.deduped += 1
+        else:
+            reply = choice[1].render(contact_context(contact))
+            self.gateway.send(number, reply)
+            self.history.add({"sender": "🤖 Bot", "recipient": contact["name"], "number": number,
+                              "content": reply, "time": stamp, "type": "sent", "rule": choice[0]})
+            self.replied += 1
+        self._recent.append((time.monotonic(), time.monotonic() - queued))
+
+@st.cache_resource
+def get_mock_gateway():
+    """Shared mock WhatsApp gateway"""
+    return MockWhatsAppGateway()
+
+@st.cache_resource
+def _engines():
+    return {}
+
+_engines_lock = threading.Lock()
+
+def get_auto_reply_engine(history, contacts):
+    """Return the profile's auto-reply worker, started on first use with the saved configuration"""
+    with _engines_lock:
+        engines = _engines()
+        key = (history.name, history.namespace, id(history.collection.backend))
+        engine = engines.get(key)
+        if engine is None:
+            engine = engines[key] = AutoReplyEngine(get_mock_gateway(), history, contacts)
+            engine.apply(load_bot_config(Collection(CONFIG_COLLECTION, history.collection.backend, history.namespace)))
+        return engine
@@ -1,6 +1,16 @@
 import streamlit as st
+import pandas as pd
 import time
 from datetime import datetime
+from tools.contacts import get_contact_directory, pick_contacts, show_contact_manager
+from tools.fragments import fragment, rerun_fragment
+from tools.message_history import get_message_history, show_history_page
+from tools.storage import get_collection
+from tools.templating import compile_template, contact_context, show_field_inputs
+from tools.whatsapp_autoreply import (
+    CONFIG_COLLECTION, RULE_KINDS, RULE_WINDOWS, TIMEZONES, get_auto_reply_engine, get_mock_gateway,
+    load_bot_config, save_bot_config,
+)
 
 def run_whatsapp_bot():
     """Run the WhatsApp bot tool"""
@@ -8,20 +18,93 @@ def run_whatsapp_bot():
     
     st.info("🤖 This is a simulated WhatsApp bot interface. In a real implementation, you would integrate with WhatsApp Web API or similar services.")
     
+    # The bot runs for the whole profile, so it only changes when a configuration is saved
+    config_store = get_collection(CONFIG_COLLECTION)
+    config = load_bot_config(config_store)
+    engine = get_auto_reply_engine(get_message_history("whatsapp_messages"), get_contact_directory())
+    
     # Bot configuration
     with st.expander("⚙️ Bot Configuration", expanded=True):
         col1, col2 = st.columns(2)
         
         with col1:
-            auto_reply = st.checkbox("Enable Auto-Reply", value=False)
+            auto_reply = st.checkbox("Enable Auto-Reply", value=config["enabled"])
             reply_message = st.text_area("Auto-Reply Message", 
-                                        value="Thanks for your message! I'll get back to you soon.",
-                                        disabled=not auto_reply)
+                                        value=config["fallback"],
+                                        disabled=not auto_reply,
+                                        help="Sent outside working hours when no rule below matches")
         
         with col2:
-            working_hours = st.slider("Working Hours", 0, 24, (9, 17))
-            timezone = st.selectbox("Timezone", ["UTC", "EST", "PST", "IST", "GMT"])
+            working_hours = st.slider("Working Hours", 0, 24, tuple(config["working_hours"]))
+            timezone = st.selectbox("Timezone", list(TIMEZONES), index=list(TIMEZONES).index(config["timezone"]))
+        
+        st.markdown("#### Reply Rules")
+        st.caption("Rules are checked top to bottom. Keywords are comma-separated whole words; "
+                   "[Name] and [First Name] in a reply are filled in from the contact.")
+        edited_rules = st.data_editor(
+            pd.DataFrame(config["rules"], columns=["kind", "pattern", "reply", "when"]),
+            # A new key per saved revision, so edits aren't replayed onto a newer configuration
+            key=f"whatsapp_rules_{config['revision']}",
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "kind": st.column_config.SelectboxColumn("Type", options=RULE_KINDS, default="Keyword"),
+                "pattern": st.column_config.TextColumn("Keywords / Pattern"),
+                "reply": st.column_config.TextColumn("Reply"),
+                "when": st.column_config.SelectboxColumn("When", options=RULE_WINDOWS, default="Always"),
+            },
+        )
+        rules = edited_rules.fillna("").to_dict("records")
+        
+        draft = {"enabled": auto_reply, "fallback": reply_message, "working_hours": list(working_hours),
+                 "timezone": timezone, "rules": rules}
+        if st.button("💾 Save Bot Configuration", key="whatsapp_save_config"):
+            save_bot_config(config_store, draft)
+            engine.apply(draft)
+            st.success("✅ Bot configuration saved!")
+            st.rerun()
+        elif any(draft[field] != config[field] for field in draft):
+            st.caption("✏️ Unsaved changes. The bot keeps running with the saved configuration until you save.")
+    
+    for error in engine.ruleset.errors:
+        st.warning(f"⚠️ Skipped invalid rule. {error}")
     
+    show_whatsapp_templates()
+    show_auto_reply_activity(engine)
+    show_whatsapp_messaging(engine.enabled)
+
+@fragment(run_every=2)
+def show_auto_reply_activity(engine):
+    """Inbound traffic and auto-reply counters, refreshed every two seconds"""
+    st.markdown("### 📥 Auto-Reply Activity")
+    
+    stats = engine.stats()
+    col1, col2, col3, col4, col5, col6 = st.columns(6)
+    col1.metric("Received", f"{stats['received']:,}")
+    col2.metric("Replied", f"{stats['replied']:,}")
+    col3.metric("Deduplicated", f"{stats['deduped']:,}", help="Same reply already sent to the contact within the last hour")
+    col4.metric("Failed", f"{stats['errors']:,}", help="Messages the bot couldn't store or answer")
+    col5.metric("Queued", f"{stats['backlog']:,}")
+    col6.metric("Throughput", f"{stats['rate']:,.0f} msg/s")
+    if stats["last_error"]:
+        st.warning(f"⚠️ Last auto-reply failure: {stats['last_error']}")
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        simulated = st.number_input("Simulated inbound messages", min_value=1, max_value=50000, value=100,
+                                    key="whatsapp_simulate_count",
+                                    help="Fed to the bot through the built-in mock gateway")
+    with col2:
+        st.write("")
+        if st.button("📥 Simulate Inbound", key="whatsapp_simulate", use_container_width=True):
+            senders = [contact['number'] for contact in get_contact_directory().search("", limit=200)]
+            get_mock_gateway().simulate(engine, int(simulated), senders)
+            rerun_fragment()
+
+@fragment
+def show_whatsapp_templates():
+    """Template picker, rerun on its own"""
     # Message templates
     st.markdown("### 📝 Message Templates")
     
@@ -41,69 +124,68 @@ def run_whatsapp_bot():
         custom_message = templates[selected_template]
         st.text_area("Message Preview", custom_message, disabled=True)
     
+    if st.button("📝 Use Template", key="whatsapp_use_template", disabled=not custom_message):
+        # The message box picks this up before it is drawn on the next page run
+        st.session_state.whatsapp_pending_template = custom_message
+        st.rerun()
+
+@fragment
+def show_whatsapp_messaging(auto_reply):
+    """Contacts, history, sending and bot status, rerun together as one fragment"""
     # Contact management
     st.markdown("### 👥 Contact Management")
     
-    contacts = st.session_state.get('whatsapp_contacts', [])
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("#### Add Contact")
-        new_contact = st.text_input("Contact Name")
-        new_number = st.text_input("Phone Number")
-        
-        if st.button("Add Contact") and new_contact and new_number:
-            contacts.append({"name": new_contact, "number": new_number})
-            st.session_state.whatsapp_contacts = contacts
-            st.success(f"Added {new_contact} to contacts!")
-            st.rerun()
-    
-    with col2:
-        st.markdown("#### Contact List")
-        if contacts:
-            for contact in contacts:
-                st.write(f"📞 **{contact['name']}** - {contact['number']}")
-        else:
-            st.info("No contacts added yet.")
+    show_contact_manager("whatsapp_contacts")
+    directory = get_contact_directory()
     
     # Message history
     st.markdown("### 💬 Message History")
     
-    messages = st.session_state.get('whatsapp_messages', [])
-    
-    if messages:
-        for message in reversed(messages[-10:]):  # Show last 10 messages
-            with st.container():
-                col1, col2 = st.columns([1, 4])
-                with col1:
-                    st.write(f"**{message['sender']}**")
-                    st.caption(message['time'])
-                with col2:
-                    st.write(message['content'])
-                st.divider()
+    whatsapp_messages = get_message_history("whatsapp_messages")
+    
+    def show_message(message):
+        with st.container():
+            col1, col2 = st.columns([1, 4])
+            with col1:
+                st.write(f"**{message['sender']}**")
+                st.caption(message['time'])
+            with col2:
+                st.write(message['content'])
+            st.divider()
+    
+    if whatsapp_messages.total:
+        show_history_page(whatsapp_messages, "whatsapp_history", show_message)
     else:
         st.info("No messages in history.")
     
     # Send message
     st.markdown("### 📤 Send Message")
     
-    recipient = st.selectbox("Select Recipient", [contact['name'] for contact in contacts] if contacts else ["No contacts"])
-    message_content = st.text_area("Message Content")
+    if "whatsapp_pending_template" in st.session_state:
+        st.session_state.whatsapp_message_content = st.session_state.pop("whatsapp_pending_template")
     
-    if st.button("Send Message", disabled=not contacts or not message_content):
-        if contacts and message_content:
+    contact = pick_contacts("whatsapp_recipient", directory, "Select Recipient", multi=False)
+    message_content = st.text_area("Message Content", key="whatsapp_message_content",
+                                   help="[Name], [First Name] and [Number] are filled in from the contact")
+    template = compile_template(message_content)
+    shared_fields = show_field_inputs(template, "whatsapp_fields")
+    rendered = template.render({**shared_fields, **contact_context(contact or {})})
+    if template.slots:
+        st.caption(f"Preview: {rendered}")
+    
+    if st.button("Send Message", disabled=not contact or not message_content):
+        if contact and message_content:
             new_message = {
                 "sender": "You",
-                "recipient": recipient,
-                "content": message_content,
+                "recipient": contact['name'],
+                "number": contact['number'],
+                "content": rendered,
                 "time": datetime.now().strftime("%Y-%m-%d %H:%M"),
                 "type": "sent"
             }
-            messages.append(new_message)
-            st.session_state.whatsapp_messages = messages
+            whatsapp_messages.add(new_message)
             st.success("Message sent!")
-            st.rerun()
+            rerun_fragment()
     
     # Bot status
     st.markdown("### 🤖 Bot Status")
@@ -111,10 +193,10 @@ def run_whatsapp_bot():
     status_col1, status_col2, status_col3 = st.columns(3)
     
     with status_col1:
-        st.metric("Total Contacts", len(contacts))
+        st.metric("Total Contacts", f"{len(directory):,}")
     
     with status_col2:
-        st.metric("Total Messages", len(messages))
+        st.metric("Total Messages", f"{whatsapp_messages.total:,}")
     
     with status_col3:
         status = "🟢 Online" if auto_reply else "🔴 Offline"